@@ -0,0 +1,70 @@
+# benchmarks/chart_export.py
+"""
+Mede a rasterização dos gráficos do export (PNG 1200x700, scale=2) com
+N figuras no estilo das rosquinhas de share da Visão Geral:
+
+- serial: um Kaleido no próprio processo (como era o to_image em laço);
+- pool:   utils.rasterize com W workers, primeira chamada (inclui subir o
+          pool) e chamadas seguintes (pool já aquecido, como entre exports).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.chart_export --figs 12 --workers 1 2 4
+"""
+import time
+import argparse
+
+import numpy as np
+import plotly.graph_objects as go
+
+from utils import rasterize
+
+
+def make_figs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    figs = []
+    for i in range(n):
+        labels = [f"Emissora {k}" for k in range(8)]
+        fig = go.Figure(go.Pie(labels=labels, values=rng.integers(1, 1000, len(labels)), hole=0.5))
+        fig.update_layout(title=f"Share {2015 + i}")
+        figs.append(fig.to_json())
+    return figs
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--figs", type=int, default=12)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    figs = make_figs(args.figs)
+
+    # Aquece o Kaleido local para a comparação não incluir a subida dele
+    rasterize.render_pngs(figs[:1], workers=1)
+    _, serial = timed(rasterize.render_pngs, figs, workers=1)
+    print(f"{args.figs} figuras | serial: {serial:.2f}s\n")
+
+    print(f"{'workers':>8}{'1ª chamada (s)':>16}{'aquecido (s)':>14}{'speedup':>10}")
+    for w in args.workers:
+        if w <= 1:
+            continue
+        rasterize.shutdown_pool()
+        rasterize.RASTER_WORKERS = w
+        res, frio = timed(rasterize.render_pngs, figs, workers=w)
+        erros = [r for r in res if isinstance(r, Exception)]
+        if erros:
+            print(f"{w:>8}  erro: {erros[0]}")
+            continue
+        quente = min(timed(rasterize.render_pngs, figs, workers=w)[1] for _ in range(args.repeat))
+        print(f"{w:>8}{frio:>16.2f}{quente:>14.2f}{serial / quente:>9.1f}x")
+    rasterize.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
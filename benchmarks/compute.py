@@ -0,0 +1,121 @@
+# benchmarks/compute.py
+"""
+Mede só o cálculo de cada página (funções compute_*), sem Streamlit e sem
+renderização, sobre as mesmas bases sintéticas de benchmarks.pages.
+
+- vendas:  compute_<página>(base, 1, 12) com os parâmetros padrão
+- crowley: compute_<módulo>(tb, ...) na praça com mais linhas, veículo
+           "Novabrasil", últimos 30 dias contra os 30 anteriores (flight:
+           último mês da base)
+
+"cold" é a primeira chamada; "warm" é a mediana das seguintes (as funções
+não guardam cache, então a diferença vem de imports e aquecimento do
+pandas/plotly). O relatório JSON tem o mesmo formato do benchmarks.pages.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.compute --rows 100000 1000000 --crowley-rows 1000000
+    python -m benchmarks.compute --only top10 eca --out bench_compute.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.pages import SALES_PAGES, CROWLEY_MODULES, environment, _result
+
+
+def crowley_params(tb):
+    """Parâmetros padrão das buscas Crowley para uma tabela (praça com mais linhas)."""
+    pracas = tb.dictionaries["Praca"]
+    praca = pracas[np.bincount(tb.codes["Praca"], minlength=len(pracas))[:len(pracas)].argmax()]
+    _, fim = tb.day_range()
+    ini = fim - timedelta(days=30)
+    ref_fim = ini - timedelta(days=1)
+    ref_ini = ref_fim - timedelta(days=30)
+    return {
+        "eca": dict(dt_ini=ini, dt_fim=fim, praca=praca, veiculo="Novabrasil"),
+        "busca_novos": dict(dt_ini=ini, dt_fim=fim, ref_ini=ref_ini, ref_fim=ref_fim, praca=praca),
+        "ranking_analitico": dict(dt_ini=ini, dt_fim=fim, ref_ini=ref_ini, ref_fim=ref_fim, praca=praca),
+        "flight": dict(ano=fim.year, mes=fim.month, praca=praca, veiculo="Novabrasil"),
+    }
+
+
+def run_compute(fn, args, kwargs, repeat):
+    """Tempos (s) da primeira chamada e das repetições de uma função compute_*."""
+    tempos = []
+    for _ in range(1 + repeat):
+        t0 = time.perf_counter()
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            return tempos, f"{type(e).__name__}: {e}"
+        tempos.append(time.perf_counter() - t0)
+    return tempos, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 100_000], help="Tamanhos da base de vendas")
+    parser.add_argument("--crowley-rows", type=int, nargs="*", default=[100_000, 1_000_000], help="Tamanhos da base Crowley")
+    parser.add_argument("--only", nargs="+", help="Só estas páginas/módulos (ex.: visao_geral eca)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições medidas por função (warm)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_compute.json", help="Relatório JSON")
+    args = parser.parse_args()
+
+    sales_pages = [p for p in SALES_PAGES if not args.only or p in args.only]
+    crowley_modules = [m for m in CROWLEY_MODULES if not args.only or m in args.only]
+    sys.path.insert(0, os.getcwd())
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "environment": environment(),
+        "datasets": [],
+        "results": [],
+    }
+
+    planos = [("vendas", n, sales_pages) for n in args.rows if sales_pages]
+    planos += [("crowley", n, crowley_modules) for n in args.crowley_rows if crowley_modules]
+
+    print(f"{'função':<34}{'linhas':>12}{'cold (s)':>11}{'warm (s)':>11}")
+    for schema, rows, nomes in planos:
+        t0 = time.perf_counter()
+        if schema == "vendas":
+            data = synthetic.sales_frame(rows, args.seed)
+        else:
+            data, _ = synthetic.crowley_table(rows, args.seed)
+            params = crowley_params(data)
+        report["datasets"].append({"schema": schema, "rows": rows, "generate_s": round(time.perf_counter() - t0, 3)})
+
+        for nome in nomes:
+            pacote = "pages" if schema == "vendas" else "crowley"
+            fn = getattr(importlib.import_module(f"{pacote}.{nome}"), f"compute_{nome}")
+            if schema == "vendas":
+                tempos, erro = run_compute(fn, (data, 1, 12), {}, args.repeat)
+            else:
+                tempos, erro = run_compute(fn, (data,), params[nome], args.repeat)
+            r = _result(schema, nome, rows, tempos, erro)
+            report["results"].append(r)
+            cold = f"{r['cold_s']:.3f}" if r["cold_s"] is not None else "-"
+            warm = "erro" if erro else f"{r['warm_s']:.3f}" if r["warm_s"] is not None else "-"
+            print(f"{r['name']:<34}{rows:>12,}{cold:>11}{warm:>11}")
+            if erro:
+                print(f"    {erro}")
+        del data
+
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\nRelatório: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/crowley_load_memory.py
+"""
+Compara o pico de memória (RSS) da carga da base Crowley:
+
+- legacy: read_table -> to_pandas -> astype("category") -> pd.to_datetime(dayfirst)
+- arrow:  crowley_store.read_source (read_dictionary + datas parseadas no Arrow)
+
+Cada variante roda num subprocesso próprio para que o pico medido seja só dela.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.crowley_load_memory --rows 2000000
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def peak_rss_mb():
+    # VmHWM é o pico do processo atual (ru_maxrss pode herdar o pico do pai)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def write_source(path, rows, seed=42):
+    """Gera um parquet com o mesmo layout do export Crowley (Data como texto)."""
+    rng = np.random.default_rng(seed)
+    datas = pd.date_range("2024-01-01", periods=700).strftime("%d/%m/%Y").to_numpy()
+    df = pd.DataFrame({
+        "Praca": rng.choice([f"Praça {i}" for i in range(12)], rows),
+        "Emissora": rng.choice([f"Emissora {i}" for i in range(150)], rows),
+        "Anunciante": rng.choice([f"Anunciante {i}" for i in range(20_000)], rows),
+        "Anuncio": rng.choice([f"Anúncio {i}" for i in range(60_000)], rows),
+        "Tipo": rng.choice(["Comercial", "Testemunhal", "Patrocínio"], rows),
+        "DayPart": rng.choice(["Manhã", "Tarde", "Noite", "Madrugada"], rows),
+        "Duracao": rng.integers(5, 61, rows),
+        "Volume de Insercoes": rng.integers(1, 6, rows),
+        "Data": rng.choice(datas, rows),
+    })
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+
+def load_legacy(path):
+    table = pq.read_table(path, memory_map=True)
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
+    gc.collect()
+    for col in ["Praca", "Emissora", "Anunciante", "Anuncio", "Tipo", "DayPart"]:
+        df[col] = df[col].astype("category")
+    for col in ["Volume de Insercoes", "Duracao"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int32")
+    df["Data_Dt"] = pd.to_datetime(df["Data"], dayfirst=True, errors="coerce")
+    df.drop(columns=["Data"], inplace=True)
+    return df
+
+
+def load_arrow(path):
+    from utils import crowley_store
+    return crowley_store.to_frame(crowley_store.read_source(path))
+
+
+VARIANTS = {"legacy": load_legacy, "arrow": load_arrow}
+
+
+def run_variant(name, path):
+    gc.collect()
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    df = VARIANTS[name](path)
+    elapsed = time.perf_counter() - t0
+    result = {
+        "variant": name,
+        "rows": len(df),
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(base, 1),
+        "frame_mb": round(df.memory_usage(deep=False).sum() / 1024 / 1024, 1),
+    }
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--path", help="Parquet de origem (se omitido, gera um sintético)")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if not path:
+            path = os.path.join(tmp, "crowley.parquet")
+            print(f"Gerando base sintética com {args.rows:,} linhas...")
+            write_source(path, args.rows)
+
+        results = []
+        for name in ["legacy", "arrow"]:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.crowley_load_memory", "--variant", name, "--path", path],
+                capture_output=True, text=True, check=True,
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'variante':<10}{'linhas':>12}{'tempo (s)':>12}{'RSS base (MB)':>16}{'pico RSS (MB)':>16}{'DataFrame (MB)':>16}")
+    for r in results:
+        print(f"{r['variant']:<10}{r['rows']:>12,}{r['seconds']:>12}{r['baseline_rss_mb']:>16}{r['peak_rss_mb']:>16}{r['frame_mb']:>16}")
+
+    legacy, arrow = results
+    if legacy["peak_rss_mb"] > 0:
+        reducao = (1 - arrow["peak_rss_mb"] / legacy["peak_rss_mb"]) * 100
+        print(f"\nRedução do pico de RSS: {reducao:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
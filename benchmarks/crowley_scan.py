@@ -0,0 +1,116 @@
+# benchmarks/crowley_scan.py
+"""
+Compara leituras típicas dos relatórios Crowley no export original e no
+arquivo regravado por crowley_store.recode_file (ordenado por Praca/Data,
+zstd, row groups com estatísticas):
+
+- eca:    uma praça, últimos 30 dias
+- flight: uma praça + um veículo, um mês
+
+Mede tempo e bytes efetivamente lidos do arquivo.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.crowley_scan --rows 2000000
+"""
+import io
+import os
+import time
+import argparse
+import tempfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+from benchmarks.crowley_load_memory import write_source
+from utils import crowley_store
+
+
+class CountingFile(io.FileIO):
+    """Arquivo que contabiliza os bytes lidos pelo leitor Parquet."""
+    def __init__(self, path):
+        super().__init__(path, "r")
+        self.bytes_read = 0
+
+    def readinto(self, b):
+        n = super().readinto(b)
+        self.bytes_read += n or 0
+        return n
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+COLUMNS = ["Praca", "Emissora", "Anunciante", "Volume de Insercoes"]
+
+
+def query_raw(path, praca, dt_ini, dt_fim, emissora=None):
+    """Export original: 'Data' é texto, então o período só é filtrado depois de ler."""
+    filters = [("Praca", "=", praca)]
+    if emissora: filters.append(("Emissora", "=", emissora))
+    with CountingFile(path) as f:
+        table = pq.read_table(f, columns=COLUMNS + ["Data"], filters=filters)
+        datas = crowley_store.parse_dates(table.column("Data"))
+        mask = pc.and_(pc.greater_equal(datas, pd.Timestamp(dt_ini)), pc.less_equal(datas, pd.Timestamp(dt_fim)))
+        return table.filter(mask).num_rows, f.bytes_read
+
+
+def query_sorted(path, praca, dt_ini, dt_fim, emissora=None):
+    filters = [("Praca", "=", praca), ("Data_Dt", ">=", pd.Timestamp(dt_ini)), ("Data_Dt", "<=", pd.Timestamp(dt_fim))]
+    if emissora: filters.append(("Emissora", "=", emissora))
+    with CountingFile(path) as f:
+        table = pq.read_table(f, columns=COLUMNS + ["Data_Dt"], filters=filters)
+        return table.num_rows, f.bytes_read
+
+
+def timed(fn, *args, repeat=5, **kwargs):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--path", help="Parquet de origem (se omitido, gera um sintético)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = args.path
+        if not raw_path:
+            raw_path = os.path.join(tmp, "crowley.parquet")
+            print(f"Gerando base sintética com {args.rows:,} linhas...")
+            write_source(raw_path, args.rows)
+
+        sorted_path = os.path.join(tmp, "crowley_sorted.parquet")
+        t0 = time.perf_counter()
+        crowley_store.recode_file(raw_path, sorted_path)
+        print(f"Regravação: {time.perf_counter() - t0:.2f}s "
+              f"({os.path.getsize(raw_path) / 1e6:.1f} MB -> {os.path.getsize(sorted_path) / 1e6:.1f} MB)\n")
+
+        # Parâmetros das consultas a partir do próprio arquivo
+        amostra = pq.read_table(sorted_path, columns=["Praca", "Emissora", "Data_Dt"])
+        praca = pc.cast(amostra.column("Praca"), "string")[0].as_py()
+        emissora = pc.cast(amostra.column("Emissora"), "string")[0].as_py()
+        fim = pd.Timestamp(pc.max(amostra.column("Data_Dt")).as_py())
+        consultas = {
+            "eca": dict(praca=praca, dt_ini=fim - pd.Timedelta(days=30), dt_fim=fim),
+            "flight": dict(praca=praca, emissora=emissora, dt_ini=fim.replace(day=1), dt_fim=fim),
+        }
+
+        print(f"{'consulta':<10}{'arquivo':<10}{'linhas':>10}{'tempo (ms)':>12}{'lido (MB)':>12}")
+        for nome, params in consultas.items():
+            for rotulo, fn, path in [("original", query_raw, raw_path), ("ordenado", query_sorted, sorted_path)]:
+                (linhas, lidos), seg = timed(fn, path, repeat=args.repeat, **params)
+                print(f"{nome:<10}{rotulo:<10}{linhas:>10,}{seg * 1000:>12.1f}{lidos / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
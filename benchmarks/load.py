@@ -0,0 +1,373 @@
+# benchmarks/load.py
+"""
+Teste de carga: N sessões simultâneas do streamlit_app.py rodando no AppTest
+do Streamlit (sem navegador e sem rede), todas no mesmo processo, como as
+sessões de um container. Cada sessão é um analista que:
+
+- faz login pelo formulário de senha;
+- navega pelas páginas de vendas e muda filtros globais (emissoras, meses);
+- abre o Relatório Crowley e roda ECA e Flight;
+- de vez em quando gera um export (ZIP da página ou Excel do ECA) e espera
+  o job em segundo plano terminar.
+
+Tudo roda num diretório temporário: a base de vendas sintética entra como
+upload manual (uploaded_dataframe) e a base Crowley sintética é publicada
+como snapshot no store local (data/crowley_store), então o Drive nunca é
+acessado. Os cookies do navegador são o valor inicial do componente do
+CookieManager.
+
+O relatório traz, por ação, os percentis de latência (cada ação é uma
+execução do script, ou o tempo até o job ficar pronto nos exports), e os
+recursos do processo amostrados durante o teste: memória residente (início,
+pico, fim) e uso de CPU em relação aos núcleos disponíveis.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.load --sessions 5 --iterations 3
+    python -m benchmarks.load --sessions 20 --rows 500000 --crowley-rows 5000000 --think 1 --out bench_load.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from contextlib import contextmanager
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+PASSWORD = "datadrivenrp"
+SALES_NAV = {1: "visao_geral", 2: "clientes_faturamento", 3: "perdas_ganhos", 4: "cruzamentos_intersecoes",
+             5: "top10", 6: "relatorio_abc", 7: "eficiencia"}
+CROWLEY_NAV = 8
+TIMEOUT_S = 900
+JOB_TIMEOUT_S = 900
+SAMPLE_S = 0.5
+
+# Probabilidade de cada passo opcional numa iteração do fluxo
+P_FILTER = 0.7
+P_EXPORT = 0.15
+P_CROWLEY = 0.5
+P_CROWLEY_EXPORT = 0.15
+
+
+# ==================== AMBIENTE ====================
+def prepare_workdir(workdir, tb):
+    """
+    Diretório de trabalho com data/ próprio (jobs, caches, store Crowley) e
+    links para os arquivos que o app lê por caminho relativo.
+    """
+    for nome in ["assets", "utils"]:
+        os.symlink(os.path.join(ROOT, nome), os.path.join(workdir, nome))
+    os.chdir(workdir)
+    from utils import crowley_table
+    crowley_table.publish_snapshot(tb)
+
+def browser_cookies():
+    """Cookies de um navegador que já viu os avisos (sem os pop-ups de boas-vindas)."""
+    agora = datetime.now().isoformat()
+    return f"last_popup_view={agora}; last_disclaimer_view={agora}"
+
+
+@contextmanager
+def shared_runtime():
+    """
+    O AppTest cria um Runtime simulado a cada execução, apaga no fim e troca
+    o config.get_option enquanto roda, o que quebra execuções simultâneas.
+    Aqui todas as sessões usam um único runtime simulado (com um só
+    gerenciador de cache, como um servidor) e a opção de teste fica ligada
+    durante todo o teste. O "magic" do Streamlit fica desligado (o script
+    não usa): o ast.parse dele não é seguro entre threads no Python 3.11.
+    """
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import patch_config_options
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    original = app_test.Runtime
+    # O AppTest passa a gravar o runtime dele nesta classe vazia, não no Runtime real
+    app_test.Runtime = type("RuntimeDaSessao", (), {"_instance": None})
+    Runtime._instance = runtime
+    try:
+        with patch_config_options({"global.appTest": True, "runner.magicEnabled": False}):
+            yield
+    finally:
+        app_test.Runtime = original
+        Runtime._instance = None
+
+
+class ResourceSampler(threading.Thread):
+    """Amostra RSS e CPU do processo a cada SAMPLE_S segundos."""
+
+    def __init__(self):
+        super().__init__(name="load-sampler", daemon=True)
+        self.samples = []
+        self._fim = threading.Event()
+
+    def run(self):
+        from utils.perf import rss_mb
+        ultimo_t, ultimo_cpu = time.perf_counter(), _cpu_s()
+        while not self._fim.wait(SAMPLE_S):
+            t, cpu = time.perf_counter(), _cpu_s()
+            self.samples.append({"t": t, "rss_mb": rss_mb(), "cpu_pct": 100 * (cpu - ultimo_cpu) / (t - ultimo_t)})
+            ultimo_t, ultimo_cpu = t, cpu
+
+    def stop(self):
+        self._fim.set()
+        self.join()
+
+def _cpu_s():
+    t = os.times()
+    return t.user + t.system
+
+
+# ==================== SESSÃO ====================
+def _button(at, texto):
+    for b in at.button:
+        if texto in (b.label or ""):
+            return b
+    raise LookupError(f"botão '{texto}' não encontrado")
+
+class Session:
+    """Um analista: AppTest próprio, ações cronometradas e estado de navegação."""
+
+    def __init__(self, idx, df, version, args, latencias, erros):
+        from streamlit.testing.v1 import AppTest
+        self.idx = idx
+        self.rng = random.Random(args.seed * 1000 + idx)
+        self.args = args
+        self.latencias = latencias
+        self.erros = erros
+        self.at = AppTest.from_file(APP, default_timeout=TIMEOUT_S)
+        self.at.session_state["CookieManager.sync_cookies"] = browser_cookies()
+        self.at.session_state["uploaded_dataframe"] = df
+        self.at.session_state["uploaded_timestamp"] = version
+
+    def _acao(self, nome, fn):
+        """Executa e cronometra uma ação; exceção do script ou do harness conta como erro."""
+        t0 = time.perf_counter()
+        try:
+            fn()
+            if self.at.exception:
+                raise RuntimeError(self.at.exception[0].value)
+        except Exception as e:
+            self.erros.append({"session": self.idx, "action": nome, "error": f"{type(e).__name__}: {e}"})
+            return False
+        finally:
+            self.latencias.setdefault(nome, []).append(time.perf_counter() - t0)
+            time.sleep(self.args.think * self.rng.uniform(0.5, 1.5))
+        return True
+
+    def _navegar(self, nav, view=None):
+        self.at.query_params["nav"] = str(nav)
+        if view:
+            self.at.query_params["view"] = view
+        else:
+            self.at.query_params.pop("view", None)
+        self.at.run()
+
+    def _esperar_job(self):
+        from utils import jobs
+        owner = self.at.session_state["export_owner"]
+        limite = time.time() + JOB_TIMEOUT_S
+        while time.time() < limite:
+            lista = jobs.list_jobs(owner)
+            if lista and lista[0]["status"] == jobs.ERROR:
+                raise RuntimeError(lista[0]["error"])
+            if lista and lista[0]["status"] == jobs.DONE:
+                return
+            time.sleep(0.2)
+        raise TimeoutError("job de export não terminou")
+
+    # --- passos do fluxo ---
+    def login(self):
+        at = self.at
+        at.run()
+
+        def entrar():
+            at.text_input(key="password_input").input(PASSWORD)
+            _button(at, "Entrar").click().run()
+        return self._acao("login", entrar)
+
+    def pagina(self):
+        nav = self.rng.choice(list(SALES_NAV))
+        return self._acao(f"pagina/{SALES_NAV[nav]}", lambda: self._navegar(nav))
+
+    def filtro(self):
+        at = self.at
+        chave = self.rng.choice(["filtro_emis", "filtro_meses_lista"])
+
+        def mudar():
+            ms = at.multiselect(key=chave)
+            opcoes = list(ms.options)
+            if chave == "filtro_meses_lista":
+                ini = self.rng.randrange(len(opcoes))
+                novo = opcoes[ini:ini + self.rng.randint(1, 12)]
+            else:
+                novo = self.rng.sample(opcoes, self.rng.randint(1, len(opcoes)))
+            ms.set_value(novo).run()
+        return self._acao("filtro", mudar)
+
+    def _exportar(self, nome, botao):
+        """
+        Clica em `botao` e espera o job. Sem o botão e com um download na tela,
+        os filtros são os de um export anterior e o job pronto é reaproveitado.
+        """
+        at = self.at
+        if not any(botao in (b.label or "") for b in at.button) and at.get("download_button"):
+            return self._acao(f"{nome}_reuse", lambda: None)
+
+        def exportar():
+            _button(at, botao).click().run()
+            self._esperar_job()
+        return self._acao(nome, exportar)
+
+    def export_pagina(self):
+        if self._acao("export/abrir", lambda: _button(self.at, "Exportar Dados da Página").click().run()):
+            self._exportar("export/pagina", "Gerar arquivo")
+
+    def crowley(self, modulo, botao):
+        at = self.at
+
+        def consultar():
+            self._navegar(CROWLEY_NAV, modulo)
+            _button(at, botao).click().run()
+        return self._acao(f"crowley/{modulo}", consultar)
+
+    def export_crowley(self):
+        return self._exportar("export/crowley", "Gerar Excel")
+
+    def run(self):
+        if not self.login():
+            return
+        for _ in range(self.args.iterations):
+            if self.pagina() and self.rng.random() < P_FILTER:
+                self.filtro()
+            if self.rng.random() < P_EXPORT:
+                self.export_pagina()
+            if self.rng.random() < P_CROWLEY:
+                if self.crowley("eca", "Gerar Relatório ECA") and self.rng.random() < P_CROWLEY_EXPORT:
+                    self.export_crowley()
+                self.crowley("flight", "Gerar Mapa Flight")
+
+
+# ==================== RELATÓRIO ====================
+def _percentil(valores, q):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(q * (len(valores) - 1))))]
+
+def summarize(latencias, erros):
+    res = []
+    for nome in sorted(latencias):
+        v = latencias[nome]
+        res.append({
+            "name": f"load/{nome}", "n": len(v),
+            "p50_s": round(_percentil(v, 0.5), 4), "p90_s": round(_percentil(v, 0.9), 4),
+            "p95_s": round(_percentil(v, 0.95), 4), "p99_s": round(_percentil(v, 0.99), 4),
+            "max_s": round(max(v), 4), "errors": sum(1 for e in erros if e["action"] == nome),
+        })
+    return res
+
+def resources(samples, rss_ini, rss_fim, cpus):
+    cpu = [s["cpu_pct"] for s in samples]
+    rss = [s["rss_mb"] for s in samples if s["rss_mb"] is not None]
+    return {
+        "rss_start_mb": rss_ini, "rss_peak_mb": max(rss + [rss_fim or 0]), "rss_end_mb": rss_fim,
+        "rss_growth_mb": round(rss_fim - rss_ini, 1) if rss_ini is not None and rss_fim is not None else None,
+        "cpu_count": cpus,
+        "cpu_mean_pct": round(statistics.mean(cpu), 1) if cpu else None,
+        "cpu_peak_pct": round(max(cpu), 1) if cpu else None,
+        # Fração do tempo com todos os núcleos (ao menos 90%) ocupados
+        "cpu_saturated_frac": round(sum(1 for c in cpu if c >= 90 * cpus) / len(cpu), 3) if cpu else None,
+        "samples": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=5, help="Sessões simultâneas")
+    parser.add_argument("--iterations", type=int, default=3, help="Iterações do fluxo por sessão")
+    parser.add_argument("--rows", type=int, default=100_000, help="Linhas da base de vendas")
+    parser.add_argument("--crowley-rows", type=int, default=1_000_000, help="Linhas da base Crowley")
+    parser.add_argument("--think", type=float, default=0.5, help="Pausa média entre ações (s)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Tempo para iniciar todas as sessões (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_load.json", help="Relatório JSON")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    sys.path.insert(0, ROOT)
+    from benchmarks import synthetic
+    from benchmarks.pages import environment
+    from utils.perf import rss_mb
+
+    t0 = time.perf_counter()
+    df = synthetic.sales_frame(args.rows, args.seed)
+    version = df["data_ref"].max().strftime("%m/%Y")
+    tb, _ = synthetic.crowley_table(args.crowley_rows, args.seed)
+    print(f"bases sintéticas: {args.rows:,} vendas, {args.crowley_rows:,} Crowley ({time.perf_counter() - t0:.1f}s)")
+
+    latencias, erros = {}, []
+    with tempfile.TemporaryDirectory(prefix="load_") as workdir:
+        cwd = os.getcwd()
+        try:
+            prepare_workdir(workdir, tb)
+            sessoes = [Session(i, df, version, args, latencias, erros) for i in range(args.sessions)]
+            threads = [threading.Thread(target=s.run, name=f"sessao-{s.idx}", daemon=True) for s in sessoes]
+
+            rss_ini = rss_mb()
+            sampler = ResourceSampler()
+            sampler.start()
+            t_ini = time.perf_counter()
+            with shared_runtime():
+                for i, th in enumerate(threads):
+                    th.start()
+                    if i < len(threads) - 1:
+                        time.sleep(args.ramp / max(len(threads) - 1, 1))
+                for th in threads:
+                    th.join()
+            duracao = time.perf_counter() - t_ini
+            sampler.stop()
+            rss_fim = rss_mb()
+        finally:
+            os.chdir(cwd)
+
+    results = summarize(latencias, erros)
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "config": {k: getattr(args, k) for k in ["sessions", "iterations", "rows", "crowley_rows", "think", "ramp"]},
+        "environment": environment(),
+        "duration_s": round(duracao, 2),
+        "actions_per_s": round(sum(r["n"] for r in results) / duracao, 3),
+        "resources": resources(sampler.samples, rss_ini, rss_fim, os.cpu_count() or 1),
+        "results": results,
+        "errors": erros,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'ação':<34}{'n':>6}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}{'máx (s)':>10}{'erros':>7}")
+    for r in results:
+        print(f"{r['name']:<34}{r['n']:>6}{r['p50_s']:>10.3f}{r['p95_s']:>10.3f}{r['p99_s']:>10.3f}{r['max_s']:>10.3f}{r['errors']:>7}")
+    rec = report["resources"]
+    print(f"\n{args.sessions} sessões em {duracao:.1f}s ({report['actions_per_s']} ações/s)")
+    print(f"memória: {rec['rss_start_mb']} -> pico {rec['rss_peak_mb']} -> {rec['rss_end_mb']} MB (crescimento {rec['rss_growth_mb']} MB)")
+    print(f"CPU: média {rec['cpu_mean_pct']}%, pico {rec['cpu_peak_pct']}% de {rec['cpu_count'] * 100}% "
+          f"(saturada em {100 * (rec['cpu_saturated_frac'] or 0):.0f}% do tempo)")
+    for e in erros[:10]:
+        print(f"  sessão {e['session']} {e['action']}: {e['error']}")
+    print(f"\nRelatório: {out}")
+
+
+if __name__ == "__main__":
+    main()
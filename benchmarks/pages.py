@@ -0,0 +1,171 @@
+# benchmarks/pages.py
+"""
+Mede o tempo de cada página sobre bases sintéticas (benchmarks.synthetic),
+sem navegador: o render de cada página roda no AppTest do Streamlit, com os
+mesmos argumentos que o streamlit_app passa.
+
+- vendas:  visao_geral, clientes_faturamento, perdas_ganhos,
+           cruzamentos_intersecoes, top10, relatorio_abc, eficiencia
+- crowley: eca, busca_novos, ranking_analitico, flight (com a busca já
+           disparada e os filtros padrão de cada módulo)
+
+Para cada página e tamanho de base: "cold" é a primeira execução com os
+caches do Streamlit limpos; "warm" é a mediana das reexecuções seguintes
+(mesma sessão, como um rerun por interação). O relatório JSON guarda os
+tempos, os tamanhos e o ambiente, para comparar execuções.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.pages --rows 10000 100000 1000000 --crowley-rows 100000 1000000
+    python -m benchmarks.pages --only visao_geral eca --rows 50000000 --out bench_pages.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmarks import synthetic
+
+SALES_PAGES = [
+    "visao_geral", "clientes_faturamento", "perdas_ganhos", "cruzamentos_intersecoes",
+    "top10", "relatorio_abc", "eficiencia",
+]
+# Módulo Crowley -> chave que dispara a busca
+CROWLEY_MODULES = {
+    "eca": "eca_search_trigger",
+    "busca_novos": "novos_search_trigger",
+    "ranking_analitico": "rank_search_trigger",
+    "flight": "flight_search_trigger",
+}
+TIMEOUT_S = 1800
+
+
+class BenchCookies(dict):
+    """Substitui o CookieManager: filtros salvos ficam só em memória."""
+    def save(self):
+        pass
+
+
+def _page_script():
+    # Script executado pelo AppTest; base e página chegam pelo session_state
+    import importlib
+    import streamlit as st
+
+    ss = st.session_state
+    page = importlib.import_module(ss["_bench_module"])
+    if ss["_bench_schema"] == "vendas":
+        page.render(ss["_bench_data"], 1, 12, False, True, ss["_bench_version"])
+    else:
+        page.render(ss["_bench_data"], ss["_bench_cookies"], ss["_bench_version"])
+
+
+def run_page(schema, name, data, version, repeat):
+    """Tempos (s) da primeira execução e das reexecuções de uma página."""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    at = AppTest.from_function(_page_script, default_timeout=TIMEOUT_S)
+    at.session_state["_bench_schema"] = schema
+    at.session_state["_bench_module"] = f"pages.{name}" if schema == "vendas" else f"crowley.{name}"
+    at.session_state["_bench_data"] = data
+    at.session_state["_bench_version"] = version
+    at.session_state["_bench_cookies"] = BenchCookies()
+    if schema == "crowley":
+        at.session_state[CROWLEY_MODULES[name]] = True
+
+    tempos = []
+    for _ in range(1 + repeat):
+        t0 = time.perf_counter()
+        at.run()
+        tempos.append(time.perf_counter() - t0)
+        if at.exception:
+            return tempos, at.exception[0].value
+    return tempos, None
+
+
+def _result(schema, name, rows, tempos, erro):
+    return {
+        "name": f"{schema}/{name}",
+        "rows": rows,
+        "cold_s": round(tempos[0], 4) if tempos else None,
+        "warm_s": round(statistics.median(tempos[1:]), 4) if len(tempos) > 1 and not erro else None,
+        "runs_s": [round(t, 4) for t in tempos],
+        "error": erro,
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "streamlit": st.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 100_000], help="Tamanhos da base de vendas")
+    parser.add_argument("--crowley-rows", type=int, nargs="*", default=[100_000, 1_000_000], help="Tamanhos da base Crowley")
+    parser.add_argument("--only", nargs="+", help="Só estas páginas/módulos (ex.: visao_geral eca)")
+    parser.add_argument("--repeat", type=int, default=3, help="Reexecuções medidas por página (warm)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_pages.json", help="Relatório JSON")
+    args = parser.parse_args()
+
+    sales_pages = [p for p in SALES_PAGES if not args.only or p in args.only]
+    crowley_modules = [m for m in CROWLEY_MODULES if not args.only or m in args.only]
+    # Os módulos das páginas (pages.*, crowley.*) são importados da raiz do projeto
+    sys.path.insert(0, os.getcwd())
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "environment": environment(),
+        "datasets": [],
+        "results": [],
+    }
+
+    planos = [("vendas", n, sales_pages) for n in args.rows if sales_pages]
+    planos += [("crowley", n, crowley_modules) for n in args.crowley_rows if crowley_modules]
+
+    print(f"{'página':<34}{'linhas':>12}{'cold (s)':>11}{'warm (s)':>11}")
+    for schema, rows, nomes in planos:
+        t0 = time.perf_counter()
+        if schema == "vendas":
+            data = synthetic.sales_frame(rows, args.seed)
+            version = data["data_ref"].max().strftime("%m/%Y")
+        else:
+            data, version = synthetic.crowley_table(rows, args.seed)
+        report["datasets"].append({"schema": schema, "rows": rows, "generate_s": round(time.perf_counter() - t0, 3)})
+
+        for nome in nomes:
+            tempos, erro = run_page(schema, nome, data, version, args.repeat)
+            r = _result(schema, nome, rows, tempos, erro)
+            report["results"].append(r)
+            warm = "erro" if erro else f"{r['warm_s']:.3f}" if r["warm_s"] is not None else "-"
+            print(f"{r['name']:<34}{rows:>12,}{r['cold_s']:>11.3f}{warm:>11}")
+            if erro:
+                print(f"    {erro}")
+        del data
+
+        # Relatório regravado a cada base: execuções longas deixam resultado parcial
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\nRelatório: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# benchmarks/regression.py
+"""
+Trava de regressão de desempenho: roda as funções quentes sobre as bases
+sintéticas e compara com o baseline versionado (benchmarks/baseline.json).
+
+Funções medidas (sem Streamlit na frente, como em benchmarks.compute):
+- filters/aplicar_filtros e format/normalize_dataframe (base de vendas);
+- compute_<página> de cada página de vendas (1 a 12, parâmetros padrão);
+- compute_<módulo> de cada módulo Crowley (pivôs de ECA, novos, ranking e
+  flight, com os parâmetros de benchmarks.compute.crowley_params).
+
+Para cada função: tempo = o menor de até --repeat execuções (o mínimo
+oscila menos que a mediana em máquinas ocupadas) e pico de memória = maior
+alocação Python/numpy acima do início da chamada (tracemalloc, numa
+execução à parte para não pesar no tempo).
+
+Cada resultado é comparado com o baseline usando a tolerância do próprio
+benchmark ("tolerance" na entrada) ou a padrão do arquivo. Diferenças
+menores que MIN_DELTA_S / MIN_DELTA_MB não contam (ruído de funções muito
+rápidas). Com regressão (ou erro), imprime a tabela de diferenças e sai com
+código 1.
+
+Os tempos dependem da máquina: gere o baseline na mesma máquina (ou runner
+de CI) que vai rodar a comparação, com --update. O --update preserva as
+tolerâncias por benchmark já escritas no arquivo.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.regression
+    python -m benchmarks.regression --only aplicar_filtros eca
+    python -m benchmarks.regression --update
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import tracemalloc
+from datetime import datetime
+
+from benchmarks import synthetic
+from benchmarks.pages import SALES_PAGES, CROWLEY_MODULES, environment
+from benchmarks.compute import crowley_params
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_ROWS = 100_000
+DEFAULT_CROWLEY_ROWS = 300_000
+DEFAULT_TOLERANCE = {"time": 0.30, "memory": 0.20}
+MIN_DELTA_S = 0.005
+MIN_DELTA_MB = 1.0
+BUDGET_S = 5  # acima disso por função, menos repetições
+
+
+class BenchCookies(dict):
+    """Cookies em memória para o aplicar_filtros."""
+    def save(self):
+        pass
+
+
+# ==================== SUÍTE ====================
+def sales_suite(raw, df):
+    """(nome, função sem argumentos) das funções da base de vendas."""
+    from utils.filters import aplicar_filtros
+    from utils.format import normalize_dataframe
+
+    suite = [
+        # aplicar_filtros renomeia as colunas do frame recebido, como no app (cópia fresca)
+        ("filters/aplicar_filtros", lambda: aplicar_filtros(df.copy(), BenchCookies())),
+        ("format/normalize_dataframe", lambda: normalize_dataframe(raw)),
+    ]
+    for nome in SALES_PAGES:
+        fn = getattr(importlib.import_module(f"pages.{nome}"), f"compute_{nome}")
+        suite.append((f"vendas/{nome}", lambda fn=fn: fn(df, 1, 12)))
+    return suite
+
+def crowley_suite(tb):
+    params = crowley_params(tb)
+    suite = []
+    for nome in CROWLEY_MODULES:
+        fn = getattr(importlib.import_module(f"crowley.{nome}"), f"compute_{nome}")
+        suite.append((f"crowley/{nome}", lambda fn=fn, kw=params[nome]: fn(tb, **kw)))
+    return suite
+
+
+def measure(fn, repeat):
+    """
+    (tempo mínimo em s, pico de memória em MB) de fn(). A primeira chamada
+    é aquecimento (imports, caches internos do pandas); funções lentas
+    param de repetir quando passam de BUDGET_S.
+    """
+    t0 = time.perf_counter()
+    fn()
+    aquecimento = time.perf_counter() - t0
+    tempos = [aquecimento] if aquecimento > BUDGET_S else []
+    while len(tempos) < repeat and sum(tempos) <= BUDGET_S:
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        inicio = tracemalloc.get_traced_memory()[0]
+        fn()
+        pico = tracemalloc.get_traced_memory()[1] - inicio
+    finally:
+        tracemalloc.stop()
+    return min(tempos), pico / 1024 / 1024
+
+
+def run_suite(rows, crowley_rows, seed, repeat, only):
+    resultados = []
+
+    def rodar(suite, n):
+        for nome, fn in suite:
+            if only and nome.split("/")[-1] not in only:
+                continue
+            try:
+                tempo, pico = measure(fn, repeat)
+                r = {"name": nome, "rows": n, "time_s": round(tempo, 4), "peak_mb": round(pico, 1), "error": None}
+            except Exception as e:
+                r = {"name": nome, "rows": n, "time_s": None, "peak_mb": None, "error": f"{type(e).__name__}: {e}"}
+            resultados.append(r)
+            print(f"  {nome:<34}{_fmt(r['time_s'], 3):>10}{_fmt(r['peak_mb'], 1):>10}", file=sys.stderr)
+
+    raw = synthetic.sales_raw(rows, seed)
+    rodar(sales_suite(raw, synthetic.sales_frame(rows, seed)), rows)
+    del raw
+    tb, _ = synthetic.crowley_table(crowley_rows, seed)
+    rodar(crowley_suite(tb), crowley_rows)
+    return resultados
+
+
+# ==================== COMPARAÇÃO ====================
+def _fmt(valor, casas):
+    return "-" if valor is None else f"{valor:.{casas}f}"
+
+def _variacao(base, atual):
+    return (atual - base) / base if base else 0.0
+
+def compare(baseline, resultados):
+    """Linhas da comparação: base, atual, variação, limite e status de cada benchmark."""
+    base_por_nome = {b["name"]: b for b in baseline.get("results", [])}
+    padrao = {**DEFAULT_TOLERANCE, **baseline.get("tolerance", {})}
+    linhas = []
+    for r in resultados:
+        base = base_por_nome.get(r["name"])
+        linha = {"name": r["name"], "current": r, "baseline": base, "problems": []}
+        linhas.append(linha)
+        if r["error"]:
+            linha["status"] = "erro"
+            linha["problems"].append(r["error"])
+            continue
+        if base is None:
+            linha["status"] = "novo"
+            continue
+        tol = {**padrao, **base.get("tolerance", {})}
+        linha["tolerance"] = tol
+        if base["rows"] != r["rows"]:
+            linha["problems"].append(f"linhas {base['rows']:,} no baseline, {r['rows']:,} agora")
+        elif (r["time_s"] - base["time_s"] > MIN_DELTA_S
+              and _variacao(base["time_s"], r["time_s"]) > tol["time"]):
+            linha["problems"].append(f"tempo {_variacao(base['time_s'], r['time_s']):+.0%} (limite {tol['time']:.0%})")
+        if (base["rows"] == r["rows"] and r["peak_mb"] - base["peak_mb"] > MIN_DELTA_MB
+                and _variacao(base["peak_mb"], r["peak_mb"]) > tol["memory"]):
+            linha["problems"].append(f"memória {_variacao(base['peak_mb'], r['peak_mb']):+.0%} (limite {tol['memory']:.0%})")
+        linha["status"] = "REGRESSÃO" if linha["problems"] else "ok"
+    return linhas
+
+def print_diff(linhas):
+    print(f"{'benchmark':<34}{'base (s)':>10}{'atual (s)':>11}{'Δ':>7}{'base MB':>10}{'atual MB':>10}{'Δ':>7}  status")
+    for l in linhas:
+        b, r = l["baseline"] or {}, l["current"]
+        dt = f"{_variacao(b['time_s'], r['time_s']):+.0%}" if b and r["time_s"] is not None else ""
+        dm = f"{_variacao(b['peak_mb'], r['peak_mb']):+.0%}" if b and r["peak_mb"] is not None else ""
+        print(
+            f"{l['name']:<34}{_fmt(b.get('time_s'), 3):>10}{_fmt(r['time_s'], 3):>11}{dt:>7}"
+            f"{_fmt(b.get('peak_mb'), 1):>10}{_fmt(r['peak_mb'], 1):>10}{dm:>7}  {l['status']}"
+        )
+        for p in l["problems"]:
+            print(f"    {p}")
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_baseline(path, anterior, resultados, args):
+    """Grava o baseline novo, mantendo tolerâncias por benchmark e entradas não medidas (--only)."""
+    anteriores = {b["name"]: b for b in (anterior or {}).get("results", [])}
+    novos = {}
+    for r in resultados:
+        if r["error"]:
+            continue
+        entrada = {"name": r["name"], "rows": r["rows"], "time_s": r["time_s"], "peak_mb": r["peak_mb"]}
+        if "tolerance" in anteriores.get(r["name"], {}):
+            entrada["tolerance"] = anteriores[r["name"]]["tolerance"]
+        novos[r["name"]] = entrada
+    baseline = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "rows": {"vendas": args.rows, "crowley": args.crowley_rows},
+        "tolerance": (anterior or {}).get("tolerance", DEFAULT_TOLERANCE),
+        "results": list({**anteriores, **novos}.values()),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE, help="Arquivo de baseline")
+    parser.add_argument("--rows", type=int, help=f"Linhas da base de vendas (padrão: a do baseline ou {DEFAULT_ROWS:,})")
+    parser.add_argument("--crowley-rows", type=int, help=f"Linhas da base Crowley (padrão: a do baseline ou {DEFAULT_CROWLEY_ROWS:,})")
+    parser.add_argument("--only", nargs="+", help="Só estes benchmarks (ex.: aplicar_filtros eca)")
+    parser.add_argument("--repeat", type=int, help="Execuções medidas por função (padrão: a do baseline ou 5)")
+    parser.add_argument("--seed", type=int, help="Semente das bases (padrão: a do baseline ou 0)")
+    parser.add_argument("--update", action="store_true", help="Grava os resultados como novo baseline")
+    parser.add_argument("--out", help="Relatório JSON da comparação")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None and not args.update:
+        parser.error(f"baseline {args.baseline} não encontrado (gere com --update)")
+    config = baseline or {}
+    args.rows = args.rows or config.get("rows", {}).get("vendas", DEFAULT_ROWS)
+    args.crowley_rows = args.crowley_rows or config.get("rows", {}).get("crowley", DEFAULT_CROWLEY_ROWS)
+    args.repeat = args.repeat or config.get("repeat", 5)
+    args.seed = config.get("seed", 0) if args.seed is None else args.seed
+    sys.path.insert(0, os.getcwd())
+
+    print(f"vendas: {args.rows:,} linhas • crowley: {args.crowley_rows:,} linhas • {args.repeat} repetições", file=sys.stderr)
+    resultados = run_suite(args.rows, args.crowley_rows, args.seed, args.repeat, args.only)
+
+    if args.update:
+        write_baseline(args.baseline, baseline, resultados, args)
+        erros = [r for r in resultados if r["error"]]
+        for r in erros:
+            print(f"{r['name']}: {r['error']}")
+        print(f"Baseline gravado: {args.baseline} ({len(resultados) - len(erros)} benchmarks)")
+        sys.exit(1 if erros else 0)
+
+    linhas = compare(baseline, resultados)
+    print()
+    print_diff(linhas)
+    falhas = [l for l in linhas if l["status"] in ("REGRESSÃO", "erro")]
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "environment": environment(), "baseline": args.baseline,
+                "results": [{**l["current"], "status": l["status"], "problems": l["problems"]} for l in linhas],
+            }, f, ensure_ascii=False, indent=2)
+    if falhas:
+        print(f"\n{len(falhas)} de {len(linhas)} benchmarks com regressão ou erro.")
+        sys.exit(1)
+    print(f"\nSem regressões ({len(linhas)} benchmarks).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmarks/synthetic.py
+"""
+Bases sintéticas reprodutíveis (mesma semente -> mesmos dados) para medir
+as páginas em tamanhos de 10 mil a 50 milhões de linhas.
+
+- Vendas: planilha com os cabeçalhos da origem (resolvidos por
+  COLUMN_ALIASES), e a versão já normalizada, equivalente à saída de
+  normalize_dataframe mas montada de forma vetorizada (as regras de texto
+  rodam só nos valores distintos).
+- Crowley: arquivo no layout do export (Praca, Emissora, Anunciante,
+  Anuncio, Tipo, DayPart, Duracao, Volume de Insercoes, Data em texto),
+  gravado em blocos, e a CrowleyTable carregada pelo mesmo caminho da
+  produção (crowley_store.read_source -> CrowleyTable.from_arrow).
+
+Os textos são gerados como códigos + dicionário, então a memória do gerador
+não depende de strings por linha. As cardinalidades crescem com o tamanho
+da base (mais clientes/anunciantes em bases maiores).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.synthetic vendas --rows 1000000 --out data/vendas_sintetica.parquet
+    python -m benchmarks.synthetic crowley --rows 50000000 --out data/crowley_sintetica.parquet
+"""
+import os
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.format import COLUMN_ALIASES, normalize_text, consolidate_executives
+from utils import crowley_store
+from utils.crowley_table import CrowleyTable
+
+# Cabeçalhos da planilha de vendas como chegam da origem
+SALES_HEADERS = {
+    "data_ref": "Ref.", "Cliente": "Cliente", "Emissora": "Emissora",
+    "Executivo": "Contato Coml.", "Faturamento": "Valor", "Insercoes": "Inserções",
+}
+assert all(COLUMN_ALIASES[h.lower()] == c for c, h in SALES_HEADERS.items())
+
+SALES_EMISSORAS = ["NOVABRASIL", "Difusora", "THATHI TV", "Th+ Prime", "cbn ribeirão", "Jovem Pan RP"]
+SALES_EXECUTIVOS = [
+    "EDUARDO NOTOMI", "eduardo n.", "JULIA BERGO", "Olga Luiza", "WALNER FRANCISCO",
+    "Venda Externa", "Marcos Lima", "Renata Souza", "",
+]
+CROWLEY_TIPOS = ["Comercial", "Testemunhal", "Patrocínio", "Vinheta"]
+CROWLEY_DAYPARTS = ["Madrugada", "Manhã", "Tarde", "Noite"]
+CROWLEY_START = "2024-01-01"
+
+
+def _cardinality(rows, per_row, minimum, maximum):
+    return int(np.clip(rows * per_row, minimum, maximum))
+
+def _zipf_codes(rng, n_values, rows, a=1.2):
+    """Códigos 0..n-1 com distribuição concentrada (poucos valores grandes, cauda longa)."""
+    pesos = 1.0 / np.arange(1, n_values + 1) ** a
+    return rng.choice(n_values, rows, p=pesos / pesos.sum()).astype(np.int32)
+
+def _categorical(codes, values):
+    return pd.Categorical.from_codes(codes, categories=pd.Index(values, dtype=object))
+
+
+# ==================== VENDAS ====================
+def sales_raw(rows, seed=0, start="2023-01-01", months=36):
+    """Planilha de vendas com cabeçalhos da origem (textos como category)."""
+    rng = np.random.default_rng(seed)
+    n_clientes = _cardinality(rows, 0.05, 200, 200_000)
+    meses = pd.date_range(start, periods=months, freq="MS").strftime("%Y-%m-%d")
+    # Nomes de cliente em caixas variadas, como na planilha
+    clientes = [f"CLIENTE {i:06d} LTDA" if i % 3 else f"cliente {i:06d}" for i in range(n_clientes)]
+    return pd.DataFrame({
+        SALES_HEADERS["data_ref"]: _categorical(rng.integers(0, months, rows), list(meses)),
+        SALES_HEADERS["Cliente"]: _categorical(_zipf_codes(rng, n_clientes, rows, a=0.9), clientes),
+        SALES_HEADERS["Emissora"]: _categorical(_zipf_codes(rng, len(SALES_EMISSORAS), rows, a=0.6), SALES_EMISSORAS),
+        SALES_HEADERS["Executivo"]: _categorical(rng.integers(0, len(SALES_EXECUTIVOS), rows), SALES_EXECUTIVOS),
+        SALES_HEADERS["Faturamento"]: np.round(rng.lognormal(7.5, 1.1, rows), 2),
+        SALES_HEADERS["Insercoes"]: rng.integers(0, 60, rows),
+    })
+
+def _map_categories(values, fn):
+    """Aplica fn só nos valores distintos e devolve a coluna em object (como o .apply)."""
+    cat = pd.Categorical(values)
+    mapeado = pd.Series(cat.categories, dtype=object).map(fn).to_numpy(dtype=object)
+    return pd.Series(mapeado[cat.codes], dtype=object)
+
+def sales_frame(rows, seed=0, **kwargs):
+    """Base de vendas normalizada (mesmo resultado de normalize_dataframe(sales_raw(...)))."""
+    raw = sales_raw(rows, seed, **kwargs)
+    df = raw.rename(columns={h: COLUMN_ALIASES[h.lower()] for h in raw.columns})
+
+    for col in ["Emissora", "Cliente", "Executivo"]:
+        df[col] = _map_categories(df[col], normalize_text)
+    df["Executivo"] = _map_categories(df["Executivo"], consolidate_executives)
+    df["Executivo"] = df["Executivo"].replace(["", "nan", "None"], np.nan).fillna("N/A")
+
+    # Colunas de data calculadas por mês distinto e expandidas pelos códigos
+    ref = raw[SALES_HEADERS["data_ref"]].cat
+    meses = pd.Series(pd.to_datetime(ref.categories, format="%Y-%m-%d"))
+    codes = ref.codes.to_numpy()
+    df["data_ref"] = meses.take(codes).reset_index(drop=True)
+    df["Ano"] = meses.dt.year.to_numpy()[codes]
+    df["Mes"] = meses.dt.month.to_numpy()[codes]
+    df["MesLabel"] = meses.dt.strftime("%b/%y").to_numpy(dtype=object)[codes]
+    df["Faturamento"] = df["Faturamento"].astype(float)
+    df["Insercoes"] = pd.to_numeric(df["Insercoes"])
+    df["Custo_Unitario"] = df["Faturamento"] / df["Insercoes"].fillna(1).replace(0, 1)
+    df.columns = df.columns.map(str)
+    return df
+
+
+# ==================== CROWLEY ====================
+def crowley_batch(rows, rng, days, total_rows=None):
+    """
+    Um bloco do export Crowley (Arrow, textos como dictionary e Data em
+    dd/mm/aaaa). As cardinalidades vêm de total_rows, então todos os blocos
+    de uma base usam os mesmos dicionários.
+    """
+    total_rows = total_rows or rows
+    n_pracas = 12
+    n_emissoras = _cardinality(total_rows, 0.0005, 40, 150)
+    n_anunciantes = _cardinality(total_rows, 0.01, 500, 60_000)
+    n_anuncios = 3 * n_anunciantes
+
+    datas = pd.date_range(CROWLEY_START, periods=days).strftime("%d/%m/%Y").to_numpy(dtype=object)
+    emissoras = ["Novabrasil"] + [f"Rádio {i:03d} FM" for i in range(1, n_emissoras)]
+    colunas = {
+        "Praca": (rng.integers(0, n_pracas, rows), [f"Praça {i:02d}" for i in range(n_pracas)]),
+        "Emissora": (_zipf_codes(rng, n_emissoras, rows, a=0.8), emissoras),
+        "Anunciante": (_zipf_codes(rng, n_anunciantes, rows, a=1.05), [f"Anunciante {i:05d}" for i in range(n_anunciantes)]),
+        "Anuncio": (_zipf_codes(rng, n_anuncios, rows, a=1.05), [f"Anúncio {i:06d}" for i in range(n_anuncios)]),
+        "Tipo": (rng.integers(0, len(CROWLEY_TIPOS), rows), CROWLEY_TIPOS),
+        "DayPart": (rng.integers(0, len(CROWLEY_DAYPARTS), rows), CROWLEY_DAYPARTS),
+    }
+    arrays = {
+        nome: pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(valores, pa.string()))
+        for nome, (codes, valores) in colunas.items()
+    }
+    arrays["Duracao"] = pa.array(rng.choice([5, 10, 15, 30, 45, 60], rows).astype(np.int32))
+    arrays["Volume de Insercoes"] = pa.array(rng.integers(1, 6, rows, dtype=np.int32))
+    arrays["Data"] = pa.DictionaryArray.from_arrays(
+        pa.array(rng.integers(0, days, rows), pa.int32()), pa.array(datas, pa.string())
+    )
+    return pa.table(arrays)
+
+def write_crowley_source(path, rows, seed=0, days=700, chunk_rows=2_000_000):
+    """Grava o export sintético em blocos (memória constante mesmo com 50M linhas)."""
+    rng = np.random.default_rng(seed)
+    writer = None
+    try:
+        for ini in range(0, rows, chunk_rows):
+            bloco = crowley_batch(min(chunk_rows, rows - ini), rng, days, total_rows=rows)
+            if writer is None:
+                writer = pq.ParquetWriter(path, bloco.schema, compression="zstd")
+            writer.write_table(bloco)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def crowley_table(rows, seed=0, days=700, tmp_dir=None):
+    """CrowleyTable sintética carregada como na produção; devolve (tabela, data de atualização)."""
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        path = os.path.join(tmp, "crowley.parquet")
+        write_crowley_source(path, rows, seed, days)
+        tb = CrowleyTable.from_arrow(crowley_store.read_source(path))
+    return tb, tb.last_date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("schema", choices=["vendas", "crowley"])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Parquet de saída")
+    args = parser.parse_args()
+
+    if args.schema == "vendas":
+        sales_raw(args.rows, args.seed).to_parquet(args.out, index=False)
+    else:
+        write_crowley_source(args.out, args.rows, args.seed)
+    print(f"{args.rows:,} linhas -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,69 @@
 import streamlit as st
 import pandas as pd
 import json
-import io
+from itertools import chain
 from datetime import datetime, timedelta, date
-
-def render(df_crowley, cookies, data_atualizacao):
-    # --- CONFIGURAÇÃO DE PERFORMANCE E VISUAL (Igual ao ECA) ---
-    pd.set_option("styler.render.max_elements", 5_000_000)
-
+from utils.tables import show_table, split_total
+from utils.detail_view import render_detail, iter_detail_frames, iter_detail_batches, DETAIL_HEADER
+from utils.export import excel_download, StreamingExcel
+from utils import perf, result_cache
+
+CONSOLIDADO = "Consolidado (Todas as emissoras)"
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+def pivot_novos(tb_crowley, rows):
+    """Inserções por anunciante x emissora, com TOTAL por linha e a linha TOTAL GERAL."""
+    pivot_table = pd.pivot_table(
+        tb_crowley.group_sum(["Anunciante", "Emissora"], rows),
+        index="Anunciante",
+        columns="Emissora",
+        values="Volume de Insercoes",
+        aggfunc="sum",
+        fill_value=0
+    )
+    pivot_table["TOTAL"] = pivot_table.sum(axis=1)
+    pivot_table = pivot_table.sort_values(by="TOTAL", ascending=False)
+    
+    # --- ADICIONA TOTALIZADOR (ROW) ---
+    total_row = pivot_table.sum(numeric_only=True)
+    pivot_table.loc["TOTAL GERAL"] = total_row
+    return pivot_table
+
+@result_cache.cached
+def compute_busca_novos(tb_crowley, dt_ini, dt_fim, ref_ini, ref_fim, praca, veiculo=CONSOLIDADO, anunciantes=None):
+    """
+    Anunciantes presentes no período atual e ausentes no de referência, sem
+    Streamlit: {"novos" (quantidade), "rows_resultado" (linhas dos novos no
+    período atual), "pivot" (None quando não há novos)}.
+    """
+    # Filtros direto nos códigos da tabela compacta (sem copiar linhas)
+    filtros_base = {}
+    if anunciantes:
+        filtros_base["Anunciante"] = anunciantes
+
+    if veiculo != CONSOLIDADO:
+        filtros_base["Emissora"] = veiculo
+
+    rows_base = tb_crowley.select(Praca=praca, **filtros_base)
+
+    rows_atual = tb_crowley.select(rows_base, date_from=dt_ini, date_to=dt_fim)
+    rows_ref = tb_crowley.select(rows_base, date_from=ref_ini, date_to=ref_fim)
+
+    anunciantes_atual = set(tb_crowley.values("Anunciante", rows_atual))
+    anunciantes_ref = set(tb_crowley.values("Anunciante", rows_ref))
+    novos_anunciantes = anunciantes_atual - anunciantes_ref
+
+    if not novos_anunciantes:
+        return {"novos": 0, "rows_resultado": rows_atual[:0], "pivot": None}
+
+    rows_resultado = tb_crowley.select(rows_atual, Anunciante=list(novos_anunciantes))
+    return {
+        "novos": len(novos_anunciantes),
+        "rows_resultado": rows_resultado,
+        "pivot": pivot_novos(tb_crowley, rows_resultado),
+    }
+
+def render(tb_crowley, cookies, data_atualizacao):
     # CSS para centralização
     st.markdown("""
         <style>
@@ -38,17 +94,10 @@ def render(df_crowley, cookies, data_atualizacao):
 
     st.markdown('<div class="page-title-centered">Busca de Novos Anunciantes</div>', unsafe_allow_html=True)
     
-    if df_crowley is None or df_crowley.empty:
+    if tb_crowley is None or len(tb_crowley) == 0:
         st.error("Base de dados não carregada.")
         st.stop()
 
-    if "Data_Dt" not in df_crowley.columns:
-        if "Data" in df_crowley.columns:
-            df_crowley["Data_Dt"] = pd.to_datetime(df_crowley["Data"], dayfirst=True, errors="coerce")
-        else:
-            st.error("Coluna de Data não encontrada na base.")
-            st.stop()
-
     # --- CONFIGURAÇÃO DE DATAS LIMITES ---
     min_date_allowed = date(2024, 1, 1)
     
@@ -118,7 +167,8 @@ def render(df_crowley, cookies, data_atualizacao):
         # 2. Filtros em Cascata
         c3, c4, c5 = st.columns([1, 1, 2])
         
-        lista_pracas = sorted(df_crowley["Praca"].dropna().unique())
+        catalogo = tb_crowley.catalog()
+        lista_pracas = catalogo.pracas()
         
         def on_praca_change():
             st.session_state["crowley_veiculo_key"] = "Consolidado (Todas as emissoras)"
@@ -137,12 +187,10 @@ def render(df_crowley, cookies, data_atualizacao):
                 on_change=on_praca_change
             )
 
-        df_praca_filtered = df_crowley[df_crowley["Praca"] == sel_praca]
-        
-        lista_anunciantes_local = sorted(df_praca_filtered["Anunciante"].dropna().unique())
-        raw_veiculos_local = sorted(df_praca_filtered["Emissora"].dropna().unique())
+        lista_anunciantes_local = catalogo.advertisers(sel_praca)
+        raw_veiculos_local = catalogo.vehicles(sel_praca)
         
-        opcao_consolidado = "Consolidado (Todas as emissoras)"
+        opcao_consolidado = CONSOLIDADO
         lista_veiculos_local = [opcao_consolidado] + raw_veiculos_local
         
         if "crowley_veiculo_key" not in st.session_state:
@@ -188,78 +236,31 @@ def render(df_crowley, cookies, data_atualizacao):
 
     if st.session_state.get("novos_search_trigger"):
         
-        mask_base = (df_crowley["Praca"] == sel_praca)
-        if sel_anunciante:
-            mask_base = mask_base & (df_crowley["Anunciante"].isin(sel_anunciante))
-
-        if sel_veiculo != opcao_consolidado:
-            mask_base = mask_base & (df_crowley["Emissora"] == sel_veiculo)
+        with perf.span("aggregate", rows=len(tb_crowley)):
+            res = compute_busca_novos(tb_crowley, dt_ini, dt_fim, ref_ini, ref_fim, sel_praca, sel_veiculo, sel_anunciante)
 
-        df_base = df_crowley[mask_base]
-
-        ts_ini = pd.Timestamp(dt_ini)
-        ts_fim = pd.Timestamp(dt_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        ts_ref_ini = pd.Timestamp(ref_ini)
-        ts_ref_fim = pd.Timestamp(ref_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-
-        df_atual = df_base[(df_base["Data_Dt"] >= ts_ini) & (df_base["Data_Dt"] <= ts_fim)]
-        df_ref = df_base[(df_base["Data_Dt"] >= ts_ref_ini) & (df_base["Data_Dt"] <= ts_ref_fim)]
-
-        anunciantes_atual = set(df_atual["Anunciante"].unique())
-        anunciantes_ref = set(df_ref["Anunciante"].unique())
-        novos_anunciantes = anunciantes_atual - anunciantes_ref
-
-        if not novos_anunciantes:
+        if not res["novos"]:
             st.warning(f"Nenhum anunciante novo encontrado na **{sel_praca}** neste período comparativo.")
         else:
-            st.success(f"Encontrados **{len(novos_anunciantes)}** novos anunciantes em relação ao período anterior!")
-            
-            df_resultado = df_atual[df_atual["Anunciante"].isin(novos_anunciantes)].copy()
+            st.success(f"Encontrados **{res['novos']}** novos anunciantes em relação ao período anterior!")
             
-            # --- TABELA RESUMO (PIVOT) ---
-            val_col = "Volume de Insercoes" if "Volume de Insercoes" in df_resultado.columns else "Contagem"
-            if val_col == "Contagem": df_resultado["Contagem"] = 1
-            agg_func = "sum" if val_col == "Volume de Insercoes" else "count"
+            rows_resultado = res["rows_resultado"]
+            pivot_table = res["pivot"]
 
-            pivot_table = pd.DataFrame()
+            # --- TABELA RESUMO (PIVOT) ---
             try:
-                pivot_table = pd.pivot_table(
-                    df_resultado,
-                    index="Anunciante",
-                    columns="Emissora",
-                    values=val_col,
-                    aggfunc=agg_func,
-                    fill_value=0,
-                    observed=True 
-                )
-                pivot_table["TOTAL"] = pivot_table.sum(axis=1)
-                pivot_table = pivot_table.sort_values(by="TOTAL", ascending=False)
-                
-                # --- ADICIONA TOTALIZADOR (ROW) ---
-                total_row = pivot_table.sum(numeric_only=True)
-                pivot_table.loc["TOTAL GERAL"] = total_row
-                
                 st.markdown("### Visão Geral por Emissora")
                 
-                # Estilização
-                def style_pivot(df):
-                    s = df.style.background_gradient(cmap="Blues", subset=["TOTAL"])
-                    s = s.format("{:.0f}")
-                    # Destaca a linha de total
-                    s = s.apply(lambda x: ["background-color: #f0f2f6; font-weight: bold" if x.name == "TOTAL GERAL" else "" for i in x], axis=1)
-                    # Centralização e Alinhamento
-                    s = s.set_properties(**{'text-align': 'center'})
-                    s = s.set_table_styles([
-                        {'selector': 'th', 'props': [('text-align', 'center'), ('vertical-align', 'middle')]},
-                        {'selector': 'th.row_heading', 'props': [('text-align', 'left')]},
-                        {'selector': 'td', 'props': [('text-align', 'center')]}
-                    ])
-                    return s
-
-                st.dataframe(
-                    style_pivot(pivot_table),
-                    width="stretch", 
-                    height=min(450, len(pivot_table) * 35 + 40)
+                # Inserções como números (milhar localizado); TOTAL em barra no lugar do gradiente
+                main, total = split_total(pivot_table, label="TOTAL GERAL")
+                pivot_config = {
+                    "TOTAL": st.column_config.ProgressColumn(
+                        "TOTAL", format="%d", min_value=0, max_value=float(main["TOTAL"].max() or 1)
+                    ),
+                }
+                show_table(
+                    main, total, column_config=pivot_config,
+                    hide_index=False, height=min(450, len(main) * 35 + 40)
                 )
 
             except Exception as e:
@@ -268,33 +269,13 @@ def render(df_crowley, cookies, data_atualizacao):
             st.markdown("<br>", unsafe_allow_html=True)
             
             # --- TABELA DETALHADA ---
-            rename_map = {
-                "Praca": "Praça", "Anuncio": "Anúncio", "Duracao": "Duração",
-                "Emissora": "Veículo", "Volume de Insercoes": "Inserções", 
-                "Tipo": "Tipo", "DayPart": "DayPart"
-            }
-            
-            df_detalhe = df_resultado.copy()
-            if "Data_Dt" in df_detalhe.columns:
-                df_detalhe["Data"] = df_detalhe["Data_Dt"].dt.strftime("%d/%m/%Y")
-            
-            # ADICIONADO DAYPART AQUI
-            cols_originais = ["Data", "Anunciante", "Anuncio", "Duracao", "Praca", "Emissora", "Tipo", "DayPart", "Volume de Insercoes"]
-            cols_existentes = [c for c in cols_originais if c in df_detalhe.columns]
-            
-            df_exibicao = df_detalhe[cols_existentes].rename(columns=rename_map)
-            df_exibicao.sort_values(by=["Anunciante", "Data"], inplace=True)
-
-            with st.expander("Fonte de Dados (Detalhamento)", expanded=False):
-                # Renderiza dataframe puro para evitar gargalo do Styler em grandes volumes
-                st.dataframe(df_exibicao, width="stretch", hide_index=True)
+            render_detail(tb_crowley, rows_resultado, key="novos", title="Fonte de Dados (Detalhamento)")
 
             # --- EXPORTAÇÃO EXCEL ---
             st.markdown("---")
-            with st.spinner("Gerando Excel..."):
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    workbook = writer.book
+            def gerar_excel():
+                with StreamingExcel() as xl:
+                    workbook = xl.book
                     
                     # Formatos
                     fmt_center = workbook.add_format({'align': 'center', 'valign': 'vcenter'})
@@ -314,51 +295,45 @@ def render(df_crowley, cookies, data_atualizacao):
                             ", ".join(sel_anunciante) if sel_anunciante else "Todos"
                         ]
                     }
-                    pd.DataFrame(filtros_dict).to_excel(writer, sheet_name='Filtros', index=False)
-                    writer.sheets['Filtros'].set_column('A:A', 30); writer.sheets['Filtros'].set_column('B:B', 50)
+                    for ws in xl.write_frame(pd.DataFrame(filtros_dict), 'Filtros'):
+                        ws.set_column('A:A', 30); ws.set_column('B:B', 50)
                     
                     # 2. Visão Geral (Pivot)
                     if not pivot_table.empty:
                         # A linha TOTAL GERAL já está no pivot_table exibido, então exportamos direto
-                        pivot_table.to_excel(writer, sheet_name='Visão Geral')
-                        worksheet_pivot = writer.sheets['Visão Geral']
-                        worksheet_pivot.set_column('A:A', 40, fmt_left) 
-                        worksheet_pivot.set_column('B:Z', 15, fmt_center)
-
-                    # 3. Detalhamento
-                    if not df_exibicao.empty:
-                        # Opcional: Adicionar Total Geral no Excel se desejar (igual ao ECA)
-                        col_insercoes = "Inserções" if "Inserções" in df_exibicao.columns else None
-                        df_export_det = df_exibicao.copy()
-                        
-                        if col_insercoes:
-                            total_ins = df_export_det[col_insercoes].sum()
-                            new_row_exp = {c: "" for c in df_export_det.columns}
-                            new_row_exp["Anunciante"] = "TOTAL GERAL"
-                            new_row_exp[col_insercoes] = total_ins
-                            if "Duração" in df_export_det.columns: new_row_exp["Duração"] = 0
-                            
-                            df_export_det = pd.concat([df_export_det, pd.DataFrame([new_row_exp])], ignore_index=True)
-
-                        df_export_det.to_excel(writer, sheet_name='Detalhamento', index=False)
-                        worksheet_detalhe = writer.sheets['Detalhamento']
-                        
-                        for idx, col_name in enumerate(df_export_det.columns):
-                            if col_name in ["Anunciante", "Anúncio"]:
-                                worksheet_detalhe.set_column(idx, idx, 35, fmt_left)
-                            else:
-                                worksheet_detalhe.set_column(idx, idx, 15, fmt_center)
-
+                        for worksheet_pivot in xl.write_frame(pivot_table, 'Visão Geral', index=True):
+                            worksheet_pivot.set_column('A:A', 40, fmt_left) 
+                            worksheet_pivot.set_column('B:Z', 15, fmt_center)
+
+                    # 3. Detalhamento (em blocos) + linha TOTAL GERAL no fim
+                    if len(rows_resultado):
+                        new_row_exp = {c: "" for c in DETAIL_HEADER}
+                        new_row_exp["Anunciante"] = "TOTAL GERAL"
+                        new_row_exp["Inserções"] = int(tb_crowley.ins[rows_resultado].sum())
+                        new_row_exp["Duração"] = 0
+                        blocos = chain(iter_detail_frames(tb_crowley, rows_resultado), [pd.DataFrame([new_row_exp])])
+
+                        for worksheet_detalhe in xl.write_frame(blocos, 'Detalhamento'):
+                            for idx, col_name in enumerate(DETAIL_HEADER):
+                                if col_name in ["Anunciante", "Anúncio"]:
+                                    worksheet_detalhe.set_column(idx, idx, 35, fmt_left)
+                                else:
+                                    worksheet_detalhe.set_column(idx, idx, 15, fmt_center)
+                return xl.getvalue()
+
+            def tabelas_export():
+                tabelas = {"Visão Geral": pivot_table.reset_index()} if not pivot_table.empty else {}
+                tabelas["Detalhamento"] = iter_detail_batches(tb_crowley, rows_resultado)
+                return tabelas
+
+            # Só gera quando pedido; repetições com os mesmos filtros vêm do cache
+            export_params = {
+                "dt_ini": dt_ini, "dt_fim": dt_fim, "ref_ini": ref_ini, "ref_fim": ref_fim,
+                "praca": sel_praca, "veiculo": sel_veiculo, "anunciantes": sel_anunciante
+            }
             c_vazio1, c_vazio2, c_btn, c_vazio3, c_vazio4 = st.columns([1, 1, 1, 1, 1])
             with c_btn:
-                st.download_button(
-                    label="Exportar Excel", # Texto igual ao ECA
-                    data=buffer,
-                    file_name=f"Novos_Anunciantes_{sel_praca}_{datetime.now().strftime('%d%m')}.xlsx",
-                    mime="application/vnd.ms-excel",
-                    type="secondary", 
-                    use_container_width=True
-                )
+                excel_download(gerar_excel, "novos", export_params, tb_crowley.version, f"Novos_Anunciantes_{sel_praca}_{datetime.now().strftime('%d%m')}.xlsx", tables=tabelas_export)
             
             st.markdown(f"""
                 <div style="text-align: center; color: #666; font-size: 0.8rem; margin-top: 5px;">
@@ -2,14 +2,100 @@
 import streamlit as st
 import pandas as pd
 import json
-import io
 import numpy as np  # Importante para usar np.nan
 from datetime import datetime, timedelta, date
-
-def render(df_crowley, cookies, data_atualizacao):
-    # Aumenta limite de renderização
-    pd.set_option("styler.render.max_elements", 5_000_000)
-
+from utils.tables import show_table, split_total, int_column
+from utils.detail_view import render_detail, iter_detail_frames, iter_detail_batches, DETAIL_HEADER
+from utils.export import excel_download, StreamingExcel
+from utils import perf, result_cache
+
+# --- HELPER DE TABELA (CORRIGIDO COM NP.NAN) ---
+def criar_tabela_resumo(tb_crowley, rows_src, lista_anunciantes, is_exclusive=False):
+    """Inserções por anunciante x emissora (com Share % quando não é a aba de exclusivos)."""
+    if not lista_anunciantes: return pd.DataFrame()
+
+    rows = tb_crowley.select(rows_src, Anunciante=list(lista_anunciantes))
+    df_agg = tb_crowley.group_sum(["Anunciante", "Emissora"], rows)
+
+    pivot_qty = pd.pivot_table(
+        df_agg, index="Anunciante", columns="Emissora", values="Volume de Insercoes", 
+        aggfunc="sum", fill_value=0
+    )
+
+    total_por_anunciante = pivot_qty.sum(axis=1)
+    pivot_qty = pivot_qty.loc[total_por_anunciante.sort_values(ascending=False).index]
+
+    if is_exclusive:
+        total_row = pivot_qty.sum(numeric_only=True)
+        pivot_qty.loc["TOTAL GERAL"] = total_row
+        return pivot_qty
+
+    total_por_emissora = pivot_qty.sum(axis=0)
+    pivot_share = pivot_qty.div(total_por_emissora.replace(0, 1), axis=1) * 100
+
+    cols = []
+    for col in pivot_qty.columns:
+        cols.append((col, "Share %"))
+        cols.append((col, "Inserções"))
+    cols.append(("TOTAL", "Inserções"))
+
+    df_multi = pd.DataFrame(index=pivot_qty.index, columns=pd.MultiIndex.from_tuples(cols))
+
+    for col in pivot_qty.columns:
+        df_multi[(col, "Inserções")] = pivot_qty[col]
+        df_multi[(col, "Share %")] = pivot_share[col]
+
+    df_multi[("TOTAL", "Inserções")] = total_por_anunciante
+
+    totals_qty = pivot_qty.sum(numeric_only=True)
+    total_geral_row = []
+
+    for col_tuple in df_multi.columns:
+        emissora, tipo = col_tuple
+        if tipo == "Inserções":
+            if emissora == "TOTAL": val = total_por_anunciante.sum()
+            else: val = totals_qty[emissora]
+            total_geral_row.append(val)
+        else:
+            # --- A MÁGICA: Usar np.nan ---
+            # Isso mantém a coluna como float e o PyArrow não reclama.
+            total_geral_row.append(np.nan)
+
+    df_multi.loc["TOTAL GERAL"] = total_geral_row
+    return df_multi
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+@result_cache.cached
+def compute_eca(tb_crowley, dt_ini, dt_fim, praca, veiculo, concorrentes=None):
+    """
+    Exclusivos, compartilhados e ausentes do veículo na praça sem Streamlit:
+    {"exclusivos", "compartilhados", "ausentes"} (DataFrames, vazios quando
+    não há anunciantes), "contagens" e "rows_detalhe" (linhas da tabela para
+    o detalhamento/exportação). Sem concorrentes, compara com todos da praça.
+    """
+    # Filtros direto nos códigos da tabela compacta (sem copiar linhas)
+    rows_base = tb_crowley.select(Praca=praca, date_from=dt_ini, date_to=dt_fim)
+    rows_target = tb_crowley.select(rows_base, Emissora=veiculo)
+    
+    if concorrentes: rows_comp = tb_crowley.select(rows_base, Emissora=concorrentes)
+    else: rows_comp = np.setdiff1d(rows_base, rows_target, assume_unique=True)
+
+    anunc_target = set(tb_crowley.values("Anunciante", rows_target))
+    anunc_comp = set(tb_crowley.values("Anunciante", rows_comp))
+    exclusivos = anunc_target - anunc_comp
+    compartilhados = anunc_target & anunc_comp
+    ausentes = anunc_comp - anunc_target
+
+    rows_detalhe = np.concatenate([rows_target, rows_comp])
+    return {
+        "exclusivos": criar_tabela_resumo(tb_crowley, rows_target, exclusivos, is_exclusive=True),
+        "compartilhados": criar_tabela_resumo(tb_crowley, rows_detalhe, compartilhados, is_exclusive=False),
+        "ausentes": criar_tabela_resumo(tb_crowley, rows_comp, ausentes, is_exclusive=False),
+        "contagens": (len(exclusivos), len(compartilhados), len(ausentes)),
+        "rows_detalhe": rows_detalhe,
+    }
+
+def render(tb_crowley, cookies, data_atualizacao):
     # --- CSS GLOBAL ---
     st.markdown("""
         <style>
@@ -37,17 +123,10 @@ def render(df_crowley, cookies, data_atualizacao):
     st.markdown('<div class="page-title-centered">Relatório ECA</div>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; color: #666;">Exclusivos • Compartilhados • Ausentes</p>', unsafe_allow_html=True)
     
-    if df_crowley is None or df_crowley.empty:
+    if tb_crowley is None or len(tb_crowley) == 0:
         st.error("Base de dados não carregada.")
         st.stop()
 
-    if "Data_Dt" not in df_crowley.columns:
-        if "Data" in df_crowley.columns:
-            df_crowley["Data_Dt"] = pd.to_datetime(df_crowley["Data"], dayfirst=True, errors="coerce")
-        else:
-            st.error("Coluna de Data não encontrada na base.")
-            st.stop()
-
     # --- CONFIGURAÇÃO ---
     min_date_allowed = date(2024, 1, 1)
     try: max_date_allowed = datetime.strptime(data_atualizacao, "%d/%m/%Y").date()
@@ -91,7 +170,8 @@ def render(df_crowley, cookies, data_atualizacao):
         with c1: dt_ini = st.date_input("Início", value=val_dt_ini, min_value=min_date_allowed, max_value=max_date_allowed, format="DD/MM/YYYY", help=tooltip_dates)
         with c2: dt_fim = st.date_input("Fim", value=val_dt_fim, min_value=min_date_allowed, max_value=max_date_allowed, format="DD/MM/YYYY")
         
-        lista_pracas = sorted(df_crowley["Praca"].dropna().unique())
+        catalogo = tb_crowley.catalog()
+        lista_pracas = catalogo.pracas()
         
         def on_praca_change():
             st.session_state["eca_veiculo_key"] = None
@@ -106,8 +186,7 @@ def render(df_crowley, cookies, data_atualizacao):
 
         st.divider()
 
-        df_praca = df_crowley[df_crowley["Praca"] == sel_praca]
-        lista_veiculos_local = sorted(df_praca["Emissora"].dropna().unique())
+        lista_veiculos_local = catalogo.vehicles(sel_praca)
         
         c4, c5 = st.columns([1, 2])
         if "eca_veiculo_key" not in st.session_state:
@@ -133,196 +212,90 @@ def render(df_crowley, cookies, data_atualizacao):
         cookies.save()
 
     if st.session_state.get("eca_search_trigger"):
-        ts_ini = pd.Timestamp(dt_ini)
-        ts_fim = pd.Timestamp(dt_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        
-        df_base = df_praca[(df_praca["Data_Dt"] >= ts_ini) & (df_praca["Data_Dt"] <= ts_fim)].copy()
-        df_target = df_base[df_base["Emissora"] == sel_veiculo]
-        
-        if sel_concorrentes: df_comp = df_base[df_base["Emissora"].isin(sel_concorrentes)]
-        else: df_comp = df_base[df_base["Emissora"] != sel_veiculo]
-
-        exclusivos = set(df_target["Anunciante"].unique()) - set(df_comp["Anunciante"].unique())
-        compartilhados = set(df_target["Anunciante"].unique()) & set(df_comp["Anunciante"].unique())
-        ausentes = set(df_comp["Anunciante"].unique()) - set(df_target["Anunciante"].unique())
-
-        # --- HELPER DE TABELA (CORRIGIDO COM NP.NAN) ---
-        def criar_tabela_resumo(df_src, lista_anunciantes, is_exclusive=False):
-            if not lista_anunciantes: return pd.DataFrame()
-            
-            df_final = df_src[df_src["Anunciante"].isin(lista_anunciantes)].copy()
-            col_val = "Volume de Insercoes" if "Volume de Insercoes" in df_final.columns else "Contagem"
-            if col_val == "Contagem": df_final["Contagem"] = 1
-            
-            pivot_qty = pd.pivot_table(
-                df_final, index="Anunciante", columns="Emissora", values=col_val, 
-                aggfunc="sum", fill_value=0, observed=True
-            )
-            
-            total_por_anunciante = pivot_qty.sum(axis=1)
-            pivot_qty = pivot_qty.loc[total_por_anunciante.sort_values(ascending=False).index]
-            
-            if is_exclusive:
-                total_row = pivot_qty.sum(numeric_only=True)
-                pivot_qty.loc["TOTAL GERAL"] = total_row
-                return pivot_qty
-            
-            total_por_emissora = pivot_qty.sum(axis=0)
-            pivot_share = pivot_qty.div(total_por_emissora.replace(0, 1), axis=1) * 100
-            
-            cols = []
-            for col in pivot_qty.columns:
-                cols.append((col, "Share %"))
-                cols.append((col, "Inserções"))
-            cols.append(("TOTAL", "Inserções"))
-            
-            df_multi = pd.DataFrame(index=pivot_qty.index, columns=pd.MultiIndex.from_tuples(cols))
-            
-            for col in pivot_qty.columns:
-                df_multi[(col, "Inserções")] = pivot_qty[col]
-                df_multi[(col, "Share %")] = pivot_share[col]
-            
-            df_multi[("TOTAL", "Inserções")] = total_por_anunciante
-            
-            totals_qty = pivot_qty.sum(numeric_only=True)
-            total_geral_row = []
-            
-            for col_tuple in df_multi.columns:
-                emissora, tipo = col_tuple
-                if tipo == "Inserções":
-                    if emissora == "TOTAL": val = total_por_anunciante.sum()
-                    else: val = totals_qty[emissora]
-                    total_geral_row.append(val)
-                else:
-                    # --- A MÁGICA: Usar np.nan ---
-                    # Isso mantém a coluna como float e o PyArrow não reclama.
-                    total_geral_row.append(np.nan)
-            
-            df_multi.loc["TOTAL GERAL"] = total_geral_row
-            return df_multi
-
-        # --- HELPERS DE ESTILO ---
-        def safe_fmt_int(x):
-            try:
-                if pd.isnull(x) or x == "": return ""
-                return f"{int(x)}"
-            except: return str(x)
-
-        def safe_fmt_pct(x):
-            try:
-                if pd.isnull(x) or x == "": return "" # NaN vira string vazia AQUI
-                return f"{float(x):.1f}%"
-            except: return str(x)
-
-        def style_df(df, is_exclusive=False):
-            if df.empty: return df
-            
-            header_styles = [
-                {'selector': 'th', 'props': [('text-align', 'center'), ('vertical-align', 'middle')]},
-                {'selector': 'th.row_heading', 'props': [('text-align', 'left')]},
-                {'selector': 'td', 'props': [('text-align', 'center')]}
-            ]
-            
-            if is_exclusive:
-                s = df.style.format(safe_fmt_int)
-            else:
-                format_dict = {}
-                for col in df.columns:
-                    if col[1] == "Share %": format_dict[col] = safe_fmt_pct
-                    else: format_dict[col] = safe_fmt_int
-                
-                # na_rep="" faz o NaN aparecer vazio no visual do Streamlit
-                s = df.style.format(format_dict, na_rep="")
+        with perf.span("aggregate", rows=len(tb_crowley)):
+            res = compute_eca(tb_crowley, dt_ini, dt_fim, sel_praca, sel_veiculo, sel_concorrentes)
+        df1, df2, df3 = res["exclusivos"], res["compartilhados"], res["ausentes"]
+        n_excl, n_comp, n_aus = res["contagens"]
+        rows_detalhe = res["rows_detalhe"]
+
+        # --- EXIBIÇÃO ---
+        # Números seguem numéricos (formato via column_config) e o TOTAL GERAL vai numa linha à parte.
+        # Nas tabelas com Share % as colunas têm dois níveis (Emissora / métrica): o
+        # column_config pelo nome do último nível vale para todas as emissoras.
+        eca_config = {
+            "Share %": st.column_config.NumberColumn("Share %", format="%.1f%%"),
+            "Inserções": int_column("Inserções"),
+        }
 
-            s = s.set_properties(**{'text-align': 'center'})
-            s = s.set_table_styles(header_styles)
-            s = s.apply(lambda x: ["background-color: #f0f2f6; font-weight: bold" if (hasattr(x, 'name') and x.name == "TOTAL GERAL") else "" for i in x], axis=1)
-            return s
+        def show_eca_table(df):
+            main, total = split_total(df, label="TOTAL GERAL")
+            show_table(main, total, column_config=eca_config, hide_index=False, height=500)
 
-        t1, t2, t3 = st.tabs([f"Exclusivos ({len(exclusivos)})", f"Compartilhados ({len(compartilhados)})", f"Ausentes ({len(ausentes)})"])
+        t1, t2, t3 = st.tabs([f"Exclusivos ({n_excl})", f"Compartilhados ({n_comp})", f"Ausentes ({n_aus})"])
 
         with t1:
-            df1 = criar_tabela_resumo(df_target, exclusivos, is_exclusive=True)
             if not df1.empty: 
-                st.dataframe(style_df(df1, is_exclusive=True), width="stretch", height=500)
+                show_eca_table(df1)
             else: st.info("Nenhum registro.")
 
         with t2:
-            df_full_shared = pd.concat([df_target[df_target["Anunciante"].isin(compartilhados)], df_comp[df_comp["Anunciante"].isin(compartilhados)]])
-            df2 = criar_tabela_resumo(df_full_shared, compartilhados, is_exclusive=False)
-            if not df2.empty: st.dataframe(style_df(df2, is_exclusive=False), width="stretch", height=500)
+            if not df2.empty: show_eca_table(df2)
             else: st.info("Nenhum registro.")
 
         with t3:
-            df3 = criar_tabela_resumo(df_comp, ausentes, is_exclusive=False)
-            if not df3.empty: st.dataframe(style_df(df3, is_exclusive=False), width="stretch", height=500)
+            if not df3.empty: show_eca_table(df3)
             else: st.info("Nenhum registro.")
 
         st.markdown("<br>", unsafe_allow_html=True)
 
         # --- DETALHAMENTO ---
-        with st.expander("Fonte de Dados Completa (Detalhamento)", expanded=False):
-            df_global_view = pd.concat([df_target, df_comp])
-            
-            rename_map = {
-                "Praca": "Praça", "Anuncio": "Anúncio", "Duracao": "Duração",
-                "Emissora": "Veículo", "Volume de Insercoes": "Inserções", 
-                "Tipo": "Tipo", "DayPart": "DayPart"
-            }
-            
-            df_detalhe = df_global_view.copy()
-            if "Data_Dt" in df_detalhe.columns:
-                df_detalhe["Data"] = df_detalhe["Data_Dt"].dt.strftime("%d/%m/%Y")
-            
-            cols_originais = ["Data", "Anunciante", "Anuncio", "Duracao", "Praca", "Emissora", "Tipo", "DayPart", "Volume de Insercoes"]
-            cols_existentes = [c for c in cols_originais if c in df_detalhe.columns]
-            
-            df_exib = df_detalhe[cols_existentes].rename(columns=rename_map)
-            df_exib.sort_values(by=["Anunciante", "Data"], inplace=True)
-            
-            st.dataframe(df_exib, width="stretch", hide_index=True)
+        render_detail(tb_crowley, rows_detalhe, key="eca")
 
         st.markdown("---")
         
         # --- EXPORTAÇÃO ---
-        with st.spinner("Gerando Excel..."):
-            buf = io.BytesIO()
-            with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
-                workbook = writer.book
+        def gerar_excel():
+            with StreamingExcel() as xl:
+                workbook = xl.book
                 
                 fmt_center = workbook.add_format({'align': 'center', 'valign': 'vcenter'})
                 fmt_left = workbook.add_format({'align': 'left', 'valign': 'vcenter'})
                 
                 f_data = {"Parâmetro": ["Início", "Fim", "Praça", "Veículo", "Concorrentes", "Share"], 
                           "Valor": [dt_ini.strftime("%d/%m/%Y"), dt_fim.strftime("%d/%m/%Y"), sel_praca, sel_veiculo, ", ".join(sel_concorrentes) if sel_concorrentes else "Todos", "Ativado"]}
-                pd.DataFrame(f_data).to_excel(writer, sheet_name='Filtros', index=False)
-                writer.sheets['Filtros'].set_column('A:B', 40)
+                for ws in xl.write_frame(pd.DataFrame(f_data), 'Filtros'):
+                    ws.set_column('A:B', 40)
 
                 def save_tab(df, name, include_index=True):
                     if not df.empty:
-                        # O Pandas já exporta np.nan como célula vazia por padrão
-                        # Não precisamos fazer replace nenhum!
-                        df.to_excel(writer, sheet_name=name, index=include_index)
-                        worksheet = writer.sheets[name]
-                        worksheet.set_column('A:A', 40, fmt_left)
-                        worksheet.set_column('B:Z', 15, fmt_center)
+                        # NaN vira célula vazia
+                        for worksheet in xl.write_frame(df, name, index=include_index):
+                            worksheet.set_column('A:A', 40, fmt_left)
+                            worksheet.set_column('B:Z', 15, fmt_center)
                 
                 save_tab(df1, 'Exclusivos')
                 save_tab(df2, 'Compartilhados')
                 save_tab(df3, 'Ausentes')
                 
-                if not df_exib.empty:
-                    df_exib.to_excel(writer, sheet_name='Detalhamento', index=False)
-                    worksheet = writer.sheets['Detalhamento']
-                    
-                    for idx, col_name in enumerate(df_exib.columns):
-                        if col_name in ["Anunciante", "Anúncio"]:
-                            worksheet.set_column(idx, idx, 35, fmt_left)
-                        else:
-                            worksheet.set_column(idx, idx, 15, fmt_center)
-
+                if len(rows_detalhe):
+                    # Escrito em blocos: o detalhamento inteiro nunca vira um DataFrame só
+                    for worksheet in xl.write_frame(iter_detail_frames(tb_crowley, rows_detalhe), 'Detalhamento'):
+                        for idx, col_name in enumerate(DETAIL_HEADER):
+                            if col_name in ["Anunciante", "Anúncio"]:
+                                worksheet.set_column(idx, idx, 35, fmt_left)
+                            else:
+                                worksheet.set_column(idx, idx, 15, fmt_center)
+            return xl.getvalue()
+
+        def tabelas_export():
+            tabelas = {nome: df.reset_index() for nome, df in [("Exclusivos", df1), ("Compartilhados", df2), ("Ausentes", df3)] if not df.empty}
+            tabelas["Detalhamento"] = iter_detail_batches(tb_crowley, rows_detalhe)
+            return tabelas
+
+        # Só gera quando pedido; repetições com os mesmos filtros vêm do cache
+        export_params = {"dt_ini": dt_ini, "dt_fim": dt_fim, "praca": sel_praca, "veiculo": sel_veiculo, "concorrentes": sel_concorrentes}
         c_vazio1, c_vazio2, c_btn, c_vazio3, c_vazio4 = st.columns([1, 1, 1, 1, 1])
         with c_btn:
-            st.download_button("Exportar Excel", data=buf, file_name=f"ECA_{sel_veiculo}_{datetime.now().strftime('%d%m')}.xlsx", mime="application/vnd.ms-excel", type="secondary", use_container_width=True)
+            excel_download(gerar_excel, "eca", export_params, tb_crowley.version, f"ECA_{sel_veiculo}_{datetime.now().strftime('%d%m')}.xlsx", tables=tabelas_export)
         
         st.markdown(f"<div style='text-align:center;color:#666;font-size:0.8rem;margin-top:5px;'>Última atualização da base de dados: {data_atualizacao}</div>", unsafe_allow_html=True)
\ No newline at end of file
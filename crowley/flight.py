@@ -2,16 +2,86 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import io
 import math
 import json
-from datetime import datetime
+from datetime import datetime, date
 import calendar
+from utils.detail_view import render_detail, iter_detail_frames, iter_detail_batches
+from utils.export import excel_download, StreamingExcel
+from utils import perf, result_cache
 
-def render(df_crowley, cookies, data_atualizacao):
-    # --- CONFIGURAÇÃO VISUAL ---
-    pd.set_option("styler.render.max_elements", 5_000_000)
-    
+MES_NOMES = {
+    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
+    7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
+}
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+@result_cache.cached
+def compute_flight(tb_crowley, ano, mes, praca, veiculo, dias=None, anunciantes=None):
+    """
+    Mapa de inserções por anunciante x dia do mês sem Streamlit:
+    {"rows_final", "pivot" (dias como "01", "02"... e TOTAL, vazio se ninguém
+    tem inserções), "total" (linha TOTAL DIÁRIO)}. None se não há inserções.
+    """
+    _, last_day = calendar.monthrange(int(ano), int(mes))
+    rows_final = tb_crowley.select(date_from=date(ano, mes, 1), date_to=date(ano, mes, last_day), Praca=praca, Emissora=veiculo)
+    if anunciantes:
+        rows_final = tb_crowley.select(rows_final, Anunciante=anunciantes)
+    if dias:
+        rows_final = tb_crowley.select(rows_final, dates=[date(ano, mes, d) for d in dias])
+
+    if len(rows_final) == 0:
+        return None
+
+    # Só o recorte selecionado vira DataFrame
+    df_final = tb_crowley.to_frame(rows_final)
+    df_final["Dia"] = df_final["Data_Dt"].dt.day
+    val_col = "Volume de Insercoes"
+
+    # Pivot Table
+    # Fix: observed=True para silenciar warning do pandas
+    pivot = pd.pivot_table(
+        df_final, 
+        index="Anunciante", 
+        columns="Dia", 
+        values=val_col, 
+        aggfunc="sum", 
+        fill_value=0,
+        observed=True
+    )
+
+    # Garante colunas de dias
+    if dias:
+        days_range = sorted(dias)
+    else:
+        days_range = list(range(1, last_day + 1))
+
+    pivot = pivot.reindex(columns=days_range, fill_value=0)
+
+    # Calcula Total por Linha e Remove Zerados
+    pivot["TOTAL"] = pivot.sum(axis=1)
+    pivot = pivot[pivot["TOTAL"] > 0]
+
+    if pivot.empty:
+        return {"rows_final": rows_final, "pivot": pivot, "total": None}
+
+    # Ordenação
+    pivot = pivot.sort_values("TOTAL", ascending=False)
+
+    # --- CÁLCULO DA LINHA TOTALIZADORA (TOTAL DIÁRIO) ---
+    # Soma as colunas (dias) e a coluna TOTAL
+    daily_totals = pivot.sum(numeric_only=True)
+    # Cria um DataFrame de uma linha para o total
+    total_row_df = pd.DataFrame(daily_totals).T
+    total_row_df.index = ["TOTAL DIÁRIO"]
+
+    # Formata cabeçalho dos dias para string (01, 02...)
+    pivot.columns = [f"{c:02d}" if isinstance(c, int) else c for c in pivot.columns]
+    total_row_df.columns = pivot.columns # Garante alinhamento exato
+
+    return {"rows_final": rows_final, "pivot": pivot, "total": total_row_df}
+
+def render(tb_crowley, cookies, data_atualizacao):
     st.markdown("""
         <style>
         /* Tabela Compacta */
@@ -47,22 +117,10 @@ def render(df_crowley, cookies, data_atualizacao):
     st.markdown('<div class="page-title-centered">Relatório Flight (Mapa de Inserções)</div>', unsafe_allow_html=True)
 
     # Validação
-    if df_crowley is None or df_crowley.empty:
+    if tb_crowley is None or len(tb_crowley) == 0:
         st.error("Base de dados não carregada.")
         st.stop()
 
-    if "Data_Dt" not in df_crowley.columns:
-        if "Data" in df_crowley.columns:
-            df_crowley["Data_Dt"] = pd.to_datetime(df_crowley["Data"], dayfirst=True, errors="coerce")
-        else:
-            st.error("Coluna de Data não encontrada na base.")
-            st.stop()
-
-    # Colunas Auxiliares
-    df_crowley["Ano"] = df_crowley["Data_Dt"].dt.year
-    df_crowley["Mes"] = df_crowley["Data_Dt"].dt.month
-    df_crowley["Dia"] = df_crowley["Data_Dt"].dt.day
-
     # --- COOKIES (PERSISTÊNCIA DE FILTROS) ---
     saved_filters = {}
     cookie_val = cookies.get("crowley_filters_flight")
@@ -90,21 +148,17 @@ def render(df_crowley, cookies, data_atualizacao):
         c1, c2, c3 = st.columns(3)
         
         # 1. Ano
-        lista_anos = sorted(df_crowley["Ano"].dropna().unique(), reverse=True)
+        catalogo = tb_crowley.catalog()
+        lista_anos = catalogo.years()
         default_ano = get_cookie_val("ano")
         idx_ano = lista_anos.index(default_ano) if default_ano in lista_anos else 0
         
         with c1:
             sel_ano = st.selectbox("1. Ano (*)", options=lista_anos, index=idx_ano, key="flight_ano", on_change=reset_pagination)
-            
-        df_ano = df_crowley[df_crowley["Ano"] == sel_ano]
-        
+
         # 2. Mês
-        lista_meses_num = sorted(df_ano["Mes"].dropna().unique())
-        mes_map = {
-            1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
-            7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
-        }
+        lista_meses_num = catalogo.months(sel_ano)
+        mes_map = MES_NOMES
         lista_meses_fmt = [(m, mes_map.get(m, str(m))) for m in lista_meses_num]
         
         # Tenta recuperar mês salvo
@@ -140,15 +194,10 @@ def render(df_crowley, cookies, data_atualizacao):
         with c3:
             sel_dias = st.multiselect("3. Dias (Opcional)", options=lista_dias, default=valid_dias, placeholder="Todo o mês", key="flight_dias", on_change=reset_pagination)
 
-        if sel_ano and sel_mes:
-            df_temp = df_ano[df_ano["Mes"] == sel_mes]
-        else:
-            df_temp = pd.DataFrame()
-
         c4, c5, c6 = st.columns(3)
         
         # 4. Praça
-        lista_pracas = sorted(df_temp["Praca"].dropna().unique()) if not df_temp.empty else []
+        lista_pracas = catalogo.pracas(sel_ano, sel_mes) if sel_ano and sel_mes else []
         saved_praca = get_cookie_val("praca")
         idx_praca = lista_pracas.index(saved_praca) if saved_praca in lista_pracas else 0
         
@@ -156,8 +205,7 @@ def render(df_crowley, cookies, data_atualizacao):
             sel_praca = st.selectbox("4. Praça (*)", options=lista_pracas, index=idx_praca, key="flight_praca", on_change=reset_pagination)
             
         # 5. Veículo
-        df_praca = df_temp[df_temp["Praca"] == sel_praca] if not df_temp.empty else pd.DataFrame()
-        lista_veiculos = sorted(df_praca["Emissora"].dropna().unique())
+        lista_veiculos = catalogo.vehicles(sel_praca, sel_ano, sel_mes)
         saved_veiculo = get_cookie_val("veiculo")
         idx_veiculo = lista_veiculos.index(saved_veiculo) if saved_veiculo in lista_veiculos else 0
         
@@ -165,8 +213,7 @@ def render(df_crowley, cookies, data_atualizacao):
             sel_veiculo = st.selectbox("5. Veículo (*)", options=lista_veiculos, index=idx_veiculo, key="flight_veiculo", on_change=reset_pagination)
             
         # 6. Anunciante
-        df_veic = df_praca[df_praca["Emissora"] == sel_veiculo] if not df_praca.empty else pd.DataFrame()
-        lista_anunciantes = sorted(df_veic["Anunciante"].dropna().unique())
+        lista_anunciantes = catalogo.advertisers(sel_praca, sel_ano, sel_mes, sel_veiculo)
         saved_anunciantes = get_cookie_val("anunciantes", [])
         valid_anunciantes = [a for a in saved_anunciantes if a in lista_anunciantes]
         
@@ -195,68 +242,15 @@ def render(df_crowley, cookies, data_atualizacao):
     # --- PROCESSAMENTO ---
     if st.session_state.get("flight_search_trigger") and sel_ano and sel_mes and sel_praca and sel_veiculo:
         
-        mask = (
-            (df_crowley["Ano"] == sel_ano) &
-            (df_crowley["Mes"] == sel_mes) &
-            (df_crowley["Praca"] == sel_praca) &
-            (df_crowley["Emissora"] == sel_veiculo)
-        )
-        if sel_anunciantes:
-            mask = mask & (df_crowley["Anunciante"].isin(sel_anunciantes))
-        if sel_dias:
-            mask = mask & (df_crowley["Dia"].isin(sel_dias))
-            
-        df_final = df_crowley[mask].copy()
-        
-        if df_final.empty:
+        with perf.span("aggregate", rows=len(tb_crowley)):
+            res = compute_flight(tb_crowley, sel_ano, sel_mes, sel_praca, sel_veiculo, sel_dias, sel_anunciantes)
+        if res is None:
             st.warning("Nenhuma inserção encontrada.")
             return
-
-        val_col = "Volume de Insercoes" if "Volume de Insercoes" in df_final.columns else "Contagem"
-        if val_col == "Contagem": df_final["Contagem"] = 1
-
-        # Pivot Table
-        # Fix: observed=True para silenciar warning do pandas
-        pivot = pd.pivot_table(
-            df_final, 
-            index="Anunciante", 
-            columns="Dia", 
-            values=val_col, 
-            aggfunc="sum", 
-            fill_value=0,
-            observed=True
-        )
-        
-        # Garante colunas de dias
-        if sel_dias:
-            days_range = sorted(sel_dias)
-        else:
-            _, last_day = calendar.monthrange(int(sel_ano), int(sel_mes))
-            days_range = list(range(1, last_day + 1))
-            
-        pivot = pivot.reindex(columns=days_range, fill_value=0)
-        
-        # Calcula Total por Linha e Remove Zerados
-        pivot["TOTAL"] = pivot.sum(axis=1)
-        pivot = pivot[pivot["TOTAL"] > 0]
-        
-        if pivot.empty:
+        if res["pivot"].empty:
             st.warning("Nenhum anunciante com inserções neste período.")
             return
-
-        # Ordenação
-        pivot = pivot.sort_values("TOTAL", ascending=False)
-        
-        # --- CÁLCULO DA LINHA TOTALIZADORA (TOTAL DIÁRIO) ---
-        # Soma as colunas (dias) e a coluna TOTAL
-        daily_totals = pivot.sum(numeric_only=True)
-        # Cria um DataFrame de uma linha para o total
-        total_row_df = pd.DataFrame(daily_totals).T
-        total_row_df.index = ["TOTAL DIÁRIO"]
-        
-        # Formata cabeçalho dos dias para string (01, 02...)
-        pivot.columns = [f"{c:02d}" if isinstance(c, int) else c for c in pivot.columns]
-        total_row_df.columns = pivot.columns # Garante alinhamento exato
+        rows_final, pivot, total_row_df = res["rows_final"], res["pivot"], res["total"]
 
         # --- LÓGICA DE PAGINAÇÃO ---
         ROWS_PER_PAGE = 20
@@ -283,22 +277,26 @@ def render(df_crowley, cookies, data_atualizacao):
         cols_days = [c for c in pivot.columns if c != "TOTAL"]
         max_val_global = pivot[cols_days].max().max() if not pivot[cols_days].empty else 1
 
+        # Números formatados pelo column_config (sem format do Styler)
         col_config = {
-            "TOTAL": st.column_config.TextColumn("Total", width="small")
+            "TOTAL": st.column_config.NumberColumn("Total", format="%d", width="small")
         }
         for c in cols_days:
-            col_config[c] = st.column_config.TextColumn(c, width="small")
+            col_config[c] = st.column_config.NumberColumn(c, format="%d", width="small")
 
         # --- RENDERIZAÇÃO DA TABELA ---
-        # Fix: map em vez de applymap para silenciar warning
+        # Estilos calculados de uma vez para a página inteira (sem função por célula)
+        def flight_styles(df):
+            css = pd.DataFrame("", index=df.index, columns=df.columns)
+            dias = df[cols_days].to_numpy()
+            css[cols_days] = np.where(dias == 0, "color: transparent", "color: black; font-weight: bold")
+            css["TOTAL"] = "background-color: #e6f3ff; font-weight: bold; border-left: 2px solid #ccc"
+            css.loc[df.index == "TOTAL DIÁRIO"] = "background-color: #d1e7dd; font-weight: bold"
+            return css
+
         styler = df_display_with_total.style\
             .background_gradient(cmap="YlOrRd", subset=cols_days, vmin=0, vmax=max_val_global)\
-            .format("{:.0f}")\
-            .map(lambda x: "color: transparent" if x == 0 else "color: black; font-weight: bold", subset=cols_days)\
-            .map(lambda x: "background-color: #e6f3ff; font-weight: bold; border-left: 2px solid #ccc", subset=["TOTAL"])\
-            .apply(lambda x: ["background-color: #d1e7dd; font-weight: bold" if x.name == "TOTAL DIÁRIO" else "" for i in x], axis=1)
-        
-        styler = styler.set_properties(**{'text-align': 'center'})
+            .apply(flight_styles, axis=None)
 
         st.dataframe(
             styler,
@@ -335,34 +333,12 @@ def render(df_crowley, cookies, data_atualizacao):
         st.markdown("---")
         
         # --- DETALHAMENTO PADRONIZADO ---
-        with st.expander("Fonte de Dados Completa (Detalhamento)", expanded=False):
-            # Prepara DF detalhado
-            rename_map = {
-                "Praca": "Praça", "Anuncio": "Anúncio", "Duracao": "Duração",
-                "Emissora": "Veículo", "Volume de Insercoes": "Inserções", 
-                "Tipo": "Tipo", "DayPart": "DayPart"
-            }
-            cols_originais = ["Data_Dt", "Anunciante", "Anuncio", "Duracao", "Praca", "Emissora", "Tipo", "DayPart", "Volume de Insercoes"]
-            cols_existentes = [c for c in cols_originais if c in df_final.columns]
-            
-            df_detalhe = df_final[cols_existentes].rename(columns=rename_map)
-            
-            # Formatação de Data para String (DD/MM/AAAA)
-            if "Data_Dt" in df_detalhe.columns:
-                df_detalhe["Data"] = df_detalhe["Data_Dt"].dt.strftime("%d/%m/%Y")
-                df_detalhe = df_detalhe.drop(columns=["Data_Dt"])
-                # Reordena para Data ser a primeira
-                cols = ["Data"] + [c for c in df_detalhe.columns if c != "Data"]
-                df_detalhe = df_detalhe[cols]
-
-            df_detalhe = df_detalhe.sort_values(by=["Anunciante", "Data"])
-            st.dataframe(df_detalhe, width="stretch", hide_index=True)
+        render_detail(tb_crowley, rows_final, key="flight")
 
         # --- EXPORTAÇÃO ---
-        with st.spinner("Gerando Excel Completo..."):
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                workbook = writer.book
+        def gerar_excel():
+            with StreamingExcel() as xl:
+                workbook = xl.book
                 fmt_center = workbook.add_format({'align': 'center', 'valign': 'vcenter'})
                 
                 # Filtros
@@ -374,33 +350,36 @@ def render(df_crowley, cookies, data_atualizacao):
                         "Selecionados" if sel_dias else "Todos"
                     ]
                 }
-                pd.DataFrame(f_data).to_excel(writer, sheet_name='Filtros', index=False)
-                writer.sheets['Filtros'].set_column('A:B', 30)
+                for ws in xl.write_frame(pd.DataFrame(f_data), 'Filtros'):
+                    ws.set_column('A:B', 30)
                 
                 # Mapa Flight Completo (com linha Total Geral no final)
                 pivot_export = pd.concat([pivot, total_row_df])
-                pivot_export.to_excel(writer, sheet_name='Flight Map')
-                ws = writer.sheets['Flight Map']
-                ws.set_column('A:A', 40)
-                ws.set_column('B:AF', 5, fmt_center)
-                ws.set_column('AG:AG', 10, fmt_center)
-
-                # Detalhamento
-                if not df_detalhe.empty:
-                    df_detalhe.to_excel(writer, sheet_name='Detalhamento', index=False)
-                    ws_det = writer.sheets['Detalhamento']
-                    ws_det.set_column('A:Z', 15, fmt_center)
-                    ws_det.set_column('B:C', 35) # Anunciante largo
-        
+                for ws in xl.write_frame(pivot_export, 'Flight Map', index=True):
+                    ws.set_column('A:A', 40)
+                    ws.set_column('B:AF', 5, fmt_center)
+                    ws.set_column('AG:AG', 10, fmt_center)
+
+                # Detalhamento (em blocos)
+                if len(rows_final):
+                    for ws_det in xl.write_frame(iter_detail_frames(tb_crowley, rows_final), 'Detalhamento'):
+                        ws_det.set_column('A:Z', 15, fmt_center)
+                        ws_det.set_column('B:C', 35) # Anunciante largo
+            return xl.getvalue()
+
+        def tabelas_export():
+            return {
+                "Flight Map": pivot.reset_index(),
+                "Detalhamento": iter_detail_batches(tb_crowley, rows_final),
+            }
+
+        # Só gera quando pedido; repetições com os mesmos filtros vêm do cache
+        export_params = {
+            "ano": sel_ano, "mes": sel_mes, "dias": sel_dias, "praca": sel_praca,
+            "veiculo": sel_veiculo, "anunciantes": sel_anunciantes
+        }
         c_vazio1, c_vazio2, c_btn, c_vazio3, c_vazio4 = st.columns([1, 1, 1, 1, 1])
         with c_btn:
-            st.download_button(
-                label="Exportar Excel",
-                data=buffer,
-                file_name=f"Flight_{sel_veiculo}_{sel_mes:02d}_{sel_ano}.xlsx",
-                mime="application/vnd.ms-excel",
-                type="secondary",
-                use_container_width=True
-            )
-            
+            excel_download(gerar_excel, "flight", export_params, tb_crowley.version, f"Flight_{sel_veiculo}_{sel_mes:02d}_{sel_ano}.xlsx", tables=tabelas_export)
+        
         st.markdown(f"<div style='text-align:center;color:#666;font-size:0.8rem;margin-top:5px;'>Última atualização da base de dados: {data_atualizacao}</div>", unsafe_allow_html=True)
\ No newline at end of file
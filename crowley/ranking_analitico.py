@@ -3,13 +3,109 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import json
-import io
 from datetime import datetime, timedelta, date
-
-def render(df_crowley, cookies, data_atualizacao):
-    # --- CONFIGURAÇÃO DE VISUAL ---
-    pd.set_option("styler.render.max_elements", 5_000_000)
-
+from utils.tables import show_table, int_column
+from utils.detail_view import render_detail, iter_detail_frames, iter_detail_batches
+from utils.export import excel_download, StreamingExcel
+from utils import perf, result_cache
+
+CONSOLIDADO = "Consolidado (Todas as emissoras)"
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+@result_cache.cached
+def compute_ranking_analitico(tb_crowley, dt_ini, dt_fim, ref_ini, ref_fim, praca, veiculo=CONSOLIDADO, anunciantes=None):
+    """
+    Ranking de anunciantes por inserções (período atual x anterior) sem
+    Streamlit: {"ranking" (numérico, sem total), "total" (linha TOTAL GERAL),
+    "rows_detalhe"}. None se nenhum dos períodos tem dados.
+    """
+    # 1. Filtro Base (direto nos códigos da tabela compacta)
+    filtros_base = {}
+    if anunciantes:
+        filtros_base["Anunciante"] = anunciantes
+    if veiculo != CONSOLIDADO:
+        filtros_base["Emissora"] = veiculo
+
+    rows_base = tb_crowley.select(Praca=praca, **filtros_base)
+
+    # 2. Divisão Temporal
+    rows_atual = tb_crowley.select(rows_base, date_from=dt_ini, date_to=dt_fim)
+    rows_ref = tb_crowley.select(rows_base, date_from=ref_ini, date_to=ref_fim)
+
+    if len(rows_atual) == 0 and len(rows_ref) == 0:
+        return None
+
+    # 3. Agregação
+    grp_atual = tb_crowley.group_sum("Anunciante", rows_atual).rename(columns={"Volume de Insercoes": "Ins_Atual"})
+    grp_ref = tb_crowley.group_sum("Anunciante", rows_ref).rename(columns={"Volume de Insercoes": "Ins_Ref"})
+
+    df_rank = pd.merge(grp_atual, grp_ref, on="Anunciante", how="outer").fillna(0)
+
+    # 4. Cálculos
+    df_rank["Rank_Atual"] = df_rank["Ins_Atual"].rank(ascending=False, method='min')
+    df_rank["Rank_Anterior"] = df_rank["Ins_Ref"].rank(ascending=False, method='min')
+
+    df_rank["Var %"] = np.where(
+        df_rank["Ins_Ref"] > 0,
+        (df_rank["Ins_Atual"] - df_rank["Ins_Ref"]) / df_rank["Ins_Ref"],
+        np.where(df_rank["Ins_Atual"] > 0, 1.0, 0.0) 
+    )
+
+    total_atual = df_rank["Ins_Atual"].sum()
+    df_rank["Share %"] = (df_rank["Ins_Atual"] / total_atual) if total_atual > 0 else 0.0
+
+    # Ordenação
+    df_rank = df_rank.sort_values(by=["Ins_Atual", "Ins_Ref"], ascending=[False, False]).reset_index(drop=True)
+    df_rank["Posição"] = range(1, len(df_rank) + 1)
+
+    # --- PREPARAÇÃO PARA EXIBIÇÃO ---
+
+    # Renomeação
+    df_rank = df_rank.rename(columns={
+        "Posição": "Ranking",
+        "Rank_Anterior": "Posição Anterior",
+        "Ins_Atual": "Inserções (Atual)",
+        "Ins_Ref": "Inserções (Anterior)"
+    })
+
+    # Totais
+    total_ins_atual = df_rank["Inserções (Atual)"].sum()
+    total_ins_ref = df_rank["Inserções (Anterior)"].sum()
+    var_total = (total_ins_atual - total_ins_ref) / total_ins_ref if total_ins_ref > 0 else 0.0
+
+    # Linha TOTAL GERAL (Vazia nos campos solicitados)
+    row_total = {
+        "Ranking": "",           
+        "Posição Anterior": "",  
+        "Anunciante": "TOTAL GERAL",
+        "Inserções (Atual)": total_ins_atual,
+        "Share %": "",           
+        "Var %": var_total,
+        "Inserções (Anterior)": total_ins_ref
+    }
+
+    cols_show = ["Ranking", "Posição Anterior", "Anunciante", "Inserções (Atual)", "Share %", "Var %", "Inserções (Anterior)"]
+
+    # DataFrame Base
+    df_final_data = df_rank[cols_show].copy()
+
+    return {"ranking": df_final_data, "total": pd.DataFrame([row_total]), "rows_detalhe": np.union1d(rows_atual, rows_ref)}
+
+# --- DF PARA TELA ---
+# Colunas numéricas formatadas pelo column_config; percentuais em pontos (x100).
+# O TOTAL GERAL é exibido à parte, então o corpo não mistura "" com números.
+def screen_frame(df):
+    out = df.copy()
+    for c in ["Share %", "Var %"]:
+        out[c] = pd.to_numeric(out[c], errors="coerce") * 100
+    out["Ranking"] = pd.to_numeric(out["Ranking"], errors="coerce").astype("Int64")
+    ant = pd.to_numeric(out["Posição Anterior"], errors="coerce")
+    out["Posição Anterior"] = np.where(
+        ant.isna(), "", np.where((ant > 100000) | (ant <= 0), "-", ant.fillna(0).astype(np.int64).astype(str))
+    )
+    return out
+
+def render(tb_crowley, cookies, data_atualizacao):
     # CSS para centralização FORÇADA e ajustes de tabela
     st.markdown("""
         <style>
@@ -39,18 +135,10 @@ def render(df_crowley, cookies, data_atualizacao):
     st.markdown('<div class="page-title-centered">Ranking Analítico de Performance</div>', unsafe_allow_html=True)
     
     # Validação da Base
-    if df_crowley is None or df_crowley.empty:
+    if tb_crowley is None or len(tb_crowley) == 0:
         st.error("Base de dados não carregada.")
         st.stop()
 
-    # Garante coluna de data
-    if "Data_Dt" not in df_crowley.columns:
-        if "Data" in df_crowley.columns:
-            df_crowley["Data_Dt"] = pd.to_datetime(df_crowley["Data"], dayfirst=True, errors="coerce")
-        else:
-            st.error("Coluna de Data não encontrada na base.")
-            st.stop()
-
     # --- DATAS LIMITE ---
     min_date_allowed = date(2024, 1, 1)
     try:
@@ -115,7 +203,8 @@ def render(df_crowley, cookies, data_atualizacao):
         # 2. Filtros Categóricos
         c3, c4, c5 = st.columns([1, 1, 2])
         
-        lista_pracas = sorted(df_crowley["Praca"].dropna().unique())
+        catalogo = tb_crowley.catalog()
+        lista_pracas = catalogo.pracas()
         
         def on_praca_change():
             st.session_state["rank_veiculo_key"] = "Consolidado (Todas as emissoras)"
@@ -130,11 +219,10 @@ def render(df_crowley, cookies, data_atualizacao):
             sel_praca = st.selectbox("Praça", options=lista_pracas, key="rank_praca_key", on_change=on_praca_change)
 
         # Filtragem preliminar para popular dropdowns
-        df_praca_filtered = df_crowley[df_crowley["Praca"] == sel_praca]
-        lista_anunciantes_local = sorted(df_praca_filtered["Anunciante"].dropna().unique())
-        raw_veiculos_local = sorted(df_praca_filtered["Emissora"].dropna().unique())
+        lista_anunciantes_local = catalogo.advertisers(sel_praca)
+        raw_veiculos_local = catalogo.vehicles(sel_praca)
         
-        opcao_consolidado = "Consolidado (Todas as emissoras)"
+        opcao_consolidado = CONSOLIDADO
         lista_veiculos_local = [opcao_consolidado] + raw_veiculos_local
         
         if "rank_veiculo_key" not in st.session_state:
@@ -168,194 +256,48 @@ def render(df_crowley, cookies, data_atualizacao):
 
     if st.session_state.get("rank_search_trigger"):
         
-        # 1. Filtro Base
-        mask_base = (df_crowley["Praca"] == sel_praca)
-        if sel_anunciante:
-            mask_base = mask_base & (df_crowley["Anunciante"].isin(sel_anunciante))
-        if sel_veiculo != opcao_consolidado:
-            mask_base = mask_base & (df_crowley["Emissora"] == sel_veiculo)
-            
-        df_base = df_crowley[mask_base]
-
-        # 2. Divisão Temporal
-        ts_ini, ts_fim = pd.Timestamp(dt_ini), pd.Timestamp(dt_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        ts_ref_ini, ts_ref_fim = pd.Timestamp(ref_ini), pd.Timestamp(ref_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-
-        df_atual = df_base[(df_base["Data_Dt"] >= ts_ini) & (df_base["Data_Dt"] <= ts_fim)]
-        df_ref = df_base[(df_base["Data_Dt"] >= ts_ref_ini) & (df_base["Data_Dt"] <= ts_ref_fim)]
-
-        if df_atual.empty and df_ref.empty:
+        with perf.span("aggregate", rows=len(tb_crowley)):
+            res = compute_ranking_analitico(tb_crowley, dt_ini, dt_fim, ref_ini, ref_fim, sel_praca, sel_veiculo, sel_anunciante)
+        if res is None:
             st.warning("Nenhum dado encontrado para os períodos selecionados.")
             return
+        df_final_data, rows_detalhe = res["ranking"], res["rows_detalhe"]
 
-        # 3. Agregação
-        val_col = "Volume de Insercoes" if "Volume de Insercoes" in df_base.columns else "Contagem"
-        if val_col == "Contagem": 
-            df_atual = df_atual.copy(); df_atual["Contagem"] = 1
-            df_ref = df_ref.copy(); df_ref["Contagem"] = 1
-
-        grp_atual = df_atual.groupby("Anunciante", observed=True)[val_col].sum().reset_index().rename(columns={val_col: "Ins_Atual"})
-        grp_ref = df_ref.groupby("Anunciante", observed=True)[val_col].sum().reset_index().rename(columns={val_col: "Ins_Ref"})
-
-        # Conversão para string para evitar erros no merge
-        grp_atual["Anunciante"] = grp_atual["Anunciante"].astype(str)
-        grp_ref["Anunciante"] = grp_ref["Anunciante"].astype(str)
-
-        df_rank = pd.merge(grp_atual, grp_ref, on="Anunciante", how="outer").fillna(0)
-
-        # 4. Cálculos
-        df_rank["Rank_Atual"] = df_rank["Ins_Atual"].rank(ascending=False, method='min')
-        df_rank["Rank_Anterior"] = df_rank["Ins_Ref"].rank(ascending=False, method='min')
-
-        df_rank["Var %"] = np.where(
-            df_rank["Ins_Ref"] > 0,
-            (df_rank["Ins_Atual"] - df_rank["Ins_Ref"]) / df_rank["Ins_Ref"],
-            np.where(df_rank["Ins_Atual"] > 0, 1.0, 0.0) 
-        )
-
-        total_atual = df_rank["Ins_Atual"].sum()
-        df_rank["Share %"] = (df_rank["Ins_Atual"] / total_atual) if total_atual > 0 else 0.0
-
-        # Ordenação
-        df_rank = df_rank.sort_values(by=["Ins_Atual", "Ins_Ref"], ascending=[False, False]).reset_index(drop=True)
-        df_rank["Posição"] = range(1, len(df_rank) + 1)
-
-        # --- PREPARAÇÃO PARA EXIBIÇÃO ---
-        
-        # Renomeação
-        df_rank = df_rank.rename(columns={
-            "Posição": "Ranking",
-            "Rank_Anterior": "Posição Anterior",
-            "Ins_Atual": "Inserções (Atual)",
-            "Ins_Ref": "Inserções (Anterior)"
-        })
-
-        # Totais
-        total_ins_atual = df_rank["Inserções (Atual)"].sum()
-        total_ins_ref = df_rank["Inserções (Anterior)"].sum()
-        var_total = (total_ins_atual - total_ins_ref) / total_ins_ref if total_ins_ref > 0 else 0.0
-        
-        # Linha TOTAL GERAL (Vazia nos campos solicitados)
-        row_total = {
-            "Ranking": "",           
-            "Posição Anterior": "",  
-            "Anunciante": "TOTAL GERAL",
-            "Inserções (Atual)": total_ins_atual,
-            "Share %": "",           
-            "Var %": var_total,
-            "Inserções (Anterior)": total_ins_ref
-        }
-        
-        cols_show = ["Ranking", "Posição Anterior", "Anunciante", "Inserções (Atual)", "Share %", "Var %", "Inserções (Anterior)"]
-        
-        # DataFrame Base
-        df_final_data = df_rank[cols_show].copy()
-        
         # --- DF PARA EXPORTAÇÃO (NUMÉRICO) ---
         # Adicionamos a linha total ao DF de exportação, mantendo tipos numéricos onde possível
-        df_export_rank = pd.concat([df_final_data, pd.DataFrame([row_total])], ignore_index=True)
-
-        # --- DF PARA TELA (TEXTO/STRING) ---
-        # Para evitar o erro do PyArrow (ArrowInvalid), convertemos colunas mistas para string EXCLUSIVAMENTE para exibição
-        df_screen = df_export_rank.copy()
-        
-        # Converte para string para aceitar o "" da linha de total sem quebrar o Arrow
-        df_screen["Ranking"] = df_screen["Ranking"].astype(str)
-        df_screen["Posição Anterior"] = df_screen["Posição Anterior"].astype(str)
-        df_screen["Share %"] = df_screen["Share %"].astype(str) # Se necessário, ou formatar depois
-
-        # Funções de Formatação Visual (Styler)
-        def safe_fmt_share(val):
-            # Se for vazio (linha total na tela), retorna vazio
-            if val == "": return ""
-            # Se for string numérica ou float
-            try:
-                v = float(val)
-                return f"{v:.1%}"
-            except:
-                return str(val)
-
-        def safe_fmt_int_dash(val):
-            if val == "": return ""
-            try:
-                v = float(val)
-                if v > 100000 or v <= 0: return "-"
-                return f"{int(v)}"
-            except:
-                return str(val)
-        
-        # Remove sufixo .0 que pode aparecer na conversão para string
-        df_screen["Ranking"] = df_screen["Ranking"].str.replace(r'\.0$', '', regex=True)
-        df_screen["Posição Anterior"] = df_screen["Posição Anterior"].str.replace(r'\.0$', '', regex=True)
+        df_export_rank = pd.concat([df_final_data, res["total"]], ignore_index=True)
 
-        def highlight_var(val):
-            if isinstance(val, (float, int)):
-                if val > 0: return 'color: #16a34a; font-weight: bold'
-                if val < 0: return 'color: #dc2626; font-weight: bold'
-            return ""
+        df_screen = screen_frame(df_final_data)
+        df_screen_total = screen_frame(res["total"])
 
         st.markdown("### Resultado Comparativo")
 
-        styler = df_screen.style\
-            .format({
-                "Inserções (Atual)": "{:,.0f}",
-                "Inserções (Anterior)": "{:,.0f}",
-                "Var %": "{:+.1%}",
-                "Share %": safe_fmt_share,
-                "Posição Anterior": safe_fmt_int_dash
-            })\
-            .map(highlight_var, subset=["Var %"])\
-            .apply(lambda x: ["background-color: #f0f2f6; font-weight: bold" if x["Anunciante"] == "TOTAL GERAL" else "" for i in x], axis=1)
-        
-        # Centralização via propriedades do pandas styler também
-        styler = styler.set_properties(**{'text-align': 'center'})
-
-        st.dataframe(
-            styler,
-            width="stretch",
+        show_table(
+            df_screen, df_screen_total,
+            color_cols=["Var %"],
             height=600,
-            hide_index=True,
             column_config={
-                "Ranking": st.column_config.TextColumn("Ranking", width="small"),
+                "Ranking": st.column_config.NumberColumn("Ranking", format="%d", width="small"),
                 "Posição Anterior": st.column_config.TextColumn("Posição Ant.", width="small"),
                 "Anunciante": st.column_config.TextColumn("Anunciante", width="large"),
-                "Var %": st.column_config.TextColumn("Var %", help="Variação em relação ao período anterior")
+                "Inserções (Atual)": int_column("Inserções (Atual)"),
+                "Inserções (Anterior)": int_column("Inserções (Anterior)"),
+                "Share %": st.column_config.NumberColumn("Share %", format="%.1f%%"),
+                "Var %": st.column_config.NumberColumn("Var %", format="%+.1f%%", help="Variação em relação ao período anterior")
             }
         )
 
         st.markdown("<br>", unsafe_allow_html=True)
 
         # --- DETALHAMENTO ---
-        with st.expander("Fonte de Dados Completa (Detalhamento)", expanded=False):
-            df_full_detail = pd.concat([df_atual, df_ref]).drop_duplicates()
-            
-            rename_map = {
-                "Praca": "Praça", "Anuncio": "Anúncio", "Duracao": "Duração",
-                "Emissora": "Veículo", "Volume de Insercoes": "Inserções", 
-                "Tipo": "Tipo", "DayPart": "DayPart"
-            }
-            
-            cols_originais = ["Data_Dt", "Anunciante", "Anuncio", "Duracao", "Praca", "Emissora", "Tipo", "DayPart", "Volume de Insercoes"]
-            cols_existentes = [c for c in cols_originais if c in df_full_detail.columns]
-            
-            df_exib_detalhe = df_full_detail[cols_existentes].rename(columns=rename_map)
-            
-            if "Data_Dt" in df_exib_detalhe.columns:
-                df_exib_detalhe["Data"] = df_exib_detalhe["Data_Dt"].dt.strftime("%d/%m/%Y")
-                df_exib_detalhe = df_exib_detalhe.drop(columns=["Data_Dt"])
-                cols = ["Data"] + [c for c in df_exib_detalhe.columns if c != "Data"]
-                df_exib_detalhe = df_exib_detalhe[cols]
-
-            df_exib_detalhe.sort_values(by=["Anunciante", "Data"], inplace=True)
-            st.dataframe(df_exib_detalhe, width="stretch", hide_index=True)
+        render_detail(tb_crowley, rows_detalhe, key="rank")
 
         st.markdown("---")
 
         # --- EXPORTAÇÃO ---
-        with st.spinner("Gerando Excel..."):
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                workbook = writer.book
+        def gerar_excel():
+            with StreamingExcel() as xl:
+                workbook = xl.book
                 fmt_center = workbook.add_format({'align': 'center', 'valign': 'vcenter'})
                 fmt_left = workbook.add_format({'align': 'left', 'valign': 'vcenter'})
                 
@@ -369,34 +311,39 @@ def render(df_crowley, cookies, data_atualizacao):
                         ", ".join(sel_anunciante) if sel_anunciante else "Todos"
                     ]
                 }
-                pd.DataFrame(f_data).to_excel(writer, sheet_name='Filtros', index=False)
-                writer.sheets['Filtros'].set_column('A:A', 30)
-                writer.sheets['Filtros'].set_column('B:B', 50)
+                for ws in xl.write_frame(pd.DataFrame(f_data), 'Filtros'):
+                    ws.set_column('A:A', 30)
+                    ws.set_column('B:B', 50)
 
                 # 2. Ranking
                 # Exporta o dataframe com NUMÉROS (df_export_rank), não o de tela (df_screen)
-                df_export_rank.to_excel(writer, sheet_name='Ranking', index=False)
-                ws_rank = writer.sheets['Ranking']
-                ws_rank.set_column('A:B', 10, fmt_center) 
-                ws_rank.set_column('C:C', 40, fmt_left)   
-                ws_rank.set_column('D:G', 15, fmt_center) 
-
-                # 3. Detalhamento
-                if not df_exib_detalhe.empty:
-                    df_exib_detalhe.to_excel(writer, sheet_name='Detalhamento', index=False)
-                    ws_det = writer.sheets['Detalhamento']
-                    ws_det.set_column('A:Z', 15, fmt_center)
-                    ws_det.set_column('B:C', 35, fmt_left)
+                for ws_rank in xl.write_frame(df_export_rank, 'Ranking'):
+                    ws_rank.set_column('A:B', 10, fmt_center) 
+                    ws_rank.set_column('C:C', 40, fmt_left)   
+                    ws_rank.set_column('D:G', 15, fmt_center) 
+
+                # 3. Detalhamento (sem linhas repetidas, escrito em blocos)
+                rows_unicas = tb_crowley.distinct(rows_detalhe)
+                if len(rows_unicas):
+                    for ws_det in xl.write_frame(iter_detail_frames(tb_crowley, rows_unicas), 'Detalhamento'):
+                        ws_det.set_column('A:Z', 15, fmt_center)
+                        ws_det.set_column('B:C', 35, fmt_left)
+            return xl.getvalue()
+
+        def tabelas_export():
+            # Sem a linha TOTAL GERAL: colunas numéricas ficam numéricas
+            return {
+                "Ranking": df_final_data,
+                "Detalhamento": iter_detail_batches(tb_crowley, tb_crowley.distinct(rows_detalhe)),
+            }
 
+        # Só gera quando pedido; repetições com os mesmos filtros vêm do cache
+        export_params = {
+            "dt_ini": dt_ini, "dt_fim": dt_fim, "ref_ini": ref_ini, "ref_fim": ref_fim,
+            "praca": sel_praca, "veiculo": sel_veiculo, "anunciantes": sel_anunciante
+        }
         c_vazio1, c_vazio2, c_btn, c_vazio3, c_vazio4 = st.columns([1, 1, 1, 1, 1])
         with c_btn:
-            st.download_button(
-                label="Exportar Excel", 
-                data=buffer, 
-                file_name=f"Ranking_Analitico_{sel_praca}_{datetime.now().strftime('%d%m')}.xlsx", 
-                mime="application/vnd.ms-excel", 
-                type="secondary", 
-                use_container_width=True
-            )
+            excel_download(gerar_excel, "rank", export_params, tb_crowley.version, f"Ranking_Analitico_{sel_praca}_{datetime.now().strftime('%d%m')}.xlsx", tables=tabelas_export)
         
         st.markdown(f"<div style='text-align:center;color:#666;font-size:0.8rem;margin-top:5px;'>Última atualização da base de dados: {data_atualizacao}</div>", unsafe_allow_html=True)
\ No newline at end of file
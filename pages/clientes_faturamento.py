@@ -3,123 +3,77 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-from utils.format import brl, PALETTE
+from utils.format import PALETTE
+from utils.tables import show_table, brl_column, int_column, decimal_column, pct_column
 from utils.loaders import load_main_base
-from utils.export import create_zip_package 
-
-# ==================== FUNÇÕES DE FORMATAÇÃO ====================
-def color_delta(val):
-    """Colore valores positivos de verde e negativos de vermelho."""
-    if pd.isna(val) or val == "" or val == "-": return ""
-    try:
-        if isinstance(val, (int, float)):
-            v = float(val)
-        else:
-            clean_val = str(val).replace("%", "").replace("+", "").replace(",", ".")
-            v = float(clean_val)
-        if v > 0: return "color: #16a34a; font-weight: 600;" 
-        if v < 0: return "color: #dc2626; font-weight: 600;" 
-    except (ValueError, TypeError): 
-        return ""
-    return ""
-
-def format_percent_col(val):
-    if pd.isna(val): return "-"
-    return f"{val:+.2f}%"
-
-def format_int(val):
-    if isinstance(val, str): return val
-    if pd.isna(val) or val == 0: return "-"
-    try:
-        return f"{int(val):,}".replace(",", ".")
-    except (ValueError, TypeError):
-        return str(val)
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== FUNÇÃO AUXILIAR DE EXIBIÇÃO (UNIFICADA) ====================
-def display_combined_table(df_main, df_total, format_dict=None, color_cols=None, show_total=True, column_config=None):
+def display_combined_table(df_main, df_total, color_cols=None, show_total=True, column_config=None):
+    """Exibe df_main com o Totalizador (df_total) logo abaixo SE show_total for True."""
+    has_total = show_total and not df_total.empty
+    show_table(df_main, df_total if has_total else None, column_config=column_config, color_cols=color_cols)
+
+# ==================== HELPER DE FORMATOS (COLUMN_CONFIG) ====================
+def get_table_config(columns, delta_brl=False):
     """
-    Concatena df_main e df_total SE show_total for True.
-    Aplica a estilização na última linha apenas se o total estiver presente.
-    Aceita column_config para customização de cabeçalhos e tooltips.
+    Formato numérico de cada coluna pelo nome. 'Custo Médio Unitário' vira
+    'CMU ℹ️' com tooltip. delta_brl: a coluna 'Δ' é monetária (senão, contagem).
     """
-    
-    # 1. Concatenação (União das tabelas)
-    if show_total and not df_total.empty:
-        # Garante que as colunas estejam alinhadas
-        df_combined = pd.concat([df_main, df_total], ignore_index=True)
-    else:
-        df_combined = df_main.copy()
-
-    # 2. Definição da função de estilo para a linha de Total
-    def highlight_total_row(row):
-        # Só destaca se o total estiver ativado e for a última linha
-        if show_total and not df_total.empty and row.name == (len(df_combined) - 1):
-            return ['background-color: #e6f3ff; font-weight: bold; color: #003366'] * len(row)
-        return [''] * len(row)
-
-    # 3. Aplicação dos estilos
-    # Primeiro aplicamos o destaque da linha total (se houver)
-    styler = df_combined.style.apply(highlight_total_row, axis=1)
-
-    # Depois aplicamos as cores condicionais (verde/vermelho) nas colunas de variação
-    if color_cols:
-        styler = styler.map(color_delta, subset=[c for c in color_cols if c in df_combined.columns])
-
-    # Se houver formatação numérica específica
-    if format_dict:
-        styler = styler.format(format_dict)
-
-    # Mescla configurações padrão com as passadas
-    final_config = {"#": st.column_config.TextColumn("#", width="small")}
-    if column_config:
-        final_config.update(column_config)
-
-    # 4. Renderização
-    st.dataframe(
-        styler,
-        hide_index=True, 
-        width="stretch", 
-        column_config=final_config
-    )
-
-    # Retorna o DF combinado para uso na exportação
-    return df_combined
-
-# ==================== HELPER PARA TOOLTIPS DE CMU ====================
-def get_cmu_config(columns):
-    """Gera configuração de colunas para substituir 'Custo Médio Unitário' por 'CMU ℹ️'."""
     config = {}
     for col in columns:
-        if "Custo Médio Unitário" in col:
+        if col == "Δ%":
+            config[col] = pct_column(col, signed=True)
+        elif col == "Share %":
+            config[col] = pct_column(col)
+        elif col == "Δ":
+            config[col] = brl_column(col) if delta_brl else int_column(col)
+        elif "Custo Médio Unitário" in col:
             # Ex: "Custo Médio Unitário (2024)" -> "CMU 2024 ℹ️"
-            # Ex: "Custo Médio Unitário" -> "CMU ℹ️"
             label = col.replace("Custo Médio Unitário", "CMU").replace("(", "").replace(")", "").strip() + " ℹ️"
-            config[col] = st.column_config.Column(
-                label=label,
-                help="Custo Médio Unitário"
-            )
+            config[col] = brl_column(label, help="Custo Médio Unitário")
+        elif col.startswith(("Faturamento", "Fat.", "Média Invest.")):
+            config[col] = brl_column(col)
+        elif col.startswith(("Ins.", "Inserções", "Total Inserções", "Clientes")):
+            config[col] = int_column(col)
+        elif col == "Média Inserções/Cliente":
+            config[col] = decimal_column(col)
     return config
 
-# ==================== RENDERIZAÇÃO DA PÁGINA ====================
-def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
-    st.markdown("<h2 style='text-align: center; color: #003366;'>Clientes & Faturamento</h2>", unsafe_allow_html=True)
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+def combined_table(df_main, df_total, show_total=True):
+    """Tabela da exportação: df_main com o Totalizador embaixo SE show_total for True."""
+    if show_total and not df_total.empty:
+        return pd.concat([df_main, df_total], ignore_index=True)
+    return df_main.copy()
 
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+@result_cache.cached
+def compute_clientes_faturamento(base, mes_ini, mes_fim, show_total=True):
+    """
+    Tabelas da página sem Streamlit: {"ano_base", "ano_comp", "secoes",
+    "export"}, com cada seção em {"titulo", "main", "total", "color_cols",
+    "delta_brl"} ("main" None quando a seção não tem dados). None se não há
+    anos válidos; ValueError se falta a coluna de faturamento.
+    """
     # Normalização
-    df = df.rename(columns={c: c.lower() for c in df.columns})
+    df = base.rename(columns={c: c.lower() for c in base.columns})
     if "faturamento" not in df.columns:
-        st.error("Coluna 'Faturamento' ausente na base.")
-        return
+        raise ValueError("Coluna 'Faturamento' ausente na base.")
     if "insercoes" not in df.columns:
         df["insercoes"] = 0.0
 
     # Anos
     anos = sorted(df["ano"].dropna().unique())
-    if not anos: st.info("Sem anos válidos."); return
+    if not anos: return None
     if len(anos) >= 2: ano_base, ano_comp = anos[-2], anos[-1]
     else: ano_base = ano_comp = anos[-1]
 
     base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
+    secoes = []
+
+    def add_secao(titulo, main, total, color_cols=None, delta_brl=False):
+        secoes.append({"titulo": titulo, "main": main, "total": total, "color_cols": color_cols, "delta_brl": delta_brl})
 
     # Helper de métricas
     def enrich_with_metrics_split(df_main, group_col):
@@ -152,7 +106,6 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
         return df_merged
 
     # ==================== 1. CLIENTES POR EMISSORA ====================
-    st.subheader("1. Número de Clientes por Emissora (Comparativo)")
     base_clientes_raw = base_periodo.groupby(["emissora", "ano"])["cliente"].nunique().unstack(fill_value=0).reset_index()
     for ano in [ano_base, ano_comp]:
         if ano not in base_clientes_raw.columns: base_clientes_raw[ano] = 0
@@ -196,23 +149,11 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     df_1_main.columns = df_1_main.columns.map(str)
     df_1_total.columns = df_1_total.columns.map(str)
     
-    # Formatação Específica
-    df_1_main["Δ%"] = df_1_main["Δ%"].apply(format_percent_col)
-    df_1_total["Δ%"] = df_1_total["Δ%"].apply(format_percent_col)
     df_1_main['#'] = df_1_main['#'].astype(str)
 
-    # EXIBE COMBINADO (COM CONTROLE DO TOTAL)
-    export_1 = display_combined_table(
-        df_1_main, 
-        df_1_total, 
-        format_dict=None, 
-        color_cols=["Δ", "Δ%"],
-        show_total=show_total
-    )
-    st.divider()
+    add_secao("1. Número de Clientes por Emissora (Comparativo)", df_1_main, df_1_total, color_cols=["Δ", "Δ%"])
 
     # ==================== 2. FATURAMENTO POR EMISSORA ====================
-    st.subheader("2. Faturamento por Emissora (com Eficiência)")
     base_emissora_raw = base_periodo.groupby(["emissora", "ano"])["faturamento"].sum().unstack(fill_value=0).reset_index()
     for ano in [ano_base, ano_comp]:
         if ano not in base_emissora_raw.columns: base_emissora_raw[ano] = 0.0
@@ -262,24 +203,11 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # Format
     for d in [df_2_main, df_2_total]:
         if not d.empty:
-            d["Δ%"] = d["Δ%"].apply(format_percent_col)
-            d[f"Ins. {ano_base}"] = d[f"Ins. {ano_base}"].apply(format_int)
-            d[f"Ins. {ano_comp}"] = d[f"Ins. {ano_comp}"].apply(format_int)
-            d[f"Custo Médio Unitário ({ano_base})"] = d[f"Custo Médio Unitário ({ano_base})"].apply(brl)
-            d[f"Custo Médio Unitário ({ano_comp})"] = d[f"Custo Médio Unitário ({ano_comp})"].apply(brl)
             d['#'] = d['#'].astype(str)
 
-    export_2 = display_combined_table(
-        df_2_main, df_2_total,
-        format_dict={f"Faturamento {ano_base}": brl, f"Faturamento {ano_comp}": brl, "Δ": brl},
-        color_cols=["Δ", "Δ%"],
-        show_total=show_total,
-        column_config=get_cmu_config(df_2_main.columns)
-    )
-    st.divider()
+    add_secao("2. Faturamento por Emissora (com Eficiência)", df_2_main, df_2_total, color_cols=["Δ", "Δ%"], delta_brl=True)
 
     # ==================== 3. FATURAMENTO POR EXECUTIVO ====================
-    st.subheader("3. Faturamento por Executivo (com Eficiência)")
     tx_raw = base_periodo.groupby(["executivo", "ano"])["faturamento"].sum().unstack(fill_value=0).reset_index()
     for ano in [ano_base, ano_comp]:
         if ano not in tx_raw.columns: tx_raw[ano] = 0.0
@@ -326,24 +254,11 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
     for d in [df_3_main, df_3_total]:
         if not d.empty:
-            d["Δ%"] = d["Δ%"].apply(format_percent_col)
-            d[f"Ins. {ano_base}"] = d[f"Ins. {ano_base}"].apply(format_int)
-            d[f"Ins. {ano_comp}"] = d[f"Ins. {ano_comp}"].apply(format_int)
-            d[f"Custo Médio Unitário ({ano_base})"] = d[f"Custo Médio Unitário ({ano_base})"].apply(brl)
-            d[f"Custo Médio Unitário ({ano_comp})"] = d[f"Custo Médio Unitário ({ano_comp})"].apply(brl)
             d['#'] = d['#'].astype(str)
 
-    export_3 = display_combined_table(
-        df_3_main, df_3_total,
-        format_dict={f"Faturamento {ano_base}": brl, f"Faturamento {ano_comp}": brl, "Δ": brl},
-        color_cols=["Δ", "Δ%"],
-        show_total=show_total,
-        column_config=get_cmu_config(df_3_main.columns)
-    )
-    st.divider()
+    add_secao("3. Faturamento por Executivo (com Eficiência)", df_3_main, df_3_total, color_cols=["Δ", "Δ%"], delta_brl=True)
 
     # ==================== 4. MÉDIAS ====================
-    st.subheader("4. Médias por Cliente (Investimento e Inserções)")
     t16_raw = base_periodo.groupby("emissora").agg(
         Faturamento=("faturamento", "sum"), Insercoes=("insercoes", "sum"), Clientes=("cliente", "nunique")
     ).reset_index()
@@ -374,17 +289,11 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
     for d in [df_4_main, df_4_total]:
         if not d.empty:
-            d["Faturamento"] = d["Faturamento"].apply(brl)
-            d["Total Inserções"] = d["Total Inserções"].apply(format_int)
-            d["Média Invest./Cliente"] = d["Média Invest./Cliente"].apply(brl)
-            d["Média Inserções/Cliente"] = d["Média Inserções/Cliente"].apply(lambda x: f"{x:,.1f}" if pd.notna(x) else "-")
             d['#'] = d['#'].astype(str)
 
-    export_4 = display_combined_table(df_4_main, df_4_total, show_total=show_total)
-    st.divider()
+    add_secao("4. Médias por Cliente (Investimento e Inserções)", df_4_main, df_4_total)
 
     # ==================== 5. FATURAMENTO TOTAL ====================
-    st.subheader("5. Faturamento por Emissora (Total)")
     t15_simple = base_periodo.groupby("emissora", as_index=False).agg(
         Faturamento=("faturamento", "sum"), Insercoes=("insercoes", "sum")
     ).sort_values("Faturamento", ascending=False)
@@ -408,20 +317,11 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
     for d in [df_5_main, df_5_total]:
         if not d.empty:
-            d["Faturamento"] = d["Faturamento"].apply(brl)
-            d["Inserções"] = d["Inserções"].apply(format_int)
-            d["Custo Médio Unitário"] = d["Custo Médio Unitário"].apply(brl)
             d['#'] = d['#'].astype(str)
 
-    export_5 = display_combined_table(
-        df_5_main, df_5_total, 
-        show_total=show_total,
-        column_config=get_cmu_config(df_5_main.columns)
-    )
-    st.divider()
+    add_secao("5. Faturamento por Emissora (Total)", df_5_main, df_5_total)
 
     # ==================== 6. COMPARATIVO MÊS A MÊS ====================
-    st.subheader("6. Comparativo mês a mês")
     mes_map = {1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun", 7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"}
     base_para_tabela = base_periodo.copy()
     base_para_tabela["mes_nome"] = base_para_tabela["mes"].map(mes_map)
@@ -477,27 +377,14 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
         for d in [df_6_main, df_6_total]:
             d.columns = d.columns.map(str)
-            for col in d.columns:
-                if "Fat." in col: d[col] = d[col].apply(brl)
-                if "Ins." in col: d[col] = d[col].apply(format_int)
-                if "Custo" in col:
-                    new_name = col.replace("Custo", "Custo Médio Unitário")
-                    d.rename(columns={col: new_name}, inplace=True)
-                    d[new_name] = d[new_name].apply(brl)
-
-        export_6 = display_combined_table(
-            df_6_main, df_6_total, 
-            show_total=show_total,
-            column_config=get_cmu_config(df_6_main.columns)
-        )
+            d.rename(columns={col: col.replace("Custo", "Custo Médio Unitário") for col in d.columns if "Custo" in col}, inplace=True)
+
+        add_secao("6. Comparativo mês a mês", df_6_main, df_6_total)
     else:
-        st.info("Sem dados mensais.")
-        export_6 = None
+        add_secao("6. Comparativo mês a mês", None, None)
     
-    st.divider()
 
     # ==================== 7. RELAÇÃO DE CLIENTES ====================
-    st.subheader(f"7. Relação de Clientes ({ano_base} vs {ano_comp})")
     
     t17_fat = base_periodo.groupby(["cliente", "ano"])["faturamento"].sum().unstack(fill_value=0)
     t17_ins = base_periodo.groupby(["cliente", "ano"])["insercoes"].sum().unstack(fill_value=0)
@@ -554,9 +441,6 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     for d in [df_7_main, df_7_total]:
         if not d.empty:
             d.rename(columns=rename_7, inplace=True)
-            for col in d.columns:
-                if "Faturamento" in col or "Custo" in col: d[col] = d[col].apply(brl)
-                if "Inserções" in col: d[col] = d[col].apply(format_int)
     
     # Ordenação colunas - Agrupar por Tema (Fat 24, Fat 25, Ins 24, Ins 25...)
     final_cols = ["Cliente"]
@@ -580,13 +464,55 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     df_7_main = df_7_main[final_cols]
     df_7_total = df_7_total[final_cols] if not df_7_total.empty else df_7_total
 
-    export_7 = display_combined_table(
-        df_7_main, df_7_total,
-        format_dict={"Share %": "{:.2f}%"},
-        show_total=show_total,
-        column_config=get_cmu_config(df_7_main.columns)
-    )
-    st.divider()
+    add_secao(f"7. Relação de Clientes ({ano_base} vs {ano_comp})", df_7_main, df_7_total)
+
+    # --- Exportação (chaves padronizadas com " (Dados)") ---
+    nomes_export = [
+        "1. Número de Clientes por Emissora (Comparativo) (Dados)",
+        "2. Faturamento por Emissora (com Eficiência) (Dados)",
+        "3. Faturamento por Executivo (com Eficiência) (Dados)",
+        "4. Médias por Cliente (Investimento e Inserções) (Dados)",
+        "5. Faturamento por Emissora (Total) (Dados)",
+        "6. Comparativo mês a mês (Dados)",
+        "7. Relação de Clientes Detalhada (Dados)",
+    ]
+    table_options = {
+        nome: {'df': combined_table(sec["main"], sec["total"], show_total) if sec["main"] is not None else None}
+        for nome, sec in zip(nomes_export, secoes)
+    }
+    # Filtra apenas o que existe
+    export = {k: v for k, v in table_options.items() if v['df'] is not None and not v['df'].empty}
+
+    return {"ano_base": ano_base, "ano_comp": ano_comp, "secoes": secoes, "export": export}
+
+# ==================== RENDERIZAÇÃO DA PÁGINA ====================
+def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
+    st.markdown("<h2 style='text-align: center; color: #003366;'>Clientes & Faturamento</h2>", unsafe_allow_html=True)
+    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+
+    try:
+        with perf.span("aggregate", rows=len(df)):
+            res = compute_clientes_faturamento(df, mes_ini, mes_fim, show_total)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if res is None:
+        st.info("Sem anos válidos.")
+        return
+
+    for sec in res["secoes"]:
+        st.subheader(sec["titulo"])
+        if sec["main"] is None:
+            st.info("Sem dados mensais.")
+        else:
+            # EXIBE COMBINADO (COM CONTROLE DO TOTAL)
+            display_combined_table(
+                sec["main"], sec["total"],
+                color_cols=sec["color_cols"],
+                show_total=show_total,
+                column_config=get_table_config(sec["main"].columns, delta_brl=sec["delta_brl"])
+            )
+        st.divider()
 
     # ==================== EXPORTAÇÃO ====================
     if st.button("📥 Exportar Dados da Página", type="secondary"):
@@ -599,19 +525,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
         @st.dialog("Opções de Exportação - Clientes & Faturamento")
         def export_dialog():
             
-            # Chaves padronizadas com " (Dados)"
-            table_options = {
-                "1. Número de Clientes por Emissora (Comparativo) (Dados)": {'df': export_1},
-                "2. Faturamento por Emissora (com Eficiência) (Dados)": {'df': export_2},
-                "3. Faturamento por Executivo (com Eficiência) (Dados)": {'df': export_3},
-                "4. Médias por Cliente (Investimento e Inserções) (Dados)": {'df': export_4},
-                "5. Faturamento por Emissora (Total) (Dados)": {'df': export_5},
-                "6. Comparativo mês a mês (Dados)": {'df': export_6},
-                "7. Relação de Clientes Detalhada (Dados)": {'df': export_7},
-            }
-            
-            # Filtra apenas o que existe
-            final_options = {k: v for k, v in table_options.items() if v['df'] is not None and not v['df'].empty}
+            final_options = res["export"]
 
             if not final_options:
                 st.warning("Nenhuma tabela com dados foi gerada.")
@@ -620,6 +534,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
             st.write("Selecione os itens para exportar:")
             selected_names = st.multiselect("Itens", options=final_options.keys(), default=final_options.keys())
+            formatos = export_format_selector("clientes_faturamento_export_formatos")
             tables_to_export = {name: final_options[name] for name in selected_names}
 
             if not tables_to_export:
@@ -640,8 +555,14 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                             f"Emissoras: {emis} | Executivos: {execs} | Clientes: {clientes}")
 
                 filtro_str = get_filter_string()
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename="Dashboard_Clientes_Faturamento.xlsx")
-                st.download_button("Clique para baixar", data=zip_data, file_name="Dashboard_Clientes_Faturamento.zip", mime="application/zip", on_click=lambda: st.session_state.update(show_clientes_export=False), type="secondary")
+                background_export(
+                    "clientes_faturamento_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename="Dashboard_Clientes_Faturamento.xlsx", formats=formatos),
+                    "Dashboard_Clientes_Faturamento.zip", ZIP_MIME, job_label="Clientes & Faturamento (ZIP)",
+                    signature={"pagina": "clientes_faturamento", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_clientes_export=False),
+                )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
 
@@ -3,66 +3,87 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from utils.format import brl, PALETTE
+from utils.format import PALETTE, format_int_array, format_brl_abrev_array
+from utils.tables import show_table, split_total, number_config
 import plotly.graph_objects as go
 import plotly.express as px
-from itertools import combinations
-from utils.export import create_zip_package 
-
-def format_int(val):
-    """Formata inteiros com separador de milhar."""
-    if pd.isna(val) or val == 0: return "-"
-    return f"{int(val):,}".replace(",", ".")
+from utils.client_matrix import ClientMatrix
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== FUNÇÃO AUXILIAR DE ESTILO ====================
-def display_styled_table(df):
+def display_styled_table(df, column_config=None):
     """
-    Renderiza o dataframe aplicando estilo de destaque (Totalizador) na última linha.
+    Renderiza o dataframe com o Totalizador (Emissora/Cliente = "Totalizador") destacado abaixo.
     """
     if df.empty: return
-
-    def highlight_total_row(row):
-        # Tenta identificar pela coluna
-        is_total = False
-        if "Emissora" in df.columns and row["Emissora"] == "Totalizador": is_total = True
-        elif "Cliente" in df.columns and row["Cliente"] == "Totalizador": is_total = True
-        
-        if is_total:
-            return ['background-color: #e6f3ff; font-weight: bold; color: #003366'] * len(row)
-        return [''] * len(row)
-
-    st.dataframe(
-        df.style.apply(highlight_total_row, axis=1), 
-        width='stretch', 
-        hide_index=True, 
-        column_config={"#": st.column_config.TextColumn("#", width="small")}
-    )
-
-def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
-    def format_pt_br_abrev(val):
-        if pd.isna(val) or val == 0: return brl(0) 
-        if val >= 1_000_000: return f"R$ {val/1_000_000:,.1f} Mi"
-        if val >= 1_000: return f"R$ {val/1_000:,.0f} mil"
-        return brl(val)
-
-    # ==================== TÍTULO CENTRALIZADO ====================
-    st.markdown("<h2 style='text-align: center; color: #003366;'>Cruzamentos & Interseções entre Emissoras</h2>", unsafe_allow_html=True)
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
-
-    # Inicialização para exportação
-    df_excl_raw = pd.DataFrame()
-    df_comp_raw = pd.DataFrame()
-    df_ausentes_raw = pd.DataFrame()
-    top_shared_raw = pd.DataFrame()
-    mat_raw = pd.DataFrame()
-    pivot_cost_display = pd.DataFrame() 
-    fig_mat = go.Figure() 
-
-    df = df.rename(columns={c: c.lower() for c in df.columns})
+    main, total = split_total(df)
+    show_table(main, total, column_config=column_config)
+
+# Métrica da matriz de interseção -> rótulo do botão/título
+METRIC_LABELS = {
+    "Clientes": "Clientes em comum",
+    "Faturamento": "Faturamento em comum (R$)",
+    "Insercoes": "Inserções em comum (Qtd)",
+}
+
+def _numerar(tabela, show_total):
+    """Coluna # (1..n, e "Total" na linha do Totalizador)."""
+    if show_total:
+         tabela.insert(0, "#", list(range(1, len(tabela))) + ["Total"])
+    else:
+         tabela.insert(0, "#", list(range(1, len(tabela) + 1)))
+    return tabela
+
+def fig_matriz(mat_raw, metric, show_labels):
+    """Heatmap da matriz de interseção."""
+    z = mat_raw.values
+    if metric == "Clientes":
+        hover = "<b>%{y} x %{x}</b><br>Clientes: %{z}<extra></extra>"
+        z_text = z.astype(int).astype(str) 
+    elif metric == "Faturamento": 
+        hover = "<b>%{y} x %{x}</b><br>Valor: R$ %{z:,.2f}<extra></extra>"
+        z_text = format_brl_abrev_array(z)
+    else: 
+        hover = "<b>%{y} x %{x}</b><br>Inserções: %{z:,.0f}<extra></extra>"
+        z_text = format_int_array(z)
+
+    # Contraste do rótulo calculado para a matriz inteira de uma vez
+    max_val = np.nanmax(z) if z.size > 0 else 0
+    celula_escura = z > max_val * 0.4
+
+    fig_mat = go.Figure(data=go.Heatmap(z=z, x=mat_raw.columns, y=mat_raw.index, colorscale="Blues", hovertemplate=hover, showscale=True))
+    if show_labels:
+        # Rótulos no próprio trace (text/texttemplate) em vez de uma annotation por célula.
+        # O heatmap aceita uma única cor de texto: as células escuras recebem o
+        # rótulo branco numa camada transparente por cima.
+        fig_mat.update_traces(text=np.where(celula_escura, "", z_text), texttemplate="%{text}", textfont=dict(color="black", size=12))
+        fig_mat.add_trace(go.Heatmap(
+            z=z, x=mat_raw.columns, y=mat_raw.index,
+            text=np.where(celula_escura, z_text, ""), texttemplate="%{text}", textfont=dict(color="white", size=12),
+            colorscale=[[0, "rgba(0,0,0,0)"], [1, "rgba(0,0,0,0)"]], showscale=False, hoverinfo="skip"
+        ))
+
+    fig_mat.update_layout(height=420, template="plotly_white", margin=dict(l=0, r=10, t=10, b=0))
+    
+    # --- TRAVA DE INTERAÇÃO (HEATMAP) ---
+    fig_mat.update_xaxes(fixedrange=True)
+    fig_mat.update_yaxes(fixedrange=True)
+    return fig_mat
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+@result_cache.cached
+def compute_cruzamentos_intersecoes(base, mes_ini, mes_fim, metric="Clientes", show_labels=False, show_total=True):
+    """
+    Tabelas e matriz da página sem Streamlit: dict com "excl", "comp",
+    "ausentes", "top_shared" e "custo" (None sem clientes compartilhados),
+    "matriz"/"fig_mat" (None com menos de 2 emissoras) e "export". None se o
+    período não tem dados; ValueError se faltam colunas obrigatórias.
+    """
+    df = base.rename(columns={c: c.lower() for c in base.columns})
 
     if "cliente" not in df.columns or "emissora" not in df.columns or "faturamento" not in df.columns:
-        st.error("Colunas obrigatórias 'Cliente', 'Emissora' e 'Faturamento' ausentes.")
-        return
+        raise ValueError("Colunas obrigatórias 'Cliente', 'Emissora' e 'Faturamento' ausentes.")
     
     if "insercoes" not in df.columns:
         df["insercoes"] = 0.0
@@ -70,89 +91,76 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
 
     if base_periodo.empty:
-        st.info("Sem dados para o período selecionado.")
-        return
+        return None
 
     # Agrupamento Base
     agg = base_periodo.groupby(["cliente", "emissora"], as_index=False).agg(
         faturamento=("faturamento", "sum"),
         insercoes=("insercoes", "sum")
     )
-    agg["presenca"] = np.where(agg["faturamento"] > 0, 1, 0)
 
-    # Pivôs para cálculos
-    pres_pivot = agg.pivot_table(index="cliente", columns="emissora", values="presenca", fill_value=0)
-    # Garante que todas as emissoras do dataframe filtrado apareçam nas colunas
-    emissoras = sorted(agg["emissora"].unique())
-    
-    # Contagem de Emissoras por Cliente
-    emis_count = pres_pivot.sum(axis=1)
+    # Matriz esparsa cliente × emissora: todas as métricas saem dela
+    mtx = ClientMatrix.from_agg(agg)
+    emissoras = list(mtx.emissoras)
+    clientes = np.asarray(mtx.clientes)
     
-    # Lista de todos os clientes únicos no período (Mercado Total Filtrado)
-    todos_clientes = set(agg["cliente"].unique())
+    # Presença = faturamento positivo no par (cliente, emissora)
+    presenca = mtx.fat > 0
     
-    st.divider()
+    # Contagem de Emissoras por Cliente (soma das linhas)
+    emis_count = mtx.row_sum(mask=presenca)
 
     # ==================== CÁLCULOS GERAIS ====================
     exclusivos_mask = emis_count == 1
     compartilhados_mask = emis_count >= 2
 
-    excl_info, comp_info, ausentes_info = [], [], []
     fat_total_geral = agg["faturamento"].sum() 
-
-    for emis in emissoras:
-        # --- 1. EXCLUSIVOS ---
-        cli_excl = pres_pivot.loc[exclusivos_mask & (pres_pivot[emis] == 1)].index
-        dados_excl = agg[(agg["cliente"].isin(cli_excl)) & (agg["emissora"] == emis)]
-        
-        fat_excl = dados_excl["faturamento"].sum()
-        ins_excl = dados_excl["insercoes"].sum()
-        
-        # --- 2. COMPARTILHADOS ---
-        cli_comp = pres_pivot.loc[compartilhados_mask & (pres_pivot[emis] == 1)].index
-        dados_comp = agg[(agg["cliente"].isin(cli_comp)) & (agg["emissora"] == emis)]
-        
-        fat_comp = dados_comp["faturamento"].sum()
-        ins_comp = dados_comp["insercoes"].sum()
-        
-        # --- 3. AUSENTES (NOVO) ---
-        clientes_emis = set(agg[agg["emissora"] == emis]["cliente"].unique())
-        lista_ausentes = list(todos_clientes - clientes_emis)
-        dados_ausentes = agg[agg["cliente"].isin(lista_ausentes)]
-        
-        fat_ausente = dados_ausentes["faturamento"].sum()
-        ins_ausente = dados_ausentes["insercoes"].sum()
-        qtd_ausentes = len(lista_ausentes)
-
-        dados_total = agg[agg["emissora"] == emis]
-        fat_total_emis = dados_total["faturamento"].sum()
-        
-        # Appends
-        excl_info.append({
-            "Emissora": emis, 
-            "Clientes Exclusivos": len(cli_excl),
-            "Faturamento Exclusivo": fat_excl, 
-            "Inserções Exclusivas": ins_excl,
-            "% Faturamento": (fat_excl / fat_total_emis * 100) if fat_total_emis > 0 else 0
-        })
-        comp_info.append({
-            "Emissora": emis, 
-            "Clientes Compartilhados": len(cli_comp),
-            "Faturamento Compartilhado": fat_comp, 
-            "Inserções Compartilhadas": ins_comp,
-            "% Faturamento": (fat_comp / fat_total_emis * 100) if fat_total_emis > 0 else 0
-        })
-        ausentes_info.append({
-            "Emissora": emis,
-            "Clientes Ausentes": qtd_ausentes,
-            "Faturamento Perdido (Oportunidade)": fat_ausente,
-            "Inserções Perdidas": ins_ausente,
-            "% Share Perdido": (fat_ausente / fat_total_geral * 100) if fat_total_geral > 0 else 0
-        })
+    ins_total_geral = agg["insercoes"].sum()
+
+    # Entradas presentes de clientes exclusivos / compartilhados
+    excl_ent = presenca & exclusivos_mask[mtx.cli]
+    comp_ent = presenca & compartilhados_mask[mtx.cli]
+
+    # Totais por cliente e por emissora
+    fat_cliente = mtx.row_sum(mtx.fat)
+    ins_cliente = mtx.row_sum(mtx.ins)
+    fat_total_emis = mtx.col_sum(mtx.fat)
+
+    def pct(num, den):
+        return np.divide(num * 100, den, out=np.zeros(len(emissoras)), where=den > 0)
+
+    # 1. Exclusivos e 2. Compartilhados (somas por coluna)
+    fat_excl = mtx.col_sum(mtx.fat, excl_ent)
+    fat_comp = mtx.col_sum(mtx.fat, comp_ent)
+
+    # 3. Ausentes: clientes sem nenhum registro na emissora
+    tem_registro = mtx.col_sum()
+    fat_ausente = fat_total_geral - mtx.col_sum(fat_cliente[mtx.cli])
+    ins_ausente = ins_total_geral - mtx.col_sum(ins_cliente[mtx.cli])
+
+    df_excl_raw = pd.DataFrame({
+        "Emissora": emissoras,
+        "Clientes Exclusivos": mtx.col_sum(mask=excl_ent).astype(int),
+        "Faturamento Exclusivo": fat_excl,
+        "Inserções Exclusivas": mtx.col_sum(mtx.ins, excl_ent),
+        "% Faturamento": pct(fat_excl, fat_total_emis)
+    })
+    df_comp_raw = pd.DataFrame({
+        "Emissora": emissoras,
+        "Clientes Compartilhados": mtx.col_sum(mask=comp_ent).astype(int),
+        "Faturamento Compartilhado": fat_comp,
+        "Inserções Compartilhadas": mtx.col_sum(mtx.ins, comp_ent),
+        "% Faturamento": pct(fat_comp, fat_total_emis)
+    })
+    df_ausentes_raw = pd.DataFrame({
+        "Emissora": emissoras,
+        "Clientes Ausentes": (mtx.n_clientes - tem_registro).astype(int),
+        "Faturamento Perdido (Oportunidade)": fat_ausente,
+        "Inserções Perdidas": ins_ausente,
+        "% Share Perdido": pct(fat_ausente, np.full(len(emissoras), fat_total_geral))
+    })
 
     # ==================== 1. EXCLUSIVOS ====================
-    st.subheader("1. Clientes Exclusivos por Emissora")
-    df_excl_raw = pd.DataFrame(excl_info) 
     if not df_excl_raw.empty:
         df_excl_raw = df_excl_raw.sort_values("Faturamento Exclusivo", ascending=False).reset_index(drop=True)
         
@@ -166,25 +174,9 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 "% Faturamento": (df_excl_raw["Faturamento Exclusivo"].sum() / fat_total_geral * 100) if fat_total_geral > 0 else np.nan
             }
             df_excl_raw = pd.concat([df_excl_raw, pd.DataFrame([total_row])], ignore_index=True)
-        
-        if show_total:
-             df_excl_raw.insert(0, "#", list(range(1, len(df_excl_raw))) + ["Total"])
-        else:
-             df_excl_raw.insert(0, "#", list(range(1, len(df_excl_raw) + 1)))
-        
-        df_excl_display = df_excl_raw.copy()
-        df_excl_display['#'] = df_excl_display['#'].astype(str)
-        df_excl_display["Faturamento Exclusivo"] = df_excl_display["Faturamento Exclusivo"].apply(brl)
-        df_excl_display["Inserções Exclusivas"] = df_excl_display["Inserções Exclusivas"].apply(format_int)
-        df_excl_display["% Faturamento"] = df_excl_display["% Faturamento"].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "—")
-        
-        display_styled_table(df_excl_display)
-    else: st.info("Nenhum cliente exclusivo encontrado.")
-    st.divider()
+        _numerar(df_excl_raw, show_total)
 
     # ==================== 2. COMPARTILHADOS ====================
-    st.subheader("2. Clientes Compartilhados por Emissora")
-    df_comp_raw = pd.DataFrame(comp_info) 
     if not df_comp_raw.empty:
         df_comp_raw = df_comp_raw.sort_values("Faturamento Compartilhado", ascending=False).reset_index(drop=True)
         
@@ -198,26 +190,9 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 "% Faturamento": (df_comp_raw["Faturamento Compartilhado"].sum() / fat_total_geral * 100) if fat_total_geral > 0 else np.nan
             }
             df_comp_raw = pd.concat([df_comp_raw, pd.DataFrame([total_row])], ignore_index=True)
-        
-        if show_total:
-             df_comp_raw.insert(0, "#", list(range(1, len(df_comp_raw))) + ["Total"])
-        else:
-             df_comp_raw.insert(0, "#", list(range(1, len(df_comp_raw) + 1)))
-        
-        df_comp_display = df_comp_raw.copy()
-        df_comp_display['#'] = df_comp_display['#'].astype(str)
-        df_comp_display["Faturamento Compartilhado"] = df_comp_display["Faturamento Compartilhado"].apply(brl)
-        df_comp_display["Inserções Compartilhadas"] = df_comp_display["Inserções Compartilhadas"].apply(format_int)
-        df_comp_display["% Faturamento"] = df_comp_display["% Faturamento"].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "—")
-        
-        display_styled_table(df_comp_display)
-    else: st.info("Nenhum cliente compartilhado encontrado.")
-    st.divider()
+        _numerar(df_comp_raw, show_total)
 
     # ==================== 3. AUSENTES (NOVO) ====================
-    st.subheader("3. Clientes Ausentes por Emissora (Oportunidade)")
-    df_ausentes_raw = pd.DataFrame(ausentes_info)
-    
     if not df_ausentes_raw.empty:
         df_ausentes_raw = df_ausentes_raw.sort_values("Faturamento Perdido (Oportunidade)", ascending=False).reset_index(drop=True)
         
@@ -231,46 +206,35 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 "% Share Perdido": np.nan 
             }
             df_ausentes_raw = pd.concat([df_ausentes_raw, pd.DataFrame([total_row])], ignore_index=True)
-        
-        if show_total:
-             df_ausentes_raw.insert(0, "#", list(range(1, len(df_ausentes_raw))) + ["Total"])
-        else:
-             df_ausentes_raw.insert(0, "#", list(range(1, len(df_ausentes_raw) + 1)))
-        
-        df_ausentes_display = df_ausentes_raw.copy()
-        df_ausentes_display['#'] = df_ausentes_display['#'].astype(str)
-        df_ausentes_display["Faturamento Perdido (Oportunidade)"] = df_ausentes_display["Faturamento Perdido (Oportunidade)"].apply(brl)
-        df_ausentes_display["Inserções Perdidas"] = df_ausentes_display["Inserções Perdidas"].apply(format_int)
-        df_ausentes_display["% Share Perdido"] = df_ausentes_display["% Share Perdido"].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "—")
-        
-        display_styled_table(df_ausentes_display)
-    else:
-        st.success("Incrível! Todas as emissoras atendem a todos os clientes do filtro (Nenhum ausente).")
-    
-    st.divider()
+        _numerar(df_ausentes_raw, show_total)
 
     # ==================== 4. TOP CLIENTES COMPARTILHADOS ====================
-    st.subheader("4. Top clientes compartilhados (2+ emissoras)")
+    top_shared_raw = None
     if compartilhados_mask.any():
-        share_clients_idx = pres_pivot[compartilhados_mask].index
-        
         custom_order = ["Difusora", "Novabrasil", "Th+ Prime", "Thathi Tv"]
         order_map = {name.lower(): i for i, name in enumerate(custom_order)}
 
-        def get_emissoras_str(row):
-            emis_ativas = row.index[row == 1].tolist()
-            emis_ativas.sort(key=lambda x: (order_map.get(x.lower(), 999), x))
-            return ", ".join(emis_ativas)
-
-        df_emis_list = pres_pivot.loc[share_clients_idx].apply(get_emissoras_str, axis=1)
-        
-        top_shared_raw = (base_periodo[base_periodo["cliente"].isin(share_clients_idx)]
-                          .groupby("cliente", as_index=False)
-                          .agg(faturamento=("faturamento", "sum"), insercoes=("insercoes", "sum"))
+        top_shared_raw = (pd.DataFrame({
+                              "cliente": clientes[compartilhados_mask],
+                              "faturamento": fat_cliente[compartilhados_mask],
+                              "insercoes": ins_cliente[compartilhados_mask]
+                          })
                           .sort_values("faturamento", ascending=False)
                           .head(20))
-        
-        top_shared_raw["emissoras_compartilhadas"] = top_shared_raw["cliente"].map(df_emis_list)
+
+        # Lista de emissoras só para os clientes exibidos
+        top_codes = np.flatnonzero(compartilhados_mask)[top_shared_raw.index.to_numpy()]
+        ent_top = comp_ent & np.isin(mtx.cli, top_codes)
+        emis_por_cliente = {}
+        for c, e in zip(mtx.cli[ent_top], mtx.emi[ent_top]):
+            emis_por_cliente.setdefault(c, []).append(emissoras[e])
+
+        def get_emissoras_str(c):
+            emis_ativas = sorted(emis_por_cliente.get(c, []), key=lambda x: (order_map.get(x.lower(), 999), x))
+            return ", ".join(emis_ativas)
+
+        top_shared_raw["emissoras_compartilhadas"] = [get_emissoras_str(c) for c in top_codes]
+        top_shared_raw = top_shared_raw.reset_index(drop=True)
 
         if not top_shared_raw.empty and show_total:
             top_shared_raw = pd.concat([
@@ -282,130 +246,24 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                     "emissoras_compartilhadas": "" 
                 }])
             ], ignore_index=True)
-        
-        if show_total:
-             top_shared_raw.insert(0, "#", list(range(1, len(top_shared_raw))) + ["Total"])
-        else:
-             top_shared_raw.insert(0, "#", list(range(1, len(top_shared_raw) + 1)))
-        
-        top_shared_disp = top_shared_raw.copy().rename(columns={
-            "cliente": "Cliente", 
-            "faturamento": "Faturamento",
-            "insercoes": "Inserções",
-            "emissoras_compartilhadas": "Emissoras Compartilhadas"
-        })
-        
-        top_shared_disp['#'] = top_shared_disp['#'].astype(str)
-        top_shared_disp["Faturamento"] = top_shared_disp["Faturamento"].apply(brl)
-        top_shared_disp["Inserções"] = top_shared_disp["Inserções"].apply(format_int)
-        
-        display_styled_table(top_shared_disp)
-    else: st.info("Não há clientes compartilhados com os filtros atuais.")
-    st.divider()
+        _numerar(top_shared_raw, show_total)
 
     # ==================== 5. MATRIZ DE INTERSEÇÃO ====================
-    if "cruzamentos_metric" not in st.session_state: st.session_state.cruzamentos_metric = "Clientes"
-    metric = st.session_state.cruzamentos_metric
-    
-    btn_label_clientes = "Clientes em comum"
-    btn_label_fat = "Faturamento em comum (R$)"
-    btn_label_ins = "Inserções em comum (Qtd)"
-    
-    metric_label = metric 
-    if metric == "Clientes": metric_label = btn_label_clientes
-    elif metric == "Faturamento": metric_label = btn_label_fat
-    else: metric_label = btn_label_ins
-    
-    st.subheader(f"5. Interseções entre emissoras (matriz) - {metric_label}")
-    emis_list = sorted(list(pres_pivot.columns))
-    
-    if len(emis_list) < 2:
-        st.info("Requer pelo menos 2 emissoras para cruzamento.")
-    else:
-        col1, col2, col3 = st.columns([1, 1, 1]) 
-        
-        btn_type_clientes = "primary" if metric == "Clientes" else "secondary"
-        btn_type_fat = "primary" if metric == "Faturamento" else "secondary"
-        btn_type_ins = "primary" if metric == "Insercoes" else "secondary"
-        
-        with col1:
-            if st.button(btn_label_clientes, type=btn_type_clientes, use_container_width=True):
-                st.session_state.cruzamentos_metric = "Clientes"
-                st.rerun() 
-        with col2:
-            if st.button(btn_label_fat, type=btn_type_fat, use_container_width=True):
-                st.session_state.cruzamentos_metric = "Faturamento"
-                st.rerun() 
-        with col3:
-            if st.button(btn_label_ins, type=btn_type_ins, use_container_width=True):
-                st.session_state.cruzamentos_metric = "Insercoes"
-                st.rerun() 
-
-        mat_raw = pd.DataFrame(0.0, index=emis_list, columns=emis_list)
-        z_text = None 
-        text_colors_2d = [] 
-
+    mat_raw = fig_mat = None
+    if len(emissoras) >= 2:
         if metric == "Clientes":
-            for a, b in combinations(emis_list, 2):
-                comuns = ((pres_pivot[a] == 1) & (pres_pivot[b] == 1)).sum()
-                mat_raw.loc[a, b] = comuns
-                mat_raw.loc[b, a] = comuns
-            for e in emis_list: mat_raw.loc[e, e] = (pres_pivot[e] == 1).sum()
-            z = mat_raw.values
-            hover = "<b>%{y} x %{x}</b><br>Clientes: %{z}<extra></extra>"
-            z_text = z.astype(int).astype(str) 
-            max_val = np.nanmax(z) if z.size > 0 else 0
-            text_colors_2d = [['white' if v > max_val * 0.4 else 'black' for v in row] for row in z]
-            
+            # P^T·P: clientes em comum (diagonal = clientes da emissora)
+            mat_raw = mtx.frame(mtx.gram(presenca))
         elif metric == "Faturamento": 
-            val_pivot = agg.pivot_table(index="cliente", columns="emissora", values="faturamento", fill_value=0.0) 
-            for a, b in combinations(emis_list, 2):
-                menor = np.minimum(val_pivot[a], val_pivot[b])
-                vlr = menor[menor > 0].sum()
-                mat_raw.loc[a, b] = vlr
-                mat_raw.loc[b, a] = vlr
-            for e in emis_list: mat_raw.loc[e, e] = val_pivot[e].sum()
-            z = mat_raw.values
-            hover = "<b>%{y} x %{x}</b><br>Valor: R$ %{z:,.2f}<extra></extra>"
-            z_text = [[format_pt_br_abrev(v) for v in row] for row in z]
-            max_val = np.nanmax(z) if z.size > 0 else 0
-            text_colors_2d = [['white' if v > max_val * 0.4 else 'black' for v in row] for row in z]
-            
+            mat_raw = mtx.frame(mtx.shared_min(mtx.fat))
         else: 
-            ins_pivot = agg.pivot_table(index="cliente", columns="emissora", values="insercoes", fill_value=0.0)
-            for a, b in combinations(emis_list, 2):
-                menor = np.minimum(ins_pivot[a], ins_pivot[b])
-                vlr = menor[menor > 0].sum()
-                mat_raw.loc[a, b] = vlr
-                mat_raw.loc[b, a] = vlr
-            for e in emis_list: mat_raw.loc[e, e] = ins_pivot[e].sum()
-            z = mat_raw.values
-            hover = "<b>%{y} x %{x}</b><br>Inserções: %{z:,.0f}<extra></extra>"
-            z_text = [[format_int(v) for v in row] for row in z]
-            max_val = np.nanmax(z) if z.size > 0 else 0
-            text_colors_2d = [['white' if v > max_val * 0.4 else 'black' for v in row] for row in z]
-
-        fig_mat = go.Figure(data=go.Heatmap(z=z, x=mat_raw.columns, y=mat_raw.index, colorscale="Blues", hovertemplate=hover, showscale=True))
-        if show_labels and z_text is not None:
-            for i, row in enumerate(z):
-                for j, val in enumerate(row):
-                    fig_mat.add_annotation(x=mat_raw.columns[j], y=mat_raw.index[i], text=z_text[i][j], showarrow=False, font=dict(color=text_colors_2d[i][j]))
-
-        fig_mat.update_layout(height=420, template="plotly_white", margin=dict(l=0, r=10, t=10, b=0))
-        
-        # --- TRAVA DE INTERAÇÃO (HEATMAP) ---
-        fig_mat.update_xaxes(fixedrange=True)
-        fig_mat.update_yaxes(fixedrange=True)
-        
-        st.plotly_chart(fig_mat, width="stretch", config={'displayModeBar': False})
-        
-    st.divider()
+            mat_raw = mtx.frame(mtx.shared_min(mtx.ins))
+        fig_mat = fig_matriz(mat_raw, metric, show_labels)
 
     # ==================== 6. COMPARATIVO CUSTO UNITÁRIO ====================
-    st.subheader("6. Comparativo de Custo Médio Unitário (Clientes Compartilhados)")
-    
+    pivot_cost_display = None
     if compartilhados_mask.any():
-        share_clients_idx = pres_pivot[compartilhados_mask].index
+        share_clients_idx = clientes[compartilhados_mask]
         
         df_cost = agg[agg["cliente"].isin(share_clients_idx)].copy()
         
@@ -425,7 +283,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
         pivot_cost = pivot_cost.reindex(columns=emissoras)
         
         # Ordenação
-        client_ranking = base_periodo.groupby("cliente")["faturamento"].sum()
+        client_ranking = pd.Series(fat_cliente, index=clientes)
         pivot_cost["_sort_val"] = pivot_cost.index.map(client_ranking)
         pivot_cost = pivot_cost.sort_values("_sort_val", ascending=False).drop(columns="_sort_val")
         
@@ -441,16 +299,118 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
             total_df = pd.DataFrame([total_row_data])
             df_final = pd.concat([df_final, total_df], ignore_index=True)
         
-        # --- FORMATAÇÃO ---
-        pivot_cost_display = df_final.copy()
-        pivot_cost_display = pivot_cost_display.rename(columns={"cliente": "Cliente"})
+        pivot_cost_display = df_final.rename(columns={"cliente": "Cliente"})
+
+    # ==================== EXPORTAÇÃO ====================
+    metric_label = METRIC_LABELS.get(metric, metric)
+    # Títulos padronizados para Exportação
+    table_options = {
+        "1. Clientes Exclusivos por Emissora (Dados)": {'df': df_excl_raw},
+        "2. Clientes Compartilhados por Emissora (Dados)": {'df': df_comp_raw},
+        "3. Clientes Ausentes por Emissora (Oportunidade) (Dados)": {'df': df_ausentes_raw}, 
+        "4. Top clientes compartilhados (2+ emissoras) (Dados)": {'df': top_shared_raw},
+        f"5. Interseções entre emissoras - {metric_label} (Dados)": {'df': mat_raw.reset_index().rename(columns={'index':'Emissora'}) if mat_raw is not None else None},
+        f"5. Interseções entre emissoras - {metric_label} (Gráfico)": {'fig': fig_mat},
+        "6. Comparativo de Custo Médio Unitário (Clientes Compartilhados) (Dados)": {'df': pivot_cost_display.reset_index() if pivot_cost_display is not None else None} 
+    }
+    export = {
+        name: data for name, data in table_options.items()
+        if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None and data['fig'].data)
+    }
+
+    return {
+        "excl": df_excl_raw, "comp": df_comp_raw, "ausentes": df_ausentes_raw,
+        "top_shared": top_shared_raw, "matriz": mat_raw, "fig_mat": fig_mat,
+        "custo": pivot_cost_display, "export": export,
+    }
+
+def _show_numbered(tabela, column_config_fn):
+    """Exibe a tabela com a coluna # em texto ("Total" na última linha)."""
+    disp = tabela.copy()
+    disp['#'] = disp['#'].astype(str)
+    display_styled_table(disp, column_config_fn(disp.columns))
+
+def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
+    # ==================== TÍTULO CENTRALIZADO ====================
+    st.markdown("<h2 style='text-align: center; color: #003366;'>Cruzamentos & Interseções entre Emissoras</h2>", unsafe_allow_html=True)
+    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+
+    if "cruzamentos_metric" not in st.session_state: st.session_state.cruzamentos_metric = "Clientes"
+    metric = st.session_state.cruzamentos_metric
+
+    try:
+        with perf.span("aggregate", rows=len(df)):
+            res = compute_cruzamentos_intersecoes(df, mes_ini, mes_fim, metric, show_labels, show_total)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if res is None:
+        st.info("Sem dados para o período selecionado.")
+        return
+
+    st.divider()
+
+    # ==================== 1. EXCLUSIVOS ====================
+    st.subheader("1. Clientes Exclusivos por Emissora")
+    if not res["excl"].empty:
+        _show_numbered(res["excl"], lambda cols: number_config(cols, brl=["Faturamento Exclusivo"], ints=["Inserções Exclusivas"], pct=["% Faturamento"]))
+    else: st.info("Nenhum cliente exclusivo encontrado.")
+    st.divider()
+
+    # ==================== 2. COMPARTILHADOS ====================
+    st.subheader("2. Clientes Compartilhados por Emissora")
+    if not res["comp"].empty:
+        _show_numbered(res["comp"], lambda cols: number_config(cols, brl=["Faturamento Compartilhado"], ints=["Inserções Compartilhadas"], pct=["% Faturamento"]))
+    else: st.info("Nenhum cliente compartilhado encontrado.")
+    st.divider()
+
+    # ==================== 3. AUSENTES (NOVO) ====================
+    st.subheader("3. Clientes Ausentes por Emissora (Oportunidade)")
+    if not res["ausentes"].empty:
+        _show_numbered(res["ausentes"], lambda cols: number_config(cols, brl=["Faturamento Perdido (Oportunidade)"], ints=["Inserções Perdidas"], pct=["% Share Perdido"]))
+    else:
+        st.success("Incrível! Todas as emissoras atendem a todos os clientes do filtro (Nenhum ausente).")
+    
+    st.divider()
+
+    # ==================== 4. TOP CLIENTES COMPARTILHADOS ====================
+    st.subheader("4. Top clientes compartilhados (2+ emissoras)")
+    if res["top_shared"] is not None:
+        top_shared_disp = res["top_shared"].rename(columns={
+            "cliente": "Cliente", 
+            "faturamento": "Faturamento",
+            "insercoes": "Inserções",
+            "emissoras_compartilhadas": "Emissoras Compartilhadas"
+        })
+        _show_numbered(top_shared_disp, lambda cols: number_config(cols, brl=["Faturamento"], ints=["Inserções"]))
+    else: st.info("Não há clientes compartilhados com os filtros atuais.")
+    st.divider()
+
+    # ==================== 5. MATRIZ DE INTERSEÇÃO ====================
+    st.subheader(f"5. Interseções entre emissoras (matriz) - {METRIC_LABELS.get(metric, metric)}")
+    
+    if res["matriz"] is None:
+        st.info("Requer pelo menos 2 emissoras para cruzamento.")
+    else:
+        col1, col2, col3 = st.columns([1, 1, 1]) 
         
-        cols_to_fmt = [c for c in pivot_cost_display.columns if c != "Cliente"]
-        for col in cols_to_fmt:
-            pivot_cost_display[col] = pivot_cost_display[col].apply(lambda x: brl(x) if pd.notna(x) else "-")
-            
-        display_styled_table(pivot_cost_display)
+        for col, (chave, rotulo) in zip((col1, col2, col3), METRIC_LABELS.items()):
+            with col:
+                if st.button(rotulo, type="primary" if metric == chave else "secondary", use_container_width=True):
+                    st.session_state.cruzamentos_metric = chave
+                    st.rerun() 
+
+        st.plotly_chart(res["fig_mat"], width="stretch", config={'displayModeBar': False})
         
+    st.divider()
+
+    # ==================== 6. COMPARATIVO CUSTO UNITÁRIO ====================
+    st.subheader("6. Comparativo de Custo Médio Unitário (Clientes Compartilhados)")
+    
+    if res["custo"] is not None:
+        pivot_cost_display = res["custo"]
+        cols_to_fmt = [c for c in pivot_cost_display.columns if c != "Cliente"]
+        display_styled_table(pivot_cost_display, number_config(pivot_cost_display.columns, brl=cols_to_fmt))
     else:
         st.info("Não há dados suficientes para comparação de custos (sem clientes compartilhados).")
 
@@ -476,18 +436,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     if st.session_state.get("show_cruzamentos_export", False):
         @st.dialog("Opções de Exportação - Cruzamentos")
         def export_dialog():
-            # Títulos padronizados para Exportação
-            table_options = {
-                "1. Clientes Exclusivos por Emissora (Dados)": {'df': df_excl_raw},
-                "2. Clientes Compartilhados por Emissora (Dados)": {'df': df_comp_raw},
-                "3. Clientes Ausentes por Emissora (Oportunidade) (Dados)": {'df': df_ausentes_raw}, 
-                "4. Top clientes compartilhados (2+ emissoras) (Dados)": {'df': top_shared_raw},
-                f"5. Interseções entre emissoras - {metric_label} (Dados)": {'df': mat_raw.reset_index().rename(columns={'index':'Emissora'})},
-                f"5. Interseções entre emissoras - {metric_label} (Gráfico)": {'fig': fig_mat},
-                "6. Comparativo de Custo Médio Unitário (Clientes Compartilhados) (Dados)": {'df': pivot_cost_display.reset_index()} 
-            }
-            
-            available_options = [name for name, data in table_options.items() if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None and data['fig'].data)]
+            table_options = res["export"]
+            available_options = list(table_options)
             
             if not available_options:
                 st.warning("Nenhuma tabela com dados foi gerada.")
@@ -497,6 +447,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 return
 
             selected_names = st.multiselect("Selecione os itens para exportar:", options=available_options, default=available_options)
+            formatos = export_format_selector("cruzamentos_intersecoes_export_formatos")
             tables_to_export = {name: table_options[name] for name in selected_names}
             
             if not tables_to_export:
@@ -510,15 +461,13 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 nome_interno_excel = "Dashboard_Cruzamentos_Intersecoes.xlsx"
                 zip_filename = "Dashboard_Cruzamentos_Intersecoes.zip"
                 
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel)
-                
-                st.download_button(
-                    label="Clique para baixar", 
-                    data=zip_data, 
-                    file_name=zip_filename, 
-                    mime="application/zip", 
-                    on_click=lambda: st.session_state.update(show_cruzamentos_export=False), 
-                    type="secondary"
+                background_export(
+                    "cruzamentos_intersecoes_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel, formats=formatos),
+                    zip_filename, ZIP_MIME, job_label="Cruzamentos & Interseções (ZIP)",
+                    signature={"pagina": "cruzamentos_intersecoes", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_cruzamentos_export=False),
                 )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
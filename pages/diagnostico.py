@@ -0,0 +1,202 @@
+# pages/diagnostico.py
+"""
+Página oculta de diagnóstico (?nav=diag): tempos das requisições registradas
+por utils/perf.py neste processo do servidor.
+
+Não aparece no menu e pede a senha de administrador (variável de ambiente
+DASHBOARD_ADMIN_PASSWORD ou admin_password nos secrets); sem senha
+configurada, a página fica desativada.
+"""
+import os
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils import perf, profiling
+from utils.tables import number_config, present
+
+SLOWEST_WINDOW = 200  # requisições recentes consideradas em "mais lentas"
+SLOWEST_TOP = 20
+
+
+def admin_password():
+    senha = os.environ.get("DASHBOARD_ADMIN_PASSWORD")
+    if senha:
+        return senha
+    try:
+        return st.secrets.get("admin_password")
+    except Exception:
+        # Sem secrets.toml
+        return None
+
+def check_admin():
+    """True se a sessão já se autenticou como administrador (pede a senha se não)."""
+    if st.session_state.get("diag_admin"):
+        return True
+    senha = admin_password()
+    if not senha:
+        st.info("Diagnóstico desativado: configure DASHBOARD_ADMIN_PASSWORD ou admin_password nos secrets.")
+        return False
+    with st.form(key="diag_login"):
+        tentativa = st.text_input("Senha de administrador", type="password")
+        enviado = st.form_submit_button("Entrar")
+    if enviado:
+        if tentativa == senha:
+            st.session_state.diag_admin = True
+            st.rerun()
+        st.error("Senha incorreta.")
+    return False
+
+
+# ==================== TABELAS ====================
+def _quantis(grupo, col):
+    return grupo[col].agg(
+        n="count", p50=lambda s: s.quantile(0.5), p95=lambda s: s.quantile(0.95), max="max"
+    )
+
+def spans_frame(registros):
+    linhas = [
+        {"page": r["page"], "request": r["id"], **s}
+        for r in registros for s in r["spans"]
+    ]
+    return pd.DataFrame(linhas)
+
+def by_page(df):
+    """p50/p95 do tempo total por página."""
+    res = _quantis(df.groupby("page"), "total_ms")
+    res["erros"] = df[df["status"] == "erro"].groupby("page").size()
+    res["rss_delta_mb (média)"] = df.groupby("page")["rss_delta_mb"].mean()
+    return res.fillna({"erros": 0}).sort_values("p95", ascending=False).reset_index()
+
+def by_stage(spans):
+    """p50/p95 de cada etapa por página, com a mediana de linhas processadas."""
+    grupo = spans.groupby(["page", "name"])
+    res = _quantis(grupo, "ms")
+    res["linhas (mediana)"] = grupo["rows"].median()
+    return res.sort_values("p95", ascending=False).reset_index()
+
+def _resumo_spans(spans):
+    return " • ".join(f"{'↳ ' if s['depth'] else ''}{s['name']} {s['ms']:.0f}ms" for s in sorted(spans, key=lambda s: s["start_ms"]))
+
+def slowest(registros):
+    recentes = sorted(registros[-SLOWEST_WINDOW:], key=lambda r: r["total_ms"], reverse=True)[:SLOWEST_TOP]
+    return pd.DataFrame([{
+        "quando": datetime.fromtimestamp(r["ts"]).strftime("%d/%m %H:%M:%S"),
+        "página": r["page"], "status": r["status"], "total_ms": r["total_ms"],
+        "rss_mb": r["rss_mb"], "etapas": _resumo_spans(r["spans"]),
+    } for r in recentes])
+
+def cache_frame(stats):
+    df = pd.DataFrame([{"cache": nome, **c} for nome, c in sorted(stats.items())])
+    if not df.empty:
+        df["acertos %"] = 100 * df["hits"] / (df["hits"] + df["misses"])
+    return df
+
+
+# ==================== PERFIS ====================
+QUALQUER = "Qualquer página"
+
+def render_profiles(registros):
+    """Gatilho do profiler (próxima execução de uma página) e capturas para download."""
+    st.subheader("Perfis (cProfile)")
+    st.caption("Também é possível perfilar uma execução própria com ?profile=1 na URL da página.")
+
+    alvo = profiling.armed()
+    if alvo:
+        ate = datetime.fromtimestamp(alvo["until"]).strftime("%H:%M")
+        st.info(f"Aguardando a próxima execução de **{alvo['page'] or QUALQUER}** (até {ate}).")
+        if st.button("Cancelar", key="diag_disarm"):
+            profiling.disarm()
+            st.rerun()
+    else:
+        c_pag, c_btn, _ = st.columns([2, 1, 2])
+        paginas = [QUALQUER] + sorted({r["page"] for r in registros if r["page"] != "Exportação"})
+        pagina = c_pag.selectbox("Página", paginas, key="diag_prof_page", label_visibility="collapsed")
+        if c_btn.button("Perfilar próxima execução", use_container_width=True):
+            profiling.arm(None if pagina == QUALQUER else pagina)
+            st.rerun()
+
+    capturas = profiling.list_captures()
+    if not capturas:
+        st.caption("Nenhuma captura.")
+        return
+    st.dataframe(pd.DataFrame([{
+        "id": m["id"], "quando": datetime.fromtimestamp(m["ts"]).strftime("%d/%m %H:%M:%S"),
+        "página": m["page"], "gatilho": m["trigger"], "total_ms": m["total_ms"], "amostras": m["samples"],
+    } for m in capturas]), hide_index=True, column_config=number_config(["total_ms"], decimals=["total_ms"]))
+
+    por_id = {m["id"]: m for m in capturas}
+    escolhido = st.selectbox("Captura", list(por_id), key="diag_prof_sel",
+                             format_func=lambda i: f"{por_id[i]['page']} • {i}")
+    meta = por_id[escolhido]
+    c1, c2, c3 = st.columns(3)
+    c1.download_button("profile.pstats", data=profiling.read_file(escolhido, profiling.PSTATS_FILE),
+                       file_name=f"{escolhido}.pstats", mime="application/octet-stream", use_container_width=True)
+    c2.download_button("stacks.collapsed", data=profiling.read_file(escolhido, profiling.STACKS_FILE),
+                       file_name=f"{escolhido}.collapsed", mime="text/plain", use_container_width=True)
+    c3.download_button("meta.json", data=profiling.read_file(escolhido, profiling.META_FILE),
+                       file_name=f"{escolhido}.json", mime="application/json", use_container_width=True)
+    with st.expander("Filtros e versão das bases"):
+        st.json({"filtros": meta["filters"], "bases": meta["datasets"]}, expanded=False)
+    with st.expander("Funções mais caras (tempo acumulado)"):
+        st.code(profiling.top_functions(escolhido), language=None)
+
+
+# ==================== PÁGINA ====================
+def render():
+    st.markdown("<h2 style='text-align: center; color: #003366;'>Diagnóstico de Desempenho</h2>", unsafe_allow_html=True)
+    if not check_admin():
+        return
+
+    registros = perf.snapshot()
+    st.caption(
+        f"{len(registros)} requisições no buffer (máx. {perf.PERF_BUFFER_SIZE}) • "
+        f"memória do processo: {perf.rss_mb() or 0:,.0f} MB • PID {os.getpid()}"
+    )
+
+    c_down, c_clear, _ = st.columns([1, 1, 3])
+    c_down.download_button(
+        "Exportar JSONL", data=perf.to_jsonl(registros), mime="application/x-ndjson",
+        file_name=f"perf_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl", use_container_width=True
+    )
+    if c_clear.button("Limpar buffer", use_container_width=True):
+        perf.clear()
+        st.rerun()
+
+    st.subheader("Bases carregadas")
+    bases = perf.datasets()
+    if bases:
+        st.dataframe(pd.DataFrame([{
+            "base": nome, "versão": d["version"], "linhas": d["rows"], "memória (MB)": d["mb"],
+            "carregada em": datetime.fromtimestamp(d["loaded_at"]).strftime("%d/%m %H:%M"),
+        } for nome, d in bases.items()]), hide_index=True, column_config=number_config(["linhas"], ints=["linhas"]))
+    else:
+        st.caption("Nenhuma base carregada neste processo.")
+
+    st.subheader("Caches")
+    caches = cache_frame(perf.cache_stats())
+    if caches.empty:
+        st.caption("Sem consultas a cache registradas.")
+    else:
+        caches, config, _ = present(caches, number_config(caches.columns, ints=["hits", "misses"], pct=["acertos %"]))
+        st.dataframe(caches, hide_index=True, column_config=config)
+
+    render_profiles(registros)
+
+    if not registros:
+        st.info("Nenhuma requisição registrada ainda.")
+        return
+
+    tempos = number_config(["p50", "p95", "max", "total_ms"], decimals=["p50", "p95", "max", "total_ms"])
+
+    st.subheader("Por página (ms)")
+    st.dataframe(by_page(pd.DataFrame(registros)), hide_index=True, column_config=tempos)
+
+    st.subheader("Por etapa (ms)")
+    spans = spans_frame(registros)
+    if not spans.empty:
+        st.dataframe(by_stage(spans), hide_index=True, column_config=tempos)
+
+    st.subheader(f"Mais lentas (últimas {SLOWEST_WINDOW} requisições)")
+    st.dataframe(slowest(registros), hide_index=True, column_config=tempos)
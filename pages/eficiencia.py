@@ -5,7 +5,9 @@ import plotly.express as px
 import pandas as pd
 import numpy as np
 from utils.format import brl, PALETTE
-from utils.export import create_zip_package 
+from utils.tables import show_table, split_total, brl_column, int_column
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== ESTILO CSS (CENTRALIZAÇÃO E ALINHAMENTO) ====================
 ST_METRIC_CENTER = """
@@ -36,213 +38,85 @@ ST_METRIC_CENTER = """
 </style>
 """
 
-def format_int(val):
-    if pd.isna(val) or val == 0: return "-"
-    return f"{int(val):,}".replace(",", ".")
-
 # ==================== FUNÇÃO AUXILIAR DE ESTILO ====================
 def display_styled_table(df, highlight_total=True, column_config=None):
     """
-    Renderiza o dataframe aplicando estilo de destaque (Totalizador) na última linha.
+    Renderiza o dataframe com o Totalizador destacado abaixo (se highlight_total).
     """
     if df.empty: return
+    main, total = split_total(df) if highlight_total else (df, None)
+    show_table(main, total, column_config=column_config)
 
-    def highlight_total_row(row):
-        # Verifica se deve destacar E se é a última linha (assumindo Totalizador no fim)
-        if highlight_total and row.name == (len(df) - 1): 
-            return ['background-color: #e6f3ff; font-weight: bold; color: #003366'] * len(row)
-        return [''] * len(row)
-
-    st.dataframe(
-        df.style.apply(highlight_total_row, axis=1), 
-        width="stretch", 
-        hide_index=True,
-        column_config=column_config if column_config else {"#": st.column_config.TextColumn("#", width="small")}
-    )
-
-def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
-    # Aplica CSS para centralizar os cards
-    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
-    
-    st.markdown("<h2 style='text-align: center; color: #003366;'>Eficiência & KPIs Avançados</h2>", unsafe_allow_html=True)
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+CONSOLIDADO = "Consolidado (Seleção Atual)"
 
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+def _bases(base, mes_ini, mes_fim):
+    """(base normalizada, base do período, base com faturamento > 0); ValueError se faltam colunas."""
     # Normalização e Filtros
-    df = df.rename(columns={c: c.lower() for c in df.columns})
+    df = base.rename(columns={c: c.lower() for c in base.columns})
     
     if "faturamento" not in df.columns or "cliente" not in df.columns:
-        st.error("Colunas obrigatórias ausentes.")
-        return
+        raise ValueError("Colunas obrigatórias ausentes.")
     
     if "insercoes" not in df.columns:
         df["insercoes"] = 0.0
 
-    # Definição dos Anos para lógica de colunas
-    anos_global = sorted(df["ano"].dropna().unique())
-    if len(anos_global) >= 2:
-        ano_base, ano_comp = anos_global[-2], anos_global[-1]
-    elif len(anos_global) == 1:
-        ano_base = ano_comp = anos_global[0]
-    else:
-        ano_base = ano_comp = 2024 # Fallback
-
     # Filtra período
     base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
     
     # Filtra apenas quem tem faturamento > 0
-    base_analise = base_periodo[base_periodo["faturamento"] > 0].copy()
+    base_analise = base_periodo[base_periodo["faturamento"] > 0]
+    return df, base_periodo, base_analise
 
-    if base_analise.empty:
-        st.info("Sem dados financeiros para o período.")
-        return
-
-    # ==================== CÁLCULOS DE KPI (MACRO - CONSOLIDADO) ====================
-    total_fat = base_analise["faturamento"].sum()
-    total_ins = base_analise["insercoes"].sum()
-    total_cli = base_analise["cliente"].nunique()
-    
-    # Yield Global (Preço por 1 Inserção)
-    custo_medio_global = (total_fat / total_ins) if total_ins > 0 else 0
-    
-    # Média de Inserções por Cliente (Substituindo o CPM)
-    media_ins_cli = (total_ins / total_cli) if total_cli > 0 else 0
-
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Yield Médio (R$ / Inserção)", brl(custo_medio_global), help="Valor médio pago por uma única inserção.")
-    col2.metric("Volume Médio (Ins. / Cliente)", f"{int(media_ins_cli)}", help="Média de inserções veiculadas por cada cliente.")
-    col3.metric("Volume Total Entregue", f"{int(total_ins):,}".replace(",", "."))
-
-    st.divider()
-
-    # ==================== 1. MATRIZ DE EFICIÊNCIA (COM FILTRO DE ANO) ====================
-    st.subheader("1. Matriz de Eficiência (Preço vs. Volume)")
-
-    # Seletor de Ano
-    anos_disponiveis = sorted(base_analise["ano"].dropna().unique())
-    opcoes_ano = ["Consolidado (Seleção Atual)"] + anos_disponiveis
-    
-    # Default: Último ano da lista (index -1 de anos_disponiveis, mas ajustado para lista completa)
-    default_idx = len(opcoes_ano) - 1 
-    
-    col_sel, _ = st.columns([1, 2])
-    ano_sel = col_sel.selectbox("Selecione o Ano:", opcoes_ano, index=default_idx)
-
-    # Filtragem Local
-    if ano_sel == "Consolidado (Seleção Atual)":
-        df_matriz = base_analise.copy()
-        titulo_matriz = "Consolidado"
-    else:
-        df_matriz = base_analise[base_analise["ano"] == ano_sel].copy()
-        titulo_matriz = str(ano_sel)
-
-    # Agrupa dados para o Gráfico
-    scatter_data = df_matriz.groupby(["cliente", "emissora"], as_index=False).agg(
-        Faturamento=("faturamento", "sum"),
-        Insercoes=("insercoes", "sum")
-    )
-    
-    # Calcula custo médio
-    scatter_data["Custo_Medio"] = scatter_data["Faturamento"] / scatter_data["Insercoes"].replace(0, 1)
-    # Filtra zeros
-    scatter_data = scatter_data[scatter_data["Insercoes"] > 0]
+def eficiencia_anos(base, mes_ini, mes_fim):
+    """Anos com faturamento no período (opções do seletor da matriz)."""
+    return sorted(_bases(base, mes_ini, mes_fim)[2]["ano"].dropna().unique())
 
+def fig_matriz_eficiencia(scatter_data):
+    """Dispersão preço médio x volume por cliente/emissora."""
     # Cores
     color_map = {
         "Novabrasil": "#007dc3", 
         "Difusora": "#ef4444", 
     }
 
-    if not scatter_data.empty:
-        fig_scatter = px.scatter(
-            scatter_data,
-            x="Insercoes",
-            y="Custo_Medio",
-            size="Faturamento",
-            color="emissora",
-            hover_name="cliente",
-            log_x=False, 
-            template="plotly_white",
-            labels={
-                "Insercoes": "Volume de Inserções (Qtd)",
-                "Custo_Medio": "Preço Médio Pago (R$)",
-                "emissora": "Emissora",
-                "Faturamento": "Investimento Total"
-            },
-            color_discrete_map=color_map, 
-            color_discrete_sequence=PALETTE 
-        )
-        
-        # Linhas médias dinâmicas
-        avg_x = scatter_data["Insercoes"].median()
-        avg_y = scatter_data["Custo_Medio"].median()
-        
-        fig_scatter.add_hline(y=avg_y, line_dash="dot", annotation_text="Preço Médio", annotation_position="bottom right")
-        fig_scatter.add_vline(x=avg_x, line_dash="dot", annotation_text="Vol. Médio", annotation_position="top right")
-
-        # BLOQUEIO DE INTERAÇÃO (Zoom/Pan fixos)
-        fig_scatter.update_layout(
-            height=500,
-            dragmode=False, # Desabilita ferramenta de seleção/arrasto
-            xaxis=dict(fixedrange=True), # Trava eixo X
-            yaxis=dict(fixedrange=True)  # Trava eixo Y
-        )
-        
-        # config={'displayModeBar': False} remove a barra de ferramentas do Plotly
-        st.plotly_chart(fig_scatter, width="stretch", config={'displayModeBar': False})
-    else:
-        st.warning(f"Sem dados de inserções para o ano {titulo_matriz}.")
-
-    # ==================== TABELAS DE EXPORTAÇÃO (INICIALIZAÇÃO) ====================
-    df_matriz_export = pd.DataFrame()
+    fig_scatter = px.scatter(
+        scatter_data,
+        x="Insercoes",
+        y="Custo_Medio",
+        size="Faturamento",
+        color="emissora",
+        hover_name="cliente",
+        log_x=False, 
+        template="plotly_white",
+        labels={
+            "Insercoes": "Volume de Inserções (Qtd)",
+            "Custo_Medio": "Preço Médio Pago (R$)",
+            "emissora": "Emissora",
+            "Faturamento": "Investimento Total"
+        },
+        color_discrete_map=color_map, 
+        color_discrete_sequence=PALETTE 
+    )
     
-    # ==================== TABELA DETALHADA (AFETADA PELO FILTRO) ====================
-    with st.expander(f"Ver dados detalhados da Matriz ({titulo_matriz})", expanded=True):
-        if not scatter_data.empty:
-            df_table = scatter_data.copy()
-            
-            # Formatação
-            df_table["Faturamento_fmt"] = df_table["Faturamento"].apply(brl)
-            df_table["Custo_Medio_fmt"] = df_table["Custo_Medio"].apply(brl)
-            df_table["Insercoes_fmt"] = df_table["Insercoes"].apply(format_int)
-            
-            # Seleção e Ordenação (Inserções ANTES de Faturamento)
-            df_table = df_table[["cliente", "emissora", "Insercoes_fmt", "Faturamento_fmt", "Custo_Medio_fmt"]]
-            
-            # Renomeia para UI
-            df_table.columns = ["Cliente", "Emissora", "Inserções", "Faturamento Total", "CMU"]
-            
-            # Ordena por Cliente
-            df_table = df_table.sort_values("Cliente", ascending=True).reset_index(drop=True)
-            
-            # Display com Tooltip
-            display_styled_table(
-                df_table, 
-                highlight_total=False,
-                column_config={
-                    "CMU": st.column_config.Column(
-                        label="CMU ℹ️",
-                        help="Custo Médio Unitário (Preço Médio Pago por Inserção)"
-                    )
-                }
-            )
-
-            # Preparação para Exportação (Cópia fiel + Renomeação solicitada)
-            df_matriz_export = scatter_data.copy()
-            # Reordena colunas RAW: Cliente, Emissora, Inserções, Faturamento, Custo
-            df_matriz_export = df_matriz_export[["cliente", "emissora", "Insercoes", "Faturamento", "Custo_Medio"]]
-            
-            # Renomeia para Excel
-            df_matriz_export.columns = ["Cliente", "Emissora", "Inserções", "Faturamento Total", "Custo Médio Unitário"]
-            df_matriz_export = df_matriz_export.sort_values("Cliente")
-            
-        else:
-            st.info("Sem dados para exibir na tabela.")
-
-    st.divider()
-
-    # ==================== 2. RESUMO POR EMISSORA (COM DIVISÃO ANUAL) ====================
-    st.subheader("2. Resumo de Eficiência por Emissora (Comparativo Anual)")
+    # Linhas médias dinâmicas
+    avg_x = scatter_data["Insercoes"].median()
+    avg_y = scatter_data["Custo_Medio"].median()
     
+    fig_scatter.add_hline(y=avg_y, line_dash="dot", annotation_text="Preço Médio", annotation_position="bottom right")
+    fig_scatter.add_vline(x=avg_x, line_dash="dot", annotation_text="Vol. Médio", annotation_position="top right")
+
+    # BLOQUEIO DE INTERAÇÃO (Zoom/Pan fixos)
+    fig_scatter.update_layout(
+        height=500,
+        dragmode=False, # Desabilita ferramenta de seleção/arrasto
+        xaxis=dict(fixedrange=True), # Trava eixo X
+        yaxis=dict(fixedrange=True)  # Trava eixo Y
+    )
+    return fig_scatter
+
+def resumo_emissoras(base_periodo, ano_base, ano_comp, show_total=True):
+    """Faturamento, inserções e yield por emissora nos anos comparados."""
     # Pivotagem para separar por ano
     grp_ano = base_periodo.groupby(["emissora", "ano"]).agg(
         Faturamento=("faturamento", "sum"),
@@ -286,9 +160,6 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
             
         grp_ano = pd.concat([grp_ano, pd.DataFrame([total_row])], ignore_index=True)
 
-    # Display Formatado
-    tb_display = grp_ano.copy()
-    
     # Dicionário de Renomeação
     cols_rename = {"emissora": "Emissora"}
     for ano in anos_check:
@@ -296,7 +167,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
         cols_rename[f"Faturamento_{ano}"] = f"Faturamento ({ano})"
         cols_rename[f"Yield_{ano}"] = f"Yield Médio ({ano})"
         
-    tb_display = tb_display.rename(columns=cols_rename)
+    tb_display = grp_ano.rename(columns=cols_rename)
     
     # Ordenação das colunas - LÓGICA ANTI-CRASH (Se anos iguais, mostra só 1 kit de colunas)
     if ano_base == ano_comp:
@@ -316,17 +187,183 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
         
     # Filtra apenas colunas que existem (segurança extra)
     cols_order = [c for c in cols_order if c in tb_display.columns]
-    tb_display = tb_display[cols_order]
+    return tb_display[cols_order]
+
+@result_cache.cached
+def compute_eficiencia(base, mes_ini, mes_fim, ano=CONSOLIDADO, show_total=True):
+    """
+    KPIs, matriz e resumo da página sem Streamlit: {"kpis", "titulo_matriz",
+    "fig_scatter" (None sem inserções), "matriz", "resumo", "export"}. None
+    se o período não tem faturamento; ValueError se faltam colunas.
+    """
+    df, base_periodo, base_analise = _bases(base, mes_ini, mes_fim)
+
+    # Definição dos Anos para lógica de colunas
+    anos_global = sorted(df["ano"].dropna().unique())
+    if len(anos_global) >= 2:
+        ano_base, ano_comp = anos_global[-2], anos_global[-1]
+    elif len(anos_global) == 1:
+        ano_base = ano_comp = anos_global[0]
+    else:
+        ano_base = ano_comp = 2024 # Fallback
+
+    if base_analise.empty:
+        return None
+
+    # ==================== CÁLCULOS DE KPI (MACRO - CONSOLIDADO) ====================
+    total_fat = base_analise["faturamento"].sum()
+    total_ins = base_analise["insercoes"].sum()
+    total_cli = base_analise["cliente"].nunique()
+    
+    kpis = {
+        # Yield Global (Preço por 1 Inserção)
+        "custo_medio_global": (total_fat / total_ins) if total_ins > 0 else 0,
+        # Média de Inserções por Cliente (Substituindo o CPM)
+        "media_ins_cli": (total_ins / total_cli) if total_cli > 0 else 0,
+        "total_ins": total_ins,
+    }
+
+    # ==================== 1. MATRIZ DE EFICIÊNCIA (COM FILTRO DE ANO) ====================
+    # Filtragem Local
+    if ano == CONSOLIDADO:
+        df_matriz = base_analise
+        titulo_matriz = "Consolidado"
+    else:
+        df_matriz = base_analise[base_analise["ano"] == ano]
+        titulo_matriz = str(ano)
+
+    # Agrupa dados para o Gráfico
+    scatter_data = df_matriz.groupby(["cliente", "emissora"], as_index=False).agg(
+        Faturamento=("faturamento", "sum"),
+        Insercoes=("insercoes", "sum")
+    )
+    
+    # Calcula custo médio
+    scatter_data["Custo_Medio"] = scatter_data["Faturamento"] / scatter_data["Insercoes"].replace(0, 1)
+    # Filtra zeros
+    scatter_data = scatter_data[scatter_data["Insercoes"] > 0]
+
+    fig_scatter = df_table = None
+    df_matriz_export = pd.DataFrame()
+    if not scatter_data.empty:
+        fig_scatter = fig_matriz_eficiencia(scatter_data)
+
+        # Seleção e Ordenação (Inserções ANTES de Faturamento)
+        df_table = scatter_data[["cliente", "emissora", "Insercoes", "Faturamento", "Custo_Medio"]]
+        
+        # Renomeia para UI
+        df_table.columns = ["Cliente", "Emissora", "Inserções", "Faturamento Total", "CMU"]
+        
+        # Ordena por Cliente
+        df_table = df_table.sort_values("Cliente", ascending=True).reset_index(drop=True)
+
+        # Preparação para Exportação (Cópia fiel + Renomeação solicitada)
+        # Reordena colunas RAW: Cliente, Emissora, Inserções, Faturamento, Custo
+        df_matriz_export = scatter_data[["cliente", "emissora", "Insercoes", "Faturamento", "Custo_Medio"]]
+        
+        # Renomeia para Excel
+        df_matriz_export.columns = ["Cliente", "Emissora", "Inserções", "Faturamento Total", "Custo Médio Unitário"]
+        df_matriz_export = df_matriz_export.sort_values("Cliente")
+
+    # ==================== 2. RESUMO POR EMISSORA (COM DIVISÃO ANUAL) ====================
+    tb_display = resumo_emissoras(base_periodo, ano_base, ano_comp, show_total)
+
+    table_options = {
+        "1. Matriz de Eficiência (Preço vs. Volume) (Dados)": {'df': df_matriz_export},
+        "1. Matriz de Eficiência (Preço vs. Volume) (Gráfico)": {'fig': fig_scatter},
+        "2. Resumo de Eficiência por Emissora (Comparativo Anual) (Dados)": {'df': tb_display} # Usa tb_display pq já está com nomes bonitos e ordem correta
+    }
+    export = {name: data for name, data in table_options.items() if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None)}
+
+    return {
+        "kpis": kpis, "titulo_matriz": titulo_matriz, "fig_scatter": fig_scatter,
+        "matriz": df_table, "resumo": tb_display, "export": export,
+    }
+
+def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
+    # Aplica CSS para centralizar os cards
+    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
     
-    # Formatação
+    st.markdown("<h2 style='text-align: center; color: #003366;'>Eficiência & KPIs Avançados</h2>", unsafe_allow_html=True)
+    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+
+    try:
+        anos_disponiveis = eficiencia_anos(df, mes_ini, mes_fim)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    if not anos_disponiveis:
+        st.info("Sem dados financeiros para o período.")
+        return
+
+    # Cards preenchidos depois do cálculo (o seletor de ano vem abaixo deles)
+    col1, col2, col3 = st.columns(3)
+
+    st.divider()
+
+    # ==================== 1. MATRIZ DE EFICIÊNCIA (COM FILTRO DE ANO) ====================
+    st.subheader("1. Matriz de Eficiência (Preço vs. Volume)")
+
+    # Seletor de Ano
+    opcoes_ano = [CONSOLIDADO] + anos_disponiveis
+    
+    # Default: Último ano da lista (index -1 de anos_disponiveis, mas ajustado para lista completa)
+    default_idx = len(opcoes_ano) - 1 
+    
+    col_sel, _ = st.columns([1, 2])
+    ano_sel = col_sel.selectbox("Selecione o Ano:", opcoes_ano, index=default_idx)
+
+    with perf.span("aggregate", rows=len(df)):
+        res = compute_eficiencia(df, mes_ini, mes_fim, ano_sel, show_total)
+    kpis, titulo_matriz = res["kpis"], res["titulo_matriz"]
+
+    col1.metric("Yield Médio (R$ / Inserção)", brl(kpis["custo_medio_global"]), help="Valor médio pago por uma única inserção.")
+    col2.metric("Volume Médio (Ins. / Cliente)", f"{int(kpis['media_ins_cli'])}", help="Média de inserções veiculadas por cada cliente.")
+    col3.metric("Volume Total Entregue", f"{int(kpis['total_ins']):,}".replace(",", "."))
+
+    if res["fig_scatter"] is not None:
+        # config={'displayModeBar': False} remove a barra de ferramentas do Plotly
+        st.plotly_chart(res["fig_scatter"], width="stretch", config={'displayModeBar': False})
+    else:
+        st.warning(f"Sem dados de inserções para o ano {titulo_matriz}.")
+
+    # ==================== TABELA DETALHADA (AFETADA PELO FILTRO) ====================
+    with st.expander(f"Ver dados detalhados da Matriz ({titulo_matriz})", expanded=True):
+        if res["matriz"] is not None:
+            # Display com Tooltip
+            display_styled_table(
+                res["matriz"], 
+                highlight_total=False,
+                column_config={
+                    "Inserções": int_column("Inserções"),
+                    "Faturamento Total": brl_column("Faturamento Total"),
+                    "CMU": brl_column(
+                        label="CMU ℹ️",
+                        help="Custo Médio Unitário (Preço Médio Pago por Inserção)"
+                    )
+                }
+            )
+        else:
+            st.info("Sem dados para exibir na tabela.")
+
+    st.divider()
+
+    # ==================== 2. RESUMO POR EMISSORA (COM DIVISÃO ANUAL) ====================
+    st.subheader("2. Resumo de Eficiência por Emissora (Comparativo Anual)")
+    
+    tb_display = res["resumo"]
+    
+    # Formatos numéricos
+    tb_config = {}
     for col in tb_display.columns:
         if "Faturamento" in col or "Yield" in col:
-            tb_display[col] = tb_display[col].apply(brl)
+            tb_config[col] = brl_column(col)
         elif "Inserções" in col:
-            tb_display[col] = tb_display[col].apply(format_int)
+            tb_config[col] = int_column(col)
     
     # Passamos o show_total como highlight_total
-    display_styled_table(tb_display, highlight_total=show_total)
+    display_styled_table(tb_display, highlight_total=show_total, column_config=tb_config)
 
     # ==================== EXPORTAÇÃO ====================
     st.divider()
@@ -351,13 +388,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     if st.session_state.get("show_efi_export", False):
         @st.dialog("Opções de Exportação - Eficiência")
         def export_dialog():
-            table_options = {
-                "1. Matriz de Eficiência (Preço vs. Volume) (Dados)": {'df': df_matriz_export},
-                "1. Matriz de Eficiência (Preço vs. Volume) (Gráfico)": {'fig': fig_scatter if not scatter_data.empty else None},
-                "2. Resumo de Eficiência por Emissora (Comparativo Anual) (Dados)": {'df': tb_display} # Usa tb_display pq já está com nomes bonitos e ordem correta
-            }
-            
-            available_options = [name for name, data in table_options.items() if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None)]
+            table_options = res["export"]
+            available_options = list(table_options)
             
             if not available_options:
                 st.warning("Sem dados para exportar.")
@@ -368,6 +400,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
             st.write("Selecione os itens para exportar:")
             selected_names = st.multiselect("Itens", options=available_options, default=available_options)
+            formatos = export_format_selector("eficiencia_export_formatos")
             tables_to_export = {name: table_options[name] for name in selected_names}
             
             if not tables_to_export:
@@ -381,15 +414,13 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 nome_interno_excel = "Dashboard_Eficiencia.xlsx"
                 zip_filename = "Dashboard_Eficiencia.zip"
                 
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel)
-                
-                st.download_button(
-                    label="Clique para baixar", 
-                    data=zip_data, 
-                    file_name=zip_filename, 
-                    mime="application/zip", 
-                    on_click=lambda: st.session_state.update(show_efi_export=False), 
-                    type="secondary"
+                background_export(
+                    "eficiencia_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel, formats=formatos),
+                    zip_filename, ZIP_MIME, job_label="Eficiência (ZIP)",
+                    signature={"pagina": "eficiencia", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_efi_export=False),
                 )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
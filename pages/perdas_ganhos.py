@@ -1,10 +1,12 @@
 # pages/perdas_ganhos.py
 
 import streamlit as st
-from utils.format import brl
+from utils.format import brl, brl_abrev
+from utils.tables import show_table, split_total, number_config
 import pandas as pd
 import numpy as np
-from utils.export import create_zip_package 
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== ESTILO CSS (CENTRALIZAÇÃO E ALINHAMENTO) ====================
 ST_METRIC_CENTER = """
@@ -42,90 +44,99 @@ ST_METRIC_CENTER = """
 </style>
 """
 
-def color_delta(val):
-    """Colore valores positivos de verde e negativos de vermelho."""
-    if pd.isna(val) or val == "" or val == "-": return ""
-    try:
-        if isinstance(val, (int, float)):
-            v = float(val)
-        else:
-            v = float(str(val).replace("%", "").replace("+", "").replace(",", "."))
-            
-        if v > 0: return "color: #16a34a; font-weight: 600;" 
-        if v < 0: return "color: #dc2626; font-weight: 600;" 
-    except (ValueError, TypeError): return ""
-    return ""
-
-def format_currency(val):
-    """Formata moeda de forma abreviada ou completa dependendo do tamanho."""
-    if pd.isna(val): return "R$ 0,00"
-    val_abs = abs(val)
-    sign = "-" if val < 0 else ""
-    if val_abs >= 1_000_000:
-        return f"{sign}R$ {val_abs/1_000_000:,.1f} Mi".replace(",", "X").replace(".", ",").replace("X", ".")
-    return brl(val)
-
-def format_int(val):
-    """Formata inteiros com separador de milhar."""
-    if pd.isna(val) or val == 0: return "-"
-    return f"{int(val):,}".replace(",", ".")
-
-def format_percent_col(val):
-    """Converte valor numérico para string formatada ou hífen se nulo."""
-    if pd.isna(val): return "-"
-    return f"{val:+.2f}%"
-
 # ==================== FUNÇÃO AUXILIAR DE ESTILO ====================
-def display_styled_table(df, format_dict=None, color_cols=None):
+def display_styled_table(df, column_config=None, color_cols=None):
     """
-    Renderiza o dataframe aplicando estilo de destaque (Totalizador) na última linha.
+    Renderiza o dataframe com o Totalizador (linha com rótulo "Totalizador") destacado abaixo.
     """
     if df.empty:
         return
-
-    # CORREÇÃO: Removemos a lógica de fallback (row.name == len-1).
-    # Agora só destaca se o nome for explicitamente "Totalizador".
-    def highlight_total_row(row):
-        is_total = False
-        if "Cliente" in df.columns and row["Cliente"] == "Totalizador": is_total = True
-        elif "Emissora" in df.columns and row["Emissora"] == "Totalizador": is_total = True
-        
-        if is_total:
-            return ['background-color: #e6f3ff; font-weight: bold; color: #003366'] * len(row)
-        return [''] * len(row)
-
-    styler = df.style.apply(highlight_total_row, axis=1)
-
-    # Aplica cores condicionais (verde/vermelho) se houver colunas de variação
-    if color_cols:
-        existing_cols = [c for c in color_cols if c in df.columns]
-        if existing_cols:
-            styler = styler.map(color_delta, subset=existing_cols)
+    main, total = split_total(df)
+    show_table(main, total, column_config=column_config, color_cols=color_cols)
+
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+def _clientes_table(base, clientes, show_total):
+    """Tabela de clientes perdidos/novos (com # e Totalizador opcional)."""
+    tabela = (base[base["cliente"].isin(clientes)]
+                .groupby("cliente", as_index=False)
+                .agg(faturamento=("faturamento", "sum"), insercoes=("insercoes", "sum"))
+                .sort_values("faturamento", ascending=False)
+                .reset_index(drop=True))
+
+    if not tabela.empty:
+        # Lógica do Totalizador
+        if show_total:
+            total_row = pd.DataFrame([{
+                "cliente": "Totalizador", 
+                "faturamento": tabela["faturamento"].sum(),
+                "insercoes": tabela["insercoes"].sum()
+            }])
+            tabela = pd.concat([tabela, total_row], ignore_index=True)
+
+    # Adiciona coluna #
+    if show_total and not tabela.empty:
+         numeracao = list(range(1, len(tabela))) + ["Total"]
+         tabela.insert(0, "#", numeracao)
+    elif not tabela.empty:
+         tabela.insert(0, "#", list(range(1, len(tabela) + 1)))
+    return tabela.rename(columns={"cliente": "Cliente", "faturamento": "Faturamento", "insercoes": "Inserções"})
+
+def _variation_table(base_periodo, groupby_col, label_col, ano_base, ano_comp, show_total):
+    # CORREÇÃO CRÍTICA: Função refeita para suportar comparação de mesmo ano (2025 vs 2025)
+    # Pivot sem preencher nomes de colunas automaticamente ainda
+    piv_fat = base_periodo.groupby([groupby_col, "ano"])["faturamento"].sum().unstack(fill_value=0)
+    piv_ins = base_periodo.groupby([groupby_col, "ano"])["insercoes"].sum().unstack(fill_value=0)
     
-    # Aplica formatação de dicionário se fornecido
-    if format_dict:
-        styler = styler.format(format_dict)
-
-    st.dataframe(
-        styler, 
-        width="stretch", 
-        hide_index=True, 
-        column_config={"#": st.column_config.TextColumn("#", width="small")}
-    )
-
-# ==================== RENDERIZAÇÃO DA PÁGINA ====================
-def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
-    # Aplica CSS para centralizar os cards
-    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
-
-    # Inicialização de DFs para exportação
-    df_perdas_raw = pd.DataFrame()
-    df_ganhos_raw = pd.DataFrame()
-    var_cli_raw = pd.DataFrame()
-    var_emis_raw = pd.DataFrame()
+    # Garante alinhamento de índices (caso algum cliente tenha só em um ano e o unstack ignore)
+    combined_index = piv_fat.index.union(piv_ins.index)
+    
+    # Constrói o DataFrame manualmente selecionando as séries. 
+    # O uso de .get() evita KeyError se o ano não existir, 
+    # e permite chamar o mesmo ano duas vezes (ex: 2025 e 2025) sem erro de duplicação de colunas no concat.
+    df_var = pd.DataFrame(index=combined_index)
+    
+    df_var[f"Fat_{ano_base}"] = piv_fat.get(ano_base, 0.0)
+    df_var[f"Fat_{ano_comp}"] = piv_fat.get(ano_comp, 0.0)
+    df_var[f"Ins_{ano_base}"] = piv_ins.get(ano_base, 0.0)
+    df_var[f"Ins_{ano_comp}"] = piv_ins.get(ano_comp, 0.0)
+    
+    # Cálculos de Delta
+    df_var["# Fat"] = df_var[f"Fat_{ano_comp}"] - df_var[f"Fat_{ano_base}"]
+    df_var["Δ%"] = np.where(df_var[f"Fat_{ano_base}"] > 0, (df_var["# Fat"] / df_var[f"Fat_{ano_base}"]) * 100, np.nan)
+    df_var["Δ Ins"] = df_var[f"Ins_{ano_comp}"] - df_var[f"Ins_{ano_base}"]
     
+    df_var = df_var.reset_index().rename(columns={groupby_col: label_col})
+    df_var = df_var.sort_values("# Fat", ascending=True)
+
+    if not df_var.empty and show_total:
+        total_fat_a = df_var[f"Fat_{ano_base}"].sum()
+        total_fat_b = df_var[f"Fat_{ano_comp}"].sum()
+        total_ins_a = df_var[f"Ins_{ano_base}"].sum()
+        total_ins_b = df_var[f"Ins_{ano_comp}"].sum()
+        
+        row_total = pd.DataFrame([{
+            label_col: "Totalizador", 
+            f"Fat_{ano_base}": total_fat_a, 
+            f"Fat_{ano_comp}": total_fat_b, 
+            "# Fat": total_fat_b - total_fat_a, 
+            "Δ%": (total_fat_b - total_fat_a) / total_fat_a * 100 if total_fat_a > 0 else np.nan,
+            f"Ins_{ano_base}": total_ins_a,
+            f"Ins_{ano_comp}": total_ins_b,
+            "Δ Ins": total_ins_b - total_ins_a
+        }])
+        df_var = pd.concat([df_var, row_total], ignore_index=True)
+    return df_var
+
+@result_cache.cached
+def compute_perdas_ganhos(base, mes_ini, mes_fim, show_total=True):
+    """
+    Saldos e tabelas da página sem Streamlit: dict com anos, "saldos" (valores
+    dos cards), "perdas"/"ganhos" (None se não há clientes), "var_cli",
+    "var_emis" e "export". None se não há anos válidos; ValueError se faltam
+    as colunas de cliente/faturamento.
+    """
     # Normalização básica
-    df = df.rename(columns={c: c.lower() for c in df.columns})
+    df = base.rename(columns={c: c.lower() for c in base.columns})
     
     # Garante coluna insercoes
     if "insercoes" not in df.columns:
@@ -135,24 +146,15 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     anos = sorted(df["ano"].dropna().unique())
     
     if not anos:
-        st.info("Sem anos válidos na base.")
-        return
+        return None
     
     if len(anos) >= 2:
         ano_base, ano_comp = anos[-2], anos[-1]
     else:
         ano_base = ano_comp = anos[-1]
 
-    # ==================== TÍTULO CENTRALIZADO ====================
-    st.markdown(
-        f"<h2 style='text-align: center; color: #003366;'>Perdas & Ganhos ({ano_base} vs {ano_comp})</h2>", 
-        unsafe_allow_html=True
-    )
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
-
     if "cliente" not in df.columns or "faturamento" not in df.columns:
-        st.error("Colunas obrigatórias 'Cliente' e/ou 'Faturamento' ausentes.")
-        return
+        raise ValueError("Colunas obrigatórias 'Cliente' e/ou 'Faturamento' ausentes.")
 
     # Filtra período (Meses) e separa as bases
     base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
@@ -180,38 +182,87 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # Cálculo do Custo Unitário Médio (Yield)
     custo_medio_perdas = (val_perdas / ins_perdas) if ins_perdas > 0 else 0.0
     custo_medio_ganhos = (val_ganhos / ins_ganhos) if ins_ganhos > 0 else 0.0
-    
-    # Deltas (Saldos)
-    saldo_financeiro = val_ganhos - val_perdas
-    saldo_clientes = len(lista_ganhos) - len(lista_perdas)
-    saldo_insercoes = ins_ganhos - ins_perdas
-    saldo_custo = custo_medio_ganhos - custo_medio_perdas
+
+    saldos = {
+        "val_perdas": val_perdas, "val_ganhos": val_ganhos,
+        "n_perdas": len(lista_perdas), "n_ganhos": len(lista_ganhos),
+        "ins_perdas": ins_perdas, "ins_ganhos": ins_ganhos,
+        "custo_perdas": custo_medio_perdas, "custo_ganhos": custo_medio_ganhos,
+        # Deltas (Saldos)
+        "financeiro": val_ganhos - val_perdas,
+        "clientes": len(lista_ganhos) - len(lista_perdas),
+        "insercoes": ins_ganhos - ins_perdas,
+        "custo": custo_medio_ganhos - custo_medio_perdas,
+    }
+
+    perdas = _clientes_table(baseA, lista_perdas, show_total) if lista_perdas else None
+    ganhos = _clientes_table(baseB, lista_ganhos, show_total) if lista_ganhos else None
+    var_cli = _variation_table(base_periodo, "cliente", "Cliente", ano_base, ano_comp, show_total)
+    var_emis = _variation_table(base_periodo, "emissora", "Emissora", ano_base, ano_comp, show_total)
+
+    # Chaves com nomes reais exibidos na tela
+    table_options = {
+        f"1. Clientes Perdidos (Saíram de {ano_base}) (Dados)": {'df': perdas}, 
+        f"2. Clientes Novos (Entraram em {ano_comp}) (Dados)": {'df': ganhos}, 
+        "3. Variações por Cliente (Faturamento e Inserções) (Dados)": {'df': var_cli}, 
+        "4. Variações por Emissora (Faturamento e Inserções) (Dados)": {'df': var_emis}
+    }
+    export = {name: data for name, data in table_options.items() if data['df'] is not None and not data['df'].empty}
+
+    return {
+        "ano_base": ano_base, "ano_comp": ano_comp, "saldos": saldos,
+        "perdas": perdas, "ganhos": ganhos, "var_cli": var_cli, "var_emis": var_emis,
+        "export": export,
+    }
+
+# ==================== RENDERIZAÇÃO DA PÁGINA ====================
+def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
+    # Aplica CSS para centralizar os cards
+    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
+
+    try:
+        with perf.span("aggregate", rows=len(df)):
+            res = compute_perdas_ganhos(df, mes_ini, mes_fim, show_total)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if res is None:
+        st.info("Sem anos válidos na base.")
+        return
+    ano_base, ano_comp, s = res["ano_base"], res["ano_comp"], res["saldos"]
+
+    # ==================== TÍTULO CENTRALIZADO ====================
+    st.markdown(
+        f"<h2 style='text-align: center; color: #003366;'>Perdas & Ganhos ({ano_base} vs {ano_comp})</h2>", 
+        unsafe_allow_html=True
+    )
+    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
 
     # ==================== CARDS DE SALDO LÍQUIDO (CENTRALIZADOS) ====================
     col_s1, col_s2, col_s3, col_s4 = st.columns(4)
     
     col_s1.metric(
         "Saldo Líquido (R$)", 
-        format_currency(saldo_financeiro), 
-        delta=f"Novos: {format_currency(val_ganhos)} | Perdidos: {format_currency(val_perdas)}",
+        brl_abrev(s["financeiro"], mil=False), 
+        delta=f"Novos: {brl_abrev(s['val_ganhos'], mil=False)} | Perdidos: {brl_abrev(s['val_perdas'], mil=False)}",
         delta_color="normal" 
     )
     col_s2.metric(
         "Saldo de Clientes (Qtd)", 
-        f"{saldo_clientes:+}", 
-        delta=f"Novos: {len(lista_ganhos)} | Perdidos: {len(lista_perdas)}",
+        f"{s['clientes']:+}", 
+        delta=f"Novos: {s['n_ganhos']} | Perdidos: {s['n_perdas']}",
         delta_color="normal"
     )
     col_s3.metric(
         "Saldo Inserções (Qtd)",
-        f"{int(saldo_insercoes):+}",
-        delta=f"Novas: {int(ins_ganhos)} | Perdidas: {int(ins_perdas)}",
+        f"{int(s['insercoes']):+}",
+        delta=f"Novas: {int(s['ins_ganhos'])} | Perdidas: {int(s['ins_perdas'])}",
         delta_color="normal"
     )
     col_s4.metric(
         "Custo Médio Unitário (Saldo)",
-        f"{saldo_custo:+.2f}".replace(".", ","), 
-        delta=f"Novos: {brl(custo_medio_ganhos)} | Perdidos: {brl(custo_medio_perdas)}",
+        f"{s['custo']:+.2f}".replace(".", ","), 
+        delta=f"Novos: {brl(s['custo_ganhos'])} | Perdidos: {brl(s['custo_perdas'])}",
         delta_color="normal"
     )
     
@@ -221,42 +272,10 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     
     # --- Tabela Perdas ---
     st.subheader(f"1. Clientes Perdidos (Saíram de {ano_base})")
-    if lista_perdas:
-        df_perdas_raw = (baseA[baseA["cliente"].isin(lista_perdas)]
-                            .groupby("cliente", as_index=False)
-                            .agg(faturamento=("faturamento", "sum"), insercoes=("insercoes", "sum"))
-                            .sort_values("faturamento", ascending=False)
-                            .reset_index(drop=True))
-        
-        if not df_perdas_raw.empty:
-            # Lógica do Totalizador
-            if show_total:
-                total_row = pd.DataFrame([{
-                    "cliente": "Totalizador", 
-                    "faturamento": df_perdas_raw["faturamento"].sum(),
-                    "insercoes": df_perdas_raw["insercoes"].sum()
-                }])
-                df_perdas_raw = pd.concat([df_perdas_raw, total_row], ignore_index=True)
-
-        # Adiciona coluna #
-        if show_total and not df_perdas_raw.empty:
-             numeracao = list(range(1, len(df_perdas_raw))) + ["Total"]
-             df_perdas_raw.insert(0, "#", numeracao)
-        elif not df_perdas_raw.empty:
-             df_perdas_raw.insert(0, "#", list(range(1, len(df_perdas_raw) + 1)))
-        
-        t_display = df_perdas_raw.copy()
-        t_display = t_display.rename(columns={
-            "cliente": "Cliente", 
-            "faturamento": "Faturamento", 
-            "insercoes": "Inserções"
-        })
+    if res["perdas"] is not None:
+        t_display = res["perdas"].copy()
         t_display['#'] = t_display['#'].astype(str)
-        t_display["Faturamento"] = t_display["Faturamento"].apply(brl)
-        t_display["Inserções"] = t_display["Inserções"].apply(format_int)
-        
-        display_styled_table(t_display)
-
+        display_styled_table(t_display, column_config=number_config(t_display.columns, brl=["Faturamento"], ints=["Inserções"]))
     else: 
         st.success("Nenhum cliente perdido neste período!")
 
@@ -264,119 +283,36 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
     # --- Tabela Ganhos ---
     st.subheader(f"2. Clientes Novos (Entraram em {ano_comp})")
-    if lista_ganhos:
-        df_ganhos_raw = (baseB[baseB["cliente"].isin(lista_ganhos)]
-                            .groupby("cliente", as_index=False)
-                            .agg(faturamento=("faturamento", "sum"), insercoes=("insercoes", "sum"))
-                            .sort_values("faturamento", ascending=False)
-                            .reset_index(drop=True))
-        
-        if not df_ganhos_raw.empty:
-            # Lógica do Totalizador
-            if show_total:
-                total_row = pd.DataFrame([{
-                    "cliente": "Totalizador", 
-                    "faturamento": df_ganhos_raw["faturamento"].sum(),
-                    "insercoes": df_ganhos_raw["insercoes"].sum()
-                }])
-                df_ganhos_raw = pd.concat([df_ganhos_raw, total_row], ignore_index=True)
-
-        if show_total and not df_ganhos_raw.empty:
-             numeracao = list(range(1, len(df_ganhos_raw))) + ["Total"]
-             df_ganhos_raw.insert(0, "#", numeracao)
-        elif not df_ganhos_raw.empty:
-             df_ganhos_raw.insert(0, "#", list(range(1, len(df_ganhos_raw) + 1)))
-        
-        t_display = df_ganhos_raw.copy()
-        t_display = t_display.rename(columns={
-            "cliente": "Cliente", 
-            "faturamento": "Faturamento",
-            "insercoes": "Inserções"
-        })
+    if res["ganhos"] is not None:
+        t_display = res["ganhos"].copy()
         t_display['#'] = t_display['#'].astype(str)
-        t_display["Faturamento"] = t_display["Faturamento"].apply(brl)
-        t_display["Inserções"] = t_display["Inserções"].apply(format_int)
-        
-        display_styled_table(t_display)
-
+        display_styled_table(t_display, column_config=number_config(t_display.columns, brl=["Faturamento"], ints=["Inserções"]))
     else: 
         st.info("Nenhum cliente novo neste período.")
 
     st.divider()
 
-    # CORREÇÃO CRÍTICA: Função refeita para suportar comparação de mesmo ano (2025 vs 2025)
-    def build_variation_table(groupby_col, label_col):
-        # Pivot sem preencher nomes de colunas automaticamente ainda
-        piv_fat = base_periodo.groupby([groupby_col, "ano"])["faturamento"].sum().unstack(fill_value=0)
-        piv_ins = base_periodo.groupby([groupby_col, "ano"])["insercoes"].sum().unstack(fill_value=0)
-        
-        # Garante alinhamento de índices (caso algum cliente tenha só em um ano e o unstack ignore)
-        combined_index = piv_fat.index.union(piv_ins.index)
-        
-        # Constrói o DataFrame manualmente selecionando as séries. 
-        # O uso de .get() evita KeyError se o ano não existir, 
-        # e permite chamar o mesmo ano duas vezes (ex: 2025 e 2025) sem erro de duplicação de colunas no concat.
-        df_var = pd.DataFrame(index=combined_index)
-        
-        df_var[f"Fat_{ano_base}"] = piv_fat.get(ano_base, 0.0)
-        df_var[f"Fat_{ano_comp}"] = piv_fat.get(ano_comp, 0.0)
-        df_var[f"Ins_{ano_base}"] = piv_ins.get(ano_base, 0.0)
-        df_var[f"Ins_{ano_comp}"] = piv_ins.get(ano_comp, 0.0)
-        
-        # Cálculos de Delta
-        df_var["# Fat"] = df_var[f"Fat_{ano_comp}"] - df_var[f"Fat_{ano_base}"]
-        df_var["Δ%"] = np.where(df_var[f"Fat_{ano_base}"] > 0, (df_var["# Fat"] / df_var[f"Fat_{ano_base}"]) * 100, np.nan)
-        df_var["Δ Ins"] = df_var[f"Ins_{ano_comp}"] - df_var[f"Ins_{ano_base}"]
-        
-        df_var = df_var.reset_index().rename(columns={groupby_col: label_col})
-        df_var = df_var.sort_values("# Fat", ascending=True)
-        
-        return df_var
-
     # ==================== VARIAÇÕES (COMPARATIVO DE CARTEIRA) ====================
     st.subheader("3. Variações por Cliente (Faturamento e Inserções)")
     
-    var_cli_raw = build_variation_table("cliente", "Cliente")
-
-    if not var_cli_raw.empty and show_total:
-        total_fat_a = var_cli_raw[f"Fat_{ano_base}"].sum()
-        total_fat_b = var_cli_raw[f"Fat_{ano_comp}"].sum()
-        total_ins_a = var_cli_raw[f"Ins_{ano_base}"].sum()
-        total_ins_b = var_cli_raw[f"Ins_{ano_comp}"].sum()
-        
-        row_total = pd.DataFrame([{
-            "Cliente": "Totalizador", 
-            f"Fat_{ano_base}": total_fat_a, 
-            f"Fat_{ano_comp}": total_fat_b, 
-            "# Fat": total_fat_b - total_fat_a, 
-            "Δ%": (total_fat_b - total_fat_a) / total_fat_a * 100 if total_fat_a > 0 else np.nan,
-            f"Ins_{ano_base}": total_ins_a,
-            f"Ins_{ano_comp}": total_ins_b,
-            "Δ Ins": total_ins_b - total_ins_a
-        }])
-        var_cli_raw = pd.concat([var_cli_raw, row_total], ignore_index=True)
-    
-    var_cli_disp = var_cli_raw.copy()
     col_map = {
         f"Fat_{ano_base}": f"R$ {ano_base}",
         f"Fat_{ano_comp}": f"R$ {ano_comp}",
         f"Ins_{ano_base}": f"Ins. {ano_base}",
         f"Ins_{ano_comp}": f"Ins. {ano_comp}",
     }
-    var_cli_disp = var_cli_disp.rename(columns=col_map)
-    var_cli_disp["Δ%"] = var_cli_disp["Δ%"].apply(format_percent_col)
+    var_cli_disp = res["var_cli"].rename(columns=col_map)
+    var_config = number_config(
+        var_cli_disp.columns,
+        brl=[f"R$ {ano_base}", f"R$ {ano_comp}", "# Fat"],
+        ints=[f"Ins. {ano_base}", f"Ins. {ano_comp}", "Δ Ins"],
+        signed_pct=["Δ%"]
+    )
 
     # Chama função de estilo
     display_styled_table(
         var_cli_disp, 
-        format_dict={
-            f"R$ {ano_base}": brl, 
-            f"R$ {ano_comp}": brl, 
-            "# Fat": brl, 
-            f"Ins. {ano_base}": format_int,
-            f"Ins. {ano_comp}": format_int,
-            "Δ Ins": format_int
-        },
+        column_config=var_config,
         color_cols=["# Fat", "Δ%", "Δ Ins"] 
     )
 
@@ -385,40 +321,12 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # ==================== VARIAÇÕES POR EMISSORA ====================
     st.subheader("4. Variações por Emissora (Faturamento e Inserções)")
     
-    var_emis_raw = build_variation_table("emissora", "Emissora")
-    
-    if not var_emis_raw.empty and show_total:
-        total_fat_a = var_emis_raw[f"Fat_{ano_base}"].sum()
-        total_fat_b = var_emis_raw[f"Fat_{ano_comp}"].sum()
-        total_ins_a = var_emis_raw[f"Ins_{ano_base}"].sum()
-        total_ins_b = var_emis_raw[f"Ins_{ano_comp}"].sum()
-        
-        row_total_e = pd.DataFrame([{
-            "Emissora": "Totalizador", 
-            f"Fat_{ano_base}": total_fat_a, 
-            f"Fat_{ano_comp}": total_fat_b, 
-            "# Fat": total_fat_b - total_fat_a, 
-            "Δ%": (total_fat_b - total_fat_a) / total_fat_a * 100 if total_fat_a > 0 else np.nan,
-            f"Ins_{ano_base}": total_ins_a,
-            f"Ins_{ano_comp}": total_ins_b,
-            "Δ Ins": total_ins_b - total_ins_a
-        }])
-        var_emis_raw = pd.concat([var_emis_raw, row_total_e], ignore_index=True)
-        
-    var_emis_disp = var_emis_raw.copy().rename(columns=col_map)
-    var_emis_disp["Δ%"] = var_emis_disp["Δ%"].apply(format_percent_col)
+    var_emis_disp = res["var_emis"].rename(columns=col_map)
 
     # Chama função de estilo
     display_styled_table(
         var_emis_disp,
-        format_dict={
-            f"R$ {ano_base}": brl, 
-            f"R$ {ano_comp}": brl, 
-            "# Fat": brl, 
-            f"Ins. {ano_base}": format_int,
-            f"Ins. {ano_comp}": format_int,
-            "Δ Ins": format_int
-        },
+        column_config=var_config,
         color_cols=["# Fat", "Δ%", "Δ Ins"]
     )
     
@@ -438,19 +346,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     if st.session_state.get("show_perdas_export", False):
         @st.dialog("Opções de Exportação - Perdas & Ganhos")
         def export_dialog():
-            df_p_exp = df_perdas_raw.rename(columns={"cliente": "Cliente", "faturamento": "Faturamento", "insercoes": "Inserções"}) if not df_perdas_raw.empty else None
-            df_g_exp = df_ganhos_raw.rename(columns={"cliente": "Cliente", "faturamento": "Faturamento", "insercoes": "Inserções"}) if not df_ganhos_raw.empty else None
-            df_vc_exp = var_cli_raw if not var_cli_raw.empty else None
-            df_ve_exp = var_emis_raw if not var_emis_raw.empty else None
-
-            # Chaves com nomes reais exibidos na tela
-            table_options = {
-                f"1. Clientes Perdidos (Saíram de {ano_base}) (Dados)": {'df': df_p_exp}, 
-                f"2. Clientes Novos (Entraram em {ano_comp}) (Dados)": {'df': df_g_exp}, 
-                "3. Variações por Cliente (Faturamento e Inserções) (Dados)": {'df': df_vc_exp}, 
-                "4. Variações por Emissora (Faturamento e Inserções) (Dados)": {'df': df_ve_exp}
-            }
-            available_options = [name for name, data in table_options.items() if data.get('df') is not None and not data['df'].empty]
+            table_options = res["export"]
+            available_options = list(table_options)
             
             if not available_options:
                 st.warning("Nenhuma tabela com dados foi gerada.")
@@ -460,6 +357,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 return
             st.write("Selecione os itens para exportar:")
             selected_names = st.multiselect("Itens", options=available_options, default=available_options)
+            formatos = export_format_selector("perdas_ganhos_export_formatos")
             tables_to_export = {name: table_options[name] for name in selected_names}
             
             if not tables_to_export:
@@ -472,15 +370,13 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 nome_interno_excel = "Dashboard_Perdas_Ganhos.xlsx"
                 zip_filename = "Dashboard_Perdas_Ganhos.zip"
                 
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel)
-                
-                st.download_button(
-                    label="Clique para baixar", 
-                    data=zip_data, 
-                    file_name=zip_filename, 
-                    mime="application/zip", 
-                    on_click=lambda: st.session_state.update(show_perdas_export=False), 
-                    type="secondary"
+                background_export(
+                    "perdas_ganhos_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel, formats=formatos),
+                    zip_filename, ZIP_MIME, job_label="Perdas & Ganhos (ZIP)",
+                    signature={"pagina": "perdas_ganhos", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_perdas_export=False),
                 )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
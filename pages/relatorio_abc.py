@@ -5,7 +5,9 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 from utils.format import brl, PALETTE
-from utils.export import create_zip_package 
+from utils.tables import present, brl_column, int_column, pct_column
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== ESTILO CSS LOCAL (PÁGINA ABC) ====================
 # Ajustes específicos para esta página:
@@ -42,10 +44,123 @@ ST_PAGE_STYLES = """
 </style>
 """
 
-def format_int(val):
-    """Formata inteiros com separador de milhar."""
-    if pd.isna(val) or val == 0: return "-"
-    return f"{int(val):,}".replace(",", ".")
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+def definir_classe(acum):
+    if acum <= 0.80: return "A"
+    elif acum <= 0.95: return "B"
+    return "C"
+
+@result_cache.cached
+def compute_relatorio_abc(base, mes_ini, mes_fim, criterio="Faturamento"):
+    """
+    Curva ABC dos clientes sem Streamlit: {"abc", "resumo", "fig_pie",
+    "detalhe", "export"}. None se o período não tem dados; ValueError se
+    faltam colunas obrigatórias.
+    """
+    # Normalização
+    df = base.rename(columns={c: c.lower() for c in base.columns})
+    
+    if "cliente" not in df.columns or "faturamento" not in df.columns:
+        raise ValueError("Colunas obrigatórias ausentes.")
+    if "insercoes" not in df.columns:
+        df["insercoes"] = 0.0
+
+    # Filtros
+    base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
+    
+    if base_periodo.empty:
+        return None
+
+    # ==================== CÁLCULO DO ABC ====================
+    df_abc = base_periodo.groupby("cliente", as_index=False).agg(
+        faturamento=("faturamento", "sum"),
+        insercoes=("insercoes", "sum")
+    )
+    
+    target_col = "faturamento" if criterio == "Faturamento" else "insercoes"
+    df_abc = df_abc.sort_values(target_col, ascending=False).reset_index(drop=True)
+    
+    total_target = df_abc[target_col].sum()
+    df_abc["share"] = (df_abc[target_col] / total_target) if total_target > 0 else 0
+    df_abc["acumulado"] = df_abc["share"].cumsum()
+    
+    df_abc["classe"] = df_abc["acumulado"].apply(definir_classe)
+    
+    df_abc["custo_medio"] = np.where(
+        df_abc["insercoes"] > 0, 
+        df_abc["faturamento"] / df_abc["insercoes"], 
+        np.nan
+    )
+
+    # ==================== RESUMO POR CLASSE ====================
+    resumo_classes = df_abc.groupby("classe").agg(
+        Qtd_Clientes=("cliente", "count"),
+        Total_Faturamento=("faturamento", "sum"),
+        Total_Insercoes=("insercoes", "sum")
+    ).reindex(["A", "B", "C"]).fillna(0)
+
+    abc_colors = {'A': '#FFD700', 'B': '#C0C0C0', 'C': '#A0522D'}
+
+    fig_pie = px.pie(
+        resumo_classes.reset_index(), 
+        values='Qtd_Clientes', 
+        names='classe', 
+        color='classe',
+        color_discrete_map=abc_colors,
+        category_orders={"classe": ["A", "B", "C"]},
+        hole=0.4
+    )
+    fig_pie.update_traces(textinfo='value')
+    fig_pie.update_layout(height=350, margin=dict(t=20, b=20, l=20, r=20))
+
+    # --- Tabela da tela (RNK no índice) ---
+    df_display = df_abc.copy()
+    df_display["share_pct"] = df_display["share"] * 100
+    df_display["acum_pct"] = df_display["acumulado"] * 100
+    
+    cols_order = ["classe", "cliente", "faturamento", "insercoes", "custo_medio", "share_pct", "acum_pct"]
+    df_display = df_display[cols_order]
+    df_display.columns = ["Classe", "Cliente", "Faturamento", "Inserções", "Custo Médio", "Share %", "% Acumulado"]
+    
+    df_display.index = range(1, len(df_display) + 1)
+    df_display.index.name = "RNK"
+
+    # ==================== EXPORTAÇÃO ====================
+    df_dist_exp = resumo_classes.reset_index().rename(columns={"classe": "Classe", "Qtd_Clientes": "Qtd Clientes"})
+    
+    if criterio == "Faturamento":
+        df_dist_exp = df_dist_exp[["Classe", "Qtd Clientes", "Total_Faturamento"]]
+        df_dist_exp = df_dist_exp.rename(columns={"Total_Faturamento": "Faturamento Total"})
+    else:
+        df_dist_exp = df_dist_exp[["Classe", "Qtd Clientes", "Total_Insercoes"]]
+        df_dist_exp = df_dist_exp.rename(columns={"Total_Insercoes": "Inserções Totais"})
+    
+    df_det_exp = df_abc.copy()
+    df_det_exp.index = range(1, len(df_det_exp) + 1)
+    df_det_exp = df_det_exp.reset_index()
+    
+    df_det_exp = df_det_exp.rename(columns={
+        "index": "RNK",
+        "classe": "Classe",
+        "cliente": "Cliente",
+        "faturamento": "Faturamento",
+        "insercoes": "Inserções",
+        "custo_medio": "Custo Médio Unitário",
+        "share": "Share %",
+        "acumulado": "% Acumulado"
+    })
+    
+    cols_export_order = ["RNK", "Classe", "Cliente", "Faturamento", "Inserções", "Custo Médio Unitário", "Share %", "% Acumulado"]
+    df_det_exp = df_det_exp[cols_export_order]
+
+    table_options = {
+        "1. Distribuição da Carteira (Dados)": {'df': df_dist_exp},
+        "1. Distribuição da Carteira (Gráfico)": {'fig': fig_pie}, 
+        "2. Detalhamento dos Clientes (Dados)": {'df': df_det_exp}
+    }
+    export = {name: data for name, data in table_options.items() if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None)}
+
+    return {"abc": df_abc, "resumo": resumo_classes, "fig_pie": fig_pie, "detalhe": df_display, "export": export}
 
 def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
     # INJEÇÃO DO CSS LOCAL
@@ -65,30 +180,21 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     </div>
     """, unsafe_allow_html=True)
 
-    # Inicializa variáveis
-    fig_pie = None 
-
-    # Normalização
-    df = df.rename(columns={c: c.lower() for c in df.columns})
-    
-    if "cliente" not in df.columns or "faturamento" not in df.columns:
-        st.error("Colunas obrigatórias ausentes.")
-        return
-    if "insercoes" not in df.columns:
-        df["insercoes"] = 0.0
-
-    # Filtros
-    base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
-    
-    if base_periodo.empty:
-        st.info("Sem dados para o período selecionado.")
-        return
-
     # ==================== SELETOR DE MÉTRICA (CENTRALIZADO) ====================
     if "abc_metric" not in st.session_state:
         st.session_state.abc_metric = "Faturamento"
     
     criterio = st.session_state.abc_metric
+
+    try:
+        with perf.span("aggregate", rows=len(df)):
+            res = compute_relatorio_abc(df, mes_ini, mes_fim, criterio)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if res is None:
+        st.info("Sem dados para o período selecionado.")
+        return
     
     # Layout responsivo: 
     # Usamos colunas vazias nas laterais para centralizar no Desktop.
@@ -114,39 +220,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
 
     st.divider()
 
-    # ==================== CÁLCULO DO ABC ====================
-    df_abc = base_periodo.groupby("cliente", as_index=False).agg(
-        faturamento=("faturamento", "sum"),
-        insercoes=("insercoes", "sum")
-    )
-    
-    target_col = "faturamento" if criterio == "Faturamento" else "insercoes"
-    df_abc = df_abc.sort_values(target_col, ascending=False).reset_index(drop=True)
-    
-    total_target = df_abc[target_col].sum()
-    df_abc["share"] = (df_abc[target_col] / total_target) if total_target > 0 else 0
-    df_abc["acumulado"] = df_abc["share"].cumsum()
-    
-    def definir_classe(acum):
-        if acum <= 0.80: return "A"
-        elif acum <= 0.95: return "B"
-        return "C"
-    
-    df_abc["classe"] = df_abc["acumulado"].apply(definir_classe)
-    
-    df_abc["custo_medio"] = np.where(
-        df_abc["insercoes"] > 0, 
-        df_abc["faturamento"] / df_abc["insercoes"], 
-        np.nan
-    )
-
     # ==================== KPIs DO TOPO ====================
-    resumo_classes = df_abc.groupby("classe").agg(
-        Qtd_Clientes=("cliente", "count"),
-        Total_Faturamento=("faturamento", "sum"),
-        Total_Insercoes=("insercoes", "sum")
-    ).reindex(["A", "B", "C"]).fillna(0)
-    
+    resumo_classes = res["resumo"]
     c1, c2, c3 = st.columns(3)
     
     def get_kpi_display(row):
@@ -174,49 +249,26 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     
     with col_graf:
         st.markdown("<p class='custom-chart-title'>1. Distribuição da Carteira (Clientes)</p>", unsafe_allow_html=True)
-        
-        abc_colors = {'A': '#FFD700', 'B': '#C0C0C0', 'C': '#A0522D'}
-
-        fig_pie = px.pie(
-            resumo_classes.reset_index(), 
-            values='Qtd_Clientes', 
-            names='classe', 
-            color='classe',
-            color_discrete_map=abc_colors,
-            category_orders={"classe": ["A", "B", "C"]},
-            hole=0.4
-        )
-        fig_pie.update_traces(textinfo='value')
-        fig_pie.update_layout(height=350, margin=dict(t=20, b=20, l=20, r=20))
-        st.plotly_chart(fig_pie, width="stretch")
+        st.plotly_chart(res["fig_pie"], width="stretch")
 
     with col_tab:
         st.markdown("<p class='custom-chart-title'>2. Detalhamento dos Clientes</p>", unsafe_allow_html=True)
         
-        df_display = df_abc.copy()
-        df_display["share_fmt"] = (df_display["share"] * 100).apply(lambda x: f"{x:.2f}%")
-        df_display["acum_fmt"] = (df_display["acumulado"] * 100).apply(lambda x: f"{x:.2f}%")
-        df_display["faturamento_fmt"] = df_display["faturamento"].apply(brl)
-        df_display["insercoes_fmt"] = df_display["insercoes"].apply(format_int)
-        df_display["custo_fmt"] = df_display["custo_medio"].apply(lambda x: brl(x) if pd.notna(x) else "-")
-        
-        cols_order = ["classe", "cliente", "faturamento_fmt", "insercoes_fmt", "custo_fmt", "share_fmt", "acum_fmt"]
-        df_display = df_display[cols_order]
-        df_display.columns = ["Classe", "Cliente", "Faturamento", "Inserções", "Custo Médio", "Share %", "% Acumulado"]
-        
-        df_display.index = range(1, len(df_display) + 1)
-        df_display.index.name = "RNK"
-        
+        detalhe, detalhe_config, _ = present(res["detalhe"], {
+            "Faturamento": brl_column("Faturamento"),
+            "Inserções": int_column("Inserções"),
+            "Custo Médio": brl_column(
+                label="CMU ℹ️",
+                help="Custo Médio Unitário"
+            ),
+            "Share %": pct_column("Share %"),
+            "% Acumulado": pct_column("% Acumulado")
+        })
         st.dataframe(
-            df_display, 
+            detalhe, 
             height=350, 
             width="stretch",
-            column_config={
-                "Custo Médio": st.column_config.Column(
-                    label="CMU ℹ️",
-                    help="Custo Médio Unitário"
-                )
-            }
+            column_config=detalhe_config
         )
         
     # ==================== EXPORTAÇÃO (CENTRALIZADA) ====================
@@ -252,40 +304,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     if st.session_state.get("show_abc_export", False):
         @st.dialog("Opções de Exportação - Relatório ABC")
         def export_dialog():
-            df_dist_exp = resumo_classes.reset_index().rename(columns={"classe": "Classe", "Qtd_Clientes": "Qtd Clientes"})
-            
-            if criterio == "Faturamento":
-                df_dist_exp = df_dist_exp[["Classe", "Qtd Clientes", "Total_Faturamento"]]
-                df_dist_exp = df_dist_exp.rename(columns={"Total_Faturamento": "Faturamento Total"})
-            else:
-                df_dist_exp = df_dist_exp[["Classe", "Qtd Clientes", "Total_Insercoes"]]
-                df_dist_exp = df_dist_exp.rename(columns={"Total_Insercoes": "Inserções Totais"})
-            
-            df_det_exp = df_abc.copy()
-            df_det_exp.index = range(1, len(df_det_exp) + 1)
-            df_det_exp = df_det_exp.reset_index()
-            
-            df_det_exp = df_det_exp.rename(columns={
-                "index": "RNK",
-                "classe": "Classe",
-                "cliente": "Cliente",
-                "faturamento": "Faturamento",
-                "insercoes": "Inserções",
-                "custo_medio": "Custo Médio Unitário",
-                "share": "Share %",
-                "acumulado": "% Acumulado"
-            })
-            
-            cols_export_order = ["RNK", "Classe", "Cliente", "Faturamento", "Inserções", "Custo Médio Unitário", "Share %", "% Acumulado"]
-            df_det_exp = df_det_exp[cols_export_order]
-
-            table_options = {
-                "1. Distribuição da Carteira (Dados)": {'df': df_dist_exp},
-                "1. Distribuição da Carteira (Gráfico)": {'fig': fig_pie}, 
-                "2. Detalhamento dos Clientes (Dados)": {'df': df_det_exp}
-            }
-            
-            available_options = [name for name, data in table_options.items() if (data.get('df') is not None and not data['df'].empty) or (data.get('fig') is not None)]
+            table_options = res["export"]
+            available_options = list(table_options)
             
             if not available_options:
                 st.warning("Sem dados para exportar.")
@@ -295,6 +315,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 return
 
             selected_names = st.multiselect("Selecione os itens para exportar:", options=available_options, default=available_options)
+            formatos = export_format_selector("relatorio_abc_export_formatos")
             tables_to_export = {name: table_options[name] for name in selected_names}
             
             if not tables_to_export:
@@ -304,15 +325,13 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
             try:
                 filtro_str = get_filter_string()
                 nome_interno_excel = "Dashboard_Relatorio_ABC.xlsx"
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel)
-                
-                st.download_button(
-                    label="Clique para baixar", 
-                    data=zip_data, 
-                    file_name=f"Dashboard_Relatorio_ABC.zip", 
-                    mime="application/zip", 
-                    on_click=lambda: st.session_state.update(show_abc_export=False), 
-                    type="secondary"
+                background_export(
+                    "relatorio_abc_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel, formats=formatos),
+                    f"Dashboard_Relatorio_ABC.zip", ZIP_MIME, job_label="Relatório ABC (ZIP)",
+                    signature={"pagina": "relatorio_abc", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_abc_export=False),
                 )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
@@ -2,6 +2,7 @@
 import streamlit as st
 import pandas as pd
 from utils.loaders import load_crowley_base
+from utils import perf
 
 # Importação dos Módulos Separados
 from crowley import busca_novos, eca, flight, ranking_analitico
@@ -10,13 +11,18 @@ from crowley import busca_novos, eca, flight, ranking_analitico
 def render(cookies):
     
     # --- 1. Carrega dados e data (Cache) ---
-    df_crowley, data_atualizacao = load_crowley_base()
+    with perf.span("load") as s:
+        tb_crowley, data_atualizacao = load_crowley_base()
+        if tb_crowley is not None:
+            s["rows"] = len(tb_crowley)
+            perf.track_dataset("crowley", tb_crowley, lambda tb: tb.nbytes / 1024 / 1024, tb_crowley.version)
 
     # --- 2. Gerenciamento de Navegação ---
     query_params = st.query_params
     current_view = query_params.get("view", "menu")
     if isinstance(current_view, list):
         current_view = current_view[0]
+    perf.set_page(f"Relatório Crowley/{current_view}")
 
     # ==================== CSS GLOBAL DO CROWLEY ====================
     st.markdown("""
@@ -81,16 +87,16 @@ def render(cookies):
 
     # --- 2. MÓDULOS ESPECÍFICOS ---
     elif current_view == "novos":
-        busca_novos.render(df_crowley, cookies, data_atualizacao)
+        busca_novos.render(tb_crowley, cookies, data_atualizacao)
 
     elif current_view == "eca":
-        eca.render(df_crowley, cookies, data_atualizacao)
+        eca.render(tb_crowley, cookies, data_atualizacao)
     
     elif current_view == "ranking":
-        ranking_analitico.render(df_crowley, cookies, data_atualizacao)
+        ranking_analitico.render(tb_crowley, cookies, data_atualizacao)
     
     elif current_view == "flight":
-        flight.render(df_crowley, cookies, data_atualizacao)
+        flight.render(tb_crowley, cookies, data_atualizacao)
     
     else:
         st.error("Página não encontrada.")
@@ -2,12 +2,14 @@
 
 import streamlit as st
 import plotly.express as px
-from utils.format import brl, PALETTE
+from utils.format import PALETTE, brl_abrev, format_brl_abrev_array
+from utils.tables import show_table, number_config
 import pandas as pd
 import plotly.graph_objects as go 
 from plotly.subplots import make_subplots
 import numpy as np
-from utils.export import create_zip_package 
+from utils.export import create_zip_package, export_format_selector, background_export, content_signature, ZIP_MIME
+from utils import dataset_version, perf, result_cache
 
 # ==================== MAPA DE CORES ====================
 COLOR_MAP = {
@@ -57,19 +59,6 @@ ST_METRIC_CENTER = """
 </style>
 """
 
-def format_pt_br_abrev(val):
-    if pd.isna(val): return "R$ 0"
-    sign = "-" if val < 0 else ""
-    val_abs = abs(val)
-    if val_abs == 0: return "R$ 0"
-    if val_abs >= 1_000_000: return f"{sign}R$ {val_abs/1_000_000:,.1f} Mi".replace(",", "X").replace(".", ",").replace("X", ".")
-    if val_abs >= 1_000: return f"{sign}R$ {val_abs/1_000:,.0f} mil".replace(",", "X").replace(".", ",").replace("X", ".")
-    return brl(val)
-
-def format_int(val):
-    if pd.isna(val) or val == 0: return "-"
-    return f"{int(val):,}".replace(",", ".")
-
 def get_pretty_ticks(max_val, num_ticks=5):
     if max_val <= 0: return [0], ["R$ 0"], 100 
     ideal_interval = max_val / num_ticks
@@ -81,7 +70,7 @@ def get_pretty_ticks(max_val, num_ticks=5):
     else: nice_interval = 10 * magnitude
     max_y_rounded = np.ceil(max_val / nice_interval) * nice_interval
     tick_values = np.arange(0, max_y_rounded + nice_interval, nice_interval)
-    tick_texts = [format_pt_br_abrev(v) for v in tick_values]
+    tick_texts = format_brl_abrev_array(tick_values).tolist()
     y_axis_cap = max_y_rounded * 1.05
     return tick_values, tick_texts, y_axis_cap
 
@@ -97,26 +86,13 @@ def get_top_client_info(df_base):
     return nome_full, valor, nome_display
 
 # ==================== FUNÇÃO AUXILIAR DE TABELA ====================
-def display_styled_table(df):
+def display_styled_table(df, column_config=None):
     if df.empty: return
-    st.dataframe(df, width="stretch", hide_index=True)
-
-def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
-    # Aplica CSS para centralizar os cards e aproximar título/valor
-    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
-
-    # Título Centralizado
-    st.markdown("<h2 style='text-align: center; color: #003366;'>Visão Geral</h2>", unsafe_allow_html=True)
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+    show_table(df, column_config=column_config)
 
-    evol_raw = pd.DataFrame()
-    base_emis_raw = pd.DataFrame()
-    base_exec_raw = pd.DataFrame()
-    
-    # Dicionário para armazenar figuras das roscas para exportação
-    figs_share_dict = {}
-    
-    # ==================== PREPARAÇÃO DE DADOS ====================
+# ==================== CÁLCULO (SEM STREAMLIT) ====================
+def prepare_base(df):
+    """Colunas em minúsculas, nomes de emissora padronizados e colunas opcionais preenchidas."""
     df = df.rename(columns={c: c.lower() for c in df.columns})
 
     if "emissora" in df.columns:
@@ -138,55 +114,241 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
             )).dt.strftime("%b/%y")
         else:
             df["meslabel"] = ""
+    return df
+
+def fig_emissoras(base_emis_raw, show_labels=False):
+    fig_emis = px.bar(
+        base_emis_raw, 
+        x="label_x", 
+        y="faturamento", 
+        color="emissora", 
+        color_discrete_map=COLOR_MAP,
+        labels={"label_x": "Emissora / Ano", "faturamento": "Faturamento"}
+    )
+    
+    max_y_emis = base_emis_raw['faturamento'].max()
+    tick_vals_e, tick_txt_e, y_cap_e = get_pretty_ticks(max_y_emis)
+    
+    fig_emis.update_layout(
+        height=400, xaxis_title=None, yaxis_title=None, 
+        template="plotly_white", showlegend=True, legend_title="Emissora",
+        bargap=0.2,
+        dragmode=False,
+        xaxis=dict(fixedrange=True),
+        yaxis=dict(fixedrange=True)
+    )
+    fig_emis.update_traces(width=0.5) 
+
+    fig_emis.update_yaxes(tickvals=tick_vals_e, ticktext=tick_txt_e, range=[0, y_cap_e])
+    
+    if show_labels:
+        fig_emis.update_traces(text=format_brl_abrev_array(base_emis_raw['faturamento']), textposition='outside')
+    return fig_emis
+
+def fig_share(df_share_ano, ano_share):
+    fig = px.pie(
+        df_share_ano, 
+        values="faturamento", 
+        names="emissora",
+        color="emissora",
+        color_discrete_map=COLOR_MAP,
+        hole=0.6 
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    
+    fig.add_annotation(
+        text=f"<b>{ano_share}</b>", 
+        x=0.5, y=0.5, 
+        showarrow=False, 
+        font_size=20,
+        xanchor='center',
+        yanchor='middle'
+    )
+
+    fig.update_layout(
+        height=300, 
+        showlegend=False, 
+        margin=dict(l=10, r=10, t=10, b=10),
+        dragmode=False
+    )
+    return fig
+
+def fig_executivos(base_exec_raw, show_labels=False):
+    fig_exec = px.bar(
+        base_exec_raw, 
+        x="label_x", 
+        y="faturamento", 
+        color="executivo",
+        color_discrete_sequence=px.colors.qualitative.Bold 
+    )
+    
+    max_y_ex = base_exec_raw['faturamento'].max()
+    tick_vals_x, tick_txt_x, y_cap_x = get_pretty_ticks(max_y_ex)
+    
+    fig_exec.update_layout(
+        height=450, xaxis_title=None, yaxis_title=None, 
+        template="plotly_white", showlegend=False,
+        bargap=0.2,
+        dragmode=False,
+        xaxis=dict(fixedrange=True),
+        yaxis=dict(fixedrange=True)
+    )
+    fig_exec.update_traces(width=0.5)
+
+    fig_exec.update_yaxes(tickvals=tick_vals_x, ticktext=tick_txt_x, range=[0, y_cap_x])
+    
+    if show_labels:
+        fig_exec.update_traces(text=format_brl_abrev_array(base_exec_raw['faturamento']), textposition='outside')
+    return fig_exec
+
+def export_items(res):
+    """Itens do export da página ({nome: {'df'|'fig': ...}}), na ordem de exibição."""
+    final_ordered_options = {}
+    evol_raw, base_emis_raw, base_exec_raw = res["evol"], res["emissoras"], res["executivos"]
+
+    # 1. Evolução (AGORA TABELA)
+    if not evol_raw.empty:
+        df_evol_exp = evol_raw[["ano", "meslabel", "mes", "faturamento", "insercoes"]].copy()
+        df_evol_exp.columns = ["Ano", "Mês", "Mês ID", "Faturamento", "Inserções"]
+        final_ordered_options["1. Evolução Mensal de Faturamento e Inserções (Dados)"] = {'df': df_evol_exp}
+
+    # 2. Emissora (CORRIGIDO: Remover label_x)
+    if not base_emis_raw.empty:
+        df_emis_exp = base_emis_raw[["emissora", "ano", "faturamento"]].copy()
+        df_emis_exp.columns = ["Emissora", "Ano", "Faturamento"]
+        final_ordered_options["2. Faturamento por Emissora (Dados)"] = {'df': df_emis_exp}
+        final_ordered_options["2. Faturamento por Emissora (Gráfico)"] = {'fig': res["fig_emis"]}
+
+    # 3. Share (CORRIGIDO: Remover label_x, usar estrutura limpa)
+    if not base_emis_raw.empty:
+        df_share_exp = base_emis_raw[["emissora", "ano", "faturamento"]].copy()
+        df_share_exp.columns = ["Emissora", "Ano", "Faturamento"]
+        final_ordered_options["3. Share de Faturamento (Dados)"] = {'df': df_share_exp}
+        for ano_share, fig in res["figs_share"].items():
+            if fig is not None:
+                final_ordered_options[f"3. Share de Faturamento (Gráfico {ano_share})"] = {'fig': fig}
+
+    # 4. Executivo (CORRIGIDO: Remover label_x)
+    if not base_exec_raw.empty:
+        df_exec_exp = base_exec_raw[["executivo", "ano", "faturamento"]].copy()
+        df_exec_exp.columns = ["Executivo", "Ano", "Faturamento"]
+        final_ordered_options["4. Faturamento por Executivo (Dados)"] = {'df': df_exec_exp}
+        final_ordered_options["4. Faturamento por Executivo (Gráfico)"] = {'fig': res["fig_exec"]}
+
+    # Filtra apenas o que tem conteúdo válido
+    return {k: v for k, v in final_ordered_options.items() if (v.get('df') is not None and not v['df'].empty) or (v.get('fig') is not None)}
+
+@result_cache.cached
+def compute_visao_geral(base, mes_ini, mes_fim, show_labels=False):
+    """
+    Resultados da página sem Streamlit: KPIs dos dois últimos anos, tabela
+    de evolução, agregados por emissora/executivo e as figuras. Devolve None
+    se a base não tem anos válidos.
+    """
+    df = prepare_base(base)
 
     anos = sorted(df["ano"].dropna().unique())
     if not anos:
-        st.info("Sem anos válidos na base.")
-        return
+        return None
     if len(anos) >= 2:
         ano_base, ano_comp = anos[-2], anos[-1]
     else:
         ano_base = ano_comp = anos[-1]
 
-    ano_base_str = str(ano_base)[-2:]
-    ano_comp_str = str(ano_comp)[-2:]
-    
     base_periodo = df[df["mes"].between(mes_ini, mes_fim)]
     baseA = base_periodo[base_periodo["ano"] == ano_base]
     baseB = base_periodo[base_periodo["ano"] == ano_comp]
 
-    # ==================== KPI LINHA 1: TOTAIS (MACRO) ====================
+    # --- KPIs ---
     totalA = float(baseA["faturamento"].sum()) if not baseA.empty else 0.0
     totalB = float(baseB["faturamento"].sum()) if not baseB.empty else 0.0
     delta_abs = totalB - totalA
     delta_pct = (delta_abs / totalA * 100) if totalA > 0.0 else 0
 
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric(f"Total {ano_base}", format_pt_br_abrev(totalA))
-    c2.metric(f"Total {ano_comp}", format_pt_br_abrev(totalB))
-    c3.metric(f"Δ Absoluto ({ano_comp_str}-{ano_base_str})", format_pt_br_abrev(delta_abs))
-    c4.metric(f"Δ % ({ano_comp_str} vs {ano_base_str})", f"{delta_pct:.2f}%" if totalA > 0 else "—")
-
-    # ==================== KPI LINHA 2: TICKET MÉDIO E MAIOR CLIENTE ====================
     cliA = baseA["cliente"].nunique()
-    tmA = totalA / cliA if cliA > 0 else 0.0
-    
     cliB = baseB["cliente"].nunique()
-    tmB = totalB / cliB if cliB > 0 else 0.0
 
-    full_A, val_A, disp_A = get_top_client_info(baseA)
-    full_B, val_B, disp_B = get_top_client_info(baseB)
+    # --- 1. Evolução mensal ---
+    evol_raw = base_periodo.groupby(["ano", "meslabel", "mes"], as_index=False)[["faturamento", "insercoes"]].sum().sort_values(["ano", "mes"])
+
+    # --- 2. Faturamento por emissora ---
+    base_emis_raw = base_periodo.groupby(["emissora", "ano"], as_index=False)["faturamento"].sum()
+    fig_emis = None
+    if not base_emis_raw.empty:
+        base_emis_raw = base_emis_raw.sort_values(["emissora", "ano"])
+        base_emis_raw["label_x"] = base_emis_raw["emissora"] + " " + base_emis_raw["ano"].astype(str)
+        fig_emis = fig_emissoras(base_emis_raw, show_labels)
+
+    # --- 3. Share por ano ---
+    figs_share = {}
+    for ano_share in sorted(base_periodo["ano"].dropna().unique()):
+        df_share_ano = base_periodo[base_periodo["ano"] == ano_share].groupby("emissora", as_index=False)["faturamento"].sum()
+        figs_share[ano_share] = fig_share(df_share_ano, ano_share) if not df_share_ano.empty else None
+
+    # --- 4. Faturamento por executivo ---
+    base_exec_raw = base_periodo.groupby(["executivo", "ano"], as_index=False)["faturamento"].sum()
+    fig_exec = None
+    if not base_exec_raw.empty:
+        rank_exec = base_exec_raw.groupby("executivo")["faturamento"].sum().sort_values(ascending=False).index.tolist()
+        base_exec_raw["executivo"] = pd.Categorical(base_exec_raw["executivo"], categories=rank_exec, ordered=True)
+        base_exec_raw = base_exec_raw.sort_values(["executivo", "ano"])
+        base_exec_raw["label_x"] = base_exec_raw["executivo"].astype(str) + " " + base_exec_raw["ano"].astype(str)
+        fig_exec = fig_executivos(base_exec_raw, show_labels)
+
+    res = {
+        "ano_base": ano_base, "ano_comp": ano_comp,
+        "total_a": totalA, "total_b": totalB, "delta_abs": delta_abs, "delta_pct": delta_pct,
+        "ticket_a": totalA / cliA if cliA > 0 else 0.0,
+        "ticket_b": totalB / cliB if cliB > 0 else 0.0,
+        "top_a": get_top_client_info(baseA), "top_b": get_top_client_info(baseB),
+        "evol": evol_raw,
+        "emissoras": base_emis_raw, "fig_emis": fig_emis,
+        "figs_share": figs_share,
+        "executivos": base_exec_raw, "fig_exec": fig_exec,
+    }
+    res["export"] = export_items(res)
+    return res
+
+# ==================== RENDERIZAÇÃO ====================
+def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=None):
+    # Aplica CSS para centralizar os cards e aproximar título/valor
+    st.markdown(ST_METRIC_CENTER, unsafe_allow_html=True)
+
+    # Título Centralizado
+    st.markdown("<h2 style='text-align: center; color: #003366;'>Visão Geral</h2>", unsafe_allow_html=True)
+    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
+
+    with perf.span("aggregate", rows=len(df)):
+        res = compute_visao_geral(df, mes_ini, mes_fim, show_labels)
+    if res is None:
+        st.info("Sem anos válidos na base.")
+        return
+
+    ano_base, ano_comp = res["ano_base"], res["ano_comp"]
+    ano_base_str = str(ano_base)[-2:]
+    ano_comp_str = str(ano_comp)[-2:]
+
+    # ==================== KPI LINHA 1: TOTAIS (MACRO) ====================
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric(f"Total {ano_base}", brl_abrev(res["total_a"]))
+    c2.metric(f"Total {ano_comp}", brl_abrev(res["total_b"]))
+    c3.metric(f"Δ Absoluto ({ano_comp_str}-{ano_base_str})", brl_abrev(res["delta_abs"]))
+    c4.metric(f"Δ % ({ano_comp_str} vs {ano_base_str})", f"{res['delta_pct']:.2f}%" if res["total_a"] > 0 else "—")
+
+    # ==================== KPI LINHA 2: TICKET MÉDIO E MAIOR CLIENTE ====================
+    full_A, val_A, disp_A = res["top_a"]
+    full_B, val_B, disp_B = res["top_b"]
 
     st.markdown("<div style='height: 25px;'></div>", unsafe_allow_html=True) 
     
     k1, k2, k3, k4 = st.columns(4)
     
-    k1.metric(f"Ticket Médio ({ano_base})", format_pt_br_abrev(tmA))
-    k2.metric(f"Ticket Médio ({ano_comp})", format_pt_br_abrev(tmB))
+    k1.metric(f"Ticket Médio ({ano_base})", brl_abrev(res["ticket_a"]))
+    k2.metric(f"Ticket Médio ({ano_comp})", brl_abrev(res["ticket_b"]))
     
     k3.metric(
         label=f"Maior Cliente ({ano_base})", 
-        value=format_pt_br_abrev(val_A),
+        value=brl_abrev(val_A),
         delta=disp_A, 
         delta_color="off",
         help=f"Cliente: {full_A}"
@@ -194,7 +356,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     
     k4.metric(
         label=f"Maior Cliente ({ano_comp})", 
-        value=format_pt_br_abrev(val_B),
+        value=brl_abrev(val_B),
         delta=disp_B, 
         delta_color="off",
         help=f"Cliente: {full_B}"
@@ -205,20 +367,15 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # ==================== 1. TABELA DE EVOLUÇÃO MENSAL ====================
     st.markdown("<p class='custom-chart-title'>1. Evolução Mensal de Faturamento e Inserções</p>", unsafe_allow_html=True)
     
-    evol_raw = base_periodo.groupby(["ano", "meslabel", "mes"], as_index=False)[["faturamento", "insercoes"]].sum().sort_values(["ano", "mes"])
-    
+    evol_raw = res["evol"]
     if not evol_raw.empty:
         # Prepara Tabela para Visualização
         evol_display = evol_raw[["meslabel", "faturamento", "insercoes"]].copy()
         
-        # Formatação
-        evol_display["faturamento"] = evol_display["faturamento"].apply(brl)
-        evol_display["insercoes"] = evol_display["insercoes"].apply(format_int)
-        
         # Renomeia
         evol_display.columns = ["Mês/Ano", "Faturamento", "Inserções"]
         
-        display_styled_table(evol_display)
+        display_styled_table(evol_display, column_config=number_config(evol_display.columns, brl=["Faturamento"], ints=["Inserções"]))
     else:
         st.info("Sem dados para o período selecionado.")
 
@@ -227,41 +384,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # ==================== GRÁFICO 2: FATURAMENTO POR EMISSORA ====================
     st.markdown("<p class='custom-chart-title'>2. Faturamento por Emissora (Ano a Ano)</p>", unsafe_allow_html=True)
     
-    base_emis_raw = base_periodo.groupby(["emissora", "ano"], as_index=False)["faturamento"].sum()
-    fig_emis = None
-
-    if not base_emis_raw.empty:
-        base_emis_raw = base_emis_raw.sort_values(["emissora", "ano"])
-        base_emis_raw["label_x"] = base_emis_raw["emissora"] + " " + base_emis_raw["ano"].astype(str)
-        
-        fig_emis = px.bar(
-            base_emis_raw, 
-            x="label_x", 
-            y="faturamento", 
-            color="emissora", 
-            color_discrete_map=COLOR_MAP,
-            labels={"label_x": "Emissora / Ano", "faturamento": "Faturamento"}
-        )
-        
-        max_y_emis = base_emis_raw['faturamento'].max()
-        tick_vals_e, tick_txt_e, y_cap_e = get_pretty_ticks(max_y_emis)
-        
-        fig_emis.update_layout(
-            height=400, xaxis_title=None, yaxis_title=None, 
-            template="plotly_white", showlegend=True, legend_title="Emissora",
-            bargap=0.2,
-            dragmode=False,
-            xaxis=dict(fixedrange=True),
-            yaxis=dict(fixedrange=True)
-        )
-        fig_emis.update_traces(width=0.5) 
-
-        fig_emis.update_yaxes(tickvals=tick_vals_e, ticktext=tick_txt_e, range=[0, y_cap_e])
-        
-        if show_labels:
-            fig_emis.update_traces(text=base_emis_raw['faturamento'].apply(format_pt_br_abrev), textposition='outside')
-            
-        st.plotly_chart(fig_emis, width="stretch", config={'displayModeBar': False})
+    if res["fig_emis"] is not None:
+        st.plotly_chart(res["fig_emis"], width="stretch", config={'displayModeBar': False})
     else:
         st.info("Sem dados.")
 
@@ -270,46 +394,15 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # ==================== GRÁFICO 3: SHARE DE MERCADO ====================
     st.markdown("<p class='custom-chart-title'>3. Share Faturamento (%)</p>", unsafe_allow_html=True)
     
-    anos_presentes = sorted(base_periodo["ano"].dropna().unique())
-    if anos_presentes:
-        cols_share = st.columns(len(anos_presentes))
+    figs_share = res["figs_share"]
+    if figs_share:
+        cols_share = st.columns(len(figs_share))
         
-        for idx, ano_share in enumerate(anos_presentes):
-            df_share_ano = base_periodo[base_periodo["ano"] == ano_share].groupby("emissora", as_index=False)["faturamento"].sum()
-            
-            if not df_share_ano.empty:
-                fig_share = px.pie(
-                    df_share_ano, 
-                    values="faturamento", 
-                    names="emissora",
-                    color="emissora",
-                    color_discrete_map=COLOR_MAP,
-                    hole=0.6 
-                )
-                fig_share.update_traces(textposition='inside', textinfo='percent+label')
-                
-                fig_share.add_annotation(
-                    text=f"<b>{ano_share}</b>", 
-                    x=0.5, y=0.5, 
-                    showarrow=False, 
-                    font_size=20,
-                    xanchor='center',
-                    yanchor='middle'
-                )
-
-                fig_share.update_layout(
-                    height=300, 
-                    showlegend=False, 
-                    margin=dict(l=10, r=10, t=10, b=10),
-                    dragmode=False
-                )
-                
-                figs_share_dict[f"3. Share de Faturamento (Gráfico {ano_share})"] = fig_share
-                
-                with cols_share[idx]:
-                    st.plotly_chart(fig_share, width="stretch", config={'displayModeBar': False})
-            else:
-                with cols_share[idx]:
+        for idx, (ano_share, fig_ano) in enumerate(figs_share.items()):
+            with cols_share[idx]:
+                if fig_ano is not None:
+                    st.plotly_chart(fig_ano, width="stretch", config={'displayModeBar': False})
+                else:
                     st.info(f"Sem dados para {ano_share}")
     else:
         st.info("Sem dados para gerar gráfico de share.")
@@ -319,42 +412,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     # ==================== GRÁFICO 4: FATURAMENTO POR EXECUTIVO ====================
     st.markdown("<p class='custom-chart-title'>4. Faturamento por Executivo (Ano a Ano)</p>", unsafe_allow_html=True)
     
-    base_exec_raw = base_periodo.groupby(["executivo", "ano"], as_index=False)["faturamento"].sum()
-    fig_exec = None 
-
-    if not base_exec_raw.empty:
-        rank_exec = base_exec_raw.groupby("executivo")["faturamento"].sum().sort_values(ascending=False).index.tolist()
-        base_exec_raw["executivo"] = pd.Categorical(base_exec_raw["executivo"], categories=rank_exec, ordered=True)
-        base_exec_raw = base_exec_raw.sort_values(["executivo", "ano"])
-        base_exec_raw["label_x"] = base_exec_raw["executivo"].astype(str) + " " + base_exec_raw["ano"].astype(str)
-        
-        fig_exec = px.bar(
-            base_exec_raw, 
-            x="label_x", 
-            y="faturamento", 
-            color="executivo",
-            color_discrete_sequence=px.colors.qualitative.Bold 
-        )
-        
-        max_y_ex = base_exec_raw['faturamento'].max()
-        tick_vals_x, tick_txt_x, y_cap_x = get_pretty_ticks(max_y_ex)
-        
-        fig_exec.update_layout(
-            height=450, xaxis_title=None, yaxis_title=None, 
-            template="plotly_white", showlegend=False,
-            bargap=0.2,
-            dragmode=False,
-            xaxis=dict(fixedrange=True),
-            yaxis=dict(fixedrange=True)
-        )
-        fig_exec.update_traces(width=0.5)
-
-        fig_exec.update_yaxes(tickvals=tick_vals_x, ticktext=tick_txt_x, range=[0, y_cap_x])
-        
-        if show_labels:
-            fig_exec.update_traces(text=base_exec_raw['faturamento'].apply(format_pt_br_abrev), textposition='outside')
-            
-        st.plotly_chart(fig_exec, width="stretch", config={'displayModeBar': False})
+    if res["fig_exec"] is not None:
+        st.plotly_chart(res["fig_exec"], width="stretch", config={'displayModeBar': False})
     else:
         st.info("Sem dados.")
 
@@ -383,38 +442,8 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
     if st.session_state.get("show_visao_geral_export", False):
         @st.dialog("Opções de Exportação - Visão Geral")
         def export_dialog():
-            final_ordered_options = {}
-
-            # 1. Evolução (AGORA TABELA)
-            if not evol_raw.empty:
-                df_evol_exp = evol_raw[["ano", "meslabel", "mes", "faturamento", "insercoes"]].copy()
-                df_evol_exp.columns = ["Ano", "Mês", "Mês ID", "Faturamento", "Inserções"]
-                final_ordered_options["1. Evolução Mensal de Faturamento e Inserções (Dados)"] = {'df': df_evol_exp}
-
-            # 2. Emissora (CORRIGIDO: Remover label_x)
-            if not base_emis_raw.empty:
-                df_emis_exp = base_emis_raw[["emissora", "ano", "faturamento"]].copy()
-                df_emis_exp.columns = ["Emissora", "Ano", "Faturamento"]
-                final_ordered_options["2. Faturamento por Emissora (Dados)"] = {'df': df_emis_exp}
-                final_ordered_options["2. Faturamento por Emissora (Gráfico)"] = {'fig': fig_emis if not base_emis_raw.empty else None}
-
-            # 3. Share (CORRIGIDO: Remover label_x, usar estrutura limpa)
-            if not base_emis_raw.empty:
-                df_share_exp = base_emis_raw[["emissora", "ano", "faturamento"]].copy()
-                df_share_exp.columns = ["Emissora", "Ano", "Faturamento"]
-                final_ordered_options["3. Share de Faturamento (Dados)"] = {'df': df_share_exp}
-                for name, fig in figs_share_dict.items():
-                    final_ordered_options[name] = {'fig': fig}
-
-            # 4. Executivo (CORRIGIDO: Remover label_x)
-            if not base_exec_raw.empty:
-                df_exec_exp = base_exec_raw[["executivo", "ano", "faturamento"]].copy()
-                df_exec_exp.columns = ["Executivo", "Ano", "Faturamento"]
-                final_ordered_options["4. Faturamento por Executivo (Dados)"] = {'df': df_exec_exp}
-                final_ordered_options["4. Faturamento por Executivo (Gráfico)"] = {'fig': fig_exec if not base_exec_raw.empty else None}
-
-            # Filtra apenas o que tem conteúdo válido
-            available_options = [k for k, v in final_ordered_options.items() if (v.get('df') is not None and not v['df'].empty) or (v.get('fig') is not None)]
+            final_ordered_options = res["export"]
+            available_options = list(final_ordered_options)
             
             if not available_options:
                 st.warning("Nenhuma tabela ou gráfico com dados foi gerado.")
@@ -424,6 +453,7 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
                 return
 
             selected_names = st.multiselect("Selecione os itens para exportar:", options=available_options, default=available_options)
+            formatos = export_format_selector("visao_geral_export_formatos")
             
             tables_to_export = {name: final_ordered_options[name] for name in selected_names}
 
@@ -434,15 +464,13 @@ def render(df, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao=Non
             try:
                 filtro_str = get_filter_string()
                 nome_interno_excel = "Dashboard_Visao_Geral.xlsx"
-                zip_data = create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel) 
-                
-                st.download_button(
-                    label="Clique para baixar", 
-                    data=zip_data, 
-                    file_name="Dashboard_VisaoGeral.zip", 
-                    mime="application/zip", 
-                    on_click=lambda: st.session_state.update(show_visao_geral_export=False), 
-                    type="secondary"
+                background_export(
+                    "visao_geral_export",
+                    lambda: create_zip_package(tables_to_export, filtro_str, excel_filename=nome_interno_excel, formats=formatos),
+                    "Dashboard_VisaoGeral.zip", ZIP_MIME, job_label="Visão Geral (ZIP)",
+                    signature={"pagina": "visao_geral", "formatos": formatos, "filtros": filtro_str, "versao": dataset_version.of(df), "conteudo": content_signature(tables_to_export)},
+                    button_label="Gerar arquivo",
+                    on_download=lambda: st.session_state.update(show_visao_geral_export=False),
                 )
             except Exception as e:
                 st.error(f"Erro ao gerar ZIP: {e}")
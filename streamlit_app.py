@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 import base64 
 import streamlit_cookies_manager 
 import json 
+import uuid
 import locale
 
 # Tenta configurar locale para pt-BR
@@ -22,6 +23,8 @@ except locale.Error:
 from utils.loaders import load_main_base
 from utils.filters import aplicar_filtros
 from utils.format import normalize_dataframe
+from utils.export import render_export_jobs
+from utils import dataset_version, perf, profiling
 
 # Importação das páginas existentes + Nova página
 from pages import (
@@ -33,7 +36,8 @@ from pages import (
     top10, 
     relatorio_abc, 
     eficiencia,
-    relatorio_crowley # <--- NOVO IMPORT
+    relatorio_crowley, # <--- NOVO IMPORT
+    diagnostico
 )
 
 
@@ -58,6 +62,15 @@ if not st.session_state.get("authenticated", False):
     else:
         st.session_state.authenticated = False
 
+# Identificador do navegador: dono dos exports em segundo plano (sobrevive a reconexões)
+if "export_owner" not in st.session_state:
+    export_owner = cookies.get("export_owner")
+    if not export_owner:
+        export_owner = uuid.uuid4().hex
+        cookies["export_owner"] = export_owner
+        cookies.save()
+    st.session_state.export_owner = export_owner
+
 if "filters_loaded" not in st.session_state:
     filter_cookie = cookies.get("app_filters")
     if filter_cookie:
@@ -174,6 +187,21 @@ except ValueError:
 
 pagina_ativa = pages_keys[idx_ativa]
 
+# Diagnóstico de desempenho: fora do menu, só por ?nav=diag (pede senha de administrador)
+if query_params.get("nav") == "diag":
+    pagina_ativa = "Diagnóstico"
+else:
+    # Tempos desta execução (utils/perf.py), vistos na página de diagnóstico
+    perf.begin_request(pagina_ativa)
+
+    # Perfil sob demanda: ?profile=1 (só esta execução) ou página armada no diagnóstico
+    forcar_perfil = query_params.get("profile") == "1"
+    if forcar_perfil:
+        del st.query_params["profile"]
+    if profiling.should_profile(pagina_ativa, forced=forcar_perfil):
+        if not profiling.start(pagina_ativa, "query" if forcar_perfil else "armed") and forcar_perfil:
+            st.info("Outra captura de perfil está em andamento; esta execução não foi perfilada.")
+
 # Menu de voltar (exceto Home)
 if pagina_ativa != "Início":
     st.markdown("""
@@ -194,8 +222,12 @@ ultima_atualizacao = "N/A"
 
 # Se NÃO for a página Crowley ou Início, carrega a base pesada de vendas
 # (O Início carrega a base para mostrar status, mas o Crowley não precisa)
-if pagina_ativa != "Relatório Crowley":
-    df, ultima_atualizacao = load_main_base()
+if pagina_ativa not in ("Relatório Crowley", "Diagnóstico"):
+    with perf.span("load") as s:
+        df, ultima_atualizacao = load_main_base()
+        if df is not None:
+            s["rows"] = len(df)
+            perf.track_dataset("vendas", df, lambda d: d.memory_usage(deep=True).sum() / 1024 / 1024, dataset_version.of(df))
 
     # Se a base for necessária (não for Crowley) e estiver vazia, exibe erro
     if (df is None or df.empty) and pagina_ativa != "Início": 
@@ -215,7 +247,8 @@ pages = {
     "Top 10": top10,
     "Relatório ABC": relatorio_abc,
     "Eficiência": eficiencia,
-    "Relatório Crowley": relatorio_crowley # <--- MAPEAMENTO DO MÓDULO
+    "Relatório Crowley": relatorio_crowley, # <--- MAPEAMENTO DO MÓDULO
+    "Diagnóstico": diagnostico
 }
 
 page_display = {
@@ -243,25 +276,40 @@ for idx, page_name in enumerate(pages_keys):
 st.sidebar.markdown(f'<div class="sidebar-nav-container">{"".join(html_menu)}</div>', unsafe_allow_html=True)
 st.sidebar.divider()
 
+# Exports em segundo plano deste navegador (download depois de navegar ou reconectar)
+render_export_jobs()
+
 # ==================== RENDERIZAÇÃO DAS PÁGINAS ====================
 
-if pagina_ativa == "Início":
-    pages[pagina_ativa].render(df) 
+try:
+    if pagina_ativa == "Início":
+        pages[pagina_ativa].render(df) 
 
-elif pagina_ativa == "Relatório Crowley":
-    # Renderiza a página Crowley passando o objeto 'cookies' existente
-    pages[pagina_ativa].render(cookies) # <--- AQUI ESTAVA O PROBLEMA
+    elif pagina_ativa == "Relatório Crowley":
+        # Renderiza a página Crowley passando o objeto 'cookies' existente
+        with perf.span("render"):
+            pages[pagina_ativa].render(cookies) # <--- AQUI ESTAVA O PROBLEMA
 
-else:
-    # --- PÁGINAS PADRÃO ---
-    if df is not None:
-        df_filtrado, anos_sel, emis_sel, exec_sel, cli_sel, mes_ini, mes_fim, show_labels, show_total = aplicar_filtros(df, cookies)
-        
-        if df_filtrado is None or df_filtrado.empty:
-            st.warning("⚠️ Nenhum dado encontrado com os filtros aplicados.")
-            st.stop()
-        
-        pages[pagina_ativa].render(df_filtrado, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao)
+    elif pagina_ativa == "Diagnóstico":
+        pages[pagina_ativa].render()
+
+    else:
+        # --- PÁGINAS PADRÃO ---
+        if df is not None:
+            with perf.span("filter", rows=len(df)) as s:
+                df_filtrado, anos_sel, emis_sel, exec_sel, cli_sel, mes_ini, mes_fim, show_labels, show_total = aplicar_filtros(df, cookies)
+                s["rows"] = 0 if df_filtrado is None else len(df_filtrado)
+            
+            if df_filtrado is None or df_filtrado.empty:
+                st.warning("⚠️ Nenhum dado encontrado com os filtros aplicados.")
+                st.stop()
+            
+            with perf.span("render", rows=len(df_filtrado)):
+                pages[pagina_ativa].render(df_filtrado, mes_ini, mes_fim, show_labels, show_total, ultima_atualizacao)
+finally:
+    req = perf.end_request()
+    if profiling.active():
+        profiling.stop(req, profiling.session_filters(st.session_state), perf.datasets())
         
 # ==================== POP-UPS e RODAPÉ ====================
 
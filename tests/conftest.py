@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Os módulos do app são importados pela raiz do repositório (utils.*, crowley.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+# tests/test_crowley_snapshot.py
+import os
+from datetime import date
+
+import numpy as np
+
+from utils import crowley_table
+from utils.crowley_table import CrowleyTable
+from tests.test_crowley_table import fonte, LINHAS
+
+
+def test_publica_e_abre_snapshot(tmp_path):
+    store = str(tmp_path)
+    tb = CrowleyTable.from_arrow(fonte(LINHAS))
+    nome = crowley_table.publish_snapshot(tb, store_dir=store)
+
+    aberta, aberto = crowley_table.open_snapshot(store_dir=store)
+    assert aberto == nome
+    assert len(aberta) == len(tb)
+    for col in tb.codes:
+        assert np.array_equal(aberta.codes[col], tb.codes[col])
+        assert aberta.dictionaries[col].tolist() == tb.dictionaries[col].tolist()
+    assert np.array_equal(aberta.day, tb.day)
+    assert np.array_equal(aberta.ins, tb.ins)
+    assert aberta.to_frame().equals(tb.to_frame())
+    # Memory-map somente leitura
+    assert not aberta.day.flags.writeable
+
+    info = crowley_table.snapshot_info(store)
+    assert info["rows"] == len(tb)
+    assert aberta.version == info["version"]
+    assert aberta.version.startswith(nome + ".")
+
+def test_novo_snapshot_substitui_o_anterior(tmp_path):
+    store = str(tmp_path)
+    tb = CrowleyTable.from_arrow(fonte(LINHAS))
+    primeiro = crowley_table.publish_snapshot(tb, store_dir=store)
+    versao_antiga = crowley_table.snapshot_info(store)["version"]
+    maior = tb.append(CrowleyTable.from_arrow(fonte([("Campinas", "Nova", "X", date(2024, 3, 1), 1)])))
+    segundo = crowley_table.publish_snapshot(maior, store_dir=store)
+
+    aberta, nome = crowley_table.open_snapshot(store_dir=store)
+    assert nome == segundo != primeiro
+    assert len(aberta) == len(maior)
+    assert os.listdir(os.path.join(store, crowley_table.SNAPSHOT_DIR)) == [segundo]
+    assert aberta.version != versao_antiga
+
+def test_sem_snapshot(tmp_path):
+    assert crowley_table.open_snapshot(store_dir=str(tmp_path)) == (None, None)
+    assert crowley_table.snapshot_info(str(tmp_path)) is None
+
+def test_touch_atualiza_so_a_conferencia(tmp_path):
+    store = str(tmp_path)
+    crowley_table.publish_snapshot(CrowleyTable.from_arrow(fonte(LINHAS)), store_dir=store)
+    antes = crowley_table.snapshot_info(store)
+    crowley_table.touch_snapshot(store)
+    depois = crowley_table.snapshot_info(store)
+    assert depois["checked_at"] >= antes["checked_at"]
+    assert {k: v for k, v in depois.items() if k != "checked_at"} == {k: v for k, v in antes.items() if k != "checked_at"}
@@ -0,0 +1,134 @@
+# tests/test_crowley_store.py
+from datetime import date, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from utils import crowley_store
+
+
+def export(path, dias, linhas_por_dia=3, row_group_size=6):
+    """Export no formato da origem: 'Data' como texto dd/mm/aaaa, em ordem de data."""
+    datas, pracas, ins = [], [], []
+    for d in dias:
+        for i in range(linhas_por_dia):
+            datas.append(d.strftime("%d/%m/%Y"))
+            pracas.append(["Ribeirão Preto", "Campinas"][i % 2])
+            ins.append(i + 1)
+    n = len(datas)
+    pq.write_table(pa.table({
+        "Praca": pracas,
+        "Emissora": ["Novabrasil"] * n,
+        "Anunciante": [f"A{i % 4}" for i in range(n)],
+        "Anuncio": ["Spot"] * n,
+        "Tipo": ["Comercial"] * n,
+        "DayPart": ["Manhã"] * n,
+        "Volume de Insercoes": ins,
+        "Duracao": [30] * n,
+        "Data": datas,
+    }), path, row_group_size=row_group_size)
+    return path
+
+def dias(inicio, n):
+    return [inicio + timedelta(days=i) for i in range(n)]
+
+@pytest.fixture
+def store(tmp_path):
+    return str(tmp_path / "store")
+
+
+def test_carga_inicial(tmp_path, store):
+    src = export(str(tmp_path / "full.parquet"), dias(date(2024, 1, 30), 4))
+    nova, reconstruido = crowley_store.ingest_file(src, store_dir=store)
+
+    assert reconstruido
+    assert nova.num_rows == 12
+    manifest = crowley_store.load_manifest(store)
+    assert manifest["max_date"] == "2024-02-02"
+    assert manifest["rows"] == 12
+    assert sorted(manifest["partitions"]) == ["2024-01", "2024-02"]
+    assert crowley_store.read_store(store).num_rows == 12
+
+def test_incremental_anexa_so_dias_novos(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "v1.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    nova, reconstruido = crowley_store.ingest_file(export(str(tmp_path / "v2.parquet"), dias(date(2024, 3, 1), 6)), store_dir=store)
+
+    assert not reconstruido
+    assert nova.num_rows == 6
+    assert {d.date() for d in nova.column("Data_Dt").to_pylist()} == {date(2024, 3, 5), date(2024, 3, 6)}
+    assert crowley_store.load_manifest(store)["rows"] == 18
+    assert crowley_store.read_store(store).num_rows == 18
+
+def test_incremental_sem_novidade(tmp_path, store):
+    src = export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 3))
+    crowley_store.ingest_file(src, store_dir=store)
+    assert crowley_store.ingest_file(src, store_dir=store) == (None, False)
+
+def test_historico_alterado_reconstroi(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "v1.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    # Mesmo período com outra contagem de linhas por dia: o histórico mudou na origem
+    src = export(str(tmp_path / "v2.parquet"), dias(date(2024, 3, 1), 5), linhas_por_dia=2)
+    nova, reconstruido = crowley_store.ingest_file(src, store_dir=store)
+
+    assert reconstruido
+    assert nova.num_rows == 10
+    assert crowley_store.load_manifest(store)["rows"] == 10
+    assert crowley_store.read_store(store).num_rows == 10
+
+def test_delta_ignora_dias_ja_armazenados(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    delta = export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 3), 4))
+    nova, reconstruido = crowley_store.ingest_file(delta, store_dir=store, is_delta=True)
+
+    assert not reconstruido
+    assert nova.num_rows == 6
+    assert crowley_store.load_manifest(store)["max_date"] == "2024-03-06"
+
+def test_incremental_le_so_row_groups_novos(tmp_path, store, monkeypatch):
+    crowley_store.ingest_file(export(str(tmp_path / "v1.parquet"), dias(date(2024, 3, 1), 8)), store_dir=store)
+    src = export(str(tmp_path / "v2.parquet"), dias(date(2024, 3, 1), 10))
+
+    lidos = []
+    original = crowley_store.read_source
+    def read_source(path, columns=None, row_groups=None):
+        lidos.append(row_groups)
+        return original(path, columns=columns, row_groups=row_groups)
+    monkeypatch.setattr(crowley_store, "read_source", read_source)
+
+    nova, _ = crowley_store.ingest_file(src, store_dir=store)
+    # 30 linhas em row groups de 6: os dias 9 e 10 (linhas 24-29) estão só no último
+    assert lidos == [[4]]
+    assert nova.num_rows == 6
+
+def test_delta_com_dias_faltando_nao_altera_o_store(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    antes = crowley_store.load_manifest(store)
+    # Store até 04/03; o delta começa em 06/03 (o de 05/03 se perdeu)
+    delta = export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 6), 2))
+
+    with pytest.raises(crowley_store.DeltaMismatch):
+        crowley_store.ingest_file(delta, store_dir=store, is_delta=True)
+    assert crowley_store.load_manifest(store) == antes
+
+def test_delta_emendado_no_dia_seguinte(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    delta = export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 5), 2))
+    nova, _ = crowley_store.ingest_file(delta, store_dir=store, is_delta=True)
+    assert nova.num_rows == 6
+
+def test_delta_com_linhas_atrasadas_em_dia_armazenado(tmp_path, store):
+    crowley_store.ingest_file(export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 4)), store_dir=store)
+    # 03 e 04/03 com 4 linhas por dia no delta; o store tem 3
+    delta = export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 3), 3), linhas_por_dia=4)
+
+    with pytest.raises(crowley_store.DeltaMismatch):
+        crowley_store.ingest_file(delta, store_dir=store, is_delta=True)
+    assert crowley_store.load_manifest(store)["rows"] == 12
+
+def test_export_completo_registra_a_conferencia(tmp_path, store):
+    src = export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 3))
+    crowley_store.ingest_file(src, store_dir=store)
+    primeira = crowley_store.load_manifest(store)["full_checked_at"]
+    crowley_store.ingest_file(src, store_dir=store)
+    assert crowley_store.load_manifest(store)["full_checked_at"] >= primeira > 0
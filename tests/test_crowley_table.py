@@ -0,0 +1,197 @@
+# tests/test_crowley_table.py
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from utils.crowley_table import CrowleyTable
+
+
+def fonte(linhas):
+    """Tabela Arrow no formato do store a partir de tuplas (praca, emissora, anunciante, data, ins)."""
+    praca, emissora, anunciante, data, ins = zip(*linhas)
+    n = len(linhas)
+    return pa.table({
+        "Praca": pa.array(praca, pa.string()),
+        "Emissora": pa.array(emissora, pa.string()),
+        "Anunciante": pa.array(anunciante, pa.string()),
+        "Anuncio": ["Spot"] * n,
+        "Tipo": ["Comercial"] * n,
+        "DayPart": ["Manhã"] * n,
+        "Volume de Insercoes": pa.array(ins, pa.int32()),
+        "Duracao": pa.array([30] * n, pa.int32()),
+        "Data_Dt": pa.array([datetime(d.year, d.month, d.day) if d else None for d in data], pa.timestamp("ms")),
+    })
+
+LINHAS = [
+    ("Ribeirão Preto", "Novabrasil", "Coca", date(2024, 1, 5), 3),
+    ("Ribeirão Preto", "Novabrasil", "Pepsi", date(2024, 1, 6), 2),
+    ("Ribeirão Preto", "Jovem Pan", "Coca", date(2024, 2, 1), 4),
+    ("Campinas", "Novabrasil", "Fiat", date(2024, 2, 2), 1),
+    ("Campinas", None, "Fiat", None, 5),
+]
+
+@pytest.fixture
+def tb():
+    return CrowleyTable.from_arrow(fonte(LINHAS))
+
+@pytest.fixture
+def df():
+    return pd.DataFrame(LINHAS, columns=["Praca", "Emissora", "Anunciante", "Data", "Ins"])
+
+
+def test_from_arrow_preserva_valores_e_nulos(tb):
+    frame = tb.to_frame()
+    assert len(tb) == 5
+    assert frame["Praca"].tolist() == [l[0] for l in LINHAS]
+    assert frame["Emissora"].isna().tolist() == [False] * 4 + [True]
+    assert frame["Volume de Insercoes"].tolist() == [3, 2, 4, 1, 5]
+    assert pd.isna(frame["Data_Dt"].iloc[4])
+    assert frame["Data_Dt"].iloc[0] == pd.Timestamp("2024-01-05")
+
+def test_values_e_dates_ignoram_nulos(tb):
+    assert tb.values("Emissora") == ["Jovem Pan", "Novabrasil"]
+    assert tb.values("Anunciante", tb.select(Praca="Campinas")) == ["Fiat"]
+    assert tb.dates() == [date(2024, 1, 5), date(2024, 1, 6), date(2024, 2, 1), date(2024, 2, 2)]
+    assert tb.day_range() == (date(2024, 1, 5), date(2024, 2, 2))
+
+def test_select(tb):
+    assert tb.select(Praca="Ribeirão Preto").tolist() == [0, 1, 2]
+    assert tb.select(Anunciante=["Coca", "Fiat"]).tolist() == [0, 2, 3, 4]
+    assert tb.select(date_from=date(2024, 1, 6), date_to=date(2024, 2, 1)).tolist() == [1, 2]
+    assert tb.select(dates=[date(2024, 2, 2)]).tolist() == [3]
+    rows = tb.select(Praca="Ribeirão Preto")
+    assert tb.select(rows, Emissora="Novabrasil", date_from=date(2024, 1, 6)).tolist() == [1]
+    assert tb.select(Praca="Inexistente").tolist() == []
+
+def test_group_sum_bate_com_pandas(tb, df):
+    got = tb.group_sum(["Praca", "Anunciante"]).sort_values(["Praca", "Anunciante"]).reset_index(drop=True)
+    esperado = df.groupby(["Praca", "Anunciante"], as_index=False)["Ins"].sum()
+    assert got["Praca"].tolist() == esperado["Praca"].tolist()
+    assert got["Anunciante"].tolist() == esperado["Anunciante"].tolist()
+    assert got["Volume de Insercoes"].tolist() == esperado["Ins"].tolist()
+
+def test_group_sum_por_data_e_recorte(tb):
+    got = tb.group_sum("Data_Dt", tb.select(Praca="Ribeirão Preto"))
+    assert dict(zip(got["Data_Dt"], got["Volume de Insercoes"])) == {
+        pd.Timestamp("2024-01-05"): 3, pd.Timestamp("2024-01-06"): 2, pd.Timestamp("2024-02-01"): 4,
+    }
+
+def test_group_sum_soma_duracao(tb):
+    got = tb.group_sum("Praca", value="Duracao")
+    assert dict(zip(got["Praca"], got["Duracao"])) == {"Ribeirão Preto": 90, "Campinas": 60}
+
+def test_search_sem_diferenciar_maiusculas(tb):
+    rows = np.arange(len(tb))
+    assert tb.search(rows, "coca").tolist() == [0, 2]
+    assert tb.search(rows, "JOVEM").tolist() == [2]
+    assert tb.search(rows, "  ").tolist() == rows.tolist()
+    assert tb.search(np.array([1, 2]), "coca").tolist() == [2]
+
+def test_append_mantem_codigos_e_junta_dicionarios(tb):
+    nova = CrowleyTable.from_arrow(fonte([
+        ("Campinas", "Jovem Pan", "Nestlé", date(2024, 3, 1), 7),
+        ("Ribeirão Preto", None, "Coca", date(2024, 3, 2), 2),
+    ]))
+    junta = tb.append(nova)
+
+    assert len(junta) == 7
+    for col in ("Praca", "Emissora", "Anunciante"):
+        assert (junta.codes[col][:5] == tb.codes[col]).all()
+    frame = junta.to_frame()
+    assert frame["Anunciante"].tolist()[5:] == ["Nestlé", "Coca"]
+    assert frame["Emissora"].isna().tolist() == [False] * 4 + [True, False, True]
+    assert junta.values("Anunciante") == ["Coca", "Fiat", "Nestlé", "Pepsi"]
+    assert tb.append(None) is tb
+
+def test_append_promove_codigos_para_int32():
+    grande = CrowleyTable.from_arrow(fonte([("P", "E", f"A{i}", date(2024, 1, 1), 1) for i in range(65_530)]))
+    extra = CrowleyTable.from_arrow(fonte([("P", None, f"B{i}", date(2024, 1, 2), 1) for i in range(10)]))
+    junta = grande.append(extra)
+
+    assert grande.codes["Anunciante"].dtype == np.uint16
+    assert junta.codes["Anunciante"].dtype == np.int32
+    assert len(junta.values("Anunciante")) == 65_540
+    assert junta.to_frame(np.array([0, 65_530]))["Anunciante"].tolist() == ["A0", "B0"]
+
+def test_sort_rows_e_distinct(tb):
+    rows = np.arange(len(tb))
+    assert tb.sort_rows(rows, ["Praca", "Volume de Insercoes"], ascending=[True, False]).tolist() == [4, 3, 2, 0, 1]
+    dobrada = np.r_[rows, rows]
+    assert sorted(tb.distinct(dobrada).tolist()) == rows.tolist()
+
+def test_to_arrow_igual_to_frame(tb):
+    pelo_arrow = tb.to_arrow().to_pandas()
+    direto = tb.to_frame()
+    assert pelo_arrow["Anunciante"].astype(object).tolist() == direto["Anunciante"].astype(object).tolist()
+    assert pelo_arrow["Volume de Insercoes"].tolist() == direto["Volume de Insercoes"].tolist()
+    assert pd.to_datetime(pelo_arrow["Data_Dt"]).tolist()[:4] == direto["Data_Dt"].tolist()[:4]
+
+
+# ==================== CATÁLOGO ====================
+def test_catalogo_em_cascata(tb):
+    cat = tb.catalog()
+    assert cat.years() == [2024]
+    assert cat.months(2024) == [1, 2]
+    assert cat.pracas() == ["Campinas", "Ribeirão Preto"]
+    assert cat.pracas(2024, 2) == ["Campinas", "Ribeirão Preto"]
+    assert cat.vehicles("Ribeirão Preto", 2024, 1) == ["Novabrasil"]
+    assert cat.advertisers("Ribeirão Preto", 2024, 1, "Novabrasil") == ["Coca", "Pepsi"]
+    # Sem data: entra nos recortes por praça, não na árvore ano/mês
+    assert cat.vehicles("Campinas") == ["Novabrasil"]
+    assert cat.advertisers("Campinas") == ["Fiat"]
+    assert cat.vehicles("Campinas", 2024, 1) == [] and cat.advertisers("Sorocaba") == []
+
+def test_catalogo_devolve_copias(tb):
+    cat = tb.catalog()
+    cat.pracas().append("X")
+    cat.advertisers("Ribeirão Preto", 2024, 1, "Novabrasil").clear()
+    assert cat.pracas() == ["Campinas", "Ribeirão Preto"]
+    assert cat.advertisers("Ribeirão Preto", 2024, 1, "Novabrasil") == ["Coca", "Pepsi"]
+    assert tb.catalog() is cat
+
+def test_catalogo_bate_com_select_e_values():
+    rng = np.random.default_rng(7)
+    n = 2_000
+    linhas = [
+        (
+            rng.choice(["Campinas", "Ribeirão Preto", "Sorocaba", None]),
+            rng.choice(["Novabrasil", "Jovem Pan", "CBN", None]),
+            rng.choice([f"Anunciante {i}" for i in range(40)] + [None]),
+            None if rng.random() < 0.05 else date(2023, 11, 1) + pd.Timedelta(days=int(rng.integers(0, 120))),
+            1,
+        )
+        for _ in range(n)
+    ]
+    tb = CrowleyTable.from_arrow(fonte(linhas))
+    cat = tb.catalog()
+
+    assert cat.years() == sorted({d.year for d in tb.dates()}, reverse=True)
+    assert cat.pracas() == tb.values("Praca")
+    for praca in tb.values("Praca"):
+        rp = tb.select(Praca=praca)
+        assert cat.vehicles(praca) == tb.values("Emissora", rp)
+        assert cat.advertisers(praca) == tb.values("Anunciante", rp)
+    for ano in cat.years():
+        ra = tb.select(date_from=date(ano, 1, 1), date_to=date(ano, 12, 31))
+        assert cat.months(ano) == sorted({d.month for d in tb.dates(ra)})
+        for mes in cat.months(ano):
+            ultimo = (pd.Timestamp(ano, mes, 1) + pd.offsets.MonthEnd(0)).date()
+            rm = tb.select(ra, date_from=date(ano, mes, 1), date_to=ultimo)
+            assert cat.pracas(ano, mes) == tb.values("Praca", rm)
+            for praca in cat.pracas(ano, mes):
+                rp = tb.select(rm, Praca=praca)
+                assert cat.vehicles(praca, ano, mes) == tb.values("Emissora", rp)
+                for veiculo in cat.vehicles(praca, ano, mes):
+                    esperado = tb.values("Anunciante", tb.select(rp, Emissora=veiculo))
+                    assert cat.advertisers(praca, ano, mes, veiculo) == esperado
+
+def test_catalogo_refeito_apos_append(tb):
+    tb.catalog()
+    nova = tb.append(CrowleyTable.from_arrow(fonte([("Sorocaba", "CBN", "Vivo", date(2025, 3, 1), 1)])))
+    cat = nova.catalog()
+    assert cat.years() == [2025, 2024]
+    assert cat.advertisers("Sorocaba", 2025, 3, "CBN") == ["Vivo"]
+    assert "Sorocaba" not in tb.catalog().pracas()
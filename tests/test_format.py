@@ -0,0 +1,102 @@
+# tests/test_format.py
+"""
+As funções vetorizadas de utils/format.py contra as funções escalares que
+as páginas usavam célula a célula (copiadas abaixo como referência).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import format as fmt
+from utils.format import brl
+
+
+# --- Referências escalares (versões originais das páginas) ---
+def format_int(val):
+    if isinstance(val, str): return val
+    if pd.isna(val) or val == 0: return "-"
+    return f"{int(val):,}".replace(",", ".")
+
+def format_percent_col(val):
+    if pd.isna(val): return "-"
+    return f"{val:+.2f}%"
+
+def format_pt_br_abrev(val):
+    if pd.isna(val): return "R$ 0"
+    sign = "-" if val < 0 else ""
+    val_abs = abs(val)
+    if val_abs == 0: return "R$ 0"
+    if val_abs >= 1_000_000: return f"{sign}R$ {val_abs/1_000_000:,.1f} Mi".replace(",", "X").replace(".", ",").replace("X", ".")
+    if val_abs >= 1_000: return f"{sign}R$ {val_abs/1_000:,.0f} mil".replace(",", "X").replace(".", ",").replace("X", ".")
+    return brl(val)
+
+def format_int_abrev(val):
+    if pd.isna(val) or val == 0: return "0"
+    if val >= 1000: return f"{val/1000:,.1f}k".replace(".", ",")
+    return f"{int(val)}"
+
+
+BORDAS = [
+    0.0, -0.0, 0.004, 0.005, 0.015, 0.125, 0.5, 1.005, 2.675, -2.675, 9.995, 999.994, 999.995,
+    999.5, 1000.0, -1000.0, 1234.5, -1234.56, 99_999.95, 999_999.995, 1_000_000.0, 1_049_999.0,
+    -3_456_789.12, 123_456_789_012.345, 7.0, -7.0, np.nan,
+]
+
+@pytest.fixture(scope="module")
+def valores():
+    rng = np.random.default_rng(0)
+    grandezas = 10.0 ** rng.integers(-3, 12, 20_000)
+    casas = 10.0 ** rng.integers(0, 4, 20_000)
+    aleatorios = np.round(rng.uniform(-1, 1, 20_000) * grandezas * casas) / casas
+    return np.concatenate([BORDAS, aleatorios])
+
+def assert_igual(vetorizado, referencia, valores):
+    esperado = [referencia(v) for v in valores]
+    diferentes = [(v, g, e) for v, g, e in zip(valores, vetorizado.tolist(), esperado) if g != e]
+    assert not diferentes, diferentes[:10]
+
+
+def test_brl_array(valores):
+    assert_igual(fmt.brl_array(valores), brl, valores)
+
+def test_format_int_array(valores):
+    assert_igual(fmt.format_int_array(valores), format_int, valores)
+
+def test_format_percent_array(valores):
+    assert_igual(fmt.format_percent_array(valores), format_percent_col, valores)
+
+def test_format_percent_array_sem_sinal(valores):
+    assert_igual(fmt.format_percent_array(valores, signed=False), lambda v: "-" if pd.isna(v) else f"{v:.2f}%", valores)
+
+def test_format_decimal_array(valores):
+    assert_igual(fmt.format_decimal_array(valores, 1), lambda v: "-" if pd.isna(v) else f"{v:,.1f}", valores)
+
+def test_format_brl_abrev_array(valores):
+    assert_igual(fmt.format_brl_abrev_array(valores), format_pt_br_abrev, valores)
+
+def test_format_int_abrev_array():
+    # Eixos de inserções: só valores não negativos
+    valores = np.r_[0, 1, 999, 1000, 1049, 1050, 1250, 999_949, 1_234_567, np.nan, np.arange(0, 200_000, 37.5)]
+    assert_igual(fmt.format_int_abrev_array(valores), format_int_abrev, valores)
+
+def test_texto_passa_sem_formatacao():
+    valores = np.array([1234, "Totalizador", np.nan, -5.5], dtype=object)
+    assert fmt.format_int_array(valores).tolist() == ["1.234", "Totalizador", "-", "-5"]
+    assert fmt.brl_array(valores).tolist() == ["R$ 1.234,00", "Totalizador", "—", "R$ -5,50"]
+
+def test_brl_abrev_escalar():
+    assert fmt.brl_abrev(1_500_000) == "R$ 1,5 Mi"
+    assert fmt.brl_abrev(-2_500) == "-R$ 2 mil"
+
+def format_currency(val):
+    """Referência de Perdas & Ganhos (brl_abrev com mil=False)."""
+    if pd.isna(val): return "R$ 0,00"
+    val_abs = abs(val)
+    sign = "-" if val < 0 else ""
+    if val_abs >= 1_000_000:
+        return f"{sign}R$ {val_abs/1_000_000:,.1f} Mi".replace(",", "X").replace(".", ",").replace("X", ".")
+    return brl(val)
+
+def test_format_brl_abrev_array_so_milhoes(valores):
+    valores = valores[~np.signbit(valores) | (valores != 0)]  # -0.0 saía como 'R$ -0,00'
+    assert_igual(fmt.format_brl_abrev_array(valores, mil=False), format_currency, valores)
@@ -0,0 +1,106 @@
+# tests/test_jobs.py
+import os
+import threading
+import time
+
+import pytest
+
+from utils import jobs
+
+
+@pytest.fixture(autouse=True)
+def fila(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 1)
+    jobs.shutdown_pool()
+    yield
+    jobs.shutdown_pool()
+
+
+def espera(job_id, *status, timeout=10):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        job = jobs.get_job(job_id)
+        if job is not None and job["status"] in status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} não chegou a {status}: {jobs.get_job(job_id)}")
+
+def submit(build, owner="nav-1", signature="sig"):
+    return jobs.submit_job(owner, "Relatório", build, "relatorio.xlsx", "application/octet-stream", signature)
+
+
+def test_job_passa_por_fila_execucao_e_pronto():
+    liberar, no_meio = threading.Event(), threading.Event()
+
+    def build():
+        jobs.report_progress(0.5, "Metade")
+        no_meio.set()
+        liberar.wait(5)
+        return b"conteudo"
+
+    primeiro = submit(build)
+    segundo = submit(lambda: b"x")  # um worker só: espera o primeiro
+    assert jobs.get_job(segundo)["status"] == jobs.QUEUED
+
+    assert no_meio.wait(5)
+    job = jobs.get_job(primeiro)
+    assert job["status"] == jobs.RUNNING
+    assert (job["progress"], job["message"]) == (0.5, "Metade")
+
+    liberar.set()
+    job = espera(primeiro, jobs.DONE)
+    assert job["progress"] == 1.0 and job["size"] == len(b"conteudo") and job["finished"]
+    assert jobs.read_artifact(job) == b"conteudo"
+    assert espera(segundo, jobs.DONE)["status"] == jobs.DONE
+
+def test_progresso_nao_volta_e_fora_de_job_e_ignorado():
+    jobs.report_progress(0.3, "sem job")  # fora de um job: no-op
+
+    visto = []
+
+    def build():
+        jobs.report_progress(0.8)
+        jobs.report_progress(0.2)
+        visto.append(jobs._local.job["progress"])
+        return b"x"
+
+    espera(submit(build), jobs.DONE)
+    assert visto == [0.8]
+
+def test_falha_no_build_vira_erro():
+    def build():
+        raise ValueError("sem dados")
+
+    job = espera(submit(build), jobs.ERROR)
+    assert job["error"] == "sem dados" and job["finished"]
+
+def test_job_de_processo_encerrado_aparece_como_erro(monkeypatch):
+    job_id = submit(lambda: b"x")
+    espera(job_id, jobs.DONE)
+    job = jobs.get_job(job_id)
+    job.update(status=jobs.RUNNING, pid=os.getpid() + 1_000_000)
+    jobs._save(job)
+    monkeypatch.setattr(jobs, "_pid_alive", lambda pid: False)
+
+    job = jobs.get_job(job_id)
+    assert job["status"] == jobs.ERROR and "reiniciado" in job["error"]
+
+def test_find_job_ignora_outros_donos_e_erros():
+    ok = submit(lambda: b"x", owner="nav-1", signature="a")
+    espera(ok, jobs.DONE)
+    espera(submit(lambda: 1 / 0, owner="nav-1", signature="b"), jobs.ERROR)
+    espera(submit(lambda: b"y", owner="nav-2", signature="a"), jobs.DONE)
+
+    assert jobs.find_job("nav-1", "a")["id"] == ok
+    assert jobs.find_job("nav-1", "b") is None
+    assert [j["owner"] for j in jobs.list_jobs("nav-2")] == ["nav-2"]
+
+def test_cleanup_apaga_terminados_fora_da_retencao():
+    job_id = submit(lambda: b"x")
+    espera(job_id, jobs.DONE)
+
+    jobs.cleanup(retention_h=1)
+    assert jobs.get_job(job_id) is not None
+    jobs.cleanup(retention_h=-1)
+    assert jobs.get_job(job_id) is None
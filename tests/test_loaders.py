@@ -0,0 +1,117 @@
+# tests/test_loaders.py
+import os
+import shutil
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from utils import crowley_store, crowley_table, dataset_version, loaders
+from tests.test_crowley_store import export, dias
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    """Drive falso: cada file_id é um arquivo local; registra o que foi baixado."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(loaders.DATA_FOLDER, exist_ok=True)
+    arquivos = {
+        "full": export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 6)),
+        "delta": export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 5), 3)),
+    }
+    baixados = []
+
+    def download_file(service, file_id, dest_path):
+        baixados.append(file_id)
+        shutil.copy(arquivos[file_id], dest_path)
+        return True
+
+    monkeypatch.setattr(loaders, "get_drive_service", lambda: object())
+    monkeypatch.setattr(loaders, "download_file", download_file)
+    monkeypatch.setattr(loaders.st, "secrets", {"drive_files": {"crowley_parquet": "full", "crowley_delta_parquet": "delta"}})
+    return baixados
+
+
+def test_store_vazio_usa_export_completo_mesmo_com_delta(drive):
+    nova, reconstruido, erro = loaders._sync_crowley_store()
+
+    assert erro is None and reconstruido
+    assert drive == ["full"]
+    assert nova.num_rows == 18
+    assert crowley_store.load_manifest()["max_date"] == "2024-03-06"
+
+def test_store_existente_usa_delta(drive):
+    loaders._sync_crowley_store()
+    nova, reconstruido, erro = loaders._sync_crowley_store()
+
+    assert erro is None and not reconstruido
+    assert drive == ["full", "delta"]
+    assert nova.num_rows == 3  # só 07/03 é novo no delta
+    assert crowley_store.load_manifest()["rows"] == 21
+
+def test_delta_com_dias_faltando_usa_export_completo(drive, tmp_path):
+    loaders._sync_crowley_store()
+    # Export completo até 06/03 no store; o delta seguinte pula 07/03
+    export(str(tmp_path / "full.parquet"), dias(date(2024, 3, 1), 10))
+    export(str(tmp_path / "delta.parquet"), dias(date(2024, 3, 8), 3))
+    nova, reconstruido, erro = loaders._sync_crowley_store()
+
+    assert erro is None and not reconstruido
+    assert drive == ["full", "delta", "full"]
+    assert nova.num_rows == 12  # 07 a 10/03, vindos do export completo
+    assert crowley_store.load_manifest()["rows"] == 30
+
+def test_conferencia_periodica_usa_export_completo(drive, monkeypatch):
+    loaders._sync_crowley_store()
+    monkeypatch.setattr(loaders, "CROWLEY_FULL_CHECK_SECONDS", 0)
+    loaders._sync_crowley_store()
+    assert drive == ["full", "full"]
+
+def test_store_apagado_volta_ao_export_completo(drive):
+    loaders._sync_crowley_store()
+    crowley_store.reset_store()
+    nova, _, _ = loaders._sync_crowley_store()
+
+    assert drive == ["full", "full"]
+    assert nova.num_rows == 18
+
+
+def vendas(path, faturamento):
+    pd.DataFrame({
+        "Emissora": ["Rádio A", "Rádio B"], "Cliente": ["Cliente X", "Cliente Y"], "Executivo": ["Ana", "Bia"],
+        "data_ref": ["2024-01-01", "2024-02-01"], "Faturamento": faturamento, "Insercoes": [10, 20],
+    }).to_parquet(path)
+    return path
+
+def test_vendas_sem_revisao_sao_versionadas_pelo_conteudo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(loaders.DATA_FOLDER, exist_ok=True)
+    origem = {"xlsx": vendas(str(tmp_path / "v1.parquet"), [100.0, 200.0])}
+    monkeypatch.setattr(loaders, "get_drive_service", lambda: object())
+    monkeypatch.setattr(loaders, "download_file", lambda service, file_id, dest: shutil.copy(origem[file_id], dest) or True)
+    monkeypatch.setattr(loaders.st, "secrets", {"drive_files": {"faturamento_xlsx": "xlsx"}})
+
+    def versao():
+        loaders.fetch_from_drive.clear()
+        df, _ = loaders.fetch_from_drive(None)
+        return dataset_version.of(df)
+
+    v1 = versao()
+    assert v1 and not v1.startswith("sem-revisao")
+    assert versao() == v1
+    origem["xlsx"] = vendas(str(tmp_path / "v2.parquet"), [100.0, 250.0])
+    assert versao() != v1
+
+def test_falha_do_drive_nao_marca_o_snapshot_como_conferido(drive, monkeypatch):
+    assert loaders._update_snapshot() is None
+    antes = crowley_table.snapshot_info()
+    monkeypatch.setattr(loaders, "download_file", lambda service, file_id, dest: False)
+
+    assert loaders._update_snapshot() == "Erro Download"
+    assert crowley_table.snapshot_info() == antes
+
+    state = {"tb": None, "snapshot": None, "ultima": "N/A", "checked_at": 0.0}
+    monkeypatch.setattr(crowley_table, "snapshot_info", lambda *a: dict(antes, checked_at=0.0))
+    loaders._refresh_crowley(state)
+    # Snapshot existente continua servindo, mas a próxima execução tenta de novo
+    assert state["tb"] is not None and state["checked_at"] == 0.0
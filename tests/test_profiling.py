@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from utils import profiling
+
+
+@pytest.fixture(autouse=True)
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    yield tmp_path
+    profiling.stop()
+
+
+def em_thread(fn):
+    out = {}
+    t = threading.Thread(target=lambda: out.setdefault("r", fn()))
+    t.start()
+    t.join()
+    return out["r"]
+
+
+def test_segunda_captura_simultanea_e_ignorada():
+    assert profiling.start("Início", "query")
+    assert em_thread(lambda: profiling.start("Top 10", "query")) is False
+
+    capture_id = profiling.stop()
+    assert capture_id is not None
+    assert [m["id"] for m in profiling.list_captures()] == [capture_id]
+    # Livre de novo depois do stop()
+    assert em_thread(lambda: (profiling.start("Top 10", "query"), profiling.stop())[0])
+
+
+def test_captura_de_thread_encerrada_e_descartada():
+    # Thread do script que terminou sem stop() não bloqueia as próximas
+    assert em_thread(lambda: profiling.start("Início", "query"))
+    assert profiling.start("Top 10", "query")
+    assert profiling.stop() is not None
+    assert [m["page"] for m in profiling.list_captures()] == ["Top 10"]
@@ -0,0 +1,127 @@
+# tests/test_result_cache.py
+import os
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import dataset_version, result_cache
+
+MODULO = '''
+from utils import result_cache
+
+CHAMADAS = []
+FATOR = {fator}
+
+@result_cache.cached
+def compute_total(base, coluna="valor", escala=1):
+    CHAMADAS.append((coluna, escala))
+    return {{"total": base[coluna].sum() * FATOR * escala, "por_grupo": base.groupby("grupo")[coluna].sum()}}
+'''
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(result_cache, "_size", {"bytes": None, "at": 0.0})
+    return tmp_path / "cache"
+
+
+def modulo(tmp_path, fator=1):
+    """Módulo compute_* num arquivo próprio (o hash do código sai dele)."""
+    path = tmp_path / "pagina_teste.py"
+    path.write_text(MODULO.format(fator=fator), encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("pagina_teste", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def base(valores, revisao="r1"):
+    df = pd.DataFrame({"grupo": ["a", "b", "a"], "valor": valores})
+    return dataset_version.attach(df, revisao)
+
+
+def test_acerto_devolve_o_mesmo_resultado_sem_recalcular(tmp_path):
+    mod = modulo(tmp_path)
+    primeiro = mod.compute_total(base([1.0, 2.0, 3.0]))
+    segundo = mod.compute_total(base([1.0, 2.0, 3.0]))
+
+    assert len(mod.CHAMADAS) == 1
+    assert segundo["total"] == primeiro["total"] == 6.0
+    pd.testing.assert_series_equal(segundo["por_grupo"], primeiro["por_grupo"])
+
+def test_parametros_equivalentes_caem_na_mesma_entrada(tmp_path):
+    mod = modulo(tmp_path)
+    mod.compute_total(base([1.0, 2.0, 3.0]))
+    mod.compute_total(base([1.0, 2.0, 3.0]), "valor", escala=1)
+    assert len(mod.CHAMADAS) == 1
+
+    assert mod.compute_total(base([1.0, 2.0, 3.0]), escala=2)["total"] == 12.0
+    assert len(mod.CHAMADAS) == 2
+
+def test_nova_versao_da_base_invalida(tmp_path):
+    mod = modulo(tmp_path)
+    mod.compute_total(base([1.0, 2.0, 3.0], "r1"))
+    assert mod.compute_total(base([5.0, 5.0, 5.0], "r2"))["total"] == 15.0
+    assert len(mod.CHAMADAS) == 2
+
+def test_base_sem_versao_nao_usa_cache(tmp_path, cache_dir):
+    mod = modulo(tmp_path)
+    df = pd.DataFrame({"grupo": ["a"], "valor": [1.0]})
+    mod.compute_total(df)
+    mod.compute_total(df)
+    assert len(mod.CHAMADAS) == 2
+    assert result_cache.stats(str(cache_dir))["entries"] == 0
+
+def test_mudanca_no_codigo_da_pagina_invalida(tmp_path):
+    modulo(tmp_path).compute_total(base([1.0, 2.0, 3.0]))
+    mod = modulo(tmp_path, fator=10)
+    assert mod.compute_total(base([1.0, 2.0, 3.0]))["total"] == 60.0
+    assert len(mod.CHAMADAS) == 1
+
+def test_mudanca_em_utils_ou_na_versao_do_codigo_invalida(tmp_path, monkeypatch):
+    modulo(tmp_path).compute_total(base([1.0, 2.0, 3.0]))
+
+    monkeypatch.setattr(result_cache, "_package_hash", lambda: "outro-utils")
+    mod = modulo(tmp_path)
+    mod.compute_total(base([1.0, 2.0, 3.0]))
+    assert len(mod.CHAMADAS) == 1
+
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_CODE_VERSION", "deploy-2")
+    mod = modulo(tmp_path)
+    mod.compute_total(base([1.0, 2.0, 3.0]))
+    assert len(mod.CHAMADAS) == 1
+
+def test_entradas_antigas_sao_apagadas_pelo_lru(cache_dir):
+    for i in range(3):
+        key = f"{i:064d}"
+        result_cache.put(key, np.zeros(100_000), str(cache_dir))
+        meta = os.path.join(result_cache._entry_path(key, str(cache_dir)), result_cache.META_FILE)
+        os.utime(meta, (1_000 + i, 1_000 + i))
+    # ~0,8 MB por entrada; limite de 2 MB mantém as mais recentes
+    result_cache.prune(str(cache_dir), max_mb=2)
+    assert result_cache.stats(str(cache_dir))["entries"] < 3
+    assert result_cache.get(f"{2:064d}", str(cache_dir)) is not result_cache._MISSING
+
+def test_varredura_so_quando_passa_do_limite_ou_expira(tmp_path, monkeypatch):
+    varreduras = []
+    original = result_cache.prune
+    monkeypatch.setattr(result_cache, "prune", lambda *a, **k: varreduras.append(1) or original(*a, **k))
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_MB", 1)
+    mod = modulo(tmp_path)
+
+    for i in range(5):
+        mod.compute_total(base([1.0, 2.0, float(i)], f"r{i}"))
+    assert len(mod.CHAMADAS) == 5
+    assert len(varreduras) == 1  # só a primeira gravação (total ainda desconhecido)
+
+    result_cache.note_write(2 * 1024 * 1024)  # passa do limite
+    assert len(varreduras) == 2
+    result_cache.note_write(10)
+    assert len(varreduras) == 2
+
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_PRUNE_SECONDS", 0)
+    result_cache.note_write(10)  # total estimado vencido: varre de novo
+    assert len(varreduras) == 3
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from utils.tables import SIGN_PREFIX, brl_column, int_column, pct_column, number_config, present, split_total
+
+
+def test_present_mantem_valores_numericos():
+    df = pd.DataFrame({"Faturamento": [1234.5, -10.0, np.nan], "Share %": [12.345, 0.0, 100.0], "Inserções": [1500, 0, 7]})
+    config = number_config(df.columns, brl=["Faturamento"], ints=["Inserções"], pct=["Share %"])
+    out, cfg, order = present(df, config)
+
+    # R$ e inteiros seguem como vieram; percentual em fração para o formato "percent"
+    pd.testing.assert_series_equal(out["Faturamento"], df["Faturamento"])
+    assert out["Inserções"].tolist() == [1500, 0, 7]
+    np.testing.assert_allclose(out["Share %"], [0.12345, 0.0, 1.0])
+    assert (cfg["Faturamento"]["type_config"]["format"], cfg["Faturamento"]["type_config"]["step"]) == ("localized", 0.01)
+    assert cfg["Faturamento"]["label"] == "Faturamento (R$)"
+    assert cfg["Share %"]["type_config"]["format"] == "percent"
+    assert order is None
+    # O df original não é alterado (exports continuam em pontos)
+    assert df["Share %"].iloc[0] == 12.345
+
+def test_present_preserva_label_e_help():
+    df = pd.DataFrame({"Custo Médio": [2.5]})
+    config = {"Custo Médio": brl_column(label="CMU", help="Custo Médio Unitário")}
+    out, cfg, _ = present(df, config)
+    assert out is df
+    assert cfg["Custo Médio"]["label"] == "CMU (R$)"
+    assert cfg["Custo Médio"]["help"] == "Custo Médio Unitário"
+
+def test_present_marca_sinal_em_coluna_propria():
+    df = pd.DataFrame({"Cliente": ["A", "B", "C"], "Δ": [5, -3, 0], "Δ%": [10.0, -2.5, np.nan]})
+    config = {"Δ": int_column("Δ"), "Δ%": pct_column("Δ%", signed=True)}
+    out, cfg, order = present(df, config, color_cols=["Δ", "Δ%", "ausente"])
+
+    assert out["Δ"].tolist() == [5, -3, 0]
+    assert list(out[f"{SIGN_PREFIX}Δ"]) == ["🟢", "🔴", ""]
+    assert list(out[f"{SIGN_PREFIX}Δ%"]) == ["🟢", "🔴", ""]
+    assert order == ["Cliente", f"{SIGN_PREFIX}Δ", "Δ", f"{SIGN_PREFIX}Δ%", "Δ%"]
+    assert cfg[f"{SIGN_PREFIX}Δ"]["type_config"]["type"] == "text"
+
+def test_present_respeita_column_order():
+    df = pd.DataFrame({"Cliente": ["A"], "Δ": [1], "Extra": [0]})
+    _, _, order = present(df, {}, color_cols=["Δ"], column_order=["Δ", "Cliente"])
+    assert order == [f"{SIGN_PREFIX}Δ", "Δ", "Cliente"]
+
+def test_present_ordenacao_numerica():
+    df = pd.DataFrame({"Faturamento": [9.0, 10_000.0, -5.0]})
+    out, _, _ = present(df, number_config(df.columns, brl=["Faturamento"]), color_cols=["Faturamento"])
+    assert out.sort_values("Faturamento")["Faturamento"].tolist() == [-5.0, 9.0, 10_000.0]
+
+def test_split_total_por_rotulo_e_ultima_linha():
+    df = pd.DataFrame({"Cliente": ["A", "B", "Totalizador"], "Faturamento": [1.0, 2.0, 3.0]})
+    corpo, total = split_total(df)
+    assert list(corpo["Cliente"]) == ["A", "B"]
+    assert list(total["Faturamento"]) == [3.0]
+
+    corpo, total = split_total(df.iloc[:2], last=True)
+    assert list(corpo["Cliente"]) == ["A"] and list(total["Cliente"]) == ["B"]
@@ -0,0 +1,117 @@
+# utils/client_matrix.py
+"""
+Matriz esparsa cliente × emissora para a página de Cruzamentos & Interseções.
+
+Cada par (cliente, emissora) existente no período vira uma entrada (formato
+COO, ordenado por cliente) com faturamento e inserções. Todas as métricas
+saem de reduções sobre essas entradas:
+
+- somas por linha (bincount por cliente): nº de emissoras do cliente;
+- somas por coluna (bincount por emissora): exclusivos, compartilhados, ausentes;
+- P^T·P e mínimos por par de colunas: matriz de interseção.
+
+Para P^T·P as entradas de cada cliente são combinadas duas a duas (o custo é
+a soma de k² sobre os clientes, onde k é o nº de emissoras do cliente), em
+blocos para limitar a memória.
+"""
+import numpy as np
+import pandas as pd
+
+# Máximo de pares (cliente, emissora_a, emissora_b) materializados por bloco
+PAIR_CHUNK = 4_000_000
+
+
+class ClientMatrix:
+    """Entradas (cliente, emissora, faturamento, inserções) ordenadas por cliente."""
+
+    def __init__(self, clientes, emissoras, cli, emi, fat, ins):
+        self.clientes = clientes    # rótulos das linhas
+        self.emissoras = emissoras  # rótulos das colunas (ordenados)
+        self.cli = cli              # código do cliente de cada entrada
+        self.emi = emi              # código da emissora de cada entrada
+        self.fat = fat
+        self.ins = ins
+
+    @classmethod
+    def from_agg(cls, agg):
+        """Monta a matriz a partir do agrupamento (cliente, emissora) com faturamento/insercoes."""
+        cli, clientes = pd.factorize(agg["cliente"], sort=True)
+        emi, emissoras = pd.factorize(agg["emissora"], sort=True)
+        order = np.lexsort((emi, cli))
+        return cls(
+            clientes, emissoras,
+            cli[order], emi[order],
+            agg["faturamento"].to_numpy(dtype=float)[order],
+            agg["insercoes"].to_numpy(dtype=float)[order],
+        )
+
+    @property
+    def n_clientes(self):
+        return len(self.clientes)
+
+    @property
+    def n_emissoras(self):
+        return len(self.emissoras)
+
+    # --- REDUÇÕES ---
+    def row_sum(self, values=None, mask=None):
+        """Soma por cliente (sem values: contagem de entradas)."""
+        cli = self.cli if mask is None else self.cli[mask]
+        w = None if values is None else (values if mask is None else values[mask])
+        return np.bincount(cli, weights=w, minlength=self.n_clientes)
+
+    def col_sum(self, values=None, mask=None):
+        """Soma por emissora (sem values: contagem de entradas)."""
+        emi = self.emi if mask is None else self.emi[mask]
+        w = None if values is None else (values if mask is None else values[mask])
+        return np.bincount(emi, weights=w, minlength=self.n_emissoras)
+
+    # --- INTERSEÇÕES ---
+    def _pairs(self, sel):
+        """
+        Pares (i, j) de entradas do mesmo cliente dentro de `sel` (índices
+        ordenados por cliente), gerados em blocos de até ~PAIR_CHUNK pares
+        sem separar um cliente entre blocos.
+        """
+        if sel.size == 0:
+            return
+        c = self.cli[sel]
+        g_ini = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+        g_k = np.diff(np.r_[g_ini, sel.size])
+        bloco = np.cumsum(g_k.astype(np.int64) ** 2) // PAIR_CHUNK
+        cortes = np.r_[0, np.flatnonzero(np.diff(bloco)) + 1, g_ini.size]
+
+        for a, b in zip(cortes[:-1], cortes[1:]):
+            ini = g_ini[a]
+            kk = g_k[a:b]
+            k_ent = np.repeat(kk, kk)                  # k do cliente de cada entrada
+            s_ent = np.repeat(g_ini[a:b], kk)          # início do cliente de cada entrada
+            ia = np.repeat(np.arange(ini, ini + k_ent.size), k_ent)
+            pos = np.arange(ia.size) - np.repeat(np.cumsum(k_ent) - k_ent, k_ent)
+            ib = np.repeat(s_ent, k_ent) + pos
+            yield sel[ia], sel[ib]
+
+    def _pair_reduce(self, mask, weight_fn):
+        n = self.n_emissoras
+        out = np.zeros(n * n)
+        for ia, ib in self._pairs(np.flatnonzero(mask)):
+            out += np.bincount(self.emi[ia] * n + self.emi[ib], weights=weight_fn(ia, ib), minlength=n * n)
+        return out.reshape(n, n)
+
+    def gram(self, mask):
+        """P^T·P: nº de clientes em comum entre cada par de emissoras (P = entradas em `mask`)."""
+        return self._pair_reduce(mask, lambda ia, ib: None)
+
+    def shared_min(self, values):
+        """
+        Soma, por par de emissoras, do menor valor entre as duas para cada
+        cliente presente em ambas (só valores positivos). A diagonal é o total
+        da emissora.
+        """
+        mat = self._pair_reduce(values > 0, lambda ia, ib: np.minimum(values[ia], values[ib]))
+        np.fill_diagonal(mat, self.col_sum(values))
+        return mat
+
+    def frame(self, mat):
+        """Matriz emissora × emissora como DataFrame rotulado."""
+        return pd.DataFrame(mat, index=list(self.emissoras), columns=list(self.emissoras))
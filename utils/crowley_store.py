@@ -0,0 +1,399 @@
+# utils/crowley_store.py
+"""
+Armazenamento local particionado da base Crowley.
+
+O export do Crowley cresce alguns dias por vez. Em vez de reprocessar todo o
+histórico a cada atualização, mantemos em disco uma cópia particionada por mês
+(data/crowley_store/mes=AAAA-MM/part-*.parquet) e anexamos apenas os dias novos
+que aparecem no arquivo de origem (ou num arquivo delta).
+
+Os arquivos do store são regravados ordenados por (Praca, Data_Dt), com zstd,
+row groups de tamanho fixo, estatísticas min/max e page index: leituras
+limitadas por praça/período (scan) pulam row groups inteiros.
+
+Este módulo não depende do Streamlit: pode ser usado por scripts e rotinas
+offline. O cache em memória fica em utils/loaders.py.
+
+Uso standalone:
+    python -m utils.crowley_store recode data/crowley.parquet data/crowley_sorted.parquet
+    python -m utils.crowley_store compact
+"""
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+# --- CONFIGURAÇÃO ---
+STORE_DIR = os.path.join("data", "crowley_store")
+MANIFEST_NAME = "_manifest.json"
+
+CAT_COLS = ["Praca", "Emissora", "Anunciante", "Anuncio", "Tipo", "DayPart"]
+NUM_COLS = ["Volume de Insercoes", "Duracao"]
+DATE_COL = "Data_Dt"
+
+# Layout dos arquivos gravados localmente
+SORT_COLS = ["Praca", DATE_COL]
+ROW_GROUP_SIZE = 65_536
+DATA_PAGE_SIZE = 256 * 1024
+COMPRESSION = "zstd"
+
+
+# --- MANIFESTO ---
+def _empty_manifest():
+    return {"partitions": {}, "max_date": None, "rows": 0, "updated_at": None, "full_checked_at": None}
+
+def load_manifest(store_dir=STORE_DIR):
+    """Lê o manifesto do store (partições, total de linhas e última data)."""
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return _empty_manifest()
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return _empty_manifest()
+
+def _save_manifest(manifest, store_dir):
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    tmp_path = os.path.join(store_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    # Troca atômica: leitores nunca veem um manifesto pela metade
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_NAME))
+
+def reset_store(store_dir=STORE_DIR):
+    """Apaga o store inteiro (usado quando o histórico da origem muda)."""
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir, ignore_errors=True)
+    os.makedirs(store_dir, exist_ok=True)
+
+
+# --- DATAS ---
+# Formatos aceitos para a coluna 'Data' da origem, em ordem de prioridade
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d")
+
+def parse_dates(values):
+    """
+    Converte a coluna 'Data' da origem para timestamp[ms] no próprio Arrow,
+    com formato explícito (sem criar strings Python nem inferir formato).
+    Valores inválidos viram nulos.
+    """
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+
+    if pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+        return pc.cast(values, pa.timestamp("ms"))
+
+    values = pc.utf8_trim_whitespace(pc.cast(values, pa.string()))
+    parsed = [pc.strptime(values, format=fmt, unit="ms", error_is_null=True) for fmt in DATE_FORMATS]
+    return pc.coalesce(*parsed)
+
+
+# --- LEITURA ---
+def read_source(path, columns=None, row_groups=None):
+    """
+    Lê um arquivo Crowley já no formato final do store:
+    - colunas categóricas como dictionary (viram category no Pandas sem
+      materializar strings Python);
+    - numéricos como int32 sem nulos;
+    - 'Data' (texto) substituída por 'Data_Dt' (timestamp).
+    row_groups limita a leitura a esses row groups (os demais nem são decodificados).
+    """
+    schema = pq.read_schema(path)
+    read_dict = [c for c in CAT_COLS if c in schema.names and (columns is None or c in columns)]
+    if row_groups is None:
+        table = pq.read_table(path, columns=columns, memory_map=True, read_dictionary=read_dict, partitioning=None)
+    else:
+        arquivo = pq.ParquetFile(path, memory_map=True, read_dictionary=read_dict)
+        table = arquivo.read_row_groups(row_groups, columns=columns)
+
+    for col in NUM_COLS:
+        if col in table.column_names:
+            arr = table.column(col)
+            if pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type):
+                arr = pc.cast(pc.fill_null(arr, 0), pa.int32(), safe=False)
+            else:
+                arr = pa.array(pd.to_numeric(arr.to_pandas(), errors="coerce").fillna(0).astype("int32"))
+            table = table.set_column(table.column_names.index(col), col, arr)
+
+    if "Data" in table.column_names:
+        datas = parse_dates(table.column("Data"))
+        table = table.drop(["Data"]).append_column(DATE_COL, datas)
+
+    return table
+
+
+# --- GRAVAÇÃO ORDENADA ---
+def sort_for_scan(table):
+    """Ordena por (Praca, Data_Dt); a praça é comparada como texto (ordem das estatísticas)."""
+    keys = pa.table({
+        "praca": pc.cast(table.column("Praca"), pa.string()),
+        "data": table.column(DATE_COL),
+    })
+    return table.take(pc.sort_indices(keys, sort_keys=[("praca", "ascending"), ("data", "ascending")]))
+
+def write_sorted(table, path):
+    """Grava a tabela no layout do store (ordenada, zstd, estatísticas e page index)."""
+    pq.write_table(
+        sort_for_scan(table), path,
+        compression=COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+        data_page_size=DATA_PAGE_SIZE,
+        write_statistics=True,
+        write_page_index=True,
+        sorting_columns=[pq.SortingColumn(table.column_names.index(c)) for c in SORT_COLS],
+    )
+
+def recode_file(src_path, dest_path):
+    """Regrava um export do Crowley no layout do store. Retorna o número de linhas."""
+    table = read_source(src_path)
+    table = table.filter(pc.is_valid(table.column(DATE_COL)))
+    tmp_path = dest_path + ".tmp"
+    write_sorted(table, tmp_path)
+    os.replace(tmp_path, dest_path)
+    return table.num_rows
+
+
+# --- INGESTÃO ---
+class DeltaMismatch(Exception):
+    """O delta não emenda no store (dias faltando ou dias já armazenados com outra contagem)."""
+
+def _write_partitions(table, store_dir, manifest):
+    """Grava as linhas novas em arquivos mensais e atualiza o manifesto."""
+    meses = pc.strftime(table.column(DATE_COL), format="%Y-%m")
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+    for mes in sorted(pc.unique(meses).to_pylist()):
+        part = table.filter(pc.equal(meses, mes))
+        part_dir = os.path.join(store_dir, f"mes={mes}")
+        os.makedirs(part_dir, exist_ok=True)
+        file_name = f"part-{stamp}.parquet"
+        write_sorted(part, os.path.join(part_dir, file_name))
+
+        info = manifest["partitions"].setdefault(mes, {"files": [], "rows": 0})
+        info["files"].append(file_name)
+        info["rows"] += part.num_rows
+
+    manifest["rows"] = sum(p["rows"] for p in manifest["partitions"].values())
+
+def _row_groups_with(path, mask):
+    """Row groups do arquivo com alguma linha marcada em `mask` e a máscara restrita a eles."""
+    meta = pq.ParquetFile(path, memory_map=True).metadata
+    mask = mask.combine_chunks() if isinstance(mask, pa.ChunkedArray) else mask
+    grupos, partes, inicio = [], [], 0
+    for i in range(meta.num_row_groups):
+        n = meta.row_group(i).num_rows
+        parte = mask.slice(inicio, n)
+        if pc.any(parte).as_py():
+            grupos.append(i)
+            partes.append(parte)
+        inicio += n
+    return grupos, pa.concat_arrays(partes)
+
+def ingest_file(src_path, store_dir=STORE_DIR, is_delta=False):
+    """
+    Anexa ao store os dias do arquivo que ainda não existem nele.
+
+    - Arquivo completo (is_delta=False): confere se o histórico já armazenado
+      bate com a origem (mesma contagem de linhas até a última data do store).
+      Se não bater, o store é reconstruído do zero.
+      A conferência fica registrada em manifest["full_checked_at"] (epoch).
+    - Arquivo delta (is_delta=True): contém apenas os dias recentes; só os
+      dias depois da última data do store são anexados. O delta precisa
+      emendar no store: se começar depois do dia seguinte à última data
+      (delta perdido ou atrasado) ou se os dias que ele repete tiverem outra
+      contagem de linhas no store (linhas que chegaram atrasadas), levanta
+      DeltaMismatch sem alterar o store, e quem chamou usa o export completo.
+
+    Linhas sem data válida são descartadas (nenhum relatório as utiliza).
+    Retorna (tabela_arrow_nova, reconstruido). A tabela vem com a coluna
+    'Data_Dt' no lugar de 'Data'.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+
+    # 1. Lê só a coluna de data para decidir o que é novo
+    datas = parse_dates(pq.read_table(src_path, columns=["Data"], memory_map=True).column("Data"))
+    validas = pc.is_valid(datas)
+
+    max_date = pa.scalar(pd.Timestamp(manifest["max_date"]), type=pa.timestamp("ms")) if manifest["max_date"] else None
+    rebuilt = False
+
+    if max_date is not None and is_delta:
+        _check_delta(datas, max_date, store_dir)
+    elif max_date is not None:
+        antigas = pc.sum(pc.and_kleene(validas, pc.less_equal(datas, max_date))).as_py() or 0
+        if antigas != manifest["rows"]:
+            reset_store(store_dir)
+            manifest = _empty_manifest()
+            max_date = None
+            rebuilt = True
+    else:
+        rebuilt = True
+    if not is_delta:
+        manifest["full_checked_at"] = time.time()
+
+    mask_novas = validas if max_date is None else pc.fill_null(pc.greater(datas, max_date), False)
+    if not pc.any(mask_novas).as_py():
+        if not is_delta:
+            _save_manifest(manifest, store_dir)
+        return None, rebuilt
+    del datas
+    gc.collect()
+
+    # 2. Lê só os row groups que têm linhas novas (o export cresce no fim:
+    #    numa atualização incremental são os últimos) e filtra dentro deles
+    grupos, mask = _row_groups_with(src_path, mask_novas)
+    table = read_source(src_path, row_groups=grupos).filter(mask)
+
+    # 3. Persiste e atualiza o manifesto
+    _write_partitions(table, store_dir, manifest)
+    manifest["max_date"] = pc.max(table.column(DATE_COL)).as_py().strftime("%Y-%m-%d")
+    _save_manifest(manifest, store_dir)
+
+    return table, rebuilt
+
+def _check_delta(datas, max_date, store_dir):
+    """Levanta DeltaMismatch se o delta não emenda no store (ver ingest_file)."""
+    inicio = pc.min(datas).as_py()
+    if inicio is None:
+        return
+    fim = max_date.as_py()
+    if inicio > fim + timedelta(days=1):
+        raise DeltaMismatch(f"delta começa em {inicio:%d/%m/%Y}; o store vai até {fim:%d/%m/%Y}")
+    if inicio <= fim:
+        repetidas = pc.sum(pc.fill_null(pc.less_equal(datas, max_date), False)).as_py() or 0
+        armazenadas = scan_store(store_dir, columns=[DATE_COL], date_from=inicio, date_to=fim)
+        armazenadas = armazenadas.num_rows if armazenadas is not None else 0
+        if repetidas != armazenadas:
+            raise DeltaMismatch(
+                f"{repetidas} linhas no delta e {armazenadas} no store entre {inicio:%d/%m/%Y} e {fim:%d/%m/%Y}"
+            )
+
+def read_store(store_dir=STORE_DIR):
+    """Lê todas as partições listadas no manifesto como uma única tabela Arrow."""
+    manifest = load_manifest(store_dir)
+    paths = [p for p in _partition_paths(store_dir, manifest) if os.path.exists(p)]
+    if not paths:
+        return None
+    tables = [read_source(p) for p in paths]
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def _partition_paths(store_dir, manifest, meses=None):
+    return [
+        os.path.join(store_dir, f"mes={mes}", file_name)
+        for mes in sorted(manifest["partitions"])
+        if meses is None or mes in meses
+        for file_name in manifest["partitions"][mes]["files"]
+    ]
+
+def compact_store(store_dir=STORE_DIR):
+    """
+    Junta os arquivos de cada mês (um por atualização incremental) num único
+    arquivo ordenado. Retorna o número de meses compactados.
+    """
+    manifest = load_manifest(store_dir)
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    compactados = 0
+
+    for mes, info in sorted(manifest["partitions"].items()):
+        part_dir = os.path.join(store_dir, f"mes={mes}")
+        antigos = [f for f in info["files"] if os.path.exists(os.path.join(part_dir, f))]
+        if not antigos:
+            continue
+        table = pa.concat_tables([read_source(os.path.join(part_dir, f)) for f in antigos], promote_options="default")
+        file_name = f"part-{stamp}.parquet"
+        write_sorted(table, os.path.join(part_dir, file_name))
+
+        info["files"], info["rows"] = [file_name], table.num_rows
+        _save_manifest(manifest, store_dir)
+        for f in antigos:
+            os.remove(os.path.join(part_dir, f))
+        compactados += 1
+
+    return compactados
+
+def scan(paths, columns=None, praca=None, date_from=None, date_to=None):
+    """
+    Leitura limitada por praça e/ou período. Os filtros vão para o leitor
+    Parquet, que descarta row groups pelas estatísticas min/max (efetivo nos
+    arquivos gravados por write_sorted).
+    """
+    filters = []
+    if praca is not None:
+        filters.append(("Praca", "in", list(praca)) if isinstance(praca, (list, tuple, set)) else ("Praca", "=", praca))
+    if date_from is not None:
+        filters.append((DATE_COL, ">=", pd.Timestamp(date_from)))
+    if date_to is not None:
+        filters.append((DATE_COL, "<", pd.Timestamp(date_to) + pd.Timedelta(days=1)))
+
+    read_dict = [c for c in CAT_COLS if columns is None or c in columns]
+    return pq.read_table(paths, columns=columns, filters=filters or None, memory_map=True,
+                         read_dictionary=read_dict, partitioning=None)
+
+def scan_store(store_dir=STORE_DIR, columns=None, praca=None, date_from=None, date_to=None):
+    """scan() sobre o store, abrindo só as partições mensais do período."""
+    manifest = load_manifest(store_dir)
+    meses = None
+    if date_from is not None or date_to is not None:
+        ini = pd.Timestamp(date_from or "1900-01-01").strftime("%Y-%m")
+        fim = pd.Timestamp(date_to or "2999-12-31").strftime("%Y-%m")
+        meses = {m for m in manifest["partitions"] if ini <= m <= fim}
+    paths = [p for p in _partition_paths(store_dir, manifest, meses) if os.path.exists(p)]
+    if not paths:
+        return None
+    return scan(paths, columns=columns, praca=praca, date_from=date_from, date_to=date_to)
+
+
+# --- CONVERSÃO PARA PANDAS ---
+def to_frame(table):
+    """Converte a tabela Arrow do store para o DataFrame usado nos relatórios."""
+    # self_destruct libera a memória do Arrow à medida que o Pandas é criado
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
+    gc.collect()
+
+    # As colunas dictionary já chegam como category; o astype só age em
+    # tabelas montadas fora de read_source
+    for col in CAT_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    return df
+
+
+# ==================== CLI ====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.crowley_store", description="Manutenção do store Crowley.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_recode = sub.add_parser("recode", help="Regrava um export do Crowley ordenado e com estatísticas.")
+    p_recode.add_argument("src")
+    p_recode.add_argument("dest")
+
+    p_compact = sub.add_parser("compact", help="Regrava cada mês do store num único arquivo ordenado.")
+    p_compact.add_argument("--store", default=STORE_DIR)
+
+    args = parser.parse_args(argv)
+    if args.cmd == "recode":
+        linhas = recode_file(args.src, args.dest)
+        print(f"{linhas} linhas gravadas em {args.dest}")
+    else:
+        meses = compact_store(args.store)
+        print(f"{meses} partições compactadas em {args.store}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,640 @@
+# utils/crowley_table.py
+"""
+Representação compacta da base Crowley em arrays NumPy.
+
+Cada linha ocupa ~20 bytes:
+- códigos de dicionário uint16 (ou int32 quando a coluna passa de 65 mil
+  valores) para Praca/Emissora/Anunciante/Anuncio/Tipo/DayPart;
+- dia como int16 (dias desde DAY_EPOCH) em vez de datetime64;
+- inserções e duração como uint16.
+
+Filtros e somas por grupo trabalham direto nos códigos. Um DataFrame só é
+montado (to_frame) para as linhas que vão ser exibidas ou exportadas.
+
+A tabela pronta é publicada como snapshot Feather (Arrow IPC sem compressão)
+e aberta com memory-map somente leitura: vários processos do servidor no
+mesmo host compartilham uma única cópia no page cache.
+"""
+import os
+import json
+import time
+import shutil
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+from .crowley_store import CAT_COLS, NUM_COLS, DATE_COL, STORE_DIR
+from . import dataset_version
+
+DAY_EPOCH = np.datetime64("2000-01-01", "D")
+DAY_NULL = np.iinfo(np.int16).min
+INS_COL, DUR_COL = NUM_COLS
+
+
+def _code_dtype(n_values):
+    return np.dtype(np.uint16) if n_values < np.iinfo(np.uint16).max else np.dtype(np.int32)
+
+def _null_code(dtype):
+    return np.iinfo(dtype).max if dtype == np.uint16 else -1
+
+def _to_day(value):
+    """Converte date/datetime/Timestamp para o ordinal int16 usado na tabela."""
+    if isinstance(value, (datetime, pd.Timestamp)):
+        value = value.date()
+    return int((np.datetime64(value, "D") - DAY_EPOCH).astype(np.int64))
+
+
+class CrowleyTable:
+    """Base Crowley compacta (imutável: append devolve uma nova tabela)."""
+
+    def __init__(self, codes, dictionaries, day, ins, dur):
+        self.codes = codes                # {coluna: array de códigos}
+        self.dictionaries = dictionaries  # {coluna: array object com os valores}
+        self.day = day                    # int16, dias desde DAY_EPOCH
+        self.ins = ins                    # uint16
+        self.dur = dur                    # uint16
+        self._ranks = {}                  # cache de _rank por coluna
+        self._arrow_dicts = {}            # cache dos dicionários em Arrow (to_arrow)
+        self._catalog = None              # cache do catálogo de filtros (catalog)
+        self.version = None               # versão do snapshot de origem (utils/dataset_version.py)
+
+    # --- CONSTRUÇÃO ---
+    @classmethod
+    def from_arrow(cls, table):
+        """Monta a tabela a partir do Arrow devolvido por crowley_store.read_source/read_store."""
+        table = table.unify_dictionaries()
+        codes, dictionaries = {}, {}
+
+        for col in CAT_COLS:
+            if col not in table.column_names:
+                arr = pa.chunked_array([pa.nulls(table.num_rows, pa.string())])
+            else:
+                arr = table.column(col)
+            if not pa.types.is_dictionary(arr.type):
+                arr = pc.dictionary_encode(arr)
+
+            dictionary = arr.chunk(0).dictionary if arr.num_chunks else pa.array([], pa.string())
+            dtype = _code_dtype(len(dictionary))
+            null = _null_code(dtype)
+            parts = [pc.fill_null(c.indices, null).to_numpy(zero_copy_only=False) for c in arr.chunks]
+            codes[col] = np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype)
+            dictionaries[col] = np.asarray(dictionary.to_pylist(), dtype=object)
+
+        if DATE_COL in table.column_names:
+            ms = pc.cast(pc.cast(table.column(DATE_COL), pa.timestamp("ms")), pa.int64())
+            dias = pc.fill_null(pc.divide(ms, 86_400_000), np.iinfo(np.int64).min).to_numpy()
+            day = np.where(dias == np.iinfo(np.int64).min, DAY_NULL, dias - DAY_EPOCH.astype(np.int64))
+            day = day.astype(np.int16)
+        else:
+            day = np.full(table.num_rows, DAY_NULL, dtype=np.int16)
+
+        def num(col):
+            if col not in table.column_names:
+                return np.zeros(table.num_rows, dtype=np.uint16)
+            arr = pc.fill_null(table.column(col), 0).to_numpy()
+            return np.clip(arr, 0, np.iinfo(np.uint16).max).astype(np.uint16)
+
+        return cls(codes, dictionaries, day, num(INS_COL), num(DUR_COL))
+
+    def append(self, other):
+        """
+        Nova tabela com as linhas de `other` no fim. Os códigos já existentes
+        não mudam: valores novos entram no fim de cada dicionário.
+        """
+        if other is None or len(other) == 0:
+            return self
+        codes, dictionaries = {}, {}
+        for col in CAT_COLS:
+            old_dict, new_dict = self.dictionaries[col], other.dictionaries[col]
+            pos = {v: i for i, v in enumerate(old_dict)}
+            extras = [v for v in new_dict if v not in pos]
+            merged = np.concatenate([old_dict, np.asarray(extras, dtype=object)]) if extras else old_dict
+            pos.update({v: len(old_dict) + i for i, v in enumerate(extras)})
+
+            dtype = _code_dtype(len(merged))
+            null = _null_code(dtype)
+            remap = np.asarray([pos[v] for v in new_dict] + [null], dtype=dtype)
+
+            old_codes = self.codes[col]
+            if old_codes.dtype != dtype:
+                # Coluna cresceu além do uint16: promove e preserva os nulos
+                was_null = old_codes == _null_code(old_codes.dtype)
+                old_codes = old_codes.astype(dtype)
+                old_codes[was_null] = null
+            new_codes = other.codes[col].astype(np.int64)
+            new_codes[new_codes == _null_code(other.codes[col].dtype)] = len(new_dict)
+
+            codes[col] = np.concatenate([old_codes, remap[new_codes]])
+            dictionaries[col] = merged
+
+        return CrowleyTable(
+            codes, dictionaries,
+            np.concatenate([self.day, other.day]),
+            np.concatenate([self.ins, other.ins]),
+            np.concatenate([self.dur, other.dur]),
+        )
+
+    # --- INFORMAÇÕES ---
+    def __len__(self):
+        return len(self.day)
+
+    def schema(self):
+        """Hash das colunas e tipos (códigos, dia e medidas)."""
+        colunas = [(f"codes_{c}", self.codes[c].dtype) for c in CAT_COLS]
+        colunas += [("day", self.day.dtype), ("ins", self.ins.dtype), ("dur", self.dur.dtype)]
+        return dataset_version.schema_hash((c, str(t)) for c, t in colunas)
+
+    @property
+    def nbytes(self):
+        arrays = list(self.codes.values()) + [self.day, self.ins, self.dur]
+        return sum(a.nbytes for a in arrays)
+
+    def day_range(self, rows=None):
+        """(primeiro_dia, último_dia) como date, ignorando datas nulas."""
+        day = self.day if rows is None else self.day[rows]
+        day = day[day != DAY_NULL]
+        if day.size == 0:
+            return None, None
+        return self.to_date(day.min()), self.to_date(day.max())
+
+    @staticmethod
+    def to_date(day):
+        return (DAY_EPOCH + np.timedelta64(int(day), "D")).astype(date)
+
+    def last_date(self):
+        """Última data da base formatada (dd/mm/aaaa) ou 'N/A'."""
+        _, fim = self.day_range()
+        return fim.strftime("%d/%m/%Y") if fim else "N/A"
+
+    def dates(self, rows=None):
+        """Datas distintas (ordenadas, como date) presentes nas linhas dadas."""
+        day = self.day if rows is None else self.day[rows]
+        day = day[day != DAY_NULL].astype(np.int64)
+        if day.size == 0:
+            return []
+        base = int(day.min())
+        presentes = np.flatnonzero(np.bincount(day - base)) + base
+        return [self.to_date(d) for d in presentes]
+
+    def values(self, col, rows=None):
+        """Valores distintos (ordenados) de uma coluna categórica nas linhas dadas."""
+        codes = self.codes[col] if rows is None else self.codes[col][rows]
+        n = len(self.dictionaries[col])
+        presentes = np.flatnonzero(np.bincount(codes[codes != _null_code(codes.dtype)], minlength=n))
+        return sorted(self.dictionaries[col][presentes].tolist())
+
+    def catalog(self):
+        """Catálogo dos valores dos filtros em cascata (montado na primeira chamada)."""
+        if self._catalog is None:
+            self._catalog = DimensionCatalog(self)
+        return self._catalog
+
+    def code_of(self, col, values):
+        """Códigos dos valores informados (valores inexistentes são ignorados)."""
+        pos = {v: i for i, v in enumerate(self.dictionaries[col])}
+        return np.asarray([pos[v] for v in values if v in pos], dtype=np.int64)
+
+    # --- FILTRO ---
+    def select(self, rows=None, date_from=None, date_to=None, dates=None, **equals):
+        """
+        Índices das linhas que atendem aos filtros.
+        - rows: restringe a busca a um conjunto prévio de índices;
+        - date_from/date_to: intervalo fechado de datas;
+        - dates: lista de datas avulsas;
+        - equals: coluna=valor ou coluna=[valores] (ex.: Praca="Ribeirão Preto").
+        """
+        mask = None
+
+        def both(m):
+            return m if mask is None else mask & m
+
+        def col_data(arr):
+            return arr if rows is None else arr[rows]
+
+        if date_from is not None or date_to is not None:
+            day = col_data(self.day)
+            m = day != DAY_NULL
+            if date_from is not None: m &= day >= _to_day(date_from)
+            if date_to is not None: m &= day <= _to_day(date_to)
+            mask = both(m)
+
+        if dates is not None:
+            mask = both(np.isin(col_data(self.day), [_to_day(d) for d in dates]))
+
+        for col, value in equals.items():
+            wanted = self.code_of(col, value if isinstance(value, (list, tuple, set)) else [value])
+            codes = col_data(self.codes[col])
+            if wanted.size == 1:
+                mask = both(codes == wanted[0])
+            else:
+                mask = both(np.isin(codes, wanted))
+
+        if mask is None:
+            return np.arange(len(self)) if rows is None else rows
+        idx = np.flatnonzero(mask)
+        return idx if rows is None else rows[idx]
+
+    def search(self, rows, text, columns=("Anunciante", "Anuncio", "Emissora")):
+        """
+        Linhas de `rows` cujo valor em alguma das colunas contém `text`
+        (sem diferenciar maiúsculas). A busca roda nos dicionários; nas linhas
+        só se compara códigos.
+        """
+        text = (text or "").strip().lower()
+        if not text:
+            return rows
+        mask = np.zeros(len(rows), dtype=bool)
+        for col in columns:
+            valores = pd.Series(self.dictionaries[col], dtype=object).astype(str).str.lower()
+            wanted = np.flatnonzero(valores.str.contains(text, regex=False).to_numpy())
+            if wanted.size:
+                mask |= np.isin(self.codes[col][rows], wanted)
+        return rows[mask]
+
+    # --- ORDENAÇÃO ---
+    def _rank(self, col):
+        """Posição alfabética de cada código da coluna (nulos por último)."""
+        ranks = self._ranks
+        if col not in ranks:
+            n = len(self.dictionaries[col])
+            order = np.argsort(pd.Series(self.dictionaries[col], dtype=object).astype(str).to_numpy(), kind="stable")
+            rank = np.empty(n + 1, dtype=np.int64)
+            rank[order] = np.arange(n)
+            rank[n] = n
+            ranks[col] = rank
+        return ranks[col]
+
+    def sort_key(self, col, rows):
+        """Chave inteira de ordenação da coluna nas linhas dadas."""
+        if col == DATE_COL:
+            return self.day[rows].astype(np.int64)
+        if col == INS_COL:
+            return self.ins[rows].astype(np.int64)
+        if col == DUR_COL:
+            return self.dur[rows].astype(np.int64)
+        codes = self.codes[col][rows].astype(np.int64)
+        codes[codes == _null_code(self.codes[col].dtype)] = len(self.dictionaries[col])
+        return self._rank(col)[codes]
+
+    def sort_rows(self, rows, by, ascending=True):
+        """
+        `rows` reordenadas pelas colunas `by` (a primeira é a principal).
+        `ascending` pode ser um bool ou uma lista com um valor por coluna.
+        """
+        if isinstance(by, str):
+            by = [by]
+        if isinstance(ascending, bool):
+            ascending = [ascending] * len(by)
+        keys = [self.sort_key(col, rows) if asc else -self.sort_key(col, rows) for col, asc in zip(by, ascending)]
+        return rows[np.lexsort(keys[::-1])]
+
+    def distinct(self, rows, columns=None):
+        """Linhas de `rows` sem repetições exatas nas colunas dadas (fica a primeira de cada grupo)."""
+        columns = columns or CAT_COLS + NUM_COLS + [DATE_COL]
+        if len(rows) < 2:
+            return rows
+        rows = self.sort_rows(rows, columns)
+        keys = np.stack([self.sort_key(col, rows) for col in columns])
+        nova = np.r_[True, (keys[:, 1:] != keys[:, :-1]).any(axis=0)]
+        return rows[nova]
+
+    # --- AGREGAÇÃO ---
+    def _key_codes(self, col, rows):
+        """Chave inteira densa (0..n) da coluna e função que decodifica a chave."""
+        if col == DATE_COL:
+            day = self.day[rows].astype(np.int64)
+            base = int(day.min()) if day.size else 0
+            return day - base, lambda k: self._decode_days(k + base)
+        codes = self.codes[col][rows].astype(np.int64)
+        codes[codes == _null_code(self.codes[col].dtype)] = len(self.dictionaries[col])
+        labels = np.append(self.dictionaries[col], None)
+        return codes, lambda k: labels[k]
+
+    @staticmethod
+    def _decode_days(day):
+        dt = (DAY_EPOCH + day.astype("timedelta64[D]")).astype("datetime64[ns]")
+        dt[day == DAY_NULL] = np.datetime64("NaT")
+        return dt
+
+    def group_sum(self, by, rows=None, value=INS_COL):
+        """
+        Soma `value` (inserções ou duração) agrupando pelas colunas `by`
+        (categóricas e/ou 'Data_Dt'). Devolve um DataFrame só com os grupos
+        presentes nas linhas selecionadas.
+        """
+        if isinstance(by, str):
+            by = [by]
+        rows = np.arange(len(self)) if rows is None else rows
+        weights = (self.ins if value == INS_COL else self.dur)[rows].astype(np.int64)
+
+        keys, decoders, dims = [], [], []
+        for col in by:
+            k, decode = self._key_codes(col, rows)
+            keys.append(k)
+            decoders.append(decode)
+            dims.append(int(k.max()) + 1 if k.size else 1)
+
+        n_bins = np.prod(dims, dtype=np.float64)
+        if n_bins <= 4 * len(rows) + 1024:
+            # Poucas combinações possíveis: bincount direto na chave combinada
+            flat = np.ravel_multi_index(keys, dims) if keys else np.zeros(len(rows), np.int64)
+            counts = np.bincount(flat, minlength=int(n_bins))
+            groups = np.flatnonzero(counts)
+            sums = np.bincount(flat, weights=weights, minlength=int(n_bins))[groups]
+            parts = np.unravel_index(groups, dims)
+        elif n_bins < 2 ** 62:
+            # Espaço de chaves esparso: ordena só as chaves presentes
+            flat = np.ravel_multi_index(keys, dims)
+            groups, inverse = np.unique(flat, return_inverse=True)
+            sums = np.bincount(inverse, weights=weights, minlength=len(groups))
+            parts = np.unravel_index(groups, dims)
+        else:
+            uniq, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+            sums = np.bincount(inverse.ravel(), weights=weights, minlength=len(uniq))
+            parts = [uniq[:, i] for i in range(len(by))]
+
+        out = {col: decode(part) for col, part, decode in zip(by, parts, decoders)}
+        out[value] = sums.astype(np.int64)
+        return pd.DataFrame(out)
+
+    # --- CONVERSÃO ---
+    def to_frame(self, rows=None, columns=None):
+        """
+        DataFrame no mesmo formato da base original (categorias, int32 e
+        'Data_Dt') apenas com as linhas pedidas.
+        """
+        rows = np.arange(len(self)) if rows is None else rows
+        columns = columns or CAT_COLS + NUM_COLS + [DATE_COL]
+        data = {}
+        for col in columns:
+            if col in CAT_COLS:
+                codes = self.codes[col][rows].astype(np.int32)
+                codes[codes == _null_code(self.codes[col].dtype)] = -1
+                data[col] = pd.Categorical.from_codes(codes, categories=pd.Index(self.dictionaries[col], dtype=object))
+            elif col == INS_COL:
+                data[col] = self.ins[rows].astype(np.int32)
+            elif col == DUR_COL:
+                data[col] = self.dur[rows].astype(np.int32)
+            elif col == DATE_COL:
+                data[col] = self._decode_days(self.day[rows])
+        return pd.DataFrame(data)
+
+    def _arrow_dictionary(self, col):
+        if col not in self._arrow_dicts:
+            self._arrow_dicts[col] = pa.array(self.dictionaries[col].tolist(), type=pa.string())
+        return self._arrow_dicts[col]
+
+    def to_arrow(self, rows=None, columns=None):
+        """
+        Mesmas colunas de to_frame, direto em Arrow: categóricas como
+        dictionary (os códigos da tabela), datas como date32.
+        """
+        rows = np.arange(len(self)) if rows is None else rows
+        columns = columns or CAT_COLS + NUM_COLS + [DATE_COL]
+        arrays = []
+        for col in columns:
+            if col in CAT_COLS:
+                codes = self.codes[col][rows]
+                indices = pa.array(codes.astype(np.int32), mask=codes == _null_code(codes.dtype))
+                arrays.append(pa.DictionaryArray.from_arrays(indices, self._arrow_dictionary(col)))
+            elif col == INS_COL:
+                arrays.append(pa.array(self.ins[rows].astype(np.int32)))
+            elif col == DUR_COL:
+                arrays.append(pa.array(self.dur[rows].astype(np.int32)))
+            elif col == DATE_COL:
+                day = self.day[rows]
+                unix = day.astype(np.int32) + int(DAY_EPOCH.astype(np.int64))
+                arrays.append(pa.array(unix, mask=day == DAY_NULL).cast(pa.date32()))
+        return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+
+# ==================== CATÁLOGO DE FILTROS ====================
+def _sorted_unique(arr):
+    """np.unique por ordenação no próprio array (o unique por hash do NumPy 2 é lento com milhões de chaves)."""
+    arr.sort()
+    return arr[np.r_[True, arr[1:] != arr[:-1]]] if arr.size else arr
+
+class DimensionCatalog:
+    """
+    Valores válidos dos dropdowns em cascata, calculados uma vez por tabela:
+    - tree[ano][mes][praca][veiculo] = [anunciantes] (Ano → Mês → Praça →
+      Veículo → Anunciante do Flight);
+    - por praça, em todas as datas: veículos e anunciantes (ECA, Novos e
+      Ranking).
+
+    Uma única ordenação das combinações (mês, praça, veículo, anunciante)
+    presentes na base monta tudo; as consultas são acessos a dicionário.
+    Listas em ordem alfabética, sem nulos, como CrowleyTable.values.
+    """
+
+    def __init__(self, tb):
+        cols = ("Praca", "Emissora", "Anunciante")
+        labels, nulls = [], []
+        for col in cols:
+            # Chave = posição alfabética (nulo = n, por último)
+            rank = tb._rank(col)
+            n = len(tb.dictionaries[col])
+            label = np.empty(n + 1, dtype=object)
+            label[rank[:n]] = tb.dictionaries[col]
+            labels.append(label)
+            nulls.append(n)
+
+        # Mês de cada linha (0 = primeiro mês da base; datas nulas = um mês
+        # depois do último), por tabela de consulta dia -> mês
+        day = tb.day.astype(np.int64)
+        valid = day != DAY_NULL
+        d0, d1 = (int(day[valid].min()), int(day[valid].max())) if valid.any() else (0, -1)
+        dias = DAY_EPOCH + np.arange(d0, d1 + 1).astype("timedelta64[D]")
+        mes_do_dia = dias.astype("datetime64[M]").astype(np.int64)
+        base = int(mes_do_dia[0]) if mes_do_dia.size else 0
+        mes_do_dia -= base
+        mes_null = int(mes_do_dia[-1]) + 1 if mes_do_dia.size else 0
+        day -= d0
+        day[~valid] = len(mes_do_dia)
+        mes = np.append(mes_do_dia, mes_null)[day]
+        del day, valid
+
+        dims = [mes_null + 1] + [n + 1 for n in nulls]
+        if np.prod(dims, dtype=np.float64) < 2 ** 62:
+            flat = mes * dims[1]
+            del mes
+            for i, col in enumerate(cols):
+                flat += tb.sort_key(col, slice(None))
+                if i + 1 < len(cols):
+                    flat *= dims[i + 2]
+            m, p, e, a = np.unravel_index(_sorted_unique(flat), dims)
+            del flat
+        else:
+            combos = np.unique(np.stack([mes] + [tb.sort_key(c, slice(None)) for c in cols], axis=1), axis=0)
+            m, p, e, a = combos.T
+        lab_p, lab_e, lab_a = labels
+        n_p, n_e, n_a = nulls
+
+        # Por praça (todas as datas)
+        com_praca = p < n_p
+        self._pracas = lab_p[_sorted_unique(p[com_praca])].tolist()
+        self._veiculos = self._por_praca(p[com_praca], e[com_praca], n_e, lab_p, lab_e)
+        self._anunciantes = self._por_praca(p[com_praca], a[com_praca], n_a, lab_p, lab_a)
+
+        # Caminho completo: grupos consecutivos de (mês, praça, veículo) nas combinações ordenadas
+        sel = (m < mes_null) & com_praca
+        m, p, e, a = m[sel], p[sel], e[sel], a[sel]
+        novo = np.r_[True, (m[1:] != m[:-1]) | (p[1:] != p[:-1]) | (e[1:] != e[:-1])]
+        inicio = np.flatnonzero(novo)
+        fim = np.r_[inicio[1:], len(m)]
+        ano_g, mes_g = np.divmod(base + m[inicio], 12)
+        praca_g = lab_p[p[inicio]].tolist()
+        veic_g = lab_e[e[inicio]].tolist()
+        a_valido = a < n_a
+        self.tree = {}
+        for ano, mes_idx, praca, veiculo, i, j in zip((ano_g + 1970).tolist(), (mes_g + 1).tolist(), praca_g, veic_g, inicio.tolist(), fim.tolist()):
+            veiculos = self.tree.setdefault(ano, {}).setdefault(mes_idx, {}).setdefault(praca, {})
+            if veiculo is not None:
+                veiculos[veiculo] = lab_a[a[i:j][a_valido[i:j]]].tolist()
+
+    @staticmethod
+    def _por_praca(p, v, n_v, lab_p, lab_v):
+        """{praca: [valores]} a partir dos pares (praça, valor) das combinações."""
+        pares = _sorted_unique(p.astype(np.int64) * (n_v + 1) + v)
+        p, v = np.divmod(pares, n_v + 1)
+        com_valor = v < n_v
+        p, v = p[com_valor], v[com_valor]
+        inicio = np.flatnonzero(np.r_[True, p[1:] != p[:-1]])
+        fim = np.r_[inicio[1:], len(p)]
+        return {lab_p[p[i]]: lab_v[v[i:j]].tolist() for i, j in zip(inicio.tolist(), fim.tolist())}
+
+    def _path(self, ano, mes, praca):
+        return self.tree.get(ano, {}).get(mes, {}).get(praca, {})
+
+    # --- CONSULTAS (cópias: quem chama pode alterar a lista) ---
+    def years(self):
+        return sorted(self.tree, reverse=True)
+
+    def months(self, ano):
+        return list(self.tree.get(ano, {}))
+
+    def pracas(self, ano=None, mes=None):
+        """Praças da base toda ou, com ano/mês, as que têm inserções no mês."""
+        if ano is None:
+            return list(self._pracas)
+        return list(self.tree.get(ano, {}).get(mes, {}))
+
+    def vehicles(self, praca, ano=None, mes=None):
+        if ano is None:
+            return list(self._veiculos.get(praca, []))
+        return list(self._path(ano, mes, praca))
+
+    def advertisers(self, praca, ano=None, mes=None, veiculo=None):
+        """Anunciantes da praça (todas as datas) ou do caminho ano/mês/praça/veículo."""
+        if ano is None:
+            return list(self._anunciantes.get(praca, []))
+        return list(self._path(ano, mes, praca).get(veiculo, []))
+
+
+# ==================== SNAPSHOT COMPARTILHADO ====================
+# Layout: <store>/_snapshots/<stamp>/colunas.feather + dict_<coluna>.feather
+# e <store>/_snapshot.json apontando para o snapshot atual.
+SNAPSHOT_DIR = "_snapshots"
+SNAPSHOT_POINTER = "_snapshot.json"
+LOCK_NAME = ".lock"
+
+@contextmanager
+def store_lock(store_dir=STORE_DIR):
+    """Trava exclusiva entre processos (só um worker sincroniza por vez)."""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, LOCK_NAME), "a") as f:
+        if fcntl: fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl: fcntl.flock(f, fcntl.LOCK_UN)
+
+def snapshot_info(store_dir=STORE_DIR):
+    """Conteúdo de _snapshot.json ({'dir', 'rows', 'version', 'checked_at'}) ou None."""
+    path = os.path.join(store_dir, SNAPSHOT_POINTER)
+    try:
+        with open(path, encoding="utf-8") as f:
+            info = json.load(f)
+    except Exception:
+        return None
+    if not os.path.isdir(os.path.join(store_dir, SNAPSHOT_DIR, info.get("dir", ""))):
+        return None
+    return info
+
+def _save_info(info, store_dir):
+    tmp_path = os.path.join(store_dir, SNAPSHOT_POINTER + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, os.path.join(store_dir, SNAPSHOT_POINTER))
+
+def touch_snapshot(store_dir=STORE_DIR):
+    """Marca o snapshot atual como conferido agora (nada mudou na origem)."""
+    info = snapshot_info(store_dir)
+    if info:
+        info["checked_at"] = time.time()
+        _save_info(info, store_dir)
+
+def publish_snapshot(tb, store_dir=STORE_DIR):
+    """
+    Grava a tabela num novo diretório de snapshot e troca o ponteiro de forma
+    atômica. Snapshots antigos são apagados: processos que ainda os mapeiam
+    continuam lendo normalmente (o arquivo só some do disco ao desmapear).
+    """
+    base = os.path.join(store_dir, SNAPSHOT_DIR)
+    name = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    tmp_dir = os.path.join(base, f".tmp-{name}")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    colunas = {f"codes_{c}": tb.codes[c] for c in CAT_COLS}
+    colunas.update({"day": tb.day, "ins": tb.ins, "dur": tb.dur})
+    # Sem compressão e num único bloco: a leitura vira memory-map sem cópia
+    feather.write_feather(pa.table(colunas), os.path.join(tmp_dir, "colunas.feather"),
+                          compression="uncompressed", chunksize=max(len(tb), 1))
+    for c in CAT_COLS:
+        dic = pa.table({"valor": pa.array(tb.dictionaries[c].tolist(), type=pa.string())})
+        feather.write_feather(dic, os.path.join(tmp_dir, f"dict_{c}.feather"), compression="uncompressed")
+
+    os.replace(tmp_dir, os.path.join(base, name))
+    versao = dataset_version.make(name, tb.schema())
+    _save_info({"dir": name, "rows": len(tb), "version": versao, "checked_at": time.time()}, store_dir)
+
+    for old in os.listdir(base):
+        if old != name:
+            shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    return name
+
+def open_snapshot(store_dir=STORE_DIR):
+    """
+    Abre o snapshot atual com memory-map somente leitura.
+    Retorna (CrowleyTable, nome_do_snapshot) ou (None, None).
+    """
+    info = snapshot_info(store_dir)
+    if not info:
+        return None, None
+    path = os.path.join(store_dir, SNAPSHOT_DIR, info["dir"])
+
+    tabela = feather.read_table(os.path.join(path, "colunas.feather"), memory_map=True)
+
+    def col(name):
+        arr = tabela.column(name)
+        return arr.chunk(0).to_numpy(zero_copy_only=True) if arr.num_chunks == 1 else arr.to_numpy()
+
+    codes = {c: col(f"codes_{c}") for c in CAT_COLS}
+    # Os dicionários são pequenos e viram objetos Python em cada processo
+    dictionaries = {
+        c: np.asarray(feather.read_table(os.path.join(path, f"dict_{c}.feather")).column("valor").to_pylist(), dtype=object)
+        for c in CAT_COLS
+    }
+    tb = CrowleyTable(codes, dictionaries, col("day"), col("ins"), col("dur"))
+    tb.version = info.get("version") or dataset_version.make(info["dir"], tb.schema())
+    return tb, info["dir"]
@@ -0,0 +1,66 @@
+# utils/dataset_version.py
+"""
+Versão das bases carregadas: "<revisão da origem>.<hash do esquema>".
+
+A versão identifica exatamente de quais dados um resultado saiu e entra na
+chave dos caches derivados (carga/normalização, exports e resultados) no
+lugar de TTLs: muda quando a origem muda, ou quando o esquema gerado muda
+(colunas/tipos, ex.: depois de uma alteração na normalização), e só então.
+
+- vendas: md5 do arquivo no Drive (ou do conteúdo, no upload manual). A
+  versão viaja em df.attrs, que o pandas copia nos filtros e cópias, então
+  chega às páginas junto do df filtrado;
+- crowley: nome do snapshot publicado, gravado em _snapshot.json e exposto
+  em CrowleyTable.version.
+"""
+import json
+import hashlib
+
+import pandas as pd
+
+ATTR = "dataset_version"
+
+
+def short_hash(data, n=12):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:n]
+
+def schema_hash(columns):
+    """Hash de [(coluna, tipo), ...]."""
+    return short_hash("|".join(f"{c}:{t}" for c, t in columns), 8)
+
+def frame_schema(df):
+    return schema_hash((str(c), str(t)) for c, t in df.dtypes.items())
+
+def make(revision, schema):
+    return f"{revision}.{schema}"
+
+def attach(df, revision):
+    """Grava em df.attrs a versão do df (revisão da origem + esquema atual) e devolve o df."""
+    df.attrs[ATTR] = make(revision, frame_schema(df))
+    return df
+
+def derive(df, parent, params):
+    """
+    Versão de um recorte (ex.: base após os filtros globais): versão de
+    origem + hash dos parâmetros do recorte. Sem versão de origem, o recorte
+    também fica sem versão.
+    """
+    if parent is None:
+        df.attrs.pop(ATTR, None)
+    else:
+        df.attrs[ATTR] = f"{parent}+{short_hash(json.dumps(params, sort_keys=True, default=str), 8)}"
+    return df
+
+def content_revision(df):
+    """Revisão pelo conteúdo (para bases sem revisão na origem, como o upload manual)."""
+    return short_hash(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+def of(data):
+    """Versão de um DataFrame (attrs) ou CrowleyTable (.version); None se desconhecida."""
+    if data is None:
+        return None
+    if isinstance(data, pd.DataFrame):
+        return data.attrs.get(ATTR)
+    return getattr(data, "version", None)
@@ -0,0 +1,111 @@
+# utils/detail_view.py
+"""
+Detalhamento (linha a linha) dos relatórios Crowley.
+
+A seção "Fonte de Dados Completa" fica atrás de um st.toggle: desligada, não
+calcula nada. Ligada, busca e ordenação rodam nos códigos da CrowleyTable e
+só a página visível vira DataFrame e vai para o navegador.
+"""
+import math
+
+import streamlit as st
+
+from utils import perf
+from utils.crowley_store import DATE_COL
+
+DETAIL_COLUMNS = [DATE_COL, "Anunciante", "Anuncio", "Duracao", "Praca", "Emissora", "Tipo", "DayPart", "Volume de Insercoes"]
+DETAIL_RENAME = {
+    "Praca": "Praça", "Anuncio": "Anúncio", "Duracao": "Duração",
+    "Emissora": "Veículo", "Volume de Insercoes": "Inserções",
+}
+DETAIL_HEADER = ["Data"] + [DETAIL_RENAME.get(c, c) for c in DETAIL_COLUMNS[1:]]
+# Ordenação padrão do detalhamento (e do Excel)
+DEFAULT_ORDER = ["Anunciante", DATE_COL]
+SORT_OPTIONS = {"Data": DATE_COL, **{DETAIL_RENAME.get(c, c): c for c in DETAIL_COLUMNS if c != DATE_COL}}
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def detail_frame(tb, rows, sort=True):
+    """
+    DataFrame do detalhamento para as linhas dadas: 'Data' (dd/mm/aaaa) na
+    frente e nomes de exibição. Com sort, ordena por Anunciante e Data.
+    """
+    if sort:
+        rows = tb.sort_rows(rows, DEFAULT_ORDER)
+    df = tb.to_frame(rows, columns=DETAIL_COLUMNS)
+    df.insert(0, "Data", df.pop(DATE_COL).dt.strftime("%d/%m/%Y"))
+    return df.rename(columns=DETAIL_RENAME)
+
+
+def iter_detail_frames(tb, rows, chunk_rows=50_000):
+    """detail_frame em blocos (mesma ordem), para exportar sem montar tudo de uma vez."""
+    rows = tb.sort_rows(rows, DEFAULT_ORDER)
+    for i in range(0, max(len(rows), 1), chunk_rows):
+        yield detail_frame(tb, rows[i:i + chunk_rows], sort=False)
+
+
+def iter_detail_batches(tb, rows, chunk_rows=500_000):
+    """Detalhamento em Arrow (RecordBatch por bloco), com 'Data' como data e nomes de exibição."""
+    rows = tb.sort_rows(rows, DEFAULT_ORDER)
+    for i in range(0, len(rows), chunk_rows):
+        yield tb.to_arrow(rows[i:i + chunk_rows], columns=DETAIL_COLUMNS).rename_columns(DETAIL_HEADER)
+
+
+def render_detail(tb, rows, key, title="Fonte de Dados Completa (Detalhamento)"):
+    """Seção paginada do detalhamento; `key` prefixa os widgets (um por relatório)."""
+    if not st.toggle(title, key=f"{key}_det_on"):
+        return
+
+    k_pag = f"{key}_det_pag"
+
+    def reset_page():
+        st.session_state[k_pag] = 1
+
+    c_busca, c_ordem, c_desc, c_tam = st.columns([3, 2, 1, 1])
+    with c_busca:
+        busca = st.text_input("Buscar (anunciante, anúncio ou veículo)", key=f"{key}_det_busca", on_change=reset_page)
+    with c_ordem:
+        ordem = st.selectbox("Ordenar por", list(SORT_OPTIONS), index=1, key=f"{key}_det_ordem", on_change=reset_page)
+    with c_desc:
+        desc = st.checkbox("Decrescente", key=f"{key}_det_desc", on_change=reset_page)
+    with c_tam:
+        por_pagina = st.selectbox("Linhas/página", PAGE_SIZES, key=f"{key}_det_tam", on_change=reset_page)
+
+    with perf.span("filter", rows=len(rows)):
+        filtradas = tb.search(rows, busca)
+    total = len(filtradas)
+    if total == 0:
+        st.info("Nenhuma linha encontrada.")
+        return
+
+    paginas = math.ceil(total / por_pagina)
+    if st.session_state.get(k_pag, 1) > paginas:
+        st.session_state[k_pag] = paginas
+
+    # Coluna escolhida primeiro; Anunciante e Data desempatam
+    col = SORT_OPTIONS[ordem]
+    by = [col] + [c for c in DEFAULT_ORDER if c != col]
+    with perf.span("aggregate", rows=total):
+        ordenadas = tb.sort_rows(filtradas, by, ascending=[not desc] + [True] * (len(by) - 1))
+
+    c_pag, c_info = st.columns([1, 4])
+    with c_pag:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key=k_pag)
+    ini = (int(pagina) - 1) * por_pagina
+    fim = min(ini + por_pagina, total)
+    with c_info:
+        st.markdown(
+            f"<div style='padding-top:2.1rem;color:#666;'>Linhas {ini + 1:,}–{fim:,} de {total:,} "
+            f"(página {int(pagina)} de {paginas})</div>".replace(",", "."),
+            unsafe_allow_html=True
+        )
+
+    st.dataframe(
+        detail_frame(tb, ordenadas[ini:fim], sort=False),
+        width="stretch",
+        hide_index=True,
+        column_config={
+            "Duração": st.column_config.NumberColumn("Duração", format="%d"),
+            "Inserções": st.column_config.NumberColumn("Inserções", format="%d"),
+        }
+    )
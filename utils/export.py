@@ -1,9 +1,148 @@
 # utils/export.py
 
 import io
+import os
+import json
+import hashlib
+import uuid
 import zipfile
+from itertools import chain
+import tempfile
 import pandas as pd
 import re
+import streamlit as st
+import xlsxwriter
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from datetime import datetime
+from utils.rasterize import cached_render_pngs
+from utils import jobs
+
+XLSX_MIME = "application/vnd.ms-excel"
+ZIP_MIME = "application/zip"
+# Rótulo exibido -> formato interno
+EXPORT_FORMATS = {"Excel (.xlsx)": "xlsx", "Parquet": "parquet", "CSV (.csv.gz)": "csv.gz"}
+FORMAT_NAMES = {"xlsx": "Excel", "parquet": "Parquet", "csv.gz": "CSV"}
+EXCEL_MAX_ROWS = 1_048_576   # limite de linhas por aba do Excel
+EXCEL_CHUNK_ROWS = 50_000    # linhas convertidas para Python por vez
+
+# ==================== ESCRITA EM STREAMING ====================
+class StreamingExcel:
+    """
+    Workbook xlsxwriter em modo constant_memory gravado num arquivo temporário.
+
+    As linhas são escritas em ordem (write_row), bloco a bloco, então a
+    memória do export não cresce com o tamanho do resultado. Abas que passam
+    do limite do Excel continuam em "Nome (2)", "Nome (3)"... com o cabeçalho
+    repetido.
+
+        with StreamingExcel() as xl:
+            for ws in xl.write_frame(df, "Dados"):
+                ws.set_column("A:A", 30)
+        data = xl.getvalue()
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        self.book = xlsxwriter.Workbook(self.path, {
+            "constant_memory": True,
+            "nan_inf_to_errors": True,
+            "default_date_format": "dd/mm/yyyy",
+        })
+        self.sheets = {}
+        self._header_fmt = self.book.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.book.close()
+        if exc_type is not None:
+            self._remove()
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def getvalue(self):
+        """Bytes do arquivo gerado (o temporário é apagado)."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self._remove()
+        return data
+
+    def add_sheet(self, name):
+        """Nova aba; nomes repetidos ganham sufixo " (2)", " (3)"..."""
+        base, n = name, 1
+        while name in self.sheets:
+            n += 1
+            name = clean_sheet_name(f"{base[:25]} ({n})")
+        ws = self.book.add_worksheet(name)
+        self.sheets[name] = ws
+        return ws
+
+    def _new_sheet(self, base, header):
+        ws = self.add_sheet(base)
+        for r, linha in enumerate(header):
+            ws.write_row(r, 0, linha, self._header_fmt)
+        return ws
+
+    @staticmethod
+    def _header(df):
+        """Linhas de cabeçalho (uma por nível de coluna; rótulos repetidos ficam em branco)."""
+        cols = df.columns
+        if not isinstance(cols, pd.MultiIndex):
+            return [[str(c) for c in cols]]
+        linhas = []
+        for lvl in range(cols.nlevels):
+            valores = cols.get_level_values(lvl)
+            anterior = None
+            linha = []
+            for i, v in enumerate(valores):
+                prefixo = tuple(cols[i][:lvl + 1])
+                linha.append("" if lvl < cols.nlevels - 1 and prefixo == anterior else str(v))
+                anterior = prefixo
+            linhas.append(linha)
+        return linhas
+
+    def write_frame(self, frames, sheet_name, index=False):
+        """
+        Escreve um DataFrame (ou um iterável de DataFrames com as mesmas
+        colunas, ex.: blocos de um resultado grande) a partir de A1.
+        Devolve a lista de abas usadas.
+        """
+        if isinstance(frames, pd.DataFrame):
+            frame = frames
+            frames = (frame.iloc[i:i + EXCEL_CHUNK_ROWS] for i in range(0, max(len(frame), 1), EXCEL_CHUNK_ROWS))
+
+        abas, ws, row, header, escritas = [], None, 0, None, 0
+        for df in frames:
+            if index:
+                # Índice sem nome sai com cabeçalho vazio (como no to_excel)
+                df = df.rename_axis([n if n is not None else "" for n in df.index.names]).reset_index()
+            if header is None:
+                header = self._header(df)
+                ws = self._new_sheet(sheet_name, header)
+                abas.append(ws)
+                row = len(header)
+            if df.empty:
+                continue
+            # NaN/NaT viram célula vazia; números saem como int/float do Python
+            valores = df.astype(object).where(df.notna(), None).to_numpy().tolist()
+            for linha in valores:
+                if row >= EXCEL_MAX_ROWS:
+                    ws = self._new_sheet(sheet_name, header)
+                    abas.append(ws)
+                    row = len(header)
+                ws.write_row(row, 0, linha)
+                row += 1
+            escritas += len(valores)
+            jobs.report_progress(message=f"{sheet_name}: {escritas:,} linhas".replace(",", "."))
+        return abas
 
 def clean_sheet_name(name):
     """
@@ -35,88 +174,331 @@ def clean_chart_title(title_key):
     
     return s
 
+def chart_layout(key):
+    """Layout aplicado aos gráficos exportados (título limpo, fundo transparente)."""
+    # === REGRAS DE LAYOUT ===
+    layout_args = {
+        'title': {
+            'text': clean_chart_title(key),
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        'title_font': dict(size=24, color="#003366", family="Arial, sans-serif"),
+        'margin': dict(t=80), 
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'plot_bgcolor': 'rgba(0,0,0,0)'
+    }
+
+    # === REGRA EXCLUSIVA PARA EVOLUÇÃO MENSAL ===
+    # Empurra título para cima e gráfico para baixo para não bater na legenda
+    if "Evolução Mensal" in key:
+        layout_args['margin'] = dict(t=150)
+        layout_args['title']['y'] = 0.98
+    return layout_args
+
 def to_excel_with_images(data_dict, filter_info):
     """
-    Gera um arquivo Excel em memória contendo DataFrames e Imagens (Plots).
+    Gera o Excel com DataFrames e Imagens (Plots) pelo StreamingExcel: o
+    workbook é gravado em modo constant_memory num arquivo temporário, linha
+    a linha, e só os bytes finais voltam (getvalue). Os gráficos são
+    rasterizados todos de uma vez (em paralelo, com cache em disco) antes
+    de montar o arquivo.
     """
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        workbook = writer.book
-        
+    # --- PNGs DE TODOS OS GRÁFICOS ---
+    figs_json = {}
+    for key, value in data_dict.items():
+        tem_df = 'df' in value and value['df'] is not None and not value['df'].empty
+        if not tem_df and value.get('fig') is not None:
+            try:
+                fig_to_export = value['fig']
+                fig_to_export.update_layout(**chart_layout(key))
+                figs_json[key] = fig_to_export.to_json()
+            except Exception as e:
+                figs_json[key] = e
+    prontos = {k: j for k, j in figs_json.items() if not isinstance(j, Exception)}
+    if prontos:
+        jobs.report_progress(0.05, f"Renderizando {len(prontos)} gráfico(s)...")
+    # Cache por conteúdo: o mesmo gráfico exportado de novo não passa pelo Kaleido
+    imagens = dict(zip(prontos, cached_render_pngs(list(prontos.values()), width=1200, height=700, scale=2)))
+    imagens.update({k: e for k, e in figs_json.items() if isinstance(e, Exception)})
+
+    with StreamingExcel() as xl:
         # --- ABA 1: FILTROS ---
         df_info = pd.DataFrame([{"Filtros Aplicados": filter_info}])
-        df_info.to_excel(writer, sheet_name="Filtros", index=False)
-        worksheet_filtros = writer.sheets["Filtros"]
+        worksheet_filtros = xl.write_frame(df_info, "Filtros")[0]
         worksheet_filtros.set_column('A:A', 100)
         worksheet_filtros.hide_gridlines(2) 
         
         # --- ABAS DE DADOS E GRÁFICOS ---
-        for key, value in data_dict.items():
+        for i, (key, value) in enumerate(data_dict.items()):
             sheet_name = clean_sheet_name(key)
+            jobs.report_progress(0.3 + 0.6 * i / len(data_dict), f"Escrevendo {sheet_name}")
             
             # 1. Se for Tabela
             if 'df' in value and value['df'] is not None and not value['df'].empty:
-                value['df'].to_excel(writer, sheet_name=sheet_name, index=False)
-                worksheet = writer.sheets[sheet_name]
-                worksheet.set_column('A:Z', 18)
+                for worksheet in xl.write_frame(value['df'], sheet_name):
+                    worksheet.set_column('A:Z', 18)
 
             # 2. Se for Gráfico
-            elif 'fig' in value and value['fig'] is not None:
-                pd.DataFrame().to_excel(writer, sheet_name=sheet_name)
-                worksheet = writer.sheets[sheet_name]
+            elif key in imagens:
+                worksheet = xl.add_sheet(sheet_name)
                 worksheet.hide_gridlines(2)
-                
-                try:
-                    # Limpa o título (Remove "1." e "(Gráfico)")
-                    chart_title = clean_chart_title(key)
-                    fig_to_export = value['fig']
-                    
-                    # === REGRAS DE LAYOUT ===
-                    layout_args = {
-                        'title': {
-                            'text': chart_title,
-                            'y': 0.95,
-                            'x': 0.5,
-                            'xanchor': 'center',
-                            'yanchor': 'top'
-                        },
-                        'title_font': dict(size=24, color="#003366", family="Arial, sans-serif"),
-                        'margin': dict(t=80), 
-                        'paper_bgcolor': 'rgba(0,0,0,0)',
-                        'plot_bgcolor': 'rgba(0,0,0,0)'
-                    }
-
-                    # === REGRA EXCLUSIVA PARA EVOLUÇÃO MENSAL ===
-                    # Empurra título para cima e gráfico para baixo para não bater na legenda
-                    if "Evolução Mensal" in key:
-                        layout_args['margin'] = dict(t=150)
-                        layout_args['title']['y'] = 0.98
-                    
-                    fig_to_export.update_layout(**layout_args)
-
-                    # Geração da Imagem
-                    img_bytes = fig_to_export.to_image(
-                        format="png", 
-                        width=1200, 
-                        height=700, 
-                        scale=2, 
-                        engine="kaleido"
-                    )
-                    
-                    image_stream = io.BytesIO(img_bytes)
-                    worksheet.insert_image('A1', f'{sheet_name}.png', {'image_data': image_stream})
-                except Exception as e:
-                    print(f"Erro ao converter imagem {key}: {e}")
-                    worksheet.write('A1', f"Erro ao gerar imagem: {e}")
-
-    return output.getvalue()
-
-def create_zip_package(data_dict, filter_info, excel_filename="Relatorio.xlsx"):
-    output_excel = to_excel_with_images(data_dict, filter_info)
+                img = imagens[key]
+                if isinstance(img, Exception):
+                    print(f"Erro ao converter imagem {key}: {img}")
+                    worksheet.write('A1', f"Erro ao gerar imagem: {img}")
+                else:
+                    worksheet.insert_image('A1', f'{sheet_name}.png', {'image_data': io.BytesIO(img)})
+
+    return xl.getvalue()
+
+def create_zip_package(data_dict, filter_info, excel_filename="Relatorio.xlsx", formats=("xlsx",)):
+    """
+    ZIP da página: o Excel (tabelas + gráficos) e, se pedidos em `formats`,
+    cada tabela também em Parquet/CSV.gz com os filtros em filtros.json.
+    """
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-        if not excel_filename.lower().endswith(".xlsx"):
-            excel_filename += ".xlsx"
-        zip_file.writestr(excel_filename, output_excel)
-    return zip_buffer.getvalue()
\ No newline at end of file
+        if "xlsx" in formats:
+            if not excel_filename.lower().endswith(".xlsx"):
+                excel_filename += ".xlsx"
+            zip_file.writestr(excel_filename, to_excel_with_images(data_dict, filter_info))
+
+        colunares = [f for f in formats if f != "xlsx"]
+        if colunares:
+            jobs.report_progress(0.9, "Gerando " + ", ".join(FORMAT_NAMES[f] for f in colunares))
+            tabelas = {k: v['df'] for k, v in data_dict.items() if v.get('df') is not None and not v['df'].empty}
+            write_columnar(zip_file, tabelas, {"Filtros Aplicados": filter_info}, colunares)
+    return zip_buffer.getvalue()
+
+def content_signature(data_dict):
+    """
+    Hash do conteúdo do que vai no export das páginas (tabelas e gráficos),
+    para reaproveitar o job só quando o arquivo sairia igual.
+    """
+    h = hashlib.sha256()
+    for key, value in data_dict.items():
+        h.update(str(key).encode())
+        df = value.get('df')
+        if df is not None:
+            h.update(str(list(df.columns)).encode())
+            h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        elif value.get('fig') is not None:
+            h.update(value['fig'].to_json().encode())
+    return h.hexdigest()
+
+def export_format_selector(key):
+    """Formatos do ZIP das páginas: Excel por padrão, Parquet/CSV.gz opcionais."""
+    rotulos = st.multiselect("Formatos:", options=list(EXPORT_FORMATS), default=list(EXPORT_FORMATS)[:1], key=key)
+    return [EXPORT_FORMATS[r] for r in rotulos] or ["xlsx"]
+
+# ==================== FORMATOS COLUNARES ====================
+def clean_file_name(name):
+    """Nome de arquivo seguro a partir do título da tabela."""
+    s = clean_chart_title(name).replace(" (Dados)", "")
+    return re.sub(r"[^\w\-]+", "_", s).strip("_") or "tabela"
+
+def frame_to_arrow(df):
+    """DataFrame -> Arrow (sem índice). Colunas de texto misturado com número viram texto."""
+    df = df.copy(deep=False)
+    df.columns = [" / ".join(str(x) for x in c if str(x) != "") if isinstance(c, tuple) else str(c) for c in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mistas = df.select_dtypes(include="object").columns
+        df[mistas] = df[mistas].astype(str).where(df[mistas].notna(), None)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+def _batches(data):
+    """Aceita DataFrame, Table ou iterável de RecordBatch e devolve (schema, iterador de batches)."""
+    if isinstance(data, pd.DataFrame):
+        data = frame_to_arrow(data)
+    if isinstance(data, pa.Table):
+        return data.schema, iter(data.to_batches())
+    it = iter(data)
+    primeiro = next(it, None)
+    if primeiro is None:
+        return None, iter(())
+    return primeiro.schema, chain([primeiro], it)
+
+def _decode_dictionaries(batch):
+    """CSV não escreve colunas dictionary: decodifica para texto."""
+    cols = [c.dictionary_decode() if pa.types.is_dictionary(c.type) else c for c in batch.columns]
+    return pa.RecordBatch.from_arrays(cols, names=batch.schema.names)
+
+def write_parquet(fileobj, data):
+    """Grava em Parquet (zstd) bloco a bloco."""
+    schema, batches = _batches(data)
+    if schema is None:
+        return
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+def write_csv_gz(fileobj, data):
+    """Grava CSV (UTF-8, vírgula) comprimido em gzip, bloco a bloco."""
+    schema, batches = _batches(data)
+    if schema is None:
+        return
+    with pa.output_stream(fileobj, compression="gzip") as out:
+        writer = None
+        for batch in batches:
+            batch = _decode_dictionaries(batch)
+            if writer is None:
+                writer = pa_csv.CSVWriter(out, batch.schema)
+            writer.write_batch(batch)
+        if writer is not None:
+            writer.close()
+
+COLUMNAR_WRITERS = {"parquet": (".parquet", write_parquet), "csv.gz": (".csv.gz", write_csv_gz)}
+
+def write_columnar(zip_file, tables, metadata, formats):
+    """
+    Grava cada tabela (nome -> DataFrame/Arrow/iterável de batches) nos
+    formatos pedidos dentro do ZIP aberto, mais filtros.json com `metadata`.
+    Arquivos já comprimidos entram sem nova compressão.
+    """
+    arquivos = []
+    for fmt in formats:
+        ext, writer = COLUMNAR_WRITERS[fmt]
+        for nome, data in tables.items():
+            if callable(data):  # iteradores só podem ser lidos uma vez
+                data = data()
+            arquivo = f"{clean_file_name(nome)}{ext}"
+            jobs.report_progress(message=f"Gravando {arquivo}")
+            with zip_file.open(zipfile.ZipInfo(arquivo, datetime.now().timetuple()[:6]), "w") as f:
+                writer(f, data)
+            arquivos.append(arquivo)
+    sidecar = {**metadata, "gerado_em": datetime.now().isoformat(timespec="seconds"), "arquivos": arquivos}
+    zip_file.writestr("filtros.json", json.dumps(sidecar, ensure_ascii=False, indent=2, default=str))
+
+def columnar_package(tables, metadata, fmt):
+    """ZIP só com as tabelas em Parquet ou CSV.gz e o filtros.json."""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_STORED) as zip_file:
+        write_columnar(zip_file, tables, metadata, [fmt])
+    return zip_buffer.getvalue()
+# ==================== EXPORTAÇÃO EM SEGUNDO PLANO ====================
+def export_owner():
+    """Dono dos jobs: id do navegador (cookie lido no streamlit_app) ou, sem ele, um id da sessão."""
+    if "export_owner" not in st.session_state:
+        st.session_state.export_owner = uuid.uuid4().hex
+    return st.session_state.export_owner
+
+def _format_size(size):
+    return f"{size / 1024 / 1024:.1f} MB" if size >= 1024 * 1024 else f"{max(size, 1) / 1024:.0f} KB"
+
+def job_download_button(job, key, label="Clique para baixar", on_download=None, **kwargs):
+    """download_button com o arquivo do job (lido do disco)."""
+    try:
+        data = jobs.read_artifact(job)
+    except OSError:
+        st.warning("Arquivo expirado ou removido. Gere novamente.")
+        return
+    st.download_button(
+        label, data=data, file_name=job["file_name"], mime=job["mime"],
+        on_click=on_download or "ignore", key=key, **kwargs
+    )
+
+def export_job_status(job_id, key, label="Clique para baixar", on_download=None, **kwargs):
+    """
+    Andamento do job: barra de progresso (atualizada a cada segundo, só
+    este trecho roda de novo) e, quando pronto, o botão de download.
+    """
+    job = jobs.get_job(job_id)
+    if job is None:
+        return
+
+    if job["status"] in (jobs.QUEUED, jobs.RUNNING):
+        @st.fragment(run_every=1)
+        def andamento():
+            atual = jobs.get_job(job_id)
+            if atual is None or atual["status"] not in (jobs.QUEUED, jobs.RUNNING):
+                st.rerun()  # terminou: a execução completa mostra o download e para o polling
+            st.progress(atual["progress"], text=atual["message"] or jobs.STATUS_LABELS[atual["status"]])
+            st.caption("A exportação continua em segundo plano; o arquivo também fica em \"Meus exports\" no menu lateral.")
+        andamento()
+    elif job["status"] == jobs.ERROR:
+        st.error(f"Erro ao gerar o arquivo: {job['error']}")
+    else:
+        job_download_button(job, f"{key}_download", label, on_download, **kwargs)
+
+def background_export(key, build, file_name, mime, job_label, signature, button_label="Gerar",
+                      download_label="Clique para baixar", on_download=None, **kwargs):
+    """
+    Botão que enfileira o export (build: função sem argumentos que devolve
+    os bytes) e, depois do clique, o andamento/download do job. Um job do
+    mesmo navegador com a mesma assinatura (relatório, filtros, formatos e
+    versão da base) é reaproveitado, inclusive depois de reconectar.
+    """
+    owner = export_owner()
+    assinatura = json.dumps(signature, sort_keys=True, default=str)
+    job = jobs.find_job(owner, assinatura)
+    if job is None:
+        if not st.button(button_label, key=f"{key}_gerar", type="secondary", use_container_width=kwargs.get("use_container_width", False)):
+            return
+        job_id = jobs.submit_job(owner, job_label, build, file_name, mime, signature=assinatura)
+    else:
+        job_id = job["id"]
+    export_job_status(job_id, key, download_label, on_download, **kwargs)
+
+def render_export_jobs():
+    """
+    Lista "Meus exports" (menu lateral): jobs do navegador ainda dentro da
+    retenção. Só o arquivo escolhido é lido do disco para o download.
+    """
+    lista = jobs.list_jobs(export_owner())
+    if not lista:
+        return
+    with st.sidebar.expander(f"Meus exports ({len(lista)})"):
+        for job in lista:
+            quando = datetime.fromtimestamp(job["created"]).strftime("%d/%m %H:%M")
+            status = jobs.STATUS_LABELS[job["status"]]
+            if job["status"] == jobs.DONE:
+                status += f" • {_format_size(job['size'] or 0)}"
+            elif job["status"] == jobs.RUNNING:
+                status += f" • {job['progress']:.0%}"
+            st.markdown(f"**{job['label']}**  \n<span style='color:#666;font-size:0.8rem;'>{quando} • {status}</span>", unsafe_allow_html=True)
+            if job["status"] == jobs.ERROR:
+                st.caption(job["error"])
+
+        prontos = {f"{j['label']} ({datetime.fromtimestamp(j['created']).strftime('%H:%M')})": j for j in lista if j["status"] == jobs.DONE}
+        if prontos:
+            escolhido = st.selectbox("Arquivo", list(prontos), key="export_jobs_sel", label_visibility="collapsed")
+            job = prontos[escolhido]
+            job_download_button(job, f"job_{job['id']}_download", "Baixar", use_container_width=True)
+        st.caption(f"Arquivos mantidos por {jobs.JOB_RETENTION_H:g}h.")
+
+# ==================== EXPORTAÇÃO SOB DEMANDA (CROWLEY) ====================
+def excel_download(build, report, params, version, file_name, tables=None):
+    """
+    Exportação sob demanda: o arquivo só é montado quando o usuário clica em
+    "Gerar", numa thread da fila de jobs (a tela continua utilizável).
+    Enquanto formato, filtros (params) e versão da base não mudam, o job
+    pronto é reaproveitado e o botão de download continua na tela.
+    - build: função sem argumentos que devolve os bytes do xlsx;
+    - tables: função que devolve {nome: DataFrame/Arrow/iterável de batches};
+      quando informada, o usuário escolhe também Parquet ou CSV.gz (ZIP com
+      os arquivos e filtros.json);
+    - version: versão da base (utils/dataset_version.py).
+    """
+    fmt = "xlsx"
+    if tables is not None:
+        rotulo = st.selectbox("Formato", list(EXPORT_FORMATS), key=f"{report}_export_fmt", label_visibility="collapsed")
+        fmt = EXPORT_FORMATS[rotulo]
+    nome = FORMAT_NAMES[fmt]
+
+    if fmt == "xlsx":
+        gerar, mime = build, XLSX_MIME
+    else:
+        metadata = {"relatorio": report, "filtros": params, "versao_base": version}
+        gerar, mime = (lambda: columnar_package(tables(), metadata, fmt)), ZIP_MIME
+        file_name = re.sub(r"\.xlsx$", "", file_name) + f"_{fmt.replace('.', '_')}.zip"
+
+    background_export(
+        f"{report}_excel", gerar, file_name, mime, job_label=file_name,
+        signature={"relatorio": report, "formato": fmt, "filtros": params, "versao": version},
+        button_label=f"Gerar {nome}", download_label=f"Exportar {nome}", type="secondary", use_container_width=True
+    )
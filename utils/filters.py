@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 import json 
 from datetime import datetime 
+from utils import dataset_version
 
 def aplicar_filtros(df, cookies):
     """
@@ -215,6 +216,12 @@ def aplicar_filtros(df, cookies):
 
     if cli_sel:
         df_filtrado = df_filtrado[df_filtrado["cliente"].isin(cli_sel)]
+
+    # Versão do recorte: caches derivados (resultados, exports) distinguem os filtros
+    dataset_version.derive(df_filtrado, dataset_version.of(df), {
+        "anos": anos_sel, "emissoras": emis_sel, "executivos": exec_sel,
+        "clientes": cli_sel, "meses": meses_sel_num,
+    })
     
     # Salva os filtros no Cookie (silencioso)
     try:
@@ -1,7 +1,7 @@
 # utils/format.py
 import pandas as pd
 import re
-import streamlit as st
+from functools import lru_cache
 import numpy as np
 
 PALETTE = ["#007dc3", "#00a8e0", "#7ad1e6", "#004b8d", "#0095d9"]
@@ -72,9 +72,11 @@ def consolidate_executives(name):
     
     return name
 
-@st.cache_data(ttl=600)
 def normalize_dataframe(df_raw: pd.DataFrame) -> pd.DataFrame:
-    """Normaliza estrutura de planilhas de vendas (Novabrasil) com alias robustos."""
+    """
+    Normaliza estrutura de planilhas de vendas (Novabrasil) com alias robustos.
+    Sem cache próprio: o resultado é cacheado pela revisão da origem no loader.
+    """
     df = df_raw.copy()
     
     # 1. Renomear colunas
@@ -148,4 +150,114 @@ def normalize_dataframe(df_raw: pd.DataFrame) -> pd.DataFrame:
     df.columns = df.columns.map(str)
     df = df.reset_index(drop=True)
 
-    return df
\ No newline at end of file
+    return df
+
+# ==================== FORMATAÇÃO VETORIZADA ====================
+# Converte arrays inteiros de números em texto de uma vez: os grupos de
+# milhar e os decimais saem de tabelas pré-montadas ("000".."999"), então não
+# há nenhuma chamada Python por célula.
+
+@lru_cache(maxsize=None)
+def _tabela_grupos(sep):
+    """Grupos de milhar já com separador: ['.000', '.001', ..., '.999']."""
+    return np.array([f"{sep}{i:03d}" for i in range(1000)])
+
+@lru_cache(maxsize=None)
+def _tabela_decimais(decimal, casas):
+    return np.array([f"{decimal}{i:0{casas}d}" for i in range(10 ** casas)])
+
+_TABELA_INICIAL = np.array([str(i) for i in range(1000)])
+
+def _como_float(values):
+    """
+    Array float + máscara das células que já são texto (ex.: '-' em linhas de
+    total), que passam adiante sem formatação.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biuf":
+        return arr.astype(float), None
+    texto = np.array([isinstance(x, str) for x in arr.ravel()], dtype=bool).reshape(arr.shape)
+    v = pd.to_numeric(pd.Series(np.where(texto, None, arr).ravel()), errors="coerce").to_numpy(dtype=float).reshape(arr.shape)
+    return v, (texto, arr.astype(str)) if texto.any() else None
+
+def _repassa_texto(txt, texto):
+    return txt if texto is None else np.where(texto[0], texto[1], txt)
+
+def fixed_array(values, decimals=0, thousands=".", decimal=","):
+    """
+    Números -> texto com casas decimais fixas e separador de milhar
+    (padrão pt-BR). NaN vira string vazia.
+    """
+    v = np.asarray(values, dtype=float)
+    nulos = np.isnan(v)
+    infinitos = np.isinf(v)
+    escala = 10 ** decimals
+    # longdouble evita empates artificiais na escala (ex.: 0.005 * 100 == 0.5)
+    arred = np.rint(np.abs(np.where(nulos | infinitos, 0.0, v)).astype(np.longdouble) * escala).astype(np.int64)
+    inteiro, frac = np.divmod(arred, escala)
+
+    grupos = np.ones(v.shape, dtype=np.int64)
+    for k in range(1, 7):
+        grupos += inteiro >= 1000 ** k
+
+    txt = _TABELA_INICIAL[inteiro // 1000 ** (grupos - 1)]
+    tabela = _tabela_grupos(thousands)
+    for e in range(int(grupos.max(initial=1)) - 2, -1, -1):
+        txt = np.where(grupos - 2 >= e, np.strings.add(txt, tabela[(inteiro // 1000 ** e) % 1000]), txt)
+    if decimals:
+        txt = np.strings.add(txt, _tabela_decimais(decimal, decimals)[frac])
+
+    txt = np.where(infinitos, "inf", txt)
+    txt = np.where(np.signbit(v) & ~nulos, np.strings.add("-", txt), txt)
+    return np.where(nulos, "", txt)
+
+def brl_array(values, na="—"):
+    """Versão vetorizada de brl: 'R$ 1.234,56'."""
+    v, texto = _como_float(values)
+    txt = np.where(np.isnan(v), na, np.strings.add("R$ ", fixed_array(v, 2)))
+    return _repassa_texto(txt, texto)
+
+def format_int_array(values):
+    """Inteiro com separador de milhar; zero/NaN viram '-'."""
+    v, texto = _como_float(values)
+    txt = fixed_array(np.trunc(v) + 0.0)  # + 0.0 descarta o sinal de -0.0
+    return _repassa_texto(np.where(np.isnan(v) | (v == 0), "-", txt), texto)
+
+def format_percent_array(values, signed=True, na="-"):
+    """Percentual com 2 casas ('+12.34%'; signed=False: '12.34%')."""
+    v, texto = _como_float(values)
+    txt = np.strings.add(fixed_array(v, 2, "", "."), "%")
+    if signed:
+        txt = np.where(np.signbit(v), txt, np.strings.add("+", txt))
+    return _repassa_texto(np.where(np.isnan(v), na, txt), texto)
+
+def format_decimal_array(values, decimals=1, na="-"):
+    """Número com casas fixas no formato da tabela ('1,234.5')."""
+    v, texto = _como_float(values)
+    return _repassa_texto(np.where(np.isnan(v), na, fixed_array(v, decimals, ",", ".")), texto)
+
+def format_brl_abrev_array(values, mil=True):
+    """
+    Valores monetários abreviados ('R$ 1,2 Mi', '-R$ 350 mil', 'R$ 980,00').
+    Com mil=False só milhões são abreviados e zero/NaN viram 'R$ 0,00'
+    (cards de Perdas & Ganhos); com mil=True, 'R$ 0'.
+    """
+    v, _ = _como_float(values)
+    a = np.abs(v)
+    sinal = np.where(v < 0, "-R$ ", "R$ ")
+    mi = np.strings.add(np.strings.add(sinal, fixed_array(a / 1_000_000, 1)), " Mi")
+    mil_txt = np.strings.add(np.strings.add(sinal, fixed_array(a / 1_000, 0)), " mil")
+    reais = np.strings.add("R$ ", fixed_array(v, 2))
+    txt = np.where(a >= 1_000_000, mi, np.where((a >= 1_000) & mil, mil_txt, reais))
+    return np.where(np.isnan(v) | (v == 0), "R$ 0" if mil else "R$ 0,00", txt)
+
+def format_int_abrev_array(values):
+    """Inserções abreviadas para eixos e rótulos ('12,3k')."""
+    v, _ = _como_float(values)
+    k = np.strings.add(fixed_array(v / 1000, 1, ",", ","), "k")
+    txt = np.where(v >= 1000, k, fixed_array(np.trunc(v) + 0.0, 0, ""))
+    return np.where(np.isnan(v) | (v == 0), "0", txt)
+
+# --- Versão escalar (cards e deltas) ---
+def brl_abrev(valor, mil=True):
+    return str(format_brl_abrev_array([valor], mil=mil)[0])
@@ -0,0 +1,198 @@
+# utils/jobs.py
+"""
+Fila local de exportações em segundo plano.
+
+O clique em "Gerar" só enfileira o job: o arquivo é montado numa thread do
+pool (as funções de build usam a base já carregada no processo, então
+threads e não processos) e a sessão continua livre. Estado e artefato de
+cada job ficam em disco (JOBS_DIR/<id>/), o que permite baixar depois,
+em outra página ou após reconectar, até o fim da retenção.
+
+O dono do job é o identificador do navegador (cookie), não a sessão.
+Dentro do build, report_progress(fração, mensagem) atualiza o progresso
+exibido na tela.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import atexit
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from . import perf
+
+JOBS_DIR = os.environ.get("EXPORT_JOBS_DIR", os.path.join("data", "export_jobs"))
+JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", 2))
+JOB_RETENTION_H = float(os.environ.get("EXPORT_JOB_RETENTION_H", 24))
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+STATUS_LABELS = {QUEUED: "Na fila", RUNNING: "Gerando", DONE: "Pronto", ERROR: "Erro"}
+
+_pool = None
+_pool_lock = threading.Lock()
+_write_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_pool():
+    """Pool de threads persistente (criado no primeiro job)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="export-job")
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+
+# ==================== ESTADO EM DISCO ====================
+def _job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+def _save(job):
+    """Grava o job.json de forma atômica (outra sessão pode estar lendo)."""
+    path = os.path.join(_job_dir(job["id"]), "job.json")
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+def _update(job, **fields):
+    with _write_lock:
+        job.update(fields)
+        try:
+            _save(job)
+        except OSError:
+            pass
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def get_job(job_id):
+    """Estado atual do job (dict) ou None se não existe / expirou."""
+    if not job_id:
+        return None
+    try:
+        with open(os.path.join(_job_dir(job_id), "job.json"), encoding="utf-8") as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if job["status"] in (QUEUED, RUNNING) and job["pid"] != os.getpid() and not _pid_alive(job["pid"]):
+        # Servidor reiniciado no meio do build: o job não vai terminar
+        job.update(status=ERROR, error="Exportação interrompida (servidor reiniciado). Gere novamente.")
+    return job
+
+def list_jobs(owner):
+    """Jobs do dono ainda na retenção, do mais recente para o mais antigo."""
+    cleanup()
+    jobs = []
+    try:
+        nomes = os.listdir(JOBS_DIR)
+    except OSError:
+        return jobs
+    for nome in nomes:
+        job = get_job(nome)
+        if job is not None and job["owner"] == owner:
+            jobs.append(job)
+    return sorted(jobs, key=lambda j: j["created"], reverse=True)
+
+def find_job(owner, signature):
+    """Job do dono com a mesma assinatura (mesmo relatório, filtros e base) que não falhou."""
+    for job in list_jobs(owner):
+        if job["signature"] == signature and job["status"] != ERROR:
+            return job
+    return None
+
+def read_artifact(job):
+    """Bytes do arquivo gerado pelo job."""
+    with open(os.path.join(_job_dir(job["id"]), job["artifact"]), "rb") as f:
+        return f.read()
+
+def cleanup(retention_h=None):
+    """Apaga os jobs terminados há mais tempo que a retenção."""
+    limite = time.time() - 3600 * (JOB_RETENTION_H if retention_h is None else retention_h)
+    try:
+        entradas = list(os.scandir(JOBS_DIR))
+    except OSError:
+        return
+    for e in entradas:
+        job = get_job(e.name)
+        if job is None:
+            # Diretório sem job.json (criação interrompida): só some depois da retenção
+            try:
+                if e.stat().st_mtime < limite:
+                    shutil.rmtree(e.path, ignore_errors=True)
+            except OSError:
+                pass
+        elif job["status"] in (DONE, ERROR) and (job["finished"] or job["created"]) < limite:
+            shutil.rmtree(e.path, ignore_errors=True)
+
+
+# ==================== EXECUÇÃO ====================
+def report_progress(fraction=None, message=None):
+    """
+    Atualiza o progresso do job em execução na thread atual (no-op fora de
+    um job, ex.: quando o build roda direto na sessão).
+    """
+    job = getattr(_local, "job", None)
+    if job is None:
+        return
+    campos = {}
+    if fraction is not None:
+        campos["progress"] = max(job["progress"], min(float(fraction), 1.0))
+    if message is not None:
+        campos["message"] = message
+    if campos:
+        _update(job, **campos)
+
+def _run(job, build):
+    _local.job = job
+    _update(job, status=RUNNING, started=time.time(), message="Gerando...")
+    try:
+        with perf.request("Exportação", label=job["label"]), perf.span("export"):
+            data = build()
+        path = os.path.join(_job_dir(job["id"]), job["artifact"])
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+        _update(job, status=DONE, progress=1.0, message="Pronto", size=len(data), finished=time.time())
+    except Exception as e:
+        traceback.print_exc()
+        _update(job, status=ERROR, error=str(e) or type(e).__name__, finished=time.time())
+    finally:
+        _local.job = None
+
+def submit_job(owner, label, build, file_name, mime, signature=None):
+    """
+    Enfileira `build` (função sem argumentos que devolve os bytes do
+    arquivo) e devolve o id do job. O arquivo fica em disco com o nome
+    `file_name` até o fim da retenção.
+    """
+    job_id = uuid.uuid4().hex[:16]
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    job = {
+        "id": job_id, "owner": owner, "label": label, "signature": signature,
+        "status": QUEUED, "progress": 0.0, "message": "Na fila", "error": None,
+        "file_name": file_name, "mime": mime, "artifact": "artefato.bin", "size": None,
+        "created": time.time(), "started": None, "finished": None, "pid": os.getpid(),
+    }
+    _update(job)
+    get_pool().submit(_run, job, build)
+    return job_id
@@ -2,15 +2,16 @@
 import os
 import gc
 import time
+import threading
 import pandas as pd
 import streamlit as st
-import pyarrow.parquet as pq
-import pyarrow as pa
 from datetime import datetime, timezone
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from .format import normalize_dataframe
+from . import crowley_store, crowley_table, dataset_version, perf
+from .crowley_table import CrowleyTable
 
 # --- CONFIGURAÇÃO ---
 DATA_FOLDER = "data"
@@ -71,9 +72,31 @@ def download_file(service, file_id, dest_path):
 # ==========================================
 # LOADERS
 # ==========================================
+# A base de vendas é cacheada pela revisão do arquivo no Drive (md5), não por
+# TTL: a cada SALES_REVISION_CHECK_SECONDS só os metadados são consultados e
+# o download acontece apenas quando o arquivo mudou. A versão da base
+# (revisão + esquema, utils/dataset_version.py) vai em df.attrs.
+SALES_REVISION_CHECK_SECONDS = int(os.environ.get("SALES_REVISION_CHECK_SECONDS", 300))
 
-@st.cache_resource(ttl=3600, show_spinner="Atualizando Vendas...")
-def fetch_from_drive():
+@st.cache_data(ttl=SALES_REVISION_CHECK_SECONDS, show_spinner=False)
+def sales_revision():
+    """Revisão atual do arquivo de vendas no Drive (md5 ou versão do Drive); None se indisponível."""
+    service = get_drive_service()
+    if not service: return None
+    try:
+        meta = service.files().get(
+            fileId=st.secrets["drive_files"]["faturamento_xlsx"], fields="md5Checksum,version,modifiedTime"
+        ).execute()
+    except Exception:
+        return None
+    if meta.get("md5Checksum"):
+        return meta["md5Checksum"][:12]
+    return dataset_version.short_hash(f"{meta.get('version')}-{meta.get('modifiedTime')}")
+
+@st.cache_resource(max_entries=1, show_spinner="Atualizando Vendas...")
+def fetch_from_drive(revision):
+    """Baixa e normaliza a base de vendas (uma revisão por processo)."""
+    perf.cache_miss()
     nuke_and_prepare([PATH_VENDAS])
     
     service = get_drive_service()
@@ -85,7 +108,10 @@ def fetch_from_drive():
             try: df = pd.read_parquet(PATH_VENDAS)
             except: df = pd.read_excel(PATH_VENDAS, engine="openpyxl")
             
-            df = normalize_dataframe(df)
+            with perf.span("normalize", rows=len(df)):
+                df = normalize_dataframe(df)
+            # Sem revisão no Drive: versão pelo conteúdo (nunca uma constante)
+            dataset_version.attach(df, revision or dataset_version.content_revision(df))
             
             ultima = "N/A"
             if "data_ref" in df.columns:
@@ -98,79 +124,150 @@ def fetch_from_drive():
             return None, None
     return None, None
 
+@st.cache_resource(show_spinner=False)
+def _sales_state():
+    """Última base de vendas carregada com sucesso neste processo."""
+    return {"df": None, "ultima": None}
+
 def load_main_base():
     if "uploaded_dataframe" in st.session_state and st.session_state.uploaded_dataframe is not None:
-        return st.session_state.uploaded_dataframe, st.session_state.get("uploaded_timestamp", "Upload Manual")
-    return fetch_from_drive()
+        df = st.session_state.uploaded_dataframe
+        if dataset_version.of(df) is None:
+            dataset_version.attach(df, dataset_version.content_revision(df))
+        return df, st.session_state.get("uploaded_timestamp", "Upload Manual")
+
+    state = _sales_state()
+    revision = sales_revision()
+    if revision is None and state["df"] is not None:
+        # Drive indisponível: segue com a última base carregada
+        return state["df"], state["ultima"]
+    with perf.cache_lookup("fetch_from_drive"):
+        df, ultima = fetch_from_drive(revision)
+    if df is None:
+        # Falha não fica em cache: a próxima execução tenta de novo
+        fetch_from_drive.clear(revision)
+        return state["df"], state["ultima"]
+    state["df"], state["ultima"] = df, ultima
+    return df, ultima
 
 
 # --- CROWLEY ---
-@st.cache_resource(ttl=3600, show_spinner="Atualizando Crowley...")
-def load_crowley_base():
-    # 1. DELETA TUDO ANTES
-    nuke_and_prepare([PATH_CROWLEY])
-    
+# A base Crowley é mantida num store local particionado (utils/crowley_store.py).
+# A cada atualização só os dias novos são lidos e anexados à tabela compacta
+# (utils/crowley_table.py), que é publicada como snapshot Feather no disco.
+# Cada processo do servidor abre o snapshot com memory-map: a memória é
+# compartilhada pelo page cache e só um processo por vez baixa/processa a origem.
+CROWLEY_REFRESH_SECONDS = 3600
+CROWLEY_FULL_CHECK_SECONDS = 24 * 3600  # conferência periódica do store contra o export completo
+PATH_CROWLEY_DELTA = os.path.join(DATA_FOLDER, "crowley_delta.parquet")
+
+@st.cache_resource(show_spinner=False)
+def _crowley_state():
+    """Estado do processo: CrowleyTable mapeada, snapshot aberto, data de atualização e trava."""
+    return {"tb": None, "snapshot": None, "ultima": "N/A", "checked_at": 0.0, "lock": threading.Lock()}
+
+def _ingest_from_drive(service, file_id, dest_path, is_delta):
+    """Baixa um arquivo do Drive e anexa ao store as datas novas: (nova, reconstruido, erro)."""
+    # 1. Remove o download anterior e baixa o novo
+    nuke_and_prepare([dest_path])
+    if not download_file(service, file_id, dest_path):
+        return None, False, "Erro Download"
+
+    # 2. Anexa apenas as datas que ainda não estão no store
+    try:
+        nova, reconstruido = crowley_store.ingest_file(dest_path, is_delta=is_delta)
+        return nova, reconstruido, None
+    except crowley_store.DeltaMismatch:
+        raise
+    except Exception:
+        # Limpa para não deixar arquivo corrompido
+        if os.path.exists(dest_path): os.remove(dest_path)
+        return None, False, "Erro Leitura"
+
+def _sync_crowley_store():
+    """
+    Baixa o arquivo do Drive e anexa ao store os dias novos.
+    Se houver um arquivo delta configurado (drive_files.crowley_delta_parquet),
+    ele é usado no lugar do export completo nas atualizações incrementais. O
+    export completo é usado com o store vazio (primeira carga, pasta de dados
+    apagada ou store reconstruído), quando o delta não emenda no store
+    (crowley_store.DeltaMismatch) e uma vez a cada CROWLEY_FULL_CHECK_SECONDS,
+    para conferir o histórico (a contagem de linhas reconstrói o store se a
+    origem mudou).
+    Retorna (tabela_nova, reconstruido, erro).
+    """
     service = get_drive_service()
-    if not service: return None, "Erro Conexão"
+    if not service: return None, False, "Erro Conexão"
 
-    file_id = st.secrets["drive_files"]["crowley_parquet"]
-    
-    # 2. BAIXA O ARQUIVO NOVO
-    if not download_file(service, file_id, PATH_CROWLEY):
-        return None, "Erro Download"
+    drive_files = st.secrets["drive_files"]
+    manifest = crowley_store.load_manifest()
+    conferido = time.time() - (manifest.get("full_checked_at") or 0) < CROWLEY_FULL_CHECK_SECONDS
+    if "crowley_delta_parquet" in drive_files and manifest["max_date"] and conferido:
+        try:
+            return _ingest_from_drive(service, drive_files["crowley_delta_parquet"], PATH_CROWLEY_DELTA, True)
+        except crowley_store.DeltaMismatch:
+            pass  # delta perdido/atrasado ou linhas tardias: o export completo reconcilia
+    return _ingest_from_drive(service, drive_files["crowley_parquet"], PATH_CROWLEY, False)
 
-    # 3. LEITURA "ZERO-COPY" (SELF DESTRUCT)
+def _update_snapshot():
+    """Sincroniza o store com o Drive e publica um novo snapshot se algo mudou."""
+    nova, reconstruido, erro = _sync_crowley_store()
+    if erro and crowley_table.snapshot_info() is not None:
+        # Falha do Drive (temporária): mantém o snapshot atual sem marcar a
+        # verificação, para que a próxima execução tente de novo
+        return erro
     try:
-        gc.collect()
-
-        # Lê como tabela PyArrow primeiro (gerencia memória melhor que Pandas direto)
-        # memory_map=True usa o disco como extensão da RAM
-        arrow_table = pq.read_table(PATH_CROWLEY, memory_map=True)
-        
-        # O SEGRED0: self_destruct=True
-        # Libera a memória do PyArrow À MEDIDA que cria o Pandas.
-        df = arrow_table.to_pandas(self_destruct=True, split_blocks=True)
-        
-        # Limpa o objeto arrow imediatamente
-        del arrow_table
-        gc.collect()
-        
-        # 4. OTIMIZAÇÃO DE TIPOS IN-PLACE
-        
-        # Categorias
-        cat_cols = ["Praca", "Emissora", "Anunciante", "Anuncio", "Tipo", "DayPart"]
-        for col in cat_cols:
-            if col in df.columns:
-                df[col] = df[col].astype("category")
-
-        # Numéricos
-        num_cols = ["Volume de Insercoes", "Duracao"]
-        for col in num_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype("int32")
-
-        # Datas
-        ultima = "N/A"
-        if "Data" in df.columns:
-            # Converte data direto
-            df["Data_Dt"] = pd.to_datetime(df["Data"], dayfirst=True, errors="coerce")
-            
-            # Tenta pegar max data
+        base = None if reconstruido else crowley_table.open_snapshot()[0]
+        if base is None:
+            # Primeira carga (ou histórico alterado): lê o store inteiro
+            table = crowley_store.read_store()
+            if table is not None:
+                crowley_table.publish_snapshot(CrowleyTable.from_arrow(table))
+        elif nova is not None:
+            # Atualização incremental: só as linhas novas são convertidas
+            crowley_table.publish_snapshot(base.append(CrowleyTable.from_arrow(nova)))
+        else:
+            crowley_table.touch_snapshot()
+    except Exception:
+        erro = "Erro Leitura"
+    return erro
+
+def _refresh_crowley(state):
+    erro = None
+    with crowley_table.store_lock():
+        # Outro processo pode ter atualizado o snapshot enquanto esperávamos
+        info = crowley_table.snapshot_info()
+        if info is None or time.time() - info["checked_at"] > CROWLEY_REFRESH_SECONDS:
+            erro = _update_snapshot()
+            info = crowley_table.snapshot_info()
+
+        if info is not None and info["dir"] != state["snapshot"]:
             try:
-                m = df["Data_Dt"].max()
-                if pd.notna(m): ultima = m.strftime("%d/%m/%Y")
-            except: pass
-            
-            # Remove a coluna de texto original para liberar RAM
-            df.drop(columns=["Data"], inplace=True) 
+                state["tb"], state["snapshot"] = crowley_table.open_snapshot()
+                # Catálogo dos filtros montado junto com a carga, não no primeiro rerun
+                if state["tb"] is not None: state["tb"].catalog()
+            except Exception:
+                erro = "Erro Leitura"
 
-        if ultima == "N/A":
-             ts = os.path.getmtime(PATH_CROWLEY)
-             ultima = datetime.fromtimestamp(ts).strftime("%d/%m/%Y")
+    if state["tb"] is None:
+        state["ultima"] = erro or "N/A"
+        return
 
-        return df, ultima
+    ultima = state["tb"].last_date()
+    if ultima == "N/A" and os.path.exists(PATH_CROWLEY):
+        ts = os.path.getmtime(PATH_CROWLEY)
+        ultima = datetime.fromtimestamp(ts).strftime("%d/%m/%Y")
+    state["ultima"] = ultima
+    if erro is None:
+        state["checked_at"] = time.time()
+    gc.collect()
 
-    except Exception:
-        # Limpa para não deixar arquivo corrompido
-        if os.path.exists(PATH_CROWLEY): os.remove(PATH_CROWLEY)
-        return None, "Erro Leitura"
\ No newline at end of file
+def load_crowley_base():
+    state = _crowley_state()
+    with state["lock"]:
+        expirado = time.time() - state["checked_at"] > CROWLEY_REFRESH_SECONDS
+        perf.record_cache("crowley_snapshot", hit=state["tb"] is not None and not expirado)
+        if state["tb"] is None or expirado:
+            with st.spinner("Atualizando Crowley..."):
+                _refresh_crowley(state)
+    return state["tb"], state["ultima"]
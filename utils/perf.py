@@ -0,0 +1,212 @@
+# utils/perf.py
+"""
+Instrumentação leve das páginas (sem profiler).
+
+Cada execução do script é uma "requisição": begin_request(página) abre o
+registro, span(etapa) mede cada trecho (load, normalize, filter, aggregate,
+format, render, export) e end_request() grava o registro num buffer circular
+do processo (PERF_BUFFER_SIZE requisições). Cada span guarda duração,
+linhas processadas e a memória residente (RSS) do processo no fim da etapa.
+
+Os exports em segundo plano viram requisições próprias (página "Exportação").
+Fora de uma requisição (benchmarks, scripts) span() não registra nada.
+
+cache_lookup()/cache_miss() contam acertos dos caches do Streamlit: a função
+cacheada chama cache_miss() quando de fato executa. track_dataset() guarda o
+tamanho atual das bases carregadas.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+PERF_BUFFER_SIZE = int(os.environ.get("PERF_BUFFER_SIZE", 2000))
+PERF_ENABLED = os.environ.get("PERF_ENABLED", "1") != "0"
+
+STAGES = ["load", "normalize", "filter", "aggregate", "format", "render", "export"]
+
+_buffer = deque(maxlen=PERF_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+_caches = {}
+_datasets = {}
+_local = threading.local()
+
+try:
+    _PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+except (AttributeError, ValueError, OSError):
+    _PAGE_MB = None
+
+
+def rss_mb():
+    """Memória residente atual do processo (MB); None se o sistema não informar."""
+    if _PAGE_MB is not None:
+        try:
+            with open("/proc/self/statm") as f:
+                return round(int(f.read().split()[1]) * _PAGE_MB, 1)
+        except (OSError, ValueError, IndexError):
+            pass
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Fora do Linux só há o pico (bytes no macOS, KB no Linux)
+        return round(pico / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except (ImportError, OSError):
+        return None
+
+
+# ==================== REQUISIÇÕES ====================
+def begin_request(page, **info):
+    """Abre o registro da execução atual (descarta um registro anterior não fechado)."""
+    if not PERF_ENABLED:
+        _local.request = None
+        return
+    _local.request = {
+        "id": uuid.uuid4().hex[:12], "ts": time.time(), "page": page, "status": None,
+        "total_ms": None, "rss_mb": rss_mb(), "rss_delta_mb": None, "spans": [], **info,
+        "_t0": time.perf_counter(), "_depth": 0,
+    }
+
+def current_request():
+    return getattr(_local, "request", None)
+
+def set_page(page):
+    """Renomeia a página da requisição (ex.: módulo do Relatório Crowley)."""
+    req = current_request()
+    if req is not None:
+        req["page"] = page
+
+def _status(exc_type):
+    if exc_type is None:
+        return "ok"
+    # st.stop() / st.rerun() interrompem o script por exceção
+    nome = exc_type.__name__
+    if nome == "StopException":
+        return "stop"
+    if nome == "RerunException":
+        return "rerun"
+    return "erro"
+
+def end_request():
+    """
+    Fecha o registro e grava no buffer. Chamado num finally: o status vem
+    da exceção em andamento (ok, stop, rerun ou erro).
+    """
+    req = current_request()
+    if req is None:
+        return None
+    _local.request = None
+    req["status"] = _status(sys.exc_info()[0])
+    req["total_ms"] = round((time.perf_counter() - req.pop("_t0")) * 1000, 2)
+    req.pop("_depth")
+    rss = rss_mb()
+    if rss is not None and req["rss_mb"] is not None:
+        req["rss_delta_mb"] = round(rss - req["rss_mb"], 1)
+    req["rss_mb"] = rss
+    with _buffer_lock:
+        _buffer.append(req)
+    return req
+
+@contextmanager
+def request(page, **info):
+    """Requisição fora do script (ex.: thread de export)."""
+    begin_request(page, **info)
+    try:
+        yield current_request()
+    finally:
+        end_request()
+
+
+# ==================== SPANS ====================
+@contextmanager
+def span(name, rows=None):
+    """
+    Mede um trecho da requisição atual. O dict devolvido aceita "rows"
+    preenchido depois (quando o total de linhas só é conhecido no fim).
+    """
+    req = current_request()
+    if req is None:
+        yield {"rows": rows}
+        return
+    s = {"name": name, "rows": rows, "depth": req["_depth"]}
+    req["_depth"] += 1
+    rss_ini = rss_mb()
+    t0 = time.perf_counter()
+    try:
+        yield s
+    finally:
+        fim = time.perf_counter()
+        req["_depth"] -= 1
+        rss = rss_mb()
+        s.update(
+            start_ms=round((t0 - req["_t0"]) * 1000, 2),
+            ms=round((fim - t0) * 1000, 2),
+            rss_mb=rss,
+            rss_delta_mb=round(rss - rss_ini, 1) if rss is not None and rss_ini is not None else None,
+        )
+        if sys.exc_info()[0] is not None:
+            s["status"] = _status(sys.exc_info()[0])
+        req["spans"].append(s)
+
+
+# ==================== CACHES ====================
+def record_cache(name, hit):
+    with _buffer_lock:
+        c = _caches.setdefault(name, {"hits": 0, "misses": 0})
+        c["hits" if hit else "misses"] += 1
+
+@contextmanager
+def cache_lookup(name):
+    """Chamada a uma função cacheada: sem cache_miss() lá dentro, conta como acerto."""
+    pilha = _local.__dict__.setdefault("lookups", [])
+    pilha.append(False)
+    try:
+        yield
+    finally:
+        record_cache(name, hit=not pilha.pop())
+
+def cache_miss():
+    """Marca a chamada cacheada em andamento como falta (a função executou)."""
+    pilha = getattr(_local, "lookups", None)
+    if pilha:
+        pilha[-1] = True
+
+
+def track_dataset(name, data, size_mb, version=None):
+    """Linhas, memória (MB) e versão da base carregada; size_mb(data) só roda quando o objeto muda."""
+    with _buffer_lock:
+        atual = _datasets.get(name)
+        if atual is not None and atual["_id"] == id(data):
+            atual["version"] = version
+            return
+    info = {"_id": id(data), "rows": len(data), "mb": round(size_mb(data), 1), "version": version, "loaded_at": time.time()}
+    with _buffer_lock:
+        _datasets[name] = info
+
+
+# ==================== LEITURA ====================
+def snapshot():
+    """Cópia das requisições do buffer (mais antiga primeiro)."""
+    with _buffer_lock:
+        return list(_buffer)
+
+def cache_stats():
+    with _buffer_lock:
+        return {nome: dict(c) for nome, c in _caches.items()}
+
+def datasets():
+    with _buffer_lock:
+        return {nome: {k: v for k, v in d.items() if k != "_id"} for nome, d in _datasets.items()}
+
+def clear():
+    with _buffer_lock:
+        _buffer.clear()
+        _caches.clear()
+
+def to_jsonl(requests=None):
+    """Requisições em JSON lines (bytes), uma por linha."""
+    requests = snapshot() if requests is None else requests
+    return "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in requests).encode("utf-8")
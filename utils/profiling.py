@@ -0,0 +1,242 @@
+# utils/profiling.py
+"""
+Captura de perfil (cProfile) de uma execução do script, sob demanda.
+
+Duas formas de ligar:
+- ?profile=1 na URL: perfila aquela execução (o parâmetro é removido em
+  seguida, então só uma execução é capturada);
+- página de diagnóstico: arm(página) perfila a próxima execução daquela
+  página neste processo, de qualquer sessão (ex.: a combinação de filtros
+  de um usuário específico). Expira em PROFILE_ARM_MINUTES.
+
+Junto do cProfile roda uma amostragem de pilhas da thread do script
+(PROFILE_SAMPLE_MS), gravada no formato "collapsed" (uma pilha por linha,
+quadros separados por ';' e o número de amostras no fim), que é a entrada
+do flamegraph.pl / speedscope. Cada captura fica em PROFILE_DIR/<id>/ com
+profile.pstats, stacks.collapsed e meta.json (página, tempos, filtros da
+sessão e versão das bases); só as PROFILE_KEEP mais recentes são mantidas.
+
+Só uma captura roda por vez no processo: a partir do Python 3.12 o cProfile
+usa sys.monitoring e um segundo Profile ativo levanta ValueError. Enquanto
+uma captura está em andamento, start() devolve False e a execução segue sem
+perfil.
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+PROFILE_SAMPLE_MS = float(os.environ.get("PROFILE_SAMPLE_MS", 5))
+PROFILE_ARM_MINUTES = float(os.environ.get("PROFILE_ARM_MINUTES", 30))
+
+PSTATS_FILE = "profile.pstats"
+STACKS_FILE = "stacks.collapsed"
+META_FILE = "meta.json"
+
+_lock = threading.Lock()
+_armed = None  # {"page": str | None, "until": ts}
+_local = threading.local()
+_running = None  # captura em andamento no processo (no máximo uma)
+
+
+# ==================== GATILHO ====================
+def arm(page=None):
+    """Perfila a próxima execução de `page` (None: qualquer página) neste processo."""
+    global _armed
+    with _lock:
+        _armed = {"page": page, "until": time.time() + 60 * PROFILE_ARM_MINUTES}
+
+def disarm():
+    global _armed
+    with _lock:
+        _armed = None
+
+def armed():
+    """Página armada ({"page", "until"}) ou None."""
+    global _armed
+    with _lock:
+        if _armed is not None and _armed["until"] < time.time():
+            _armed = None
+        return dict(_armed) if _armed else None
+
+def _matches(alvo, page, final=False):
+    # Os módulos do Crowley só são conhecidos depois do roteamento
+    # ("Relatório Crowley" -> "Relatório Crowley/eca"): no início basta o prefixo.
+    if alvo is None or alvo == page:
+        return True
+    return not final and alvo.startswith(f"{page}/")
+
+def should_profile(page, forced=False):
+    """True se esta execução deve ser perfilada (forçada por ?profile=1 ou página armada)."""
+    if forced:
+        return True
+    alvo = armed()
+    return alvo is not None and _matches(alvo["page"], page)
+
+
+# ==================== AMOSTRAGEM ====================
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler(threading.Thread):
+    """Conta as pilhas de uma thread a cada `interval` segundos (formato collapsed)."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._fim = threading.Event()
+
+    def run(self):
+        while not self._fim.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break  # thread do script terminou sem stop() (ex.: st.stop antes do finally)
+            pilha = []
+            while frame is not None:
+                pilha.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(pilha))] += 1
+
+    def stop(self):
+        self._fim.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{pilha} {n}\n" for pilha, n in self.stacks.most_common())
+
+
+# ==================== CAPTURA ====================
+def _discard(cap):
+    cap["prof"].disable()
+    cap["sampler"].stop()
+
+def start(page, trigger):
+    """
+    Liga o cProfile e a amostragem na thread atual. Devolve False (sem
+    perfilar) se outra captura já estiver em andamento no processo.
+    """
+    global _running
+    with _lock:
+        anterior = _running
+        if anterior is not None and anterior["thread"] != threading.get_ident():
+            vivas = {t.ident for t in threading.enumerate()}
+            if anterior["thread"] in vivas:
+                return False
+        if anterior is not None:
+            # Execução anterior interrompida antes do stop() (mesma thread ou
+            # thread já encerrada): descarta para liberar o cProfile
+            _discard(anterior)
+        prof = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_MS / 1000)
+        cap = {"page": page, "trigger": trigger, "prof": prof, "sampler": sampler,
+               "t0": time.time(), "thread": threading.get_ident()}
+        _running = _local.capture = cap
+        sampler.start()
+        prof.enable()
+    return True
+
+def active():
+    return getattr(_local, "capture", None) is not None
+
+def stop(request=None, filters=None, datasets=None):
+    """
+    Desliga a captura da thread atual e grava os arquivos. Uma captura
+    armada para um módulo que não foi o executado (ver _matches) é
+    descartada e o gatilho continua armado. Devolve o id ou None.
+    """
+    global _running
+    cap = getattr(_local, "capture", None)
+    if cap is None:
+        return None
+    _local.capture = None
+    with _lock:
+        if _running is not cap:
+            return None  # descartada por outra thread em start()
+        _running = None
+        _discard(cap)
+
+    page = request["page"] if request else cap["page"]
+    if cap["trigger"] == "armed":
+        alvo = armed()
+        if alvo is None or not _matches(alvo["page"], page, final=True):
+            return None
+        disarm()
+
+    capture_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    pasta = os.path.join(PROFILE_DIR, capture_id)
+    os.makedirs(pasta, exist_ok=True)
+    cap["prof"].dump_stats(os.path.join(pasta, PSTATS_FILE))
+    with open(os.path.join(pasta, STACKS_FILE), "w", encoding="utf-8") as f:
+        f.write(cap["sampler"].collapsed())
+    meta = {
+        "id": capture_id, "ts": cap["t0"], "page": page, "trigger": cap["trigger"],
+        "status": request["status"] if request else None,
+        "total_ms": request["total_ms"] if request else round((time.time() - cap["t0"]) * 1000, 2),
+        "samples": sum(cap["sampler"].stacks.values()), "sample_ms": PROFILE_SAMPLE_MS,
+        "filters": filters or {}, "datasets": datasets or {},
+    }
+    with open(os.path.join(pasta, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+    prune()
+    return capture_id
+
+
+# ==================== CAPTURAS EM DISCO ====================
+def list_captures():
+    """Metadados das capturas, da mais recente para a mais antiga."""
+    capturas = []
+    try:
+        nomes = os.listdir(PROFILE_DIR)
+    except OSError:
+        return capturas
+    for nome in nomes:
+        try:
+            with open(os.path.join(PROFILE_DIR, nome, META_FILE), encoding="utf-8") as f:
+                capturas.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(capturas, key=lambda m: m["ts"], reverse=True)
+
+def read_file(capture_id, file_name):
+    with open(os.path.join(PROFILE_DIR, capture_id, file_name), "rb") as f:
+        return f.read()
+
+def top_functions(capture_id, sort="cumulative", limit=30):
+    """Texto do pstats com as `limit` funções mais caras."""
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(PROFILE_DIR, capture_id, PSTATS_FILE), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+def prune(keep=None):
+    """Apaga as capturas além das `keep` mais recentes."""
+    keep = PROFILE_KEEP if keep is None else keep
+    for meta in list_captures()[keep:]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, meta["id"]), ignore_errors=True)
+
+def session_filters(state):
+    """Filtros da sessão: valores simples do session_state (sem chaves internas nem senhas)."""
+    filtros = {}
+    for chave, valor in state.items():
+        chave = str(chave)
+        if chave.startswith("_") or "password" in chave:
+            continue
+        if isinstance(valor, (str, int, float, bool)) or valor is None:
+            filtros[chave] = valor
+        elif isinstance(valor, (list, tuple)) and len(valor) <= 200:
+            filtros[chave] = [v if isinstance(v, (str, int, float, bool)) else str(v) for v in valor]
+        elif hasattr(valor, "isoformat"):
+            filtros[chave] = valor.isoformat()
+    return dict(sorted(filtros.items()))
@@ -0,0 +1,186 @@
+# utils/rasterize.py
+"""
+Rasterização de gráficos Plotly (PNG) em paralelo para os exports.
+
+Cada processo Python conversa com um único subprocesso do Kaleido, então
+to_image em série não usa mais de um núcleo. Aqui as figuras vão (como JSON)
+para um pool de processos persistente: cada worker mantém o próprio Kaleido
+aquecido entre exports, e o arquivo só é montado quando todas as imagens
+estão prontas.
+
+RASTER_WORKERS (variável de ambiente) define o tamanho do pool; com 1 a
+renderização é feita no próprio processo.
+
+Os PNGs prontos ficam num cache em disco endereçado pelo conteúdo
+(sha256 do JSON da figura + dimensões), compartilhado entre sessões e
+processos, com limite de tamanho e descarte dos menos usados (LRU pelo
+mtime, atualizado a cada acerto).
+"""
+import os
+import atexit
+import hashlib
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+
+from . import perf
+
+RASTER_WORKERS = int(os.environ.get("RASTER_WORKERS", min(4, os.cpu_count() or 1)))
+CHART_CACHE_DIR = os.environ.get("CHART_CACHE_DIR", os.path.join("data", "chart_cache"))
+CHART_CACHE_MAX_MB = float(os.environ.get("CHART_CACHE_MAX_MB", 200))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_png(fig_json, width, height, scale):
+    """PNG de uma figura serializada (roda no worker ou no próprio processo)."""
+    import plotly.io as pio
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return pio.to_image(pio.from_json(fig_json), format="png", width=width, height=height, scale=scale, engine="kaleido")
+
+
+def _warm_up():
+    """Sobe o Kaleido do worker já na criação do pool."""
+    try:
+        render_png('{"data": [], "layout": {}}', 10, 10, 1)
+    except Exception:
+        pass
+
+
+def get_pool():
+    """Pool persistente (criado no primeiro uso, reaproveitado entre exports)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o servidor do Streamlit tem várias threads, fork não é seguro
+            _pool = ProcessPoolExecutor(
+                max_workers=RASTER_WORKERS, mp_context=mp.get_context("spawn"), initializer=_warm_up
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+
+def _safe(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+def render_pngs(figs_json, width=1200, height=700, scale=2, workers=None):
+    """
+    Renderiza as figuras (lista de JSON) e devolve, na mesma ordem, os bytes
+    do PNG ou a exceção daquela figura.
+    """
+    workers = RASTER_WORKERS if workers is None else workers
+    if workers <= 1 or len(figs_json) == 0:
+        return [_safe(render_png, j, width, height, scale) for j in figs_json]
+
+    try:
+        pool = get_pool()
+        futures = [pool.submit(render_png, j, width, height, scale) for j in figs_json]
+        resultados = [f.exception() or f.result() for f in futures]
+    except BrokenProcessPool as e:
+        resultados = [e] * len(figs_json)
+
+    if any(isinstance(r, BrokenProcessPool) for r in resultados):
+        # Worker morreu (ex.: falta de memória): recria o pool na próxima vez e refaz aqui
+        shutdown_pool()
+        resultados = [
+            _safe(render_png, j, width, height, scale) if isinstance(r, BrokenProcessPool) else r
+            for j, r in zip(figs_json, resultados)
+        ]
+    return resultados
+
+
+# ==================== CACHE DE IMAGENS ====================
+def image_key(fig_json, width, height, scale):
+    """Chave do PNG: hash do JSON da figura e das dimensões do export."""
+    h = hashlib.sha256(fig_json.encode("utf-8"))
+    h.update(f"|{width}x{height}@{scale}".encode())
+    return h.hexdigest()
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.png")
+
+def cache_get(key, cache_dir=None):
+    """Bytes do PNG em cache (marca o uso para o LRU) ou None."""
+    path = _cache_path(key, cache_dir or CHART_CACHE_DIR)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+def cache_put(key, data, cache_dir=None):
+    """Grava o PNG de forma atômica (outro processo pode estar lendo)."""
+    path = _cache_path(key, cache_dir or CHART_CACHE_DIR)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def cache_prune(cache_dir=None, max_mb=None):
+    """Apaga os PNGs usados há mais tempo até o cache voltar a 90% do limite."""
+    cache_dir = cache_dir or CHART_CACHE_DIR
+    limite = (CHART_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    arquivos = []
+    try:
+        for sub in os.scandir(cache_dir):
+            if sub.is_dir():
+                for e in os.scandir(sub.path):
+                    if e.name.endswith(".png"):
+                        info = e.stat()
+                        arquivos.append((info.st_mtime, info.st_size, e.path))
+    except OSError:
+        return
+    total = sum(a[1] for a in arquivos)
+    if total <= limite:
+        return
+    for _, size, path in sorted(arquivos):
+        if total <= 0.9 * limite:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # já removido por outro processo
+        total -= size
+
+def cached_render_pngs(figs_json, width=1200, height=700, scale=2, cache_dir=None):
+    """
+    render_pngs consultando o cache: só as figuras ausentes vão para o
+    Kaleido; as renderizadas com sucesso entram no cache.
+    """
+    keys = [image_key(j, width, height, scale) for j in figs_json]
+    resultados = [cache_get(k, cache_dir) for k in keys]
+    faltando = [i for i, r in enumerate(resultados) if r is None]
+    for r in resultados:
+        perf.record_cache("chart_png", hit=r is not None)
+    if faltando:
+        with perf.span("render", rows=len(faltando)):
+            novos = render_pngs([figs_json[i] for i in faltando], width, height, scale)
+        for i, img in zip(faltando, novos):
+            resultados[i] = img
+            if isinstance(img, bytes):
+                cache_put(keys[i], img, cache_dir)
+        cache_prune(cache_dir)
+    return resultados
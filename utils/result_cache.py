@@ -0,0 +1,333 @@
+# utils/result_cache.py
+"""
+Cache em disco dos resultados das funções compute_* das páginas,
+compartilhado entre sessões, processos e reinícios do servidor.
+
+@cached numa função compute_* guarda o resultado em RESULT_CACHE_DIR com a
+chave (função, parâmetros normalizados, versão da base). A versão vem do
+primeiro argumento (DataFrame ou CrowleyTable, utils/dataset_version.py);
+sem versão conhecida a função roda sem cache. A chave inclui também a versão
+do código: hash do arquivo-fonte da função, dos módulos de utils/ (de onde
+vêm os helpers de cálculo) e RESULT_CACHE_CODE_VERSION (ex.: o commit do
+deploy, para mudanças fora desses arquivos). Um deploy que muda o cálculo
+não reaproveita resultados antigos.
+
+Cada entrada é um diretório <chave[:2]>/<chave>/ com meta.json (estrutura do
+resultado e valores simples), DataFrames em Arrow IPC (Feather), arrays
+NumPy em .npy e figuras Plotly em JSON; o que não se encaixa vai em pickle.
+O mtime do meta.json é o índice LRU (atualizado a cada acerto): quando o
+cache passa de RESULT_CACHE_MAX_MB, as entradas usadas há mais tempo são
+apagadas, como no cache de imagens (utils/rasterize.py). A varredura do
+diretório não roda a cada gravação: o processo soma o tamanho do que grava
+sobre o total da última varredura e só varre de novo quando essa conta
+passa do limite ou quando ela tem mais de RESULT_CACHE_PRUNE_SECONDS
+(outros processos também gravam).
+"""
+import os
+import json
+import time
+import uuid
+import pickle
+import shutil
+import inspect
+import hashlib
+import functools
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from plotly.basedatatypes import BaseFigure
+import plotly.io as pio
+
+from . import dataset_version, perf
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join("data", "result_cache"))
+RESULT_CACHE_MAX_MB = float(os.environ.get("RESULT_CACHE_MAX_MB", 500))
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_CODE_VERSION = os.environ.get("RESULT_CACHE_CODE_VERSION", "")
+RESULT_CACHE_PRUNE_SECONDS = float(os.environ.get("RESULT_CACHE_PRUNE_SECONDS", 300))
+
+FORMAT = 1  # muda quando o layout das entradas muda
+META_FILE = "meta.json"
+_MISSING = object()
+_size_lock = threading.Lock()
+_size = {"bytes": None, "at": 0.0}  # total estimado do cache e hora da última varredura
+
+
+# ==================== CHAVE ====================
+def normalize_params(value):
+    """Parâmetros em forma canônica para a chave (TypeError se não for possível)."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted((normalize_params(v) for v in value), key=repr)
+    if isinstance(value, (list, tuple)):
+        return [normalize_params(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): normalize_params(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    raise TypeError(f"parâmetro sem forma canônica: {type(value).__name__}")
+
+def result_key(function, params, version, code=""):
+    texto = json.dumps(
+        {"f": function, "p": normalize_params(params), "v": version, "c": code, "fmt": FORMAT},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return dataset_version.short_hash(f.read())
+    except (OSError, TypeError):
+        return ""
+
+@functools.lru_cache(maxsize=1)
+def _package_hash():
+    """Hash dos módulos de utils/ (lido uma vez por processo)."""
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    arquivos = sorted(n for n in os.listdir(pasta) if n.endswith(".py"))
+    return dataset_version.short_hash("".join(f"{n}:{_file_hash(os.path.join(pasta, n))};" for n in arquivos))
+
+def _code_hash(fn):
+    """Versão do código de fn: módulo da função + utils/ + RESULT_CACHE_CODE_VERSION."""
+    try:
+        fonte = inspect.getsourcefile(fn)
+    except TypeError:
+        fonte = None
+    return dataset_version.short_hash(f"{RESULT_CACHE_CODE_VERSION}|{_package_hash()}|{_file_hash(fonte)}")
+
+
+# ==================== SERIALIZAÇÃO ====================
+class _Entry:
+    """Arquivos de uma entrada (nomes sequenciais dentro do diretório)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.n = 0
+
+    def new_file(self, ext):
+        nome = f"{self.n}{ext}"
+        self.n += 1
+        return nome, os.path.join(self.path, nome)
+
+def _encode(value, entry):
+    # np.float64 é subclasse de float: o tipo NumPy é preservado antes
+    if isinstance(value, np.generic):
+        return {"__np__": value.dtype.str, "v": value.item()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, pd.Timestamp):
+        return {"__timestamp__": value.isoformat()}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        try:
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            tabela = pa.Table.from_pandas(frame, preserve_index=True)
+            nome, path = entry.new_file(".arrow")
+            feather.write_feather(tabela, path)
+            if isinstance(value, pd.Series):
+                return {"__series__": nome}
+            return {"__frame__": nome}
+        except (pa.ArrowException, TypeError, ValueError):
+            pass  # tipos que o Arrow não representa: pickle
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        nome, path = entry.new_file(".npy")
+        np.save(path, value, allow_pickle=False)
+        return {"__array__": nome}
+    elif isinstance(value, BaseFigure):
+        nome, path = entry.new_file(".json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(value.to_json())
+        return {"__figure__": nome}
+    elif isinstance(value, tuple):
+        return {"__tuple__": [_encode(v, entry) for v in value]}
+    elif isinstance(value, list):
+        return [_encode(v, entry) for v in value]
+    elif isinstance(value, dict):
+        return {"__dict__": [[_encode(k, entry), _encode(v, entry)] for k, v in value.items()]}
+
+    nome, path = entry.new_file(".pkl")
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"__pickle__": nome}
+
+def _decode(value, path):
+    if isinstance(value, list):
+        return [_decode(v, path) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "__np__" in value:
+        return np.dtype(value["__np__"]).type(value["v"])
+    if "__timestamp__" in value:
+        return pd.Timestamp(value["__timestamp__"])
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    if "__frame__" in value:
+        return feather.read_table(os.path.join(path, value["__frame__"])).to_pandas()
+    if "__series__" in value:
+        return feather.read_table(os.path.join(path, value["__series__"])).to_pandas().iloc[:, 0]
+    if "__array__" in value:
+        return np.load(os.path.join(path, value["__array__"]), allow_pickle=False)
+    if "__figure__" in value:
+        with open(os.path.join(path, value["__figure__"]), encoding="utf-8") as f:
+            return pio.from_json(f.read())
+    if "__tuple__" in value:
+        return tuple(_decode(v, path) for v in value["__tuple__"])
+    if "__dict__" in value:
+        return {_decode(k, path): _decode(v, path) for k, v in value["__dict__"]}
+    with open(os.path.join(path, value["__pickle__"]), "rb") as f:
+        return pickle.load(f)
+
+
+# ==================== DISCO ====================
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], key)
+
+def get(key, cache_dir=None):
+    """Resultado em cache (marca o uso para o LRU) ou _MISSING."""
+    path = _entry_path(key, cache_dir or RESULT_CACHE_DIR)
+    meta_path = os.path.join(path, META_FILE)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        valor = _decode(meta["value"], path)
+        os.utime(meta_path)
+        return valor
+    except Exception:
+        # Ausente, apagada pelo prune de outro processo no meio da leitura ou corrompida
+        return _MISSING
+
+def put(key, value, cache_dir=None, **info):
+    """
+    Grava a entrada num diretório temporário e publica com rename (atômico).
+    Devolve o tamanho gravado em bytes (0 se não gravou).
+    """
+    cache_dir = cache_dir or RESULT_CACHE_DIR
+    path = _entry_path(key, cache_dir)
+    tmp = os.path.join(cache_dir, f".tmp-{uuid.uuid4().hex}")
+    try:
+        os.makedirs(tmp)
+        meta = {"value": _encode(value, _Entry(tmp)), **info}
+        with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        tamanho = sum(f.stat().st_size for f in os.scandir(tmp))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+        return tamanho
+    except OSError:
+        return 0  # já gravada por outro processo (ou disco cheio): segue sem cache
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _entries(cache_dir):
+    """[(último uso, bytes, caminho)] das entradas."""
+    entradas = []
+    try:
+        for sub in os.scandir(cache_dir):
+            if not sub.is_dir() or sub.name.startswith(".tmp-"):
+                continue
+            for e in os.scandir(sub.path):
+                try:
+                    uso = os.stat(os.path.join(e.path, META_FILE)).st_mtime
+                    tamanho = sum(f.stat().st_size for f in os.scandir(e.path))
+                except OSError:
+                    continue
+                entradas.append((uso, tamanho, e.path))
+    except OSError:
+        pass
+    return entradas
+
+def prune(cache_dir=None, max_mb=None):
+    """
+    Apaga as entradas usadas há mais tempo até o cache voltar a 90% do
+    limite. Devolve o tamanho restante em bytes.
+    """
+    limite = (RESULT_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    entradas = _entries(cache_dir or RESULT_CACHE_DIR)
+    total = sum(e[1] for e in entradas)
+    if total <= limite:
+        return total
+    for _, tamanho, path in sorted(entradas):
+        if total <= 0.9 * limite:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= tamanho
+    return total
+
+def note_write(nbytes):
+    """
+    Soma uma gravação ao total estimado e chama prune() só quando o total
+    passa de RESULT_CACHE_MAX_MB ou a última varredura é mais antiga que
+    RESULT_CACHE_PRUNE_SECONDS.
+    """
+    with _size_lock:
+        agora = time.time()
+        if _size["bytes"] is not None and agora - _size["at"] < RESULT_CACHE_PRUNE_SECONDS:
+            _size["bytes"] += nbytes
+            if _size["bytes"] <= RESULT_CACHE_MAX_MB * 1024 * 1024:
+                return
+        # Marca antes de varrer: outras threads não disparam uma segunda varredura
+        # (o que elas gravarem enquanto isso é somado ao resultado)
+        _size["at"], _size["bytes"] = agora, 0
+    restante = prune()
+    with _size_lock:
+        _size["bytes"] += restante
+
+def stats(cache_dir=None):
+    """Entradas e tamanho (MB) do cache."""
+    entradas = _entries(cache_dir or RESULT_CACHE_DIR)
+    return {"entries": len(entradas), "mb": round(sum(e[1] for e in entradas) / 1024 / 1024, 1)}
+
+def clear(cache_dir=None):
+    shutil.rmtree(cache_dir or RESULT_CACHE_DIR, ignore_errors=True)
+    with _size_lock:
+        _size["bytes"] = None
+
+
+# ==================== DECORADOR ====================
+def cached(fn):
+    """
+    Cacheia em disco uma função compute_*(base, ...): a chave usa a versão
+    da base (primeiro argumento) e os demais parâmetros, com os padrões
+    aplicados (chamadas equivalentes caem na mesma entrada).
+    """
+    assinatura = inspect.signature(fn)
+    param_base = next(iter(assinatura.parameters))
+    nome = f"{fn.__module__}.{fn.__qualname__}"
+    codigo = _code_hash(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not RESULT_CACHE_ENABLED:
+            return fn(*args, **kwargs)
+        bound = assinatura.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        versao = dataset_version.of(params.pop(param_base))
+        if versao is None:
+            return fn(*args, **kwargs)
+        try:
+            key = result_key(nome, params, versao, codigo)
+        except TypeError:
+            return fn(*args, **kwargs)
+
+        valor = get(key)
+        perf.record_cache(f"resultado:{fn.__name__}", hit=valor is not _MISSING)
+        if valor is not _MISSING:
+            return valor
+        valor = fn(*args, **kwargs)
+        note_write(put(key, valor, function=nome, version=versao))
+        return valor
+    return wrapper
@@ -0,0 +1,135 @@
+# utils/tables.py
+"""
+Camada de apresentação das tabelas (st.dataframe), sem pandas Styler.
+
+Os números seguem numéricos até o navegador (a ordenação por coluna continua
+numérica): a formatação vem dos formatos do st.column_config com Intl do
+navegador, "localized" para R$/inteiros/decimais (pt-BR: 1.234,56; a moeda
+vai no rótulo) e "percent" para percentuais.
+
+O Totalizador é exibido como uma tabela de uma linha logo abaixo da
+principal. As colunas de variação ganham, ao lado, uma coluna com o
+marcador de sinal (🟢 / 🔴) calculado para a coluna inteira, no lugar das
+cores por célula; os valores não são reescritos.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import perf
+
+POSITIVE_MARK = "🟢"
+NEGATIVE_MARK = "🔴"
+SIGN_PREFIX = "sinal:"  # coluna do marcador de sinal de cada coluna de variação
+
+# ==================== FORMATOS DE COLUNA ====================
+# "localized" usa o idioma do navegador (pt-BR: 1.234,56); o step define as casas.
+# "percent" espera frações (0.1234 -> 12,34%): present() divide os pontos por 100.
+
+def brl_column(label=None, **kwargs):
+    """Valor monetário com 2 casas; a moeda fica no rótulo ('Faturamento (R$)')."""
+    label = f"{label} (R$)" if label else label
+    return st.column_config.NumberColumn(label, format="localized", step=0.01, **kwargs)
+
+def int_column(label=None, **kwargs):
+    """Inteiro com separador de milhar."""
+    return st.column_config.NumberColumn(label, format="localized", step=1, **kwargs)
+
+def decimal_column(label=None, decimals=1, **kwargs):
+    return st.column_config.NumberColumn(label, format="localized", step=10 ** -decimals, **kwargs)
+
+def pct_column(label=None, signed=False, **kwargs):
+    """
+    Percentual já em pontos (12.5 -> '12,50%'), exibido pelo formato
+    "percent" sobre valor/100 (ver present()). O sinal de uma variação vem
+    do marcador de color_cols, então `signed` não muda o formato.
+    """
+    return st.column_config.NumberColumn(label, format="percent", **kwargs)
+
+def number_config(columns, brl=(), ints=(), pct=(), signed_pct=(), decimals=()):
+    """Monta o column_config das colunas numéricas presentes em `columns`."""
+    config = {}
+    for tipo, cols in [(brl_column, brl), (int_column, ints), (pct_column, pct), (decimal_column, decimals)]:
+        for c in cols:
+            if c in columns: config[c] = tipo(c)
+    for c in signed_pct:
+        if c in columns: config[c] = pct_column(c, signed=True)
+    return config
+
+# ==================== PERCENTUAIS E SINAL ====================
+def _format_of(cfg):
+    return cfg.get("type_config", {}).get("format") if isinstance(cfg, dict) else None
+
+def sign_marks(values):
+    """Marcador do sinal de cada valor ('🟢', '🔴' ou '')."""
+    v = pd.to_numeric(values, errors="coerce")
+    v = np.asarray(v, dtype=float)
+    return np.select([v > 0, v < 0], [POSITIVE_MARK, NEGATIVE_MARK], "")
+
+def present(df, column_config=None, color_cols=None, column_order=None):
+    """
+    (df, column_config, column_order) prontos para o st.dataframe. As
+    colunas seguem numéricas: as de formato "percent" passam de pontos a
+    fração e cada coluna de color_cols ganha, logo antes dela, a coluna
+    SIGN_PREFIX + nome com o marcador de sinal. O df original não é alterado
+    (exports continuam com os pontos percentuais).
+    """
+    config = dict(column_config or {})
+    marcar = [c for c in (color_cols or []) if c in df.columns]
+    pct = [c for c in df.columns if c in config and _format_of(config[c]) == "percent"]
+    if not marcar and not pct:
+        return df, config, column_order
+
+    out = df.copy()
+    for c in pct:
+        out[c] = pd.to_numeric(df[c], errors="coerce") / 100
+    for c in marcar:
+        out[f"{SIGN_PREFIX}{c}"] = sign_marks(df[c])
+        config[f"{SIGN_PREFIX}{c}"] = st.column_config.TextColumn(" ", width=40)
+
+    order = []
+    for c in (column_order if column_order is not None else df.columns):
+        if c in marcar:
+            order.append(f"{SIGN_PREFIX}{c}")
+        order.append(c)
+    return out, config, order if marcar else column_order
+
+# ==================== EXIBIÇÃO ====================
+def split_total(df, last=False, label="Totalizador"):
+    """
+    Separa o Totalizador do corpo da tabela: a última linha (last=True) ou as
+    linhas com `label` no índice ou em alguma coluna de texto.
+    """
+    if df.empty:
+        return df, df.iloc[0:0]
+    if last:
+        return df.iloc[:-1], df.iloc[-1:]
+    mask = (df.select_dtypes(include="object") == label).any(axis=1) | (df.index == label)
+    return df[~mask], df[mask]
+
+def show_table(df, total=None, column_config=None, color_cols=None, **kwargs):
+    """
+    Exibe df com os formatos de column_config e, se houver, o Totalizador
+    (DataFrame de uma linha com as mesmas colunas) destacado logo abaixo.
+    """
+    config = {"#": st.column_config.TextColumn("#", width="small")}
+    if column_config:
+        config.update(column_config)
+    # Numéricas sem formato explícito: milhar localizado
+    ref = df if not df.empty or total is None else total
+    for c in ref.columns:
+        if isinstance(c, str) and c not in config and pd.api.types.is_numeric_dtype(ref[c]):
+            config[c] = int_column(c) if pd.api.types.is_integer_dtype(ref[c]) else decimal_column(c, decimals=2)
+    kwargs.setdefault("width", "stretch")
+    kwargs.setdefault("hide_index", True)
+
+    with perf.span("format", rows=len(df)):
+        if not df.empty:
+            data, cfg, order = present(df, config, color_cols, kwargs.get("column_order"))
+            st.dataframe(data, column_config=cfg, **{**kwargs, "column_order": order})
+        if total is not None and not total.empty:
+            kwargs.pop("height", None)
+            # Mesma ordem de colunas da tabela principal
+            total = total.reindex(columns=df.columns) if not df.empty else total
+            data, cfg, order = present(total, config, color_cols, kwargs.get("column_order"))
+            st.dataframe(data, column_config=cfg, **{**kwargs, "column_order": order})